@@ -1,7 +1,9 @@
 import time
 import uuid
 from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
+from django.db import connections
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 
@@ -12,6 +14,7 @@ from casexml.apps.case.mock import CaseBlock, CaseBlockError
 from corehq.apps.receiverwrapper.rate_limiter import rate_limit_submission
 from corehq.util.timer import TimingContext
 from couchexport.export import SCALAR_NEVER_WAS
+from dimagi.utils.chunked import chunked
 from dimagi.utils.logging import notify_exception
 from soil.progress import set_task_progress
 
@@ -20,19 +23,23 @@ from corehq.apps.export.tasks import add_inferred_export_properties
 from corehq.apps.groups.models import Group
 from corehq.apps.hqcase.utils import submit_case_blocks
 from corehq.apps.locations.models import SQLLocation
-from corehq.apps.users.cases import get_wrapped_owner
+from corehq.apps.users.cases import get_wrapped_owner, get_wrapped_owners
 from corehq.apps.users.models import CouchUser
 from corehq.apps.users.util import format_username
-from corehq.toggles import BULK_UPLOAD_DATE_OPENED
+from corehq.toggles import BULK_UPLOAD_DATE_OPENED, PARALLEL_CASE_IMPORT
 from corehq.util.datadog.utils import case_load_counter, bucket_value
 from corehq.util.soft_assert import soft_assert
 from corehq.util.metrics import metrics_counter, metrics_histogram
 
 from . import exceptions
 from .const import LookupErrors
-from .util import EXTERNAL_ID, RESERVED_FIELDS, lookup_case
+from .util import EXTERNAL_ID, RESERVED_FIELDS, lookup_case, lookup_cases
 
 CASEBLOCK_CHUNKSIZE = 100
+# number of rows whose cases and owners are looked up together
+ROW_WINDOW_SIZE = 1000
+# number of chunks submitted at a time with the PARALLEL_CASE_IMPORT toggle
+CASEBLOCK_SUBMISSION_WORKERS = 4
 RowAndCase = namedtuple('RowAndCase', ['row', 'case'])
 ALL_LOCATIONS = 'ALL_LOCATIONS'
 
@@ -52,40 +59,105 @@ class _Importer(object):
         self.results = _ImportResults()
 
         self.owner_accessor = _OwnerAccessor(domain, self.user)
+        self.case_lookup = _CaseLookup(domain)
         self.uncreated_external_ids = set()
         self._unsubmitted_caseblocks = []
 
+        # chunks that are being submitted concurrently
+        self._submission_pool = None
+        self._submissions = []
+        self._submitting_case_ids = set()
+        self._submitting_external_ids = set()
+
     def do_import(self, spreadsheet):
-        for row_num, row in enumerate(spreadsheet.iter_row_dicts(), start=1):
-            set_task_progress(self.task, row_num - 1, spreadsheet.max_row)
+        if self.submission_workers > 1:
+            self._submission_pool = ThreadPoolExecutor(max_workers=self.submission_workers)
+        try:
+            row_dicts = enumerate(spreadsheet.iter_row_dicts(), start=1)
+            for window in chunked(row_dicts, ROW_WINDOW_SIZE):
+                self.import_rows(window, spreadsheet.max_row)
+
+            self.commit_caseblocks()
+            self.wait_for_submissions()
+        finally:
+            if self._submission_pool:
+                self._submission_pool.shutdown()
+        return self.results.to_json()
+
+    def import_rows(self, row_dicts, max_row):
+        """
+        Import a window of rows in two passes: parse the rows and look up
+        their cases and owners in bulk, then import them in order.
+        """
+        parsed_rows = []
+        for row_num, raw_row in row_dicts:
             if row_num == 1:
+                parsed_rows.append((row_num, None, None))
                 continue  # skip first row (header row)
 
             try:
-                self.import_row(row_num, row)
+                parsed_rows.append((row_num, self.parse_row(raw_row), None))
             except exceptions.CaseRowError as error:
-                self.results.add_error(row_num, error)
+                parsed_rows.append((row_num, None, error))
 
-        self.commit_caseblocks()
-        return self.results.to_json()
+        self.prefetch([row for row_num, row, parse_error in parsed_rows if row])
+
+        for row_num, row, parse_error in parsed_rows:
+            set_task_progress(self.task, row_num - 1, max_row)
+            try:
+                if parse_error:
+                    raise parse_error
+                if row:
+                    self.import_row(row_num, row)
+            except exceptions.CaseRowError as error:
+                self.results.add_error(row_num, error)
 
-    def import_row(self, row_num, raw_row):
+    def parse_row(self, raw_row):
         search_id = _parse_search_id(self.config, raw_row)
         fields_to_update = _populate_updated_fields(self.config, raw_row)
         if not any(fields_to_update.values()):
             # if the row was blank, just skip it, no errors
-            return
+            return None
 
-        row = _CaseImportRow(
+        return _CaseImportRow(
             search_id=search_id,
             fields_to_update=fields_to_update,
             config=self.config,
             domain=self.domain,
             user_id=self.user.user_id,
             owner_accessor=self.owner_accessor,
+            case_lookup=self.case_lookup,
         )
-        if row.relies_on_uncreated_case(self.uncreated_external_ids):
+
+    def prefetch(self, rows):
+        """
+        Look up the cases, parent cases and owners of rows with one query
+        per kind of lookup instead of one per row
+        """
+        self.case_lookup.clear()
+        self.case_lookup.prefetch(
+            self.config.search_field,
+            [row.search_id for row in rows],
+            self.config.case_type,
+        )
+
+        parent_ids = defaultdict(set)
+        for row in rows:
+            if row.parent_id:
+                parent_ids['case_id', row.parent_type].add(row.parent_id)
+            elif row.parent_external_id:
+                parent_ids[EXTERNAL_ID, row.parent_type].add(row.parent_external_id)
+        for (search_field, parent_type), search_ids in parent_ids.items():
+            self.case_lookup.prefetch(search_field, search_ids, parent_type)
+
+        self.owner_accessor.prefetch_owner_ids([
+            row.uploaded_owner_id for row in rows if not row.uploaded_owner_name
+        ])
+
+    def import_row(self, row_num, row):
+        if row.relies_on_uncreated_case(self.uncreated_external_ids | self._submitting_external_ids):
             self.commit_caseblocks()
+            self.wait_for_submissions()
         if row.is_new_case and not self.config.create_new_cases:
             return
 
@@ -107,7 +179,16 @@ class _Importer(object):
     def user(self):
         return CouchUser.get_by_user_id(self.config.couch_user_id, self.domain)
 
+    @cached_property
+    def submission_workers(self):
+        if PARALLEL_CASE_IMPORT.enabled(self.domain):
+            return CASEBLOCK_SUBMISSION_WORKERS
+        return 1
+
     def add_caseblock(self, caseblock):
+        if _get_case_ids([caseblock]) & self._submitting_case_ids:
+            # the case or its parent is in a chunk that is being submitted
+            self.wait_for_submissions()
         self._unsubmitted_caseblocks.append(caseblock)
         # check if we've reached a reasonable chunksize and if so, submit
         if len(self._unsubmitted_caseblocks) >= CASEBLOCK_CHUNKSIZE:
@@ -115,24 +196,67 @@ class _Importer(object):
 
     def commit_caseblocks(self):
         if self._unsubmitted_caseblocks:
-            self.submit_and_process_caseblocks(self._unsubmitted_caseblocks)
+            if self._submission_pool:
+                self.submit_caseblocks_concurrently(self._unsubmitted_caseblocks)
+            else:
+                self.submit_and_process_caseblocks(self._unsubmitted_caseblocks)
+                self.case_lookup.forget(self.uncreated_external_ids)
             self.results.num_chunks += 1
             self._unsubmitted_caseblocks = []
             self.uncreated_external_ids = set()
 
+    def submit_caseblocks_concurrently(self, caseblocks):
+        if len(self._submissions) >= self.submission_workers:
+            # limit the number of chunks held in memory
+            self._process_submission(*self._submissions.pop(0))
+        self.pre_submit_hook()
+        future = self._submission_pool.submit(self._submit_caseblocks_in_thread, caseblocks)
+        self._submissions.append((caseblocks, future))
+        self._submitting_case_ids.update(_get_case_ids(caseblocks))
+        self._submitting_external_ids.update(self.uncreated_external_ids)
+
+    def wait_for_submissions(self):
+        while self._submissions:
+            self._process_submission(*self._submissions.pop(0))
+        self.case_lookup.forget(self._submitting_external_ids)
+        self._submitting_case_ids = set()
+        self._submitting_external_ids = set()
+
+    def _process_submission(self, caseblocks, future):
+        self.process_submission(caseblocks, future.result())
+
+    def _submit_caseblocks_in_thread(self, caseblocks):
+        try:
+            return self.submit_caseblocks_and_check(caseblocks)
+        finally:
+            # database connections are not shared between threads
+            connections.close_all()
+
     def submit_and_process_caseblocks(self, caseblocks):
         if not caseblocks:
             return
         self.pre_submit_hook()
+        self.process_submission(caseblocks, self.submit_caseblocks_and_check(caseblocks))
+
+    def submit_caseblocks_and_check(self, caseblocks):
+        """
+        :return: The form and cases of the submission, or None if it failed
+        """
         try:
             form, cases = self.submit_case_blocks(caseblocks)
             if form.is_error:
                 raise Exception("Form error during case import: {}".format(form.problem))
         except Exception:
             notify_exception(None, "Case Importer: Uncaught failure submitting caseblocks")
+            return None
+        return form, cases
+
+    def process_submission(self, caseblocks, submission):
+        if submission is None:
             for row_number, case in caseblocks:
                 self.results.add_error(row_number, exceptions.ImportErrorMessage())
         else:
+            form, cases = submission
             if self.record_form_callback:
                 self.record_form_callback(form.form_id)
             properties = {p for c in cases for p in c.dynamic_case_properties().keys()}
@@ -230,13 +354,14 @@ class _TimedAndThrottledImporter(_Importer):
 
 
 class _CaseImportRow(object):
-    def __init__(self, search_id, fields_to_update, config, domain, user_id, owner_accessor):
+    def __init__(self, search_id, fields_to_update, config, domain, user_id, owner_accessor, case_lookup):
         self.search_id = search_id
         self.fields_to_update = fields_to_update
         self.config = config
         self.domain = domain
         self.user_id = user_id
         self.owner_accessor = owner_accessor
+        self.case_lookup = case_lookup
 
         self.case_name = fields_to_update.pop('name', None)
         self.external_id = fields_to_update.pop('external_id', None)
@@ -261,13 +386,11 @@ class _CaseImportRow(object):
 
     @cached_property
     def existing_case(self):
-        case, error = lookup_case(
+        case, error = self.case_lookup.lookup(
             self.config.search_field,
             self.search_id,
-            self.domain,
             self.config.case_type
         )
-        _log_case_lookup(self.domain)
         if error == LookupErrors.MultipleResults:
             raise exceptions.TooManyMatches()
         return case
@@ -292,9 +415,7 @@ class _CaseImportRow(object):
                 ('parent_external_id', 'external_id', self.parent_external_id),
         ]:
             if search_id:
-                parent_case, error = lookup_case(
-                    search_field, search_id, self.domain, self.parent_type)
-                _log_case_lookup(self.domain)
+                parent_case, error = self.case_lookup.lookup(search_field, search_id, self.parent_type)
                 if parent_case:
                     return {self.parent_ref: (parent_case.type, parent_case.case_id)}
                 raise exceptions.InvalidParentId(column)
@@ -341,8 +462,63 @@ class _CaseImportRow(object):
         )
 
 
-def _log_case_lookup(domain):
-    case_load_counter("case_importer", domain)
+class _CaseLookup(object):
+    """
+    Looks up cases with lookup_case, or from the results of lookup_cases
+    for the IDs that were prefetched
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self._results = {}
+
+    def prefetch(self, search_field, search_ids, case_type):
+        search_ids = {
+            search_id for search_id in search_ids
+            if (search_field, search_id, case_type) not in self._results
+        }
+        if not search_ids:
+            return
+        results = lookup_cases(search_field, search_ids, self.domain, case_type)
+        _log_case_lookup(self.domain, len(results))
+        for search_id, result in results.items():
+            self._results[search_field, search_id, case_type] = result
+
+    def lookup(self, search_field, search_id, case_type):
+        key = (search_field, search_id, case_type)
+        if key not in self._results:
+            self._results[key] = lookup_case(search_field, search_id, self.domain, case_type)
+            _log_case_lookup(self.domain)
+        return self._results[key]
+
+    def forget(self, search_ids):
+        """
+        Forget the results for search_ids, e.g. the external IDs of cases
+        that have been created since they were looked up
+        """
+        if search_ids:
+            self._results = {
+                key: result for key, result in self._results.items()
+                if key[1] not in search_ids
+            }
+
+    def clear(self):
+        self._results = {}
+
+
+def _get_case_ids(caseblocks):
+    """
+    The IDs of the cases in caseblocks and of the cases they index
+    """
+    case_ids = set()
+    for row_and_case in caseblocks:
+        case_ids.add(row_and_case.case.case_id)
+        case_ids.update(index.case_id for index in row_and_case.case.index.values())
+    return case_ids
+
+
+def _log_case_lookup(domain, count=1):
+    case_load_counter("case_importer", domain)(count)
 
 
 def _convert_custom_fields_to_struct(config):
@@ -526,6 +702,25 @@ class _OwnerAccessor(object):
     def check_owner_id(self, owner_id):
         return cached_function_call(self._check_owner_id, owner_id, self.id_cache)
 
+    def prefetch_owner_ids(self, owner_ids):
+        """
+        Check the owner IDs that are not cached yet with bulk lookups,
+        caching the results like check_owner_id
+        """
+        owner_ids = {owner_id for owner_id in owner_ids if owner_id and owner_id not in self.id_cache}
+        if not owner_ids:
+            return
+        owners = get_wrapped_owners(owner_ids)
+        for owner_id in owner_ids:
+            try:
+                cached_function_call(
+                    lambda owner_id: self._check_owner(owners.get(owner_id), 'owner_id'),
+                    owner_id,
+                    self.id_cache,
+                )
+            except CaseRowError:
+                pass
+
     def _check_owner_id(self, owner_id):
         """
         Raises InvalidOwner if the owner cannot own cases.
@@ -1,3 +1,4 @@
+from concurrent.futures import Future
 from contextlib import contextmanager
 
 from django.test import TestCase
@@ -495,6 +496,60 @@ class ImporterTest(TestCase):
         ])
         self.assertIn(exceptions.InvalidOwner.title, res['errors'])
 
+    @run_with_all_backends
+    def test_bulk_lookups(self):
+        [parent_case] = self.factory.create_or_update_case(CaseStructure(attrs={'create': True}))
+        case = self.factory.create_case()
+        with patch('corehq.apps.case_importer.do_import.lookup_case') as lookup_case, \
+                patch('corehq.apps.case_importer.do_import.get_wrapped_owner') as get_wrapped_owner:
+            res = self.import_mock_file([
+                ['case_id', 'parent_id', 'owner_id', 'age'],
+                [case.case_id, parent_case.case_id, self.couch_user._id, '1'],
+                ['', parent_case.case_id, self.couch_user._id, '2'],
+                ['', 'missing-parent', '', '3'],
+            ])
+        lookup_case.assert_not_called()
+        get_wrapped_owner.assert_not_called()
+        self.assertEqual(1, res['match_count'])
+        self.assertEqual(1, res['created_count'])
+        self.assertEqual([4], res['errors'][exceptions.InvalidParentId.title]['parent_id']['rows'])
+
+    @run_with_all_backends
+    @flag_enabled('PARALLEL_CASE_IMPORT')
+    @patch('corehq.apps.case_importer.do_import.CASEBLOCK_CHUNKSIZE', 1)
+    @patch('corehq.apps.case_importer.do_import.ThreadPoolExecutor', lambda max_workers: _InlineExecutor())
+    @patch('corehq.apps.case_importer.do_import._Importer._submit_caseblocks_in_thread',
+           lambda self, caseblocks: self.submit_caseblocks_and_check(caseblocks))
+    def test_parallel_submission(self):
+        headers = ['external_id', 'age']
+        config = self._config(headers, search_field='external_id')
+        file = make_worksheet_wrapper(
+            headers,
+            ['importer-test-external-id-1', 'age-0'],
+            ['importer-test-external-id-2', 'age-1'],
+            ['importer-test-external-id-1', 'age-2'],
+        )
+        res = do_import(file, config, self.domain)
+        self.assertEqual(2, res['created_count'])
+        self.assertEqual(1, res['match_count'])
+        self.assertFalse(res['errors'])
+        self.assertEqual(3, res['num_chunks'])
+        self.assertEqual(2, len(self.accessor.get_case_ids_in_domain()))
+        [case] = self.accessor.get_cases_by_external_id('importer-test-external-id-1')
+        self.assertEqual('age-2', case.get_case_property('age'))
+
+
+class _InlineExecutor(object):
+    """Runs submissions in the test thread, which owns the test transaction"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self):
+        pass
+
 
 def make_worksheet_wrapper(*rows):
     return WorksheetWrapper(make_worksheet(rows))
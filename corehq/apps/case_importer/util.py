@@ -1,5 +1,5 @@
 import json
-from collections import OrderedDict, namedtuple
+from collections import OrderedDict, defaultdict, namedtuple
 from contextlib import contextmanager
 
 from celery import states
@@ -171,6 +171,38 @@ def lookup_case(search_field, search_id, domain, case_type):
         return (None, LookupErrors.NotFound)
 
 
+def lookup_cases(search_field, search_ids, domain, case_type):
+    """
+    Like lookup_case for several search_ids, with bulk queries.
+
+    Returns a dict of (case, error) tuples by search_id.
+    """
+    search_ids = set(search_ids)
+    ids_to_query = [search_id for search_id in search_ids if search_id]
+    case_accessors = CaseAccessors(domain)
+    cases_by_search_id = defaultdict(list)
+    if not ids_to_query:
+        pass
+    elif search_field == 'case_id':
+        for case in case_accessors.get_cases(ids_to_query):
+            if case.domain == domain and case.type == case_type:
+                cases_by_search_id[case.case_id].append(case)
+    elif search_field == EXTERNAL_ID:
+        for case in case_accessors.get_cases_by_external_ids(ids_to_query, case_type=case_type):
+            cases_by_search_id[case.external_id].append(case)
+
+    results = {}
+    for search_id in search_ids:
+        cases = cases_by_search_id[search_id]
+        if not cases:
+            results[search_id] = (None, LookupErrors.NotFound)
+        elif len(cases) > 1:
+            results[search_id] = (None, LookupErrors.MultipleResults)
+        else:
+            results[search_id] = (cases[0], None)
+    return results
+
+
 def open_spreadsheet_download_ref(filename):
     """
     open a spreadsheet download ref just to test there are no errors opening it
@@ -24,6 +24,7 @@ class KafkaChangeFeed(ChangeFeed):
     Kafka-based implementation of a ChangeFeed
     """
     sequence_format = 'json'
+    supports_deferred_offsets = True
 
     def __init__(self, topics, client_id, strict=False, num_processes=1, process_num=0):
         """
@@ -34,6 +35,7 @@ class KafkaChangeFeed(ChangeFeed):
         self._topics = topics
         self._client_id = client_id
         self._processed_topic_offsets = {}
+        self._track_read_offsets = True
         self.strict = strict
         self.num_processes = num_processes
         self.process_num = process_num
@@ -88,7 +90,8 @@ class KafkaChangeFeed(ChangeFeed):
 
         try:
             for message in self.consumer:
-                self._processed_topic_offsets[(message.topic, message.partition)] = message.offset
+                if self._track_read_offsets:
+                    self._processed_topic_offsets[(message.topic, message.partition)] = message.offset
                 yield change_from_kafka_message(message)
         except StopIteration:
             assert not forever, 'Kafka pillow should not timeout when waiting forever!'
@@ -114,6 +117,12 @@ class KafkaChangeFeed(ChangeFeed):
     def get_processed_offsets(self):
         return copy(self._processed_topic_offsets)
 
+    def defer_processed_offsets(self):
+        self._track_read_offsets = False
+
+    def mark_processed(self, offsets):
+        self._processed_topic_offsets.update(offsets)
+
     def get_latest_offsets(self):
         return self.consumer.end_offsets(self.consumer.assignment())
 
@@ -1,12 +1,15 @@
+import json
 import re
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from copy import deepcopy
 from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 
 from django.conf import settings
 from django.contrib.postgres.fields import JSONField
 from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.expressions import RawSQL
 from django.utils.translation import ugettext_lazy
 
 import jsonfield
@@ -58,6 +61,8 @@ from corehq.messaging.scheduling.models import (
     TimedSchedule,
 )
 from corehq.messaging.scheduling.scheduling_partitioned.dbaccessors import (
+    delete_case_alert_schedule_instances_for_schedule_id,
+    delete_case_timed_schedule_instances_for_schedule_id,
     get_case_alert_schedule_instances_for_schedule_id,
     get_case_timed_schedule_instances_for_schedule_id,
 )
@@ -88,12 +93,31 @@ def _try_date_conversion(date_or_string):
         date_or_string = date_or_string.decode('utf-8')
     if isinstance(date_or_string, str) and ALLOWED_DATE_REGEX.match(date_or_string):
         try:
-            return parse(date_or_string)
+            return _parse_date(date_or_string)
         except ValueError:
             pass
     return date_or_string
 
 
+# Many cases share the same dates, and rules check the same case properties
+@lru_cache(maxsize=10000)
+def _parse_date(value):
+    return parse(value)
+
+
+class CaseFilter(namedtuple('CaseFilter', 'q_expression annotations')):
+    """
+    A filter for CommCareCaseSQL queries. annotations is a dict of the
+    annotations referenced by q_expression.
+    """
+
+    def __and__(self, other):
+        return CaseFilter(self.q_expression & other.q_expression, dict(self.annotations, **other.annotations))
+
+    def __or__(self, other):
+        return CaseFilter(self.q_expression | other.q_expression, dict(self.annotations, **other.annotations))
+
+
 class AutomaticUpdateRule(models.Model):
     # Used when the rule performs case update actions
     WORKFLOW_CASE_UPDATE = 'CASE_UPDATE'
@@ -220,14 +244,63 @@ class AutomaticUpdateRule(models.Model):
         return date
 
     @classmethod
-    def iter_cases(cls, domain, case_type, boundary_date=None, db=None):
+    def get_case_filter(cls, rules, now):
+        """
+        :return: A CaseFilter matching every CommCareCaseSQL that can match
+        the criteria of at least one of the rules, or None if the cases can't
+        be filtered in the query.
+        """
+        case_filter = None
+        for rule in rules:
+            rule_filter = rule.get_criteria_filter(now)
+            if rule_filter is None:
+                return None
+
+            case_filter = rule_filter if case_filter is None else case_filter | rule_filter
+
+        return case_filter
+
+    def get_criteria_filter(self, now):
+        """
+        :return: A CaseFilter matching every CommCareCaseSQL that can match
+        the criteria of this rule, or None if no criteria can be checked in the
+        query. Cases matching the filter must still be checked with
+        criteria_match.
+        """
+        filters = []
+        if self.filter_on_server_modified:
+            boundary = now - timedelta(days=self.server_modified_boundary)
+            filters.append(CaseFilter(Q(server_modified_on__lte=boundary), {}))
+
+        for criteria in self.memoized_criteria:
+            criteria_filter = criteria.definition.get_case_filter()
+            if criteria_filter is not None:
+                filters.append(criteria_filter)
+
+        if not filters:
+            return None
+
+        result = filters[0]
+        for criteria_filter in filters[1:]:
+            result &= criteria_filter
+
+        return result
+
+    @classmethod
+    def iter_cases(cls, domain, case_type, boundary_date=None, db=None, case_filter=None):
+        """
+        :param case_filter: (optional) A CaseFilter from get_case_filter to
+        only load the cases that can match. It is ignored for domains that use
+        the couch backend.
+        """
         if should_use_sql_backend(domain):
-            return cls._iter_cases_from_postgres(domain, case_type, boundary_date=boundary_date, db=db)
+            return cls._iter_cases_from_postgres(domain, case_type, boundary_date=boundary_date, db=db,
+                                                 case_filter=case_filter)
         else:
             return cls._iter_cases_from_es(domain, case_type, boundary_date=boundary_date)
 
     @classmethod
-    def _iter_cases_from_postgres(cls, domain, case_type, boundary_date=None, db=None):
+    def _iter_cases_from_postgres(cls, domain, case_type, boundary_date=None, db=None, case_filter=None):
         q_expression = Q(
             domain=domain,
             type=case_type,
@@ -238,11 +311,17 @@ class AutomaticUpdateRule(models.Model):
         if boundary_date:
             q_expression = q_expression & Q(server_modified_on__lte=boundary_date)
 
+        annotate = None
+        if case_filter is not None:
+            q_expression = q_expression & case_filter.q_expression
+            annotate = case_filter.annotations
+
         if db:
-            return paginate_query(db, CommCareCaseSQL, q_expression, load_source='auto_update_rule')
+            return paginate_query(db, CommCareCaseSQL, q_expression, annotate=annotate,
+                                  load_source='auto_update_rule')
         else:
             return paginate_query_across_partitioned_databases(
-                CommCareCaseSQL, q_expression, load_source='auto_update_rule'
+                CommCareCaseSQL, q_expression, annotate=annotate, load_source='auto_update_rule'
             )
 
     @classmethod
@@ -330,6 +409,36 @@ class AutomaticUpdateRule(models.Model):
         else:
             return self.run_actions_when_case_does_not_match(case)
 
+    def run_rule_for_cases(self, cases, now):
+        """
+        Same as run_rule, but for many cases at once. The actions for the
+        cases that do not match the criteria are run together for all of
+        those cases.
+
+        :return: CaseRuleActionResult object aggregating the results from all actions.
+        """
+        if self.deleted:
+            raise self.RuleError("Attempted to call run_rule on a deleted rule")
+
+        if not self.active:
+            raise self.RuleError("Attempted to call run_rule on an inactive rule")
+
+        aggregated_result = CaseRuleActionResult()
+        cases_not_matching = []
+        for case in cases:
+            if not isinstance(case, (CommCareCase, CommCareCaseSQL)) or case.domain != self.domain:
+                raise self.RuleError("Invalid case given")
+
+            if self.criteria_match(case, now):
+                aggregated_result.add_result(self.run_actions_when_case_matches(case))
+            else:
+                cases_not_matching.append(case)
+
+        if cases_not_matching:
+            aggregated_result.add_result(self.run_actions_when_cases_do_not_match(cases_not_matching))
+
+        return aggregated_result
+
     def criteria_match(self, case, now):
         if case.is_deleted or case.closed:
             return False
@@ -373,6 +482,9 @@ class AutomaticUpdateRule(models.Model):
     def run_actions_when_case_does_not_match(self, case):
         return self._run_method_on_action_definitions(case, 'when_case_does_not_match')
 
+    def run_actions_when_cases_do_not_match(self, cases):
+        return self._run_method_on_action_definitions(cases, 'when_cases_do_not_match')
+
     def delete_criteria(self):
         for item in self.caserulecriteria_set.all():
             item.definition.delete()
@@ -483,6 +595,15 @@ class CaseRuleCriteriaDefinition(models.Model):
     def matches(self, case, now):
         raise NotImplementedError()
 
+    def get_case_filter(self):
+        """
+        Can be optionally overridden to return a CaseFilter that every
+        CommCareCaseSQL matching this criteria also matches, so that cases
+        which can't match are not loaded. By default returns None, meaning
+        that the criteria can't be checked in the query.
+        """
+        return None
+
 
 class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
     # True when today < (the date in property_name + property_value days)
@@ -511,10 +632,66 @@ class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
     property_value = models.CharField(max_length=126, null=True)
     match_type = models.CharField(max_length=15)
 
+    # The match types which can only match a case that has a value for the property
+    MATCH_TYPES_REQUIRING_VALUE = (
+        MATCH_DAYS_BEFORE,
+        MATCH_DAYS_AFTER,
+        MATCH_EQUAL,
+        MATCH_HAS_VALUE,
+        MATCH_REGEX,
+    )
+
     def get_case_values(self, case):
         values = case.resolve_case_property(self.property_name)
         return [element.value for element in values]
 
+    @property
+    @memoized
+    def days(self):
+        return int(self.property_value)
+
+    @property
+    @memoized
+    def regex(self):
+        """
+        The compiled property_value, or None if it is not a valid regex
+        """
+        try:
+            return re.compile(self.property_value)
+        except (re.error, ValueError, TypeError):
+            return None
+
+    def get_case_filter(self):
+        if (
+            self.match_type not in self.MATCH_TYPES_REQUIRING_VALUE
+            or self.property_name.lower().startswith(('parent/', 'host/'))
+            or self.property_name in self._case_field_names()
+        ):
+            return None
+
+        # case_json is a text column
+        case_json = '"{}"."case_json"::jsonb'.format(CommCareCaseSQL._meta.db_table)
+        if self.match_type == self.MATCH_EQUAL:
+            if not self.property_value:
+                return None
+            sql = case_json + ' @> %s::jsonb'
+            params = [json.dumps({self.property_name: self.property_value})]
+        else:
+            sql = case_json + ' ? %s'
+            params = [self.property_name]
+
+        alias = 'match_property_definition_{}'.format(self.pk)
+        return CaseFilter(
+            Q(**{alias: True}),
+            {alias: RawSQL(sql, params, output_field=models.BooleanField())},
+        )
+
+    @staticmethod
+    def _case_field_names():
+        # CommCareCaseSQL.get_case_property falls back to these fields
+        # when a property is not in case_json
+        return {'_id'} | {field.name for field in CommCareCaseSQL._meta.fields}
+
     def clean_datetime(self, timestamp):
         if not isinstance(timestamp, datetime):
             timestamp = datetime.combine(timestamp, time(0, 0))
@@ -527,6 +704,7 @@ class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
 
     def check_days_before(self, case, now):
         values = self.get_case_values(case)
+        boundary = None
         for date_to_check in values:
             date_to_check = _try_date_conversion(date_to_check)
 
@@ -535,14 +713,16 @@ class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
 
             date_to_check = self.clean_datetime(date_to_check)
 
-            days = int(self.property_value)
-            if now < (date_to_check + timedelta(days=days)):
+            if boundary is None:
+                boundary = now - timedelta(days=self.days)
+            if date_to_check > boundary:
                 return True
 
         return False
 
     def check_days_after(self, case, now):
         values = self.get_case_values(case)
+        boundary = None
         for date_to_check in values:
             date_to_check = _try_date_conversion(date_to_check)
 
@@ -551,8 +731,9 @@ class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
 
             date_to_check = self.clean_datetime(date_to_check)
 
-            days = int(self.property_value)
-            if now >= (date_to_check + timedelta(days=days)):
+            if boundary is None:
+                boundary = now - timedelta(days=self.days)
+            if date_to_check <= boundary:
                 return True
 
         return False
@@ -582,9 +763,8 @@ class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
         return not self.check_has_value(case, now)
 
     def check_regex(self, case, now):
-        try:
-            regex = re.compile(self.property_value)
-        except (re.error, ValueError, TypeError):
+        regex = self.regex
+        if regex is None:
             return False
 
         for value in self.get_case_values(case):
@@ -745,6 +925,19 @@ class CaseRuleActionDefinition(models.Model):
         """
         return CaseRuleActionResult()
 
+    def when_cases_do_not_match(self, cases, rule):
+        """
+        Defines the actions to be taken when many cases do not match the rule.
+        This method can be optionally overriden to handle the cases together,
+        but by default calls when_case_does_not_match for each case.
+        Should return an instance of CaseRuleActionResult
+        """
+        aggregated_result = CaseRuleActionResult()
+        for case in cases:
+            aggregated_result.add_result(self.when_case_does_not_match(case, rule))
+
+        return aggregated_result
+
 
 class UpdateCaseDefinition(CaseRuleActionDefinition):
     # Expected to be a list of PropertyDefinition objects representing the
@@ -1134,6 +1327,10 @@ class CreateScheduleInstanceActionDefinition(CaseRuleActionDefinition):
         self.delete_schedule_instances(case)
         return CaseRuleActionResult()
 
+    def when_cases_do_not_match(self, cases, rule):
+        self.delete_schedule_instances_for_cases([case.case_id for case in cases])
+        return CaseRuleActionResult()
+
     def delete_schedule_instances(self, case):
         if self.alert_schedule_id:
             get_case_alert_schedule_instances_for_schedule_id(case.case_id, self.alert_schedule_id).delete()
@@ -1141,6 +1338,13 @@ class CreateScheduleInstanceActionDefinition(CaseRuleActionDefinition):
         if self.timed_schedule_id:
             get_case_timed_schedule_instances_for_schedule_id(case.case_id, self.timed_schedule_id).delete()
 
+    def delete_schedule_instances_for_cases(self, case_ids):
+        if self.alert_schedule_id:
+            delete_case_alert_schedule_instances_for_schedule_id(case_ids, self.alert_schedule_id)
+
+        if self.timed_schedule_id:
+            delete_case_timed_schedule_instances_for_schedule_id(case_ids, self.timed_schedule_id)
+
     def get_scheduler_module_info(self):
         return self.SchedulerModuleInfo(**self.scheduler_module_info)
 
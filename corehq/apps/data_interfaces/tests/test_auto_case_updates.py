@@ -37,6 +37,7 @@ from corehq.form_processor.signals import sql_case_post_save
 from corehq.form_processor.tests.utils import (
     run_with_all_backends,
     set_case_property_directly,
+    use_sql_backend,
 )
 from corehq.form_processor.utils.general import should_use_sql_backend
 from corehq.toggles import NAMESPACE_DOMAIN, RUN_AUTO_CASE_UPDATES_ON_SAVE
@@ -1095,6 +1096,67 @@ class CaseRuleEndToEndTests(BaseCaseRuleTest):
                 self.assertLastRuleRun(1)
 
 
+@use_sql_backend
+class CaseFilterTest(BaseCaseRuleTest):
+
+    def _rule_with_criteria(self, property_name, match_type, property_value='x'):
+        rule = _create_empty_rule(self.domain)
+        rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name=property_name,
+            property_value=property_value,
+            match_type=match_type,
+        )
+        return AutomaticUpdateRule.objects.get(pk=rule.pk)
+
+    def test_criteria_that_cannot_be_filtered(self):
+        for property_name, match_type in [
+            ('result', MatchPropertyDefinition.MATCH_NOT_EQUAL),
+            ('result', MatchPropertyDefinition.MATCH_HAS_NO_VALUE),
+            ('parent/result', MatchPropertyDefinition.MATCH_EQUAL),
+            ('name', MatchPropertyDefinition.MATCH_EQUAL),
+            ('_id', MatchPropertyDefinition.MATCH_HAS_VALUE),
+        ]:
+            rule = self._rule_with_criteria(property_name, match_type)
+            self.assertIsNone(rule.get_criteria_filter(datetime.utcnow()))
+
+    def test_criteria_filter(self):
+        rule = self._rule_with_criteria('result', MatchPropertyDefinition.MATCH_EQUAL)
+        case_filter = rule.get_criteria_filter(datetime.utcnow())
+        self.assertEqual(len(case_filter.annotations), 1)
+
+        rule.filter_on_server_modified = True
+        rule.server_modified_boundary = 10
+        case_filter = rule.get_criteria_filter(datetime(2017, 4, 26))
+        self.assertIn(('server_modified_on__lte', datetime(2017, 4, 16)), case_filter.q_expression.children)
+
+    def test_rules_filter(self):
+        rule1 = self._rule_with_criteria('result', MatchPropertyDefinition.MATCH_EQUAL)
+        rule2 = self._rule_with_criteria('category', MatchPropertyDefinition.MATCH_REGEX)
+        case_filter = AutomaticUpdateRule.get_case_filter([rule1, rule2], datetime.utcnow())
+        self.assertEqual(len(case_filter.annotations), 2)
+        self.assertEqual(case_filter.q_expression.connector, 'OR')
+
+        # a rule which can match any case means no case can be skipped
+        rule3 = self._rule_with_criteria('result', MatchPropertyDefinition.MATCH_NOT_EQUAL)
+        self.assertIsNone(AutomaticUpdateRule.get_case_filter([rule1, rule3], datetime.utcnow()))
+
+    def test_iter_cases_with_filter(self):
+        rule = self._rule_with_criteria('result', MatchPropertyDefinition.MATCH_EQUAL, property_value='negative')
+        case_filter = AutomaticUpdateRule.get_case_filter([rule], datetime.utcnow())
+
+        with _with_case(self.domain, 'person', datetime.utcnow()) as case1, \
+                _with_case(self.domain, 'person', datetime.utcnow()) as case2:
+            hqcase.utils.update_case(self.domain, case1.case_id, case_properties={'result': 'negative'})
+            hqcase.utils.update_case(self.domain, case2.case_id, case_properties={'result': 'positive'})
+
+            case_ids = {
+                case.case_id
+                for case in AutomaticUpdateRule.iter_cases(self.domain, 'person', case_filter=case_filter)
+            }
+            self.assertEqual(case_ids, {case1.case_id})
+
+
 class TestParentCaseReferences(BaseCaseRuleTest):
 
     def test_closed_parent_criteria(self):
@@ -1,9 +1,9 @@
 from datetime import date, datetime, time
 
 from django.db.models import Q
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
-from mock import call, patch
+from mock import MagicMock, call, patch
 
 from corehq.apps.app_manager.models import (
     AdvancedForm,
@@ -59,6 +59,7 @@ from corehq.messaging.scheduling.tests.util import (
 from corehq.messaging.tasks import (
     run_messaging_rule,
     sync_case_for_messaging_rule,
+    sync_cases_for_messaging_rule,
 )
 from corehq.sql_db.util import paginate_query_across_partitioned_databases
 
@@ -1012,7 +1013,7 @@ class CaseRuleSchedulingIntegrationTest(TestCase):
             self.assertTrue(instances[0].active)
 
     @run_with_all_backends
-    @patch('corehq.messaging.tasks.sync_case_for_messaging_rule.delay')
+    @patch('corehq.messaging.tasks.sync_cases_for_messaging_rule.delay')
     def test_run_messaging_rule(self, task_patch):
         schedule = AlertSchedule.create_simple_alert(
             self.domain,
@@ -1031,14 +1032,53 @@ class CaseRuleSchedulingIntegrationTest(TestCase):
 
         with create_case(self.domain, 'person') as case1, create_case(self.domain, 'person') as case2:
             run_messaging_rule(self.domain, rule.pk)
-            self.assertEqual(task_patch.call_count, 2)
-            task_patch.assert_has_calls(
-                [
-                    call(self.domain, case1.case_id, rule.pk),
-                    call(self.domain, case2.case_id, rule.pk),
-                ],
-                any_order=True
-            )
+            self.assertEqual(task_patch.call_count, 1)
+            domain, case_ids, rule_id = task_patch.call_args[0]
+            self.assertEqual((domain, rule_id), (self.domain, rule.pk))
+            self.assertEqual(set(case_ids), {case1.case_id, case2.case_id})
+
+    @run_with_all_backends
+    @patch('corehq.messaging.scheduling.util.utcnow')
+    def test_sync_cases_for_messaging_rule(self, utcnow_patch):
+        schedule = AlertSchedule.create_simple_alert(
+            self.domain,
+            SMSContent(message={'en': 'Hello'})
+        )
+
+        rule = create_empty_rule(self.domain, AutomaticUpdateRule.WORKFLOW_SCHEDULING)
+
+        _, definition = rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name='start_sending',
+            property_value='Y',
+            match_type=MatchPropertyDefinition.MATCH_EQUAL,
+        )
+
+        rule.add_action(
+            CreateScheduleInstanceActionDefinition,
+            alert_schedule_id=schedule.schedule_id,
+            recipients=(('CommCareUser', self.user.get_id),)
+        )
+
+        AutomaticUpdateRule.clear_caches(self.domain, AutomaticUpdateRule.WORKFLOW_SCHEDULING)
+
+        utcnow_patch.return_value = datetime(2017, 5, 1, 7, 0)
+        with create_case(self.domain, 'person') as case1, create_case(self.domain, 'person') as case2:
+            update_case(self.domain, case1.case_id, case_properties={'start_sending': 'Y'})
+            update_case(self.domain, case2.case_id, case_properties={'start_sending': 'N'})
+            self.assertEqual(get_case_alert_schedule_instances_for_schedule(case1.case_id, schedule).count(), 1)
+            self.assertEqual(get_case_alert_schedule_instances_for_schedule(case2.case_id, schedule).count(), 0)
+
+            # Make the rule match the second case only
+            definition.property_value = 'N'
+            definition.save()
+            AutomaticUpdateRule.clear_caches(self.domain, AutomaticUpdateRule.WORKFLOW_SCHEDULING)
+
+            sync_cases_for_messaging_rule(self.domain, [case1.case_id, case2.case_id], rule.pk)
+            self.assertEqual(get_case_alert_schedule_instances_for_schedule(case1.case_id, schedule).count(), 0)
+            instances = get_case_alert_schedule_instances_for_schedule(case2.case_id, schedule)
+            self.assertEqual(instances.count(), 1)
+            self.assertEqual(instances[0].rule_id, rule.pk)
 
     @run_with_all_backends
     @patch('corehq.messaging.scheduling.models.content.SMSContent.send')
@@ -1368,3 +1408,38 @@ class VisitSchedulerIntegrationHelperTestCase(TestCase):
             case = CaseAccessors(self.domain).get_case(case.case_id)
             helper = self.get_helper(case)
             self.assertEqual(helper.get_anchor_date('add'), date(2017, 8, 1))
+
+
+@patch('corehq.messaging.tasks.CriticalSection', MagicMock())
+@patch('corehq.messaging.tasks.notify_exception')
+@patch('corehq.messaging.tasks.sync_case_for_messaging_rule.delay')
+@patch('corehq.messaging.tasks._sync_case_for_messaging_rule')
+class SyncCasesForMessagingRuleTest(SimpleTestCase):
+
+    def test_failing_case_does_not_block_others(self, sync_case, delay, notify_exception):
+        def sync_cases(domain, case_ids, rule_id):
+            if 'bad' in case_ids:
+                raise Exception('Boom!')
+
+        def sync(domain, case_id, rule_id):
+            if case_id == 'bad':
+                raise Exception('Boom!')
+
+        sync_case.side_effect = sync
+        with patch('corehq.messaging.tasks.MESSAGING_RULE_CASE_BATCH_SIZE', 3), \
+                patch('corehq.messaging.tasks._sync_cases_for_messaging_rule') as sync_batch:
+            sync_batch.side_effect = sync_cases
+            sync_cases_for_messaging_rule('test', ['a', 'bad', 'b', 'c', 'd'], 1)
+
+        sync_batch.assert_has_calls([
+            call('test', ['a', 'bad', 'b'], 1),
+            call('test', ['c', 'd'], 1),
+        ])
+        sync_case.assert_has_calls([
+            call('test', 'a', 1),
+            call('test', 'bad', 1),
+            call('test', 'b', 1),
+        ])
+        self.assertEqual(sync_case.call_count, 3)
+        delay.assert_called_once_with('test', 'bad', 1)
+        notify_exception.assert_called_once()
@@ -109,10 +109,17 @@ from corehq.elastic import (
     SCROLL_PAGE_SIZE_LIMIT,
     SIZE_LIMIT,
     ESError,
+    ParallelScanResult,
     ScanResult,
+    parallel_scroll_query,
     run_query,
     scroll_query,
 )
+from corehq.util.es.query_cache import (
+    QUERY_CACHE_TIMEOUTS,
+    ESQueryCache,
+    get_query_domains,
+)
 
 from . import aggregations, filters, queries
 from .utils import flatten_field_dict, values_list
@@ -143,6 +150,8 @@ class ESQuery(object):
     _size = None
     _aggregations = None
     _source = None
+    _preference = None
+    _cache_options = None
     default_filters = {
         "match_all": filters.match_all()
     }
@@ -213,29 +222,74 @@ class ESQuery(object):
     def run(self, include_hits=False):
         """Actually run the query.  Returns an ESQuerySet object."""
         query = self._clean_before_run(include_hits)
-        raw = run_query(
-            query.index,
-            query.raw_query,
-            debug_host=query.debug_host,
-            es_instance_alias=self.es_instance_alias,
-        )
+
+        def _run_query():
+            return run_query(
+                query.index,
+                query.raw_query,
+                debug_host=query.debug_host,
+                es_instance_alias=self.es_instance_alias,
+            )
+
+        if query._cache_options is not None and not query.debug_host:
+            raw = query._run_cached(_run_query)
+        else:
+            raw = _run_query()
         return ESQuerySet(raw, deepcopy(query))
 
+    def _run_cached(self, run_fn):
+        # only the indices in QUERY_CACHE_TIMEOUTS are invalidated by the ES pillows
+        domains = get_query_domains(self._filters) if self.index in QUERY_CACHE_TIMEOUTS else None
+        index = ES_META[self.index].index if domains else None
+        cache = ESQueryCache(self.index, index, domains, **self._cache_options)
+        return cache.get_or_run(self.raw_query, self.es_instance_alias, run_fn)
+
+    def cached(self, report=None, timeout=None):
+        """
+        Cache the results of ``run`` until documents of the queried domains
+        are written to the index or for ``timeout`` seconds (defaults to a
+        timeout for the index). Only queries filtered by domain of the indices
+        in ``QUERY_CACHE_TIMEOUTS`` are cached.
+        ``report`` is used to tag metrics. See ``corehq.util.es.query_cache``
+        """
+        query = deepcopy(self)
+        query._cache_options = {'report': report, 'timeout': timeout}
+        return query
+
     def _clean_before_run(self, include_hits=False):
         query = deepcopy(self)
         if not include_hits and query.uses_aggregations():
             query = query.size(0)
         return query
 
-    def scroll(self):
+    def scroll(self, slices=None, ordered=False):
         """
         Run the query against the scroll api. Returns an iterator yielding each
         document that matches the query.
+
+        If ``slices`` is given the shards of the index are split between that
+        many scrolls which are read concurrently. Documents are then returned
+        one slice after the other if ``ordered`` is set and as they are
+        fetched otherwise. Use ``slices=0`` for one slice per shard. See
+        ``corehq.elastic.parallel_scan``
         """
         query = deepcopy(self)
         if query._size is None:
             query._size = SCROLL_PAGE_SIZE_LIMIT
-        result = scroll_query(query.index, query.raw_query, es_instance_alias=self.es_instance_alias)
+        if slices is not None:
+            if query._preference:
+                raise ESError("A sliced scroll cannot be limited to a shard")
+            result = parallel_scroll_query(
+                query.index, query.raw_query, slices=slices, ordered=ordered,
+                es_instance_alias=self.es_instance_alias,
+            )
+            return ParallelScanResult(
+                result.count,
+                (ESQuerySet.normalize_result(query, r) for r in result),
+                result.slices,
+            )
+        kwargs = {'preference': query._preference} if query._preference else {}
+        result = scroll_query(query.index, query.raw_query, es_instance_alias=self.es_instance_alias, **kwargs)
         return ScanResult(
             result.count,
             (ESQuerySet.normalize_result(query, r) for r in result)
@@ -388,6 +442,14 @@ class ESQuery(object):
         query._size = size
         return query
 
+    def shard(self, shard_number):
+        """Only search the given shard of the index. The documents of an index
+        can be split between workers by scrolling each shard separately.
+        See ``corehq.elastic.get_shard_count``"""
+        query = deepcopy(self)
+        query._preference = '_shards:{}'.format(shard_number)
+        return query
+
     @property
     def raw_query(self):
         query = deepcopy(self)
@@ -0,0 +1,107 @@
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from corehq.elastic import (
+    ESError,
+    ScanResult,
+    get_slice_preferences,
+    parallel_scan,
+)
+from corehq.util.es.elasticsearch import ElasticsearchException
+
+
+def _hits(ids):
+    return [{'_id': doc_id} for doc_id in ids]
+
+
+class FakeScan(object):
+    """Fake ``corehq.elastic.scan`` returning the hits of each preference"""
+
+    def __init__(self, hits_by_preference, failures=None, rescan_hits=None):
+        self.hits_by_preference = hits_by_preference
+        # preference -> number of hits after which the scroll fails, once per entry
+        self.failures = failures or {}
+        # preference -> hits returned when the preference is scanned again
+        self.rescan_hits = rescan_hits or {}
+        self.calls = []
+
+    def __call__(self, client, query=None, scroll='5m', preference=None, **kwargs):
+        hits = self.hits_by_preference[preference]
+        if preference in self.calls and preference in self.rescan_hits:
+            hits = self.rescan_hits[preference]
+        self.calls.append(preference)
+        failures = self.failures.get(preference)
+        fail_after = failures.pop(0) if failures else None
+
+        def _iter():
+            for index, hit in enumerate(hits):
+                if index == fail_after:
+                    raise ElasticsearchException('scroll failed')
+                yield hit
+
+        return ScanResult(len(hits), _iter())
+
+
+@patch('corehq.elastic.time.sleep')
+class ParallelScanTest(SimpleTestCase):
+    hits = {
+        '_shards:0': _hits(['a', 'b', 'c']),
+        '_shards:1': _hits(['d', 'e']),
+        '_shards:2': _hits([]),
+    }
+
+    def _scan(self, fake_scan, **kwargs):
+        with patch('corehq.elastic.scan', fake_scan), \
+                patch('corehq.elastic.SCAN_SLICE_PAGE_SIZE', 2):
+            result = parallel_scan(None, preferences=sorted(fake_scan.hits_by_preference), **kwargs)
+            return result, [hit['_id'] for hit in result]
+
+    def test_unordered(self, sleep):
+        result, ids = self._scan(FakeScan(self.hits))
+        self.assertEqual(result.count, 5)
+        self.assertEqual(sorted(ids), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual([(s.count, s.fetched, s.done) for s in result.slices],
+                         [(3, 3, True), (2, 2, True), (0, 0, True)])
+
+    def test_ordered(self, sleep):
+        result, ids = self._scan(FakeScan(self.hits), ordered=True, buffer_size=1)
+        self.assertEqual(ids, ['a', 'b', 'c', 'd', 'e'])
+
+    def test_retry_skips_returned_hits(self, sleep):
+        fake_scan = FakeScan(self.hits, failures={'_shards:0': [2]})
+        result, ids = self._scan(fake_scan, ordered=True)
+        self.assertEqual(ids, ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(fake_scan.calls.count('_shards:0'), 2)
+        self.assertEqual((result.slices[0].retries, result.slices[0].fetched), (1, 3))
+
+    def test_retry_with_changed_hits(self, sleep):
+        fake_scan = FakeScan(self.hits, failures={'_shards:0': [2]},
+                             rescan_hits={'_shards:0': _hits(['b', 'a', 'c'])})
+        with self.assertRaises(ESError):
+            self._scan(fake_scan, ordered=True)
+
+    def test_too_many_failures(self, sleep):
+        fake_scan = FakeScan(self.hits, failures={'_shards:1': [1, 1]})
+        with self.assertRaises(ESError):
+            self._scan(fake_scan, retries=1)
+
+    def test_stop_reading(self, sleep):
+        with patch('corehq.elastic.scan', FakeScan(self.hits)), \
+                patch('corehq.elastic.SCAN_SLICE_PAGE_SIZE', 1):
+            result = parallel_scan(None, preferences=sorted(self.hits), ordered=True, buffer_size=1)
+            iterator = iter(result)
+            self.assertEqual(next(iterator), {'_id': 'a'})
+            iterator.close()
+
+
+class SlicePreferencesTest(SimpleTestCase):
+
+    def test_slice_per_shard(self):
+        self.assertEqual(get_slice_preferences(3), ['_shards:0', '_shards:1', '_shards:2'])
+
+    def test_fewer_slices(self):
+        self.assertEqual(get_slice_preferences(5, 2), ['_shards:0,2,4', '_shards:1,3'])
+
+    def test_more_slices_than_shards(self):
+        self.assertEqual(get_slice_preferences(2, 4), ['_shards:0', '_shards:1'])
@@ -8,6 +8,7 @@ from couchdbkit import ResourceConflict
 
 from couchexport.export import FormattedRow, get_writer
 from couchexport.models import Format
+from dimagi.utils.chunked import chunked
 from dimagi.utils.logging import notify_exception
 from soil import DownloadBase
 
@@ -23,12 +24,19 @@ from corehq.apps.export.models.new import (
     FormExportInstance,
     SMSExportInstance,
 )
-from corehq.elastic import iter_es_docs_from_query
-from corehq.toggles import PAGINATED_EXPORTS
+from corehq.elastic import get_shard_count, iter_es_docs_from_query
+from corehq.toggles import (
+    INCREMENTAL_SAVED_EXPORTS,
+    PAGINATED_EXPORTS,
+    STREAMING_XLSX_EXPORTS,
+)
 from corehq.util.datadog.gauges import datadog_histogram, datadog_track_errors
 from corehq.util.datadog.utils import DAY_SCALE_TIME_BUCKETS, load_counter
 from corehq.util.files import TransientTempfile, safe_filename
 
+# Number of documents whose rows are built and written together
+EXPORT_BATCH_SIZE = 200
+
 
 class ExportFile(object):
     # This is essentially coppied from couchexport.files.ExportFiles
@@ -106,13 +114,22 @@ class _ExportWriter(object):
         :param table: A TableConfiguration
         :param row: An ExportRow
         """
+        return self.write_rows(table, [row])
+
+    def write_rows(self, table, rows):
+        """
+        Write the given rows to the given table of the export.
+        _Writer must be opened first.
+        :param table: A TableConfiguration
+        :param rows: A list of ExportRows
+        """
         return self.writer.write([
             (table, [FormattedRow(
                 data=row.data,
                 hyperlink_column_indices=row.hyperlink_column_indices,
                 skip_excel_formatting=row.skip_excel_formatting
                 if hasattr(row, 'skip_excel_formatting') else ()
-            )])
+            ) for row in rows])
         ])
 
     def get_preview(self):
@@ -255,16 +272,33 @@ class _PaginatedExportWriter(object):
         :param table: A TableConfiguration
         :param row: An ExportRow
         """
-        if self.rows_written[table] >= MAX_EXPORTABLE_ROWS * (self.pages[table] + 1):
-            self.pages[table] += 1
-            self.writer.add_table(
-                self._paged_table_index(table),
-                self._get_paginated_headers()[self._paged_table_index(table)][0],
-                table_title=self._get_paginated_table_titles()[self._paged_table_index(table)],
-            )
+        self.write_rows(table, [row])
+
+    def write_rows(self, table, rows):
+        """
+        Write the given rows to the given table of the export, starting a
+        new table whenever the current one is full.
+        :param table: A TableConfiguration
+        :param rows: A list of ExportRows
+        """
+        start = 0
+        while start < len(rows):
+            page_end = MAX_EXPORTABLE_ROWS * (self.pages[table] + 1)
+            if self.rows_written[table] >= page_end:
+                self.pages[table] += 1
+                self.writer.add_table(
+                    self._paged_table_index(table),
+                    self._get_paginated_headers()[self._paged_table_index(table)][0],
+                    table_title=self._get_paginated_table_titles()[self._paged_table_index(table)],
+                )
+                continue
 
-        self.writer.write([(self._paged_table_index(table), [FormattedRow(data=row.data)])])
-        self.rows_written[table] += 1
+            end = start + min(len(rows) - start, page_end - self.rows_written[table])
+            self.writer.write([
+                (self._paged_table_index(table), [FormattedRow(data=row.data) for row in rows[start:end]])
+            ])
+            self.rows_written[table] += end - start
+            start = end
 
 
 def get_export_writer(export_instances, temp_path, allow_pagination=True):
@@ -278,7 +312,11 @@ def get_export_writer(export_instances, temp_path, allow_pagination=True):
         format = export_instances[0].export_format
         format_data_in_excel = export_instances[0].format_data_in_excel
 
-    legacy_writer = get_writer(format, use_formatted_cells=format_data_in_excel)
+    legacy_writer = get_writer(
+        format,
+        use_formatted_cells=format_data_in_excel,
+        streaming=STREAMING_XLSX_EXPORTS.enabled(export_instances[0].domain),
+    )
 
     if allow_pagination and PAGINATED_EXPORTS.enabled(export_instances[0].domain):
         writer = _PaginatedExportWriter(legacy_writer, temp_path)
@@ -317,12 +355,21 @@ def get_export_file(export_instances, filters, temp_path, progress_tracker=None)
     return ExportFile(writer.path, writer.format)
 
 
-def get_export_documents(export_instance, filters):
+def get_export_documents(export_instance, filters, shard=None):
     # Pull doc ids from elasticsearch and stream to disk
     query = _get_export_query(export_instance, filters)
+    if shard is not None:
+        query = query.shard(shard)
     return iter_es_docs_from_query(query)
 
 
+def get_export_shard_count(export_instance):
+    """Number of shards the documents of the export can be fetched from separately
+    by passing ``shard`` to ``get_export_documents``"""
+    query = _get_base_query(export_instance)
+    return get_shard_count(query.index, query.es_instance_alias)
+
+
 def _get_export_query(export_instance, filters):
     query = _get_base_query(export_instance)
     for filter in filters:
@@ -355,40 +402,25 @@ def write_export_instance(writer, export_instance, documents, progress_tracker=N
     write_total = 0
     track_load = load_counter(export_instance.type, "export", export_instance.domain)
 
-    for row_number, doc in enumerate(documents):
-        total_bytes += sys.getsizeof(doc)
+    row_number = 0
+    for batch in chunked(documents, EXPORT_BATCH_SIZE):
+        total_bytes += sum(sys.getsizeof(doc) for doc in batch)
         for table in export_instance.selected_tables:
             compute_start = _time_in_milliseconds()
-            try:
-                rows = table.get_rows(
-                    doc,
-                    row_number,
-                    split_columns=export_instance.split_multiselects,
-                    transform_dates=export_instance.transform_dates,
-                )
-            except Exception as e:
-                notify_exception(None, "Error exporting doc", details={
-                    'domain': export_instance.domain,
-                    'export_instance_id': export_instance.get_id,
-                    'export_table': table.label,
-                    'doc_id': doc.get('_id'),
-                })
-                e.sentry_capture = False
-                raise
+            rows = _get_table_rows(export_instance, table, batch, row_number)
             compute_total += _time_in_milliseconds() - compute_start
 
             write_start = _time_in_milliseconds()
-            for row in rows:
-                # It might be bad to write one row at a time when you can do more (from a performance perspective)
-                # Regardless, we should handle the batching of rows in the _Writer class, not here.
-                writer.write(table, row)
+            if rows:
+                writer.write_rows(table, rows)
             write_total += _time_in_milliseconds() - write_start
 
             total_rows += len(rows)
 
-        track_load()
+        row_number += len(batch)
+        track_load(len(batch))
         if progress_tracker:
-            DownloadBase.set_progress(progress_tracker, row_number + 1, documents.count)
+            DownloadBase.set_progress(progress_tracker, row_number, documents.count)
 
     end = _time_in_milliseconds()
     tags = ['format:{}'.format(writer.format)]
@@ -398,6 +430,37 @@ def write_export_instance(writer, export_instance, documents, progress_tracker=N
     _record_export_duration(end - start, export_instance)
 
 
+def _get_table_rows(export_instance, table, documents, start_row_number, by_document=False):
+    get_rows = table.get_rows_by_document if by_document else table.get_rows_for_documents
+    try:
+        return get_rows(
+            documents,
+            start_row_number,
+            split_columns=export_instance.split_multiselects,
+            transform_dates=export_instance.transform_dates,
+        )
+    except Exception:
+        # Build the rows one document at a time to find the one that failed
+        for row_number, doc in enumerate(documents, start_row_number):
+            try:
+                table.get_rows(
+                    doc,
+                    row_number,
+                    split_columns=export_instance.split_multiselects,
+                    transform_dates=export_instance.transform_dates,
+                )
+            except Exception as e:
+                notify_exception(None, "Error exporting doc", details={
+                    'domain': export_instance.domain,
+                    'export_instance_id': export_instance.get_id,
+                    'export_table': table.label,
+                    'doc_id': doc.get('_id'),
+                })
+                e.sentry_capture = False
+                raise
+        raise
+
+
 def _time_in_milliseconds():
     return int(time.time() * 1000)
 
@@ -474,16 +537,25 @@ def rebuild_export(export_instance, progress_tracker):
     """
     Rebuild the given daily saved ExportInstance
     """
+    from corehq.apps.export.incremental import (
+        rebuild_export_incrementally,
+        supports_incremental_build,
+    )
     filters = export_instance.get_filters()
+    if INCREMENTAL_SAVED_EXPORTS.enabled(export_instance.domain) and supports_incremental_build(export_instance):
+        rebuild_export_incrementally(export_instance, filters or [], progress_tracker)
+        return
+
     with TransientTempfile() as temp_path:
         export_file = get_export_file([export_instance], filters or [], temp_path, progress_tracker)
         with export_file as payload:
             save_export_payload(export_instance, payload)
 
 
-def save_export_payload(export, payload):
+def save_export_payload(export, payload, row_store=None):
     """
     Save the contents of an export file to disk for later retrieval.
+    :param row_store: Rendered rows to save with an incrementally built export
     """
     if export.last_accessed is None:
         export.last_accessed = datetime.datetime.utcnow()
@@ -492,6 +564,8 @@ def save_export_payload(export, payload):
     try:
         with export.atomic_blobs():
             export.set_payload(payload)
+            if row_store is not None:
+                export.set_row_store(row_store)
     except ResourceConflict:
         # task was executed concurrently, so let first to finish win and abort the rest
         pass
@@ -206,6 +206,15 @@ class ReceivedOnRangeFilter(RangeExportFilter):
         return submitted(self.gt, self.gte, self.lt, self.lte)
 
 
+class InsertedAtRangeFilter(RangeExportFilter):
+    """
+    Filter on the time the document was last indexed in ES
+    """
+
+    def to_es_filter(self):
+        return esfilters.date_range('inserted_at', self.gt, self.gte, self.lt, self.lte)
+
+
 class FormSubmittedByFilter(ExportFilter):
 
     def __init__(self, submitted_by):
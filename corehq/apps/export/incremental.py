@@ -0,0 +1,278 @@
+"""
+Incremental builds of daily saved exports
+
+The rows rendered for each document of the export are saved with the
+export file in a "row store". Each rebuild only fetches and renders the
+documents that were indexed in ES since the previous build, merges them
+with the rows of the documents that are unchanged and writes out the
+export file from the merged row store. Rebuild time then depends on the
+number of documents that changed rather than on the size of the export.
+
+The row store is a gzipped sequence of pickles: a header dict followed by
+``(sort_key, doc_id, rows)`` for each document, where ``rows`` holds a list
+of ``(data, skip_excel_formatting)`` for each selected table. Entries are
+kept in the order of the export query (see ``SORT_FIELDS``), and the
+changed documents are merged into the unchanged ones in that order, so
+the rows are in the same order as in a full build. Row numbers are
+assigned again when the export file is written, in the values of the
+row number columns of each table.
+
+The whole export is rendered again if its tables or filters change, or
+if the last full build is older than ``FULL_REBUILD_INTERVAL`` so that
+values looked up from other documents (e.g. usernames) are refreshed.
+"""
+import datetime
+import gzip
+import hashlib
+import heapq
+import json
+import pickle
+import shutil
+from contextlib import closing
+
+from dimagi.utils.chunked import chunked
+from dimagi.utils.parsing import string_to_utc_datetime
+from soil import DownloadBase
+
+from corehq.apps.export.const import CASE_EXPORT, FORM_EXPORT
+from corehq.apps.export.export import (
+    EXPORT_BATCH_SIZE,
+    _get_export_query,
+    _get_table_rows,
+    _record_export_duration,
+    get_export_documents,
+    get_export_writer,
+    save_export_payload,
+)
+from corehq.apps.export.filters import InsertedAtRangeFilter
+from corehq.apps.export.models.new import ExportRow, RowNumberColumn
+from corehq.util.files import TransientTempfile
+from corehq.util.metrics import metrics_counter
+
+ROW_STORE_VERSION = 3
+# `inserted_at` is set shortly before the document is indexed
+CHECKPOINT_OVERLAP = datetime.timedelta(minutes=15)
+FULL_REBUILD_INTERVAL = datetime.timedelta(days=7)
+# number of unchanged documents to check against ES at once
+DOC_ID_CHUNK_SIZE = 1000
+
+
+# the fields export queries are sorted by, see get_form_export_base_query
+# and get_case_export_base_query
+SORT_FIELDS = {
+    FORM_EXPORT: 'received_on',
+    CASE_EXPORT: 'opened_on',
+}
+
+
+def supports_incremental_build(export_instance):
+    # SMS exports have no `inserted_at`
+    return export_instance.type in SORT_FIELDS
+
+
+def rebuild_export_incrementally(export_instance, filters, progress_tracker=None):
+    build_started = datetime.datetime.utcnow()
+    config_hash = get_build_config_hash(export_instance, filters)
+    with TransientTempfile() as previous_path, \
+            TransientTempfile() as changed_path, \
+            TransientTempfile() as store_path, \
+            TransientTempfile() as export_path:
+        previous_header = _fetch_row_store(export_instance, previous_path)
+        full_build = _needs_full_build(previous_header, config_hash, build_started)
+        if full_build:
+            documents = get_export_documents(export_instance, filters)
+        else:
+            since = InsertedAtRangeFilter(gte=previous_header['checkpoint'])
+            documents = get_export_documents(export_instance, filters + [since])
+
+        header = {
+            'version': ROW_STORE_VERSION,
+            'config_hash': config_hash,
+            'checkpoint': build_started - CHECKPOINT_OVERLAP,
+            'full_build': build_started if full_build else previous_header['full_build'],
+        }
+        rendered = _render_documents(export_instance, documents, progress_tracker)
+        if full_build:
+            write_row_store(store_path, header, rendered)
+        else:
+            changed_ids = set()
+            write_row_store(changed_path, {}, _collect_doc_ids(rendered, changed_ids))
+            unchanged = _iter_unchanged_entries(export_instance, filters, previous_path, changed_ids)
+            write_row_store(store_path, header, merge_entries(unchanged, read_row_store(changed_path)[1]))
+
+        metrics_counter('commcare.export.incremental_build', tags={
+            'build_type': 'full' if full_build else 'incremental',
+        })
+        write_export_from_row_store(export_instance, store_path, export_path)
+        build_duration = datetime.datetime.utcnow() - build_started
+        _record_export_duration(int(build_duration.total_seconds() * 1000), export_instance)
+        with open(export_path, 'rb') as payload, open(store_path, 'rb') as row_store:
+            save_export_payload(export_instance, payload, row_store)
+
+
+def get_build_config_hash(export_instance, filters):
+    """Hash of everything other than the documents that the rendered rows depend on"""
+    config = {
+        'version': ROW_STORE_VERSION,
+        'query': _get_export_query(export_instance, filters).raw_query,
+        'tables': [table.to_json() for table in export_instance.selected_tables],
+        'split_multiselects': export_instance.split_multiselects,
+        'transform_dates': export_instance.transform_dates,
+    }
+    content = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+def _needs_full_build(previous_header, config_hash, build_started):
+    return (
+        previous_header is None
+        or previous_header['version'] != ROW_STORE_VERSION
+        or previous_header['config_hash'] != config_hash
+        or build_started - previous_header['full_build'] > FULL_REBUILD_INTERVAL
+    )
+
+
+def _fetch_row_store(export_instance, path):
+    """Copy the row store of the last build to ``path`` and return its header"""
+    if not export_instance.has_row_store():
+        return None
+    with closing(export_instance.get_row_store(stream=True)) as row_store, open(path, 'wb') as file:
+        shutil.copyfileobj(row_store, file)
+    return read_row_store(path)[0]
+
+
+def _render_documents(export_instance, documents, progress_tracker=None):
+    tables = export_instance.selected_tables
+    sort_field = SORT_FIELDS[export_instance.type]
+    if progress_tracker:
+        DownloadBase.set_progress(progress_tracker, 0, documents.count)
+    done = 0
+    for batch in chunked(documents, EXPORT_BATCH_SIZE):
+        rows_by_table = [
+            _get_table_rows(export_instance, table, batch, 0, by_document=True)
+            for table in tables
+        ]
+        for doc, doc_rows in zip(batch, zip(*rows_by_table) if tables else [()] * len(batch)):
+            yield get_sort_key(doc.get(sort_field)), doc['_id'], [
+                [(row.data, row.skip_excel_formatting) for row in table_rows]
+                for table_rows in doc_rows
+            ]
+        done += len(batch)
+        if progress_tracker:
+            DownloadBase.set_progress(progress_tracker, done, documents.count)
+
+
+def get_sort_key(value):
+    # ES sorts documents by date and those without a value last. Date
+    # strings are parsed because they differ in sub-second precision.
+    if value is None:
+        return (True, datetime.datetime.min)
+    return (False, string_to_utc_datetime(value))
+
+
+def merge_entries(*entry_iterables):
+    """Merge row store entries that are each in export order"""
+    return heapq.merge(*entry_iterables, key=lambda entry: entry[0])
+
+
+def _collect_doc_ids(entries, doc_ids):
+    for entry in entries:
+        doc_ids.add(entry[1])
+        yield entry
+
+
+def _iter_unchanged_entries(export_instance, filters, previous_path, changed_ids):
+    """Rows of the last build for documents that did not change and still match the export"""
+    query = _get_export_query(export_instance, filters)
+    entries = (entry for entry in read_row_store(previous_path)[1] if entry[1] not in changed_ids)
+    for chunk in chunked(entries, DOC_ID_CHUNK_SIZE):
+        doc_ids = [doc_id for sort_key, doc_id, rows in chunk]
+        # deleted documents and those that no longer match the filters
+        matching_ids = set(query.doc_id(doc_ids).size(len(doc_ids)).get_ids())
+        for entry in chunk:
+            if entry[1] in matching_ids:
+                yield entry
+
+
+def read_row_store(path):
+    """
+    :return: tuple of the header and an iterator over ``(sort_key, doc_id, rows)``
+    """
+    def _iter_pickles():
+        with gzip.open(path, 'rb') as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    return
+
+    entries = _iter_pickles()
+    return next(entries), entries
+
+
+def write_row_store(path, header, entries):
+    with gzip.open(path, 'wb') as file:
+        pickle.dump(header, file, pickle.HIGHEST_PROTOCOL)
+        for entry in entries:
+            pickle.dump(entry, file, pickle.HIGHEST_PROTOCOL)
+
+
+def write_export_from_row_store(export_instance, store_path, export_path):
+    export_instances = [export_instance]
+    tables = export_instance.selected_tables
+    hyperlink_column_indices = [
+        table.get_hyperlink_column_indices(export_instance.split_multiselects)
+        for table in tables
+    ]
+    row_number_column_indices = [
+        get_row_number_column_indices(table, export_instance.split_multiselects)
+        for table in tables
+    ]
+    writer = get_export_writer(export_instances, export_path)
+    with writer.open(export_instances):
+        row_number = 0
+        for batch in chunked(read_row_store(store_path)[1], EXPORT_BATCH_SIZE):
+            for table_index, table in enumerate(tables):
+                rows = [
+                    ExportRow(
+                        data=renumber_row(data, row_number_column_indices[table_index], doc_row_number),
+                        hyperlink_column_indices=hyperlink_column_indices[table_index],
+                        skip_excel_formatting=skip_excel_formatting,
+                    )
+                    for doc_row_number, (sort_key, doc_id, rows_by_table) in enumerate(batch, row_number)
+                    for data, skip_excel_formatting in rows_by_table[table_index]
+                ]
+                if rows:
+                    writer.write_rows(table, rows)
+            row_number += len(batch)
+
+
+def get_row_number_column_indices(table, split_columns):
+    """Index of the first value of each ``RowNumberColumn`` of the table"""
+    column_indices = []
+    index = 0
+    for column in table.selected_columns:
+        if isinstance(column, RowNumberColumn):
+            column_indices.append(index)
+        index += len(column.get_headers(split_column=split_columns))
+    return column_indices
+
+
+def renumber_row(data, row_number_column_indices, row_number):
+    """
+    Set the row number of the document in the values of the row number
+    columns: "<row number>.<repeat index>..." followed by each of its parts
+    for repeats.
+
+    :param row_number_column_indices: index of the first value of each
+    row number column (see ``get_row_number_column_indices``)
+    """
+    if not row_number_column_indices:
+        return data
+    data = list(data)
+    for index in row_number_column_indices:
+        parts = data[index].split('.')
+        data[index] = '.'.join([str(row_number)] + parts[1:])
+        if len(parts) > 1:
+            data[index + 1] = row_number
+    return data
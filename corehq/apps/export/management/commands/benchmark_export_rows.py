@@ -0,0 +1,61 @@
+import time
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dimagi.utils.chunked import chunked
+
+from corehq.apps.export.dbaccessors import get_properly_wrapped_export_instance
+from corehq.apps.export.export import EXPORT_BATCH_SIZE, get_export_documents
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the time taken to build the rows of an export one document at a time "
+        "and in batches. A sample of the export's documents is repeated to make up the "
+        "requested number of documents. Fails if the rows are not identical."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('export_id')
+        parser.add_argument('--docs', type=int, default=100000,
+                            help='Number of documents to build rows for.')
+        parser.add_argument('--sample', type=int, default=1000,
+                            help='Number of documents to fetch from the export.')
+        parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+
+    def handle(self, export_id, **options):
+        export_instance = get_properly_wrapped_export_instance(export_id)
+        sample = list(islice(get_export_documents(export_instance, []), options['sample']))
+        if not sample:
+            raise CommandError("The export has no documents")
+        documents = list(islice(cycle(sample), options['docs']))
+        kwargs = {
+            'split_columns': export_instance.split_multiselects,
+            'transform_dates': export_instance.transform_dates,
+        }
+
+        for table in export_instance.selected_tables:
+            start = time.time()
+            expected = [
+                row.data
+                for row_number, doc in enumerate(documents)
+                for row in table.get_rows(doc, row_number, **kwargs)
+            ]
+            per_document = time.time() - start
+
+            start = time.time()
+            rows = []
+            row_number = 0
+            for batch in chunked(documents, options['batch_size']):
+                rows.extend(row.data for row in table.get_rows_for_documents(batch, row_number, **kwargs))
+                row_number += len(batch)
+            batched = time.time() - start
+
+            if rows != expected:
+                raise CommandError("Rows of table '{}' do not match".format(table.label))
+            speedup = per_document / batched if batched else 0
+            self.stdout.write(
+                '{}: {} rows from {} documents, per document {:.2f}s, batched {:.2f}s ({:.1f}x)'.format(
+                    table.label, len(rows), len(documents), per_document, batched, speedup)
+            )
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from couchexport.export import FormattedRow
+from couchexport.writers import (
+    Excel2007ExportWriter,
+    StreamingExcel2007ExportWriter,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the time, peak memory and file size of writing a synthetic "
+        "table with the openpyxl and the streaming Excel 2007 export writers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--columns', type=int, default=20)
+        parser.add_argument('--formatted', action='store_true',
+                            help='Write formatted cells (dates, numbers) as for exports with '
+                                 '"Automatically format cells for Excel 2007+" enabled.')
+
+    def handle(self, **options):
+        for writer_class in (Excel2007ExportWriter, StreamingExcel2007ExportWriter):
+            fd, path = tempfile.mkstemp(suffix='.xlsx')
+            os.close(fd)
+            try:
+                tracemalloc.start()
+                start = time.time()
+                self._write(writer_class(use_formatted_cells=options['formatted']), path, options)
+                duration = time.time() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.stdout.write('{}: {:.2f}s, peak memory {:.1f}MB, file size {:.1f}MB'.format(
+                    writer_class.__name__, duration, peak / 1024 ** 2, os.path.getsize(path) / 1024 ** 2))
+            finally:
+                os.remove(path)
+
+    def _write(self, writer, path, options):
+        columns = options['columns']
+        headers = [['column {}'.format(index) for index in range(columns)]]
+        with open(path, 'wb') as file:
+            writer.open([('table', headers)], file)
+            for row_number in range(options['rows']):
+                writer.write_row('table', FormattedRow(
+                    self._get_row(row_number, columns),
+                    hyperlink_column_indices=[columns - 1],
+                ))
+            writer.close()
+
+    @staticmethod
+    def _get_row(row_number, columns):
+        values = [
+            str(row_number),
+            '2020-01-{:02d}'.format(row_number % 28 + 1),
+            '2020-01-01T10:{:02d}:00.000Z'.format(row_number % 60),
+            str(row_number * 1.5),
+            'option{}'.format(row_number % 10),
+            'free text value {}'.format(row_number),
+        ]
+        row = [values[index % len(values)] for index in range(columns - 1)]
+        return row + ['https://example.com/a/test/{}'.format(row_number)]
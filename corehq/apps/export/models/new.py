@@ -111,6 +111,7 @@ from corehq.util.timezones.utils import get_timezone_for_domain
 from corehq.util.view_utils import absolute_reverse
 
 DAILY_SAVED_EXPORT_ATTACHMENT_NAME = "payload"
+ROW_STORE_ATTACHMENT_NAME = "row_store"
 
 
 ExcelFormatValue = namedtuple('ExcelFormatValue', 'format value')
@@ -279,6 +280,41 @@ class ExportColumn(DocumentSchema):
         path = [x.name for x in self.item.path[len(base_path):]]
         return self._transform(NestedDictGetter(path)(doc), doc, transform_dates)
 
+    def get_values(self, doc_rows, base_path, transform_dates=False, split_column=False):
+        """
+        Get the values of self.item for a batch of rows.
+        Returns the same values as calling get_value for each row, but the
+        path to the ExportItem is resolved once for the whole batch.
+        :param doc_rows: A list of (domain, doc_id, DocRow) tuples
+        :param base_path: The PathNode list to the column
+        :param transform_dates: If set to True, will convert dates to be compatible with Excel
+        :param split_column: When True will split SplitExportColumn into multiple columns
+        :return: A list containing the value of each row
+        """
+        if type(self).get_value is not ExportColumn.get_value:
+            # Columns that compute their value differently are evaluated row by row
+            return [
+                self.get_value(
+                    domain,
+                    doc_id,
+                    doc_row.doc,
+                    base_path,
+                    transform_dates=transform_dates,
+                    row_index=doc_row.row,
+                    split_column=split_column,
+                )
+                for domain, doc_id, doc_row in doc_rows
+            ]
+        return self._get_item_values(doc_rows, base_path, transform_dates)
+
+    def _get_item_values(self, doc_rows, base_path, transform_dates):
+        assert base_path == self.item.path[:len(base_path)], "ExportItem's path doesn't start with the base_path"
+        getter = NestedDictGetter([x.name for x in self.item.path[len(base_path):]])
+        return [
+            self._transform(getter(doc_row.doc), doc_row.doc, transform_dates)
+            for domain, doc_id, doc_row in doc_rows
+        ]
+
     def _transform(self, value, doc, transform_dates):
         """
         Transform the given value with the transform specified in self.item.transform.
@@ -554,6 +590,79 @@ class TableConfiguration(DocumentSchema, ReadablePathMixin):
                 ))
         return rows
 
+    def get_rows_for_documents(self, documents, start_row_number, split_columns=False,
+                               transform_dates=False):
+        """
+        Return a list of ExportRows generated for a batch of documents.
+        Produces the same rows as calling get_rows for each document, but
+        builds the table one column at a time and computes everything that
+        does not depend on the document once per batch.
+        :param documents: list of dictionary representations of form submissions or cases
+        :param start_row_number: index of the first document in the sequence of all documents in the export
+        :return: List of ExportRows
+        """
+        doc_rows, _ = self._get_doc_rows(documents, start_row_number)
+        return self._get_rows_for_doc_rows(doc_rows, split_columns, transform_dates)
+
+    def get_rows_by_document(self, documents, start_row_number, split_columns=False,
+                             transform_dates=False):
+        """
+        Same as get_rows_for_documents, but the rows are grouped by document.
+        :return: List containing a list of ExportRows for each document
+        """
+        doc_rows, rows_per_document = self._get_doc_rows(documents, start_row_number)
+        rows = self._get_rows_for_doc_rows(doc_rows, split_columns, transform_dates)
+        rows_by_document = []
+        start = 0
+        for count in rows_per_document:
+            rows_by_document.append(rows[start:start + count])
+            start += count
+        return rows_by_document
+
+    def _get_doc_rows(self, documents, start_row_number):
+        doc_rows = []
+        rows_per_document = []
+        for row_number, document in enumerate(documents, start_row_number):
+            document_id = document.get('_id')
+            sub_documents = self._get_sub_documents(document, row_number, document_id=document_id)
+            domain = document.get('domain')
+
+            assert domain is not None, 'Form or Case must be associated with domain'
+            assert document_id is not None, 'Form or Case must have an id'
+
+            doc_rows.extend((domain, document_id, doc_row) for doc_row in sub_documents)
+            rows_per_document.append(len(sub_documents))
+        return doc_rows, rows_per_document
+
+    def _get_rows_for_doc_rows(self, doc_rows, split_columns, transform_dates):
+        selected_columns = self.selected_columns
+        columns = [
+            col.get_values(doc_rows, self.path, transform_dates=transform_dates, split_column=split_columns)
+            for col in selected_columns
+        ]
+        # we never want to auto-format RowNumberColumn (always treat as text)
+        is_row_number_column = [isinstance(col, RowNumberColumn) for col in selected_columns]
+        hyperlink_column_indices = self.get_hyperlink_column_indices(split_columns)
+
+        rows = []
+        for row_values in (zip(*columns) if columns else [()] * len(doc_rows)):
+            row_data = []
+            skip_excel_formatting = []
+            for val, skip_formatting in zip(row_values, is_row_number_column):
+                col_index = len(row_data)
+                if isinstance(val, list):
+                    row_data.extend(val)
+                else:
+                    row_data.append(val)
+                if skip_formatting:
+                    skip_excel_formatting.extend(range(col_index, len(row_data)))
+            rows.append(ExportRow(
+                data=row_data,
+                hyperlink_column_indices=hyperlink_column_indices,
+                skip_excel_formatting=skip_excel_formatting
+            ))
+        return rows
+
     def get_column(self, item_path, item_doc_type, column_transform):
         """
         Given a path and transform, will return the column and its index. If not found, will
@@ -1068,6 +1177,19 @@ class ExportInstance(BlobMixin, Document):
         """
         return self.fetch_attachment(DAILY_SAVED_EXPORT_ATTACHMENT_NAME, stream=stream)
 
+    def has_row_store(self):
+        """
+        Return True if the rendered rows of the last incremental build are saved.
+        See corehq.apps.export.incremental
+        """
+        return ROW_STORE_ATTACHMENT_NAME in self.blobs
+
+    def set_row_store(self, row_store):
+        self.put_attachment(row_store, ROW_STORE_ATTACHMENT_NAME)
+
+    def get_row_store(self, stream=False):
+        return self.fetch_attachment(ROW_STORE_ATTACHMENT_NAME, stream=stream)
+
     def copy_export(self):
         export_json = self.to_json()
         del export_json['_id']
@@ -2466,7 +2588,15 @@ class SplitGPSExportColumn(ExportColumn):
         )
         if not split_column:
             return value
+        return self._split_value(value)
+
+    def get_values(self, doc_rows, base_path, transform_dates=False, split_column=False):
+        values = self._get_item_values(doc_rows, base_path, transform_dates)
+        if not split_column:
+            return values
+        return [self._split_value(value) for value in values]
 
+    def _split_value(self, value):
         if value == MISSING_VALUE:
             return [MISSING_VALUE] * 4
 
@@ -2515,7 +2645,15 @@ class SplitExportColumn(ExportColumn):
         value = super(SplitExportColumn, self).get_value(domain, doc_id, doc, base_path, **kwargs)
         if not split_column:
             return value
+        return self._split_value(value)
+
+    def get_values(self, doc_rows, base_path, transform_dates=False, split_column=False):
+        values = self._get_item_values(doc_rows, base_path, transform_dates)
+        if not split_column:
+            return values
+        return [self._split_value(value) for value in values]
 
+    def _split_value(self, value):
         if value == MISSING_VALUE:
             value = [MISSING_VALUE] * len(self.item.options)
             if not self.ignore_unspecified_options:
@@ -10,11 +10,13 @@ You can also use the MultiprocessExporter class to have more control over the pr
 See the 'process_skipped_pages' management command for an example.
 
 The export works as follows:
-  * Dump raw docs from ES into files of size N docs
-  * Once each file is complete add it to a multiprocessing Queue
-  * Pool of X processes listen to queue and process the dump file
+  * Each shard of the ES index is added to a pool of X processes
+  * Each process fetches the docs of its shard and streams them into the export
+    writer, starting a new page every N docs
+    * A raw dump of each page is written alongside so that it can be retried
   * Results returned back to the main process
-    * Unsuccessful results can be retried
+    * Shards that could not be fetched are retried from the start
+    * Unsuccessful pages are retried from their raw dump
   * Add successful pages to final ZIP archive
   * Add raw data dumps for unsuccessful pages to final ZIP archive
 """
@@ -28,6 +30,7 @@ import time
 import zipfile
 from collections import namedtuple
 from datetime import timedelta
+from itertools import chain, islice
 
 from six.moves.queue import Empty
 
@@ -37,6 +40,7 @@ from couchexport.writers import ZippedExportWriter
 from corehq.apps.export.dbaccessors import get_properly_wrapped_export_instance
 from corehq.apps.export.export import (
     get_export_documents,
+    get_export_shard_count,
     get_export_size,
     get_export_writer,
     save_export_payload,
@@ -80,6 +84,19 @@ class QueuedResult(RetryResult):
         self.async_result = async_result
 
 
+class QueuedShard(object):
+    def __init__(self, async_result, shard, filters, page_size, retry_count):
+        self.async_result = async_result
+        self.shard = shard
+        self.filters = filters
+        self.page_size = page_size
+        self.retry_count = retry_count
+
+
+class ShardFetchError(Exception):
+    """Raised when the documents of a shard could not be fetched"""
+
+
 class OutputPaginator(object):
     """Helper class to paginate raw export output"""
     def __init__(self, export_id, start_page_count=0):
@@ -113,7 +130,7 @@ class OutputPaginator(object):
 
     def write(self, doc):
         self.page_size += 1
-        self.file.write('{}\n'.format(json.dumps(doc)))
+        self.file.write('{}\n'.format(json.dumps(doc)).encode('utf-8'))
 
     def get_result(self):
         return RetryResult(self.page, self.path, self.page_size, 0)
@@ -126,10 +143,18 @@ def rebuild_export_mutiprocess(export_id, num_processes, page_size=100000):
     filters = export_instance.get_filters()
     total_docs = get_export_size(export_instance, filters)
     exporter = MultiprocessExporter(export_instance, total_docs, num_processes)
-    paginator = OutputPaginator(export_id)
 
-    logger.info('Starting data dump of {} docs'.format(total_docs))
-    run_multiprocess_exporter(exporter, filters, paginator, page_size)
+    logger.info('Starting export of {} docs'.format(total_docs))
+    run_sharded_exporter(exporter, filters, page_size)
+
+
+def run_sharded_exporter(exporter, filters, page_size):
+    """Export each shard of the ES index in a separate process"""
+    with exporter:
+        for shard in range(get_export_shard_count(exporter.export_instance)):
+            exporter.process_shard(shard, filters, page_size)
+
+    exporter.wait_till_completion()
 
 
 def run_multiprocess_exporter(exporter, filters, paginator, page_size):
@@ -170,6 +195,101 @@ def run_export_with_logging(export_instance, page_number, dump_path, doc_count,
         raise
 
 
+def run_shard_export_with_logging(export_instance, filters, shard, page_size, attempts):
+    """Log any exceptions here since logging on the other side of the process queue
+    won't show the traceback
+    """
+    logger.info('    Processing shard {} started (attempt {})'.format(shard, attempts))
+    progress_queue = getattr(run_shard_export_with_logging, 'queue', None)
+    try:
+        results = run_shard_export(export_instance, filters, shard, page_size, progress_queue)
+        logger.info('    Processing shard {} complete: {} pages'.format(shard, len(results)))
+        return results
+    except Exception:
+        logger.exception("Error processing shard {} (attempt {})".format(shard, attempts))
+        raise
+
+
+def run_shard_export(export_instance, filters, shard, page_size, progress_queue=None):
+    """Export the docs of one shard of the ES index in pages of ``page_size`` docs
+
+    Docs are passed to the export writer as they are fetched. Pages that
+    could not be processed are returned as a ``RetryResult`` with the path
+    to a raw dump of the page. If fetching the docs fails, no results are
+    kept and ``ShardFetchError`` is raised.
+
+    :return: list of results, numbered from 0 within the shard
+    """
+    documents = get_export_documents(export_instance, filters, shard=shard)
+    docs_remaining = documents.count
+    docs = iter(documents)
+    results = []
+    try:
+        while True:
+            try:
+                first_doc = next(docs)
+            except StopIteration:
+                break
+            except Exception as e:
+                raise ShardFetchError(e) from e
+            page_docs = chain([first_doc], islice(docs, page_size - 1))
+            page_name = '{}.{}'.format(shard, len(results))
+            doc_count = max(min(page_size, docs_remaining), 1)
+            result = _run_page_export(
+                export_instance, len(results), page_name, page_docs, doc_count, progress_queue
+            )
+            docs_remaining -= result.page_size
+            results.append(result)
+    except Exception:
+        for result in results:
+            if os.path.exists(result.path):
+                os.remove(result.path)
+        raise
+    return results
+
+
+def _run_page_export(export_instance, page_number, page_name, docs, doc_count, progress_queue=None):
+    update_frequency = min(1000, int(doc_count // 10) or 1)
+    progress_tracker = LoggingProgressTracker(page_name, progress_queue, update_frequency)
+    paginator = OutputPaginator(export_instance.get_id, page_number)
+    with paginator:
+        dumped_docs = _dump_docs(docs, paginator)
+        try:
+            export_file_path = _get_export_file_path(
+                export_instance, ScanResult(doc_count, dumped_docs), progress_tracker
+            )
+        except ShardFetchError:
+            raise
+        except Exception:
+            logger.exception("Error processing page {}".format(page_name))
+            # dump the rest of the page so that it can be retried
+            for doc in dumped_docs:
+                pass
+            result = paginator.get_result()
+            result.retry_count = 1
+        else:
+            result = SuccessResult(page_number, export_file_path, paginator.page_size)
+            dump_path = paginator.path
+    if result.success:
+        os.remove(dump_path)
+    progress = result.page_size if result.success else 0
+    if progress_queue:
+        progress_queue.put(ProgressValue(page_name, progress, progress))
+    return result
+
+
+def _dump_docs(docs, paginator):
+    while True:
+        try:
+            doc = next(docs)
+        except StopIteration:
+            return
+        except Exception as e:
+            raise ShardFetchError(e) from e
+        paginator.write(doc)
+        yield doc
+
+
 def run_export(export_instance, page_number, dump_path, doc_count, progress_tracker=None):
     docs = _get_export_documents_from_file(dump_path, doc_count)
     export_file_path = _get_export_file_path(export_instance, docs, progress_tracker)
@@ -236,11 +356,13 @@ class MultiprocessExporter(object):
         self.progress = multiprocessing.Process(target=_output_progress, args=(self.progress_queue, total_docs))
 
         self.export_function = run_export_with_logging
+        self.shard_export_function = run_shard_export_with_logging
 
         def _set_queue(queue):
-            """Set the progress queue as an attribute on the function
+            """Set the progress queue as an attribute on the functions
             You can't pass this as an arg"""
             self.export_function.queue = queue
+            self.shard_export_function.queue = queue
 
         self.pool = multiprocessing.Pool(
             processes=num_processes,
@@ -250,6 +372,7 @@ class MultiprocessExporter(object):
 
         self.is_zip = isinstance(get_writer(export_instance.export_format), ZippedExportWriter)
         self.premature_exit = False
+        self.page_count = 0
 
     def __enter__(self):
         self.start()
@@ -275,6 +398,28 @@ class MultiprocessExporter(object):
         result = self.pool.apply_async(self.export_function, args=args)
         self.results.append(QueuedResult(result, page_info.page, page_info.path, page_info.page_size, attempts))
 
+    def process_shard(self, shard, filters, page_size, retry_count=0):
+        """Fetch and export the docs of one shard of the ES index
+
+        :param shard: shard number
+        :param filters: list of export filters
+        :param page_size: number of docs per page
+        """
+        attempts = retry_count + 1
+        args = self.export_instance, filters, shard, page_size, attempts
+        result = self.pool.apply_async(self.shard_export_function, args=args)
+        self.results.append(QueuedShard(result, shard, filters, page_size, attempts))
+
+    def _add_shard_results(self, shard_results, export_results):
+        for result in shard_results:
+            # pages are numbered in the order their shards complete
+            result.page = self.page_count
+            self.page_count += 1
+            if result.success:
+                export_results.append(result)
+            else:
+                self.process_page(result)
+
     def wait_till_completion(self):
         results = self.get_results()
         final_path = self.build_final_export(results)
@@ -289,16 +434,25 @@ class MultiprocessExporter(object):
             while self.results:
                 queued_result = self.results[0]
                 try:
-                    export_results.append(queued_result.async_result.get(timeout=5))
+                    result = queued_result.async_result.get(timeout=5)
                     self.results.pop(0)
+                    if isinstance(queued_result, QueuedShard):
+                        self._add_shard_results(result, export_results)
+                    else:
+                        export_results.append(result)
                 except KeyboardInterrupt:
                     logger.error('Exiting before all results received.')
                     self.premature_exit = True
-                    export_results.extend(self.results)
+                    export_results.extend(
+                        result for result in self.results if not isinstance(result, QueuedShard)
+                    )
                     return export_results
                 except multiprocessing.TimeoutError:
                     pass
                 except Exception:
+                    if isinstance(queued_result, QueuedShard):
+                        self._retry_shard(queued_result, retries_per_page)
+                        continue
                     logger.exception(
                         "Error getting results for page %s after %s tries",
                         queued_result.page,
@@ -314,6 +468,22 @@ class MultiprocessExporter(object):
 
         return export_results
 
+    def _retry_shard(self, queued_shard, retries):
+        logger.exception(
+            "Error getting results for shard %s after %s tries",
+            queued_shard.shard,
+            queued_shard.retry_count
+        )
+        self.results.pop(0)
+        if queued_shard.retry_count < retries:
+            self.process_shard(
+                queued_shard.shard, queued_shard.filters, queued_shard.page_size, queued_shard.retry_count
+            )
+        else:
+            # the docs of the shard are missing from the export so it must not be uploaded
+            logger.error('Giving up on shard %s', queued_shard.shard)
+            self.premature_exit = True
+
     def stop(self):
         self._safe_terminate(self.pool)
         self._safe_terminate(self.progress)
@@ -0,0 +1,133 @@
+import datetime
+
+from django.test import SimpleTestCase
+
+from corehq.apps.export.incremental import (
+    FULL_REBUILD_INTERVAL,
+    ROW_STORE_VERSION,
+    _needs_full_build,
+    get_row_number_column_indices,
+    get_sort_key,
+    merge_entries,
+    read_row_store,
+    renumber_row,
+    write_row_store,
+)
+from corehq.apps.export.models.new import (
+    ExcelFormatValue,
+    ExportColumn,
+    MultipleChoiceItem,
+    Option,
+    PathNode,
+    RowNumberColumn,
+    ScalarItem,
+    SplitExportColumn,
+    TableConfiguration,
+)
+from corehq.util.files import TransientTempfile
+from corehq.util.test_utils import generate_cases
+
+
+class RenumberRowTest(SimpleTestCase):
+    pass
+
+
+@generate_cases([
+    (['3', 'a'], [0], 7, ['7', 'a']),
+    (['3.1', 3, 1, 'a'], [0], 7, ['7.1', 7, 1, 'a']),
+    (['a', '0.2.1', 0, 2, 1], [1], 12, ['a', '12.2.1', 12, 2, 1]),
+    (['a', 'b'], [], 7, ['a', 'b']),
+], RenumberRowTest)
+def test_renumber_row(self, data, row_number_column_indices, row_number, expected):
+    self.assertEqual(renumber_row(data, row_number_column_indices, row_number), expected)
+
+
+class RowNumberColumnIndicesTest(SimpleTestCase):
+
+    def setUp(self):
+        def item_path(name):
+            return [PathNode(name='form'), PathNode(name='repeat1', is_repeat=True), PathNode(name=name)]
+
+        self.table = TableConfiguration(
+            path=[PathNode(name='form'), PathNode(name='repeat1', is_repeat=True)],
+            columns=[
+                ExportColumn(item=ScalarItem(path=item_path('q1')), selected=True),
+                SplitExportColumn(
+                    label='MC',
+                    item=MultipleChoiceItem(path=item_path('mc'), options=[Option(value='a'), Option(value='b')]),
+                    selected=True,
+                ),
+                ExportColumn(item=ScalarItem(path=item_path('q2')), selected=False),
+                RowNumberColumn(selected=True, repeat=1),
+            ],
+        )
+
+    def test_split_columns(self):
+        self.assertEqual(get_row_number_column_indices(self.table, True), [4])
+
+    def test_no_split_columns(self):
+        self.assertEqual(get_row_number_column_indices(self.table, False), [2])
+
+
+class SortKeyTest(SimpleTestCase):
+
+    def test_sub_second_precision(self):
+        dates = ['2020-01-01T10:00:00.5Z', '2020-01-01T10:00:00Z', '2020-01-01T10:00:00.123456Z', None]
+        self.assertEqual(sorted(dates, key=get_sort_key), [
+            '2020-01-01T10:00:00Z',
+            '2020-01-01T10:00:00.123456Z',
+            '2020-01-01T10:00:00.5Z',
+            None,
+        ])
+
+
+class RowStoreTest(SimpleTestCase):
+
+    def test_round_trip(self):
+        header = {'version': ROW_STORE_VERSION, 'checkpoint': datetime.datetime(2020, 1, 1)}
+        entries = [
+            (get_sort_key('2020-01-01'), 'doc1', [[(['0', ExcelFormatValue('0', 1.5)], [0])], []]),
+            (get_sort_key('2020-01-02'), 'doc2', [[], [(['0.1', 0, 1], [0, 1, 2])]]),
+        ]
+        with TransientTempfile() as path:
+            write_row_store(path, header, iter(entries))
+            read_header, read_entries = read_row_store(path)
+            self.assertEqual(read_header, header)
+            self.assertEqual(list(read_entries), entries)
+
+
+class MergeEntriesTest(SimpleTestCase):
+
+    def test_changed_documents_keep_export_order(self):
+        def entry(doc_id, date):
+            return get_sort_key(date), doc_id, []
+
+        unchanged = [entry('a', '2020-01-01'), entry('c', '2020-01-03'), entry('e', None)]
+        changed = [entry('b', '2020-01-02'), entry('d', '2020-01-04'), entry('f', None)]
+        merged = [doc_id for sort_key, doc_id, rows in merge_entries(iter(unchanged), iter(changed))]
+        self.assertEqual(merged, ['a', 'b', 'c', 'd', 'e', 'f'])
+
+
+class NeedsFullBuildTest(SimpleTestCase):
+
+    def setUp(self):
+        self.now = datetime.datetime(2020, 1, 10)
+        self.header = {
+            'version': ROW_STORE_VERSION,
+            'config_hash': 'abc',
+            'checkpoint': self.now - datetime.timedelta(days=1),
+            'full_build': self.now - datetime.timedelta(days=2),
+        }
+
+    def test_incremental(self):
+        self.assertFalse(_needs_full_build(self.header, 'abc', self.now))
+
+    def test_no_previous_build(self):
+        self.assertTrue(_needs_full_build(None, 'abc', self.now))
+
+    def test_config_changed(self):
+        self.assertTrue(_needs_full_build(self.header, 'def', self.now))
+
+    def test_last_full_build_too_old(self):
+        self.header['full_build'] = self.now - FULL_REBUILD_INTERVAL - datetime.timedelta(minutes=1)
+        self.assertTrue(_needs_full_build(self.header, 'abc', self.now))
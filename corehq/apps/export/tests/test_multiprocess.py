@@ -0,0 +1,84 @@
+import gzip
+import json
+import os
+
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from corehq.apps.export.multiprocess import (
+    ShardFetchError,
+    run_shard_export,
+)
+from corehq.elastic import ScanResult
+
+
+class FakeExportInstance(object):
+    get_id = 'export-id'
+
+
+def _read_dump(path):
+    with gzip.open(path) as file:
+        return [json.loads(line.decode()) for line in file]
+
+
+@patch('corehq.apps.export.multiprocess.get_export_documents')
+@patch('corehq.apps.export.multiprocess._get_export_file_path')
+class RunShardExportTest(SimpleTestCase):
+
+    def setUp(self):
+        self.paths = []
+
+    def tearDown(self):
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _export_page(self, export_instance, docs, progress_tracker=None):
+        doc_ids = []
+        for doc in docs:
+            if doc['_id'] == 'bad':
+                raise Exception('bad doc')
+            doc_ids.append(doc['_id'])
+        self.paths.append(json.dumps(doc_ids))
+        return self.paths[-1]
+
+    def _run(self, get_export_documents, docs):
+        get_export_documents.return_value = ScanResult(len(docs), iter(docs))
+        results = run_shard_export(FakeExportInstance(), [], 3, page_size=2)
+        self.paths.extend(result.path for result in results if not result.success)
+        self.assertEqual(get_export_documents.call_args[1], {'shard': 3})
+        return results
+
+    def test_pages(self, export_file_path, get_export_documents):
+        export_file_path.side_effect = self._export_page
+        results = self._run(get_export_documents, [{'_id': doc_id} for doc_id in 'abcde'])
+        self.assertEqual([result.page for result in results], [0, 1, 2])
+        self.assertEqual([result.page_size for result in results], [2, 2, 1])
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual([json.loads(result.path) for result in results], [['a', 'b'], ['c', 'd'], ['e']])
+
+    def test_failed_page_is_dumped(self, export_file_path, get_export_documents):
+        export_file_path.side_effect = self._export_page
+        docs = [{'_id': doc_id} for doc_id in ['a', 'b', 'bad', 'c', 'd']]
+        results = self._run(get_export_documents, docs)
+        self.assertEqual([result.success for result in results], [True, False, True])
+        failed = results[1]
+        self.assertEqual((failed.page_size, failed.retry_count), (2, 1))
+        self.assertEqual(_read_dump(failed.path), [{'_id': 'bad'}, {'_id': 'c'}])
+
+    def test_fetch_error(self, export_file_path, get_export_documents):
+        def _docs():
+            yield {'_id': 'a'}
+            yield {'_id': 'b'}
+            yield {'_id': 'bad'}
+            raise Exception('ES is down')
+
+        def _export_page(export_instance, docs, progress_tracker=None):
+            list(docs)
+            return self._export_page(export_instance, [])
+
+        export_file_path.side_effect = _export_page
+        get_export_documents.return_value = ScanResult(4, _docs())
+        with self.assertRaises(ShardFetchError):
+            run_shard_export(FakeExportInstance(), [], 0, page_size=2)
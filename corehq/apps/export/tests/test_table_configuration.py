@@ -5,11 +5,18 @@ from corehq.apps.export.models import (
     DocRow,
     ExportColumn,
     ExportRow,
+    GeopointItem,
+    MultipleChoiceItem,
+    Option,
     PathNode,
     RowNumberColumn,
     ScalarItem,
+    SplitExportColumn,
+    SplitGPSExportColumn,
     TableConfiguration,
+    UserDefinedExportColumn,
 )
+from corehq.util.test_utils import generate_cases
 
 
 class TableConfigurationTest(SimpleTestCase):
@@ -336,3 +343,83 @@ class TableConfigurationGetRowsTest(SimpleTestCase):
         self.assertEqual(
             [row.data for row in table_configuration.get_rows(submission, 0)], []
         )
+
+
+class TableConfigurationGetRowsForDocumentsTest(SimpleTestCase):
+
+    def setUp(self):
+        def item_path(*names):
+            return [PathNode(name='form'), PathNode(name='repeat1', is_repeat=True)] + [
+                PathNode(name=name) for name in names
+            ]
+
+        self.table_configuration = TableConfiguration(
+            path=[PathNode(name='form'), PathNode(name='repeat1', is_repeat=True)],
+            columns=[
+                RowNumberColumn(selected=True),
+                ExportColumn(item=ScalarItem(path=item_path('q1')), selected=True),
+                ExportColumn(item=ScalarItem(path=item_path('q2')), selected=False),
+                ExportColumn(item=ScalarItem(path=item_path('date')), selected=True),
+                SplitExportColumn(
+                    label='MC',
+                    item=MultipleChoiceItem(path=item_path('mc'), options=[Option(value='a'), Option(value='b')]),
+                    selected=True,
+                ),
+                SplitGPSExportColumn(label='GPS', item=GeopointItem(path=item_path('gps')), selected=True),
+                UserDefinedExportColumn(custom_path=item_path('list'), selected=True),
+            ]
+        )
+        self.documents = [
+            {
+                'domain': 'my-domain',
+                '_id': '1',
+                'form': {
+                    'repeat1': [
+                        {'q1': 'foo', 'date': '2020-01-02', 'mc': 'a c', 'gps': '1 2 3 4', 'list': ['x', 'y']},
+                        {'q1': {'#text': 'bar', 'id': 'q1'}, 'mc': 'b', 'gps': '1 2'},
+                    ],
+                },
+            },
+            {
+                'domain': 'my-domain',
+                '_id': '2',
+                'form': {
+                    'repeat1': {'q1': 'single', 'date': '2020-01-02T10:00:00.000000Z', 'list': 'z'},
+                },
+            },
+            {
+                'domain': 'my-domain',
+                '_id': '3',
+                'form': {},
+            },
+        ]
+
+    def test_get_rows_by_document(self):
+        rows_by_document = self.table_configuration.get_rows_by_document(self.documents, 5)
+        self.assertEqual(
+            [[row.data for row in rows] for rows in rows_by_document],
+            [[row.data for row in self.table_configuration.get_rows(doc, row_number)]
+             for row_number, doc in enumerate(self.documents, 5)],
+        )
+        self.assertEqual([len(rows) for rows in rows_by_document], [2, 1, 0])
+
+
+@generate_cases([
+    (False, False),
+    (True, False),
+    (False, True),
+    (True, True),
+], TableConfigurationGetRowsForDocumentsTest)
+def test_get_rows_for_documents(self, split_columns, transform_dates):
+    kwargs = {'split_columns': split_columns, 'transform_dates': transform_dates}
+    expected = [
+        row
+        for row_number, doc in enumerate(self.documents, 5)
+        for row in self.table_configuration.get_rows(doc, row_number, **kwargs)
+    ]
+    rows = self.table_configuration.get_rows_for_documents(self.documents, 5, **kwargs)
+    self.assertEqual(
+        [(row.data, row.hyperlink_column_indices, row.skip_excel_formatting) for row in rows],
+        [(row.data, row.hyperlink_column_indices, row.skip_excel_formatting) for row in expected],
+    )
+    self.assertEqual(len(rows), 3)
@@ -64,6 +64,17 @@ def count_fixture_items(domain, data_type_id):
     ).first()['value']
 
 
+def get_fixture_item_revs(item_ids):
+    """Get a dict of `item_id -> rev` for fixture items that exist"""
+    from corehq.apps.fixtures.models import FixtureDataItem
+    results = FixtureDataItem.get_db().view('_all_docs', keys=list(item_ids))
+    return {
+        row['id']: row['value']['rev']
+        for row in results
+        if 'value' in row and not row['value'].get('deleted')
+    }
+
+
 def get_owner_ids_by_type(domain, owner_type, data_item_id):
     from corehq.apps.fixtures.models import FixtureOwnership
     assert owner_type in FixtureOwnership.owner_type.choices, \
@@ -3,14 +3,23 @@ from functools import partial
 from operator import attrgetter
 from xml.etree import cElementTree as ElementTree
 
+from casexml.apps.phone.fixture_cache import FixturePayloadCache, get_content_hash
 from casexml.apps.phone.fixtures import FixtureProvider
 from casexml.apps.phone.utils import (
     GLOBAL_USER_ID,
     get_or_cache_global_fixture,
 )
 
-from corehq.apps.fixtures.dbaccessors import iter_fixture_items_for_data_type
-from corehq.apps.fixtures.models import FIXTURE_BUCKET, FixtureDataType
+from corehq import toggles
+from corehq.apps.fixtures.dbaccessors import (
+    get_fixture_item_revs,
+    iter_fixture_items_for_data_type,
+)
+from corehq.apps.fixtures.models import (
+    FIXTURE_BUCKET,
+    USER_FIXTURE_BUCKET,
+    FixtureDataType,
+)
 from corehq.apps.products.fixtures import product_fixture_generator_json
 from corehq.apps.programs.fixtures import program_fixture_generator_json
 
@@ -64,7 +73,10 @@ class ItemListsProvider(FixtureProvider):
         if global_types:
             items.extend(self.get_global_items(global_types, restore_state))
         if user_types:
-            items.extend(self.get_user_items(user_types, restore_user))
+            if toggles.SHARED_FIXTURE_CACHE.enabled(restore_user.domain):
+                items.extend(self.get_cached_user_items(user_types, restore_state))
+            else:
+                items.extend(self.get_user_items(user_types, restore_user))
         return items
 
     def get_global_items(self, global_types, restore_state):
@@ -80,7 +92,24 @@ class ItemListsProvider(FixtureProvider):
 
         return self._get_fixtures(global_types, get_items_by_type, GLOBAL_USER_ID)
 
-    def get_user_items(self, user_types, restore_user):
+    def get_cached_user_items(self, user_types, restore_state):
+        """Get user item lists from the shared fixture payload cache
+
+        Users that own the same revisions of the same items get the same
+        payload, so it is cached by a hash of the item and type revisions.
+        """
+        restore_user = restore_state.restore_user
+        item_revs = get_fixture_item_revs(restore_user.get_fixture_data_item_ids())
+        scope = get_content_hash([
+            sorted(item_revs.items()),
+            sorted((data_type._id, data_type._rev) for data_type in user_types.values()),
+        ])
+        payload_cache = FixturePayloadCache(restore_user.domain, USER_FIXTURE_BUCKET)
+        data_fn = partial(self.get_user_items, user_types, restore_user, GLOBAL_USER_ID)
+        return payload_cache.get_or_generate(
+            scope, data_fn, restore_user.user_id, restore_state.overwrite_cache)
+
+    def get_user_items(self, user_types, restore_user, user_id=None):
         items_by_type = defaultdict(list)
         for item in restore_user.get_fixture_data_items():
             data_type = user_types.get(item.data_type_id)
@@ -92,7 +121,7 @@ class ItemListsProvider(FixtureProvider):
             return sorted(items_by_type.get(data_type, []),
                           key=attrgetter('sort_key'))
 
-        return self._get_fixtures(user_types, get_items_by_type, restore_user.user_id)
+        return self._get_fixtures(user_types, get_items_by_type, user_id or restore_user.user_id)
 
     def _set_cached_type(self, item, data_type):
         # set the cached version used by the object so that it doesn't
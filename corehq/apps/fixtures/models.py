@@ -41,6 +41,7 @@ from corehq.apps.users.models import CommCareUser
 from corehq.util.xml_utils import serialize
 
 FIXTURE_BUCKET = 'domain-fixtures'
+USER_FIXTURE_BUCKET = 'user-fixtures'
 
 
 class FixtureTypeField(DocumentSchema):
@@ -62,8 +62,10 @@ def get_index_schema_node(fixture_id, attrs_to_index):
 
 
 def clear_fixture_cache(domain):
+    from casexml.apps.phone.fixture_cache import invalidate_fixture_payloads
     from corehq.apps.fixtures.models import FIXTURE_BUCKET
     get_blob_db().delete(key=FIXTURE_BUCKET + '/' + domain)
+    invalidate_fixture_payloads(domain)
 
 
 @task(queue='background_queue')
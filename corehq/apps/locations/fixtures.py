@@ -1,4 +1,5 @@
 from collections import defaultdict
+from functools import partial
 from itertools import groupby
 from xml.etree.cElementTree import Element, SubElement
 
@@ -8,7 +9,9 @@ from django.db.models import IntegerField, Q
 from django_cte import With
 from django_cte.raw import raw_cte_sql
 
+from casexml.apps.phone.fixture_cache import FixturePayloadCache, get_content_hash
 from casexml.apps.phone.fixtures import FixtureProvider
+from casexml.apps.phone.utils import GLOBAL_USER_ID
 
 from corehq import toggles
 from corehq.apps.app_manager.const import (
@@ -123,18 +126,40 @@ class LocationFixtureProvider(FixtureProvider):
             return []
 
         data_fields = _get_location_data_fields(restore_user.domain)
+        if toggles.SHARED_FIXTURE_CACHE.enabled(restore_user.domain):
+            return self._get_cached_xml_nodes(restore_state, locations_queryset, data_fields)
         return self.serializer.get_xml_nodes(self.id, restore_user, locations_queryset, data_fields)
 
+    def _get_cached_xml_nodes(self, restore_state, locations_queryset, data_fields):
+        """Get the fixture from the shared fixture payload cache
+
+        The fixture only depends on the locations, location types and
+        location fields, which are modified when they change, so users
+        that sync the same locations share a payload.
+        """
+        restore_user = restore_state.restore_user
+        location_types = LocationType.objects.filter(domain=restore_user.domain)
+        scope = get_content_hash([
+            sorted(locations_queryset.values_list('location_id', 'last_modified')),
+            sorted(location_types.values_list('id', 'last_modified')),
+            [field.to_json() for field in data_fields],
+        ])
+        payload_cache = FixturePayloadCache(restore_user.domain, self.id)
+        data_fn = partial(self.serializer.get_xml_nodes, self.id, restore_user,
+                          locations_queryset, data_fields, user_id=GLOBAL_USER_ID)
+        return payload_cache.get_or_generate(
+            scope, data_fn, restore_user.user_id, restore_state.overwrite_cache)
+
 
 class HierarchicalLocationSerializer(object):
 
     def should_sync(self, restore_user, app):
         return should_sync_hierarchical_fixture(restore_user.project, app)
 
-    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields):
+    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields, user_id=None):
         locations_db = LocationSet(locations_queryset)
 
-        root_node = Element('fixture', {'id': fixture_id, 'user_id': restore_user.user_id})
+        root_node = Element('fixture', {'id': fixture_id, 'user_id': user_id or restore_user.user_id})
         root_locations = locations_db.root_locations
 
         if root_locations:
@@ -154,7 +179,7 @@ class FlatLocationSerializer(object):
     def should_sync(self, restore_user, app):
         return should_sync_flat_fixture(restore_user.project, app)
 
-    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields):
+    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields, user_id=None):
 
         all_types = LocationType.objects.filter(domain=restore_user.domain).values_list(
             'code', flat=True
@@ -165,12 +190,12 @@ class FlatLocationSerializer(object):
 
         return [get_index_schema_node(fixture_id, attrs_to_index),
                 self._get_fixture_node(fixture_id, restore_user, locations_queryset,
-                                       location_type_attrs, data_fields)]
+                                       location_type_attrs, data_fields, user_id)]
 
     def _get_fixture_node(self, fixture_id, restore_user, locations_queryset,
-                          location_type_attrs, data_fields):
+                          location_type_attrs, data_fields, user_id=None):
         root_node = Element('fixture', {'id': fixture_id,
-                                        'user_id': restore_user.user_id,
+                                        'user_id': user_id or restore_user.user_id,
                                         'indexed': 'true'})
         outer_node = Element('locations')
         root_node.append(outer_node)
@@ -0,0 +1,498 @@
+"""
+Compiled evaluation of UCR data sources.
+
+Configured expressions, filters and indicators are trees of spec objects that
+are interpreted by calling each node in turn. ``DataSourcePlan`` compiles a data
+source's filter, base item expression and indicators into plain closures
+instead, which gives the same results with less work per document:
+
+  - datatype transforms and property paths are resolved once at compile time
+    rather than on every call
+  - constants are folded, e.g. a boolean filter comparing two constants or a
+    conditional with a constant test
+  - ``named`` expressions and filters are compiled once and shared by every
+    reference to them
+  - identical property lookups are compiled once, and lookups used in more than
+    one place are only evaluated once per item (within an iteration)
+
+Node types that the compiler doesn't know about (including custom expressions
+registered with ``ExpressionFactory.register``) are called as-is, so compiled
+output is always identical to the interpreted output.
+"""
+from collections import Counter
+
+from corehq.apps.userreports.expressions.getters import (
+    TransformedGetter,
+    transform_from_datatype,
+)
+from corehq.apps.userreports.expressions.specs import (
+    ArrayIndexExpressionSpec,
+    CoalesceExpressionSpec,
+    ConditionalExpressionSpec,
+    ConstantGetterSpec,
+    DictExpressionSpec,
+    IdentityExpressionSpec,
+    IteratorExpressionSpec,
+    NamedExpressionSpec,
+    NestedExpressionSpec,
+    PropertyNameGetterSpec,
+    PropertyPathGetterSpec,
+    RootDocExpressionSpec,
+    SwitchExpressionSpec,
+)
+from corehq.apps.userreports.filters import (
+    ANDFilter,
+    NamedFilter,
+    NOTFilter,
+    ORFilter,
+    SinglePropertyValueFilter,
+)
+from corehq.apps.userreports.indicators import (
+    BooleanIndicator,
+    ColumnValue,
+    CompoundIndicator,
+    RawIndicator,
+)
+
+SHARED_LOOKUP_CACHE_PREFIX = 'compiled_lookup'
+
+
+class ExpressionCompiler(object):
+    """
+    Compiles expression and filter objects built by ``ExpressionFactory`` and
+    ``FilterFactory`` into closures with the signature ``fn(item, context=None)``.
+
+    One compiler should be used per data source so that compiled nodes can be shared.
+    """
+
+    def __init__(self, shared_lookup_keys=frozenset()):
+        # keys of property lookups that are referenced more than once
+        self.shared_lookup_keys = shared_lookup_keys
+        self._compiled = {}
+        self._lookups = {}
+        self._constants = {}
+        self.stats = Counter()
+
+    def is_constant(self, fn):
+        return fn in self._constants
+
+    def constant_value(self, fn):
+        return self._constants[fn]
+
+    def compile_expression(self, expression):
+        return self._compile(expression, self._expression_compilers)
+
+    def compile_filter(self, filter_):
+        return self._compile(filter_, self._filter_compilers)
+
+    def _compile(self, node, compilers):
+        # nodes can be referenced from several places, e.g. named expressions
+        try:
+            return self._compiled[id(node)][1]
+        except KeyError:
+            pass
+        compile_fn = compilers.get(type(node))
+        if compile_fn is None:
+            self.stats['interpreted'] += 1
+            fn = node
+        else:
+            self.stats['compiled'] += 1
+            fn = compile_fn(self, node)
+        # keep a reference to the node so its id can't be reused
+        self._compiled[id(node)] = (node, fn)
+        return fn
+
+    def constant(self, value):
+        def constant(item, context=None):
+            return value
+        self._constants[constant] = value
+        self.stats['constant'] += 1
+        return constant
+
+    def _compile_constant(self, expression):
+        return self.constant(expression.constant)
+
+    def _compile_identity(self, expression):
+        def identity(item, context=None):
+            return item
+        return identity
+
+    def _compile_property_name(self, expression):
+        name_fn = self.compile_expression(expression._property_name_expression)
+        transform = transform_from_datatype(expression.datatype)
+        if not self.is_constant(name_fn):
+            def property_name(item, context=None):
+                return transform(item.get(name_fn(item, context)) if isinstance(item, dict) else None)
+            return property_name
+
+        name = self.constant_value(name_fn)
+
+        def property_name(item, context=None):
+            return transform(item.get(name) if isinstance(item, dict) else None)
+        if not isinstance(name, str):
+            return property_name
+        return self._lookup(('property_name', name, expression.datatype), property_name)
+
+    def _compile_property_path(self, expression):
+        path = list(expression.property_path)
+        transform = transform_from_datatype(expression.datatype)
+
+        def property_path(item, context=None):
+            # an empty path is invalid and never finds anything
+            if not path or not isinstance(item, dict):
+                return transform(None)
+            try:
+                for key in path:
+                    item = item[key]
+            except (KeyError, TypeError, ValueError):
+                return transform(None)
+            return transform(item)
+        return self._lookup(('property_path', tuple(path), expression.datatype), property_path)
+
+    def _lookup(self, key, fn):
+        """Share compiled lookups and cache the results of lookups that are used more than once"""
+        if key in self._lookups:
+            self.stats['shared'] += 1
+            return self._lookups[key]
+
+        if key in self.shared_lookup_keys:
+            cache_id = (SHARED_LOOKUP_CACHE_PREFIX, len(self._lookups))
+            lookup_fn = fn
+
+            def fn(item, context=None):
+                if context is None:
+                    return lookup_fn(item, context)
+                cache_key = cache_id + (id(item),)
+                cached = context.iteration_cache.get(cache_key)
+                # the item is stored with the value so that its id can't be reused during the iteration
+                if cached is not None and cached[0] is item:
+                    return cached[1]
+                value = lookup_fn(item, context)
+                context.iteration_cache[cache_key] = (item, value)
+                return value
+
+        self._lookups[key] = fn
+        return fn
+
+    def _compile_named_expression(self, expression):
+        target = self.compile_expression(expression._context.named_expressions[expression.name])
+        name = expression.name
+
+        def named(item, context=None):
+            # same caching as NamedExpressionSpec
+            key = 'named_expression-{}-{}'.format(name, id(item))
+            if context and context.exists_in_cache(key):
+                return context.get_cache_value(key)
+
+            result = target(item, context)
+            if context:
+                context.set_iteration_cache_value(key, result)
+            return result
+        return named
+
+    def _compile_conditional(self, expression):
+        test = self.compile_filter(expression._test_function)
+        if_true = self.compile_expression(expression._true_expression)
+        if_false = self.compile_expression(expression._false_expression)
+        if self.is_constant(test):
+            return if_true if self.constant_value(test) else if_false
+
+        def conditional(item, context=None):
+            if test(item, context):
+                return if_true(item, context)
+            return if_false(item, context)
+        return conditional
+
+    def _compile_switch(self, expression):
+        switch_on = self.compile_expression(expression._switch_on_expression)
+        default = self.compile_expression(expression._default_expression)
+        cases = {}
+        for case in expression.cases:
+            cases.setdefault(case, self.compile_expression(expression._case_expressions[case]))
+
+        def switch(item, context=None):
+            value = switch_on(item, context)
+            try:
+                case_fn = cases.get(value, default)
+            except TypeError:
+                # unhashable values can't match any of the (string) cases
+                case_fn = default
+            return case_fn(item, context)
+        return switch
+
+    def _compile_array_index(self, expression):
+        array_fn = self.compile_expression(expression._array_expression)
+        index_fn = self.compile_expression(expression._index_expression)
+
+        def array_index(item, context=None):
+            array_value = array_fn(item, context)
+            if not isinstance(array_value, list):
+                return None
+            index_value = index_fn(item, context)
+            if not isinstance(index_value, int):
+                return None
+            try:
+                return array_value[index_value]
+            except IndexError:
+                return None
+        return array_index
+
+    def _compile_root_doc(self, expression):
+        expression_fn = self.compile_expression(expression._expression_fn)
+
+        def root_doc(item, context=None):
+            if context is None:
+                return None
+            return expression_fn(context.root_doc, context)
+        return root_doc
+
+    def _compile_nested(self, expression):
+        argument_fn = self.compile_expression(expression._argument_expression)
+        value_fn = self.compile_expression(expression._value_expression)
+
+        def nested(item, context=None):
+            return value_fn(argument_fn(item, context), context)
+        return nested
+
+    def _compile_dict(self, expression):
+        properties = [
+            (name, self.compile_expression(property_expression))
+            for name, property_expression in expression._compiled_properties.items()
+        ]
+
+        def dict_(item, context=None):
+            return {name: fn(item, context) for name, fn in properties}
+        return dict_
+
+    def _compile_iterator(self, expression):
+        expression_fns = [self.compile_expression(e) for e in expression._expression_fns]
+        test = self.compile_filter(expression._test)
+
+        def iterator(item, context=None):
+            values = []
+            for fn in expression_fns:
+                value = fn(item, context)
+                if test(value):
+                    values.append(value)
+            return values
+        return iterator
+
+    def _compile_coalesce(self, expression):
+        expression_fn = self.compile_expression(expression._expression)
+        default_fn = self.compile_expression(expression._default_expression)
+
+        def coalesce(item, context=None):
+            expression_value = expression_fn(item, context)
+            default_value = default_fn(item, context)
+            if expression_value is None or expression_value == '':
+                return default_value
+            return expression_value
+        return coalesce
+
+    def _compile_transformed_getter(self, getter):
+        inner = self.compile_expression(getter.getter)
+        transform = getter.transform
+        if not transform:
+            return inner
+        if self.is_constant(inner):
+            try:
+                return self.constant(transform(self.constant_value(inner)))
+            except Exception:
+                # leave the error to be raised when evaluating
+                pass
+
+        def transformed(item, context=None):
+            return transform(inner(item, context))
+        return transformed
+
+    def _compile_and(self, filter_):
+        filters = []
+        for sub_filter in filter_.filters:
+            fn = self.compile_filter(sub_filter)
+            if self.is_constant(fn):
+                if not self.constant_value(fn):
+                    return self.constant(False)
+                continue
+            filters.append(fn)
+        if not filters:
+            return self.constant(True)
+
+        def and_(item, context=None):
+            for fn in filters:
+                if not fn(item, context):
+                    return False
+            return True
+        return and_
+
+    def _compile_or(self, filter_):
+        filters = []
+        for sub_filter in filter_.filters:
+            fn = self.compile_filter(sub_filter)
+            if self.is_constant(fn):
+                if self.constant_value(fn):
+                    return self.constant(True)
+                continue
+            filters.append(fn)
+        if not filters:
+            return self.constant(False)
+
+        def or_(item, context=None):
+            for fn in filters:
+                if fn(item, context):
+                    return True
+            return False
+        return or_
+
+    def _compile_not(self, filter_):
+        inner = self.compile_filter(filter_._filter)
+        if self.is_constant(inner):
+            return self.constant(not self.constant_value(inner))
+
+        def not_(item, context=None):
+            return not inner(item, context)
+        return not_
+
+    def _compile_single_property_value(self, filter_):
+        operator = filter_.operator
+        expression_fn = self.compile_expression(filter_.expression)
+        reference_fn = self.compile_expression(filter_.reference_expression)
+        if not self.is_constant(reference_fn):
+            def single_property_value(item, context=None):
+                return operator(expression_fn(item, context), reference_fn(item, context))
+            return single_property_value
+
+        reference = self.constant_value(reference_fn)
+        if self.is_constant(expression_fn):
+            try:
+                return self.constant(operator(self.constant_value(expression_fn), reference))
+            except Exception:
+                # leave the error to be raised when evaluating
+                pass
+
+        def single_property_value(item, context=None):
+            return operator(expression_fn(item, context), reference)
+        return single_property_value
+
+    def _compile_named_filter(self, filter_):
+        return self.compile_filter(filter_.filter)
+
+    _expression_compilers = {
+        ConstantGetterSpec: _compile_constant,
+        IdentityExpressionSpec: _compile_identity,
+        PropertyNameGetterSpec: _compile_property_name,
+        PropertyPathGetterSpec: _compile_property_path,
+        NamedExpressionSpec: _compile_named_expression,
+        ConditionalExpressionSpec: _compile_conditional,
+        SwitchExpressionSpec: _compile_switch,
+        ArrayIndexExpressionSpec: _compile_array_index,
+        RootDocExpressionSpec: _compile_root_doc,
+        NestedExpressionSpec: _compile_nested,
+        DictExpressionSpec: _compile_dict,
+        IteratorExpressionSpec: _compile_iterator,
+        CoalesceExpressionSpec: _compile_coalesce,
+        TransformedGetter: _compile_transformed_getter,
+    }
+
+    _filter_compilers = {
+        ANDFilter: _compile_and,
+        ORFilter: _compile_or,
+        NOTFilter: _compile_not,
+        SinglePropertyValueFilter: _compile_single_property_value,
+        NamedFilter: _compile_named_filter,
+    }
+
+
+class DataSourcePlan(object):
+    """
+    The compiled filter, base item expression and indicators of a data source.
+
+    Provides the same results as ``DataSourceConfiguration._get_main_filter()``,
+    ``DataSourceConfiguration.parsed_expression`` and ``DataSourceConfiguration.indicators.get_values``.
+    """
+
+    def __init__(self, filter_fn, base_item_fn, columns, compiler):
+        self.filter = filter_fn
+        self.base_item_expression = base_item_fn
+        # list of (column, getter). column is None if the getter returns a list of ColumnValues
+        self._columns = columns
+        self.stats = compiler.stats
+
+    @classmethod
+    def from_data_source(cls, config):
+        compiler = ExpressionCompiler(shared_lookup_keys=get_shared_lookup_keys([
+            config.configured_filter,
+            config.configured_indicators,
+            config.named_expressions,
+            config.named_filters,
+            config.base_item_expression,
+        ]))
+        filter_fn = compiler.compile_filter(config._get_main_filter())
+        base_item_fn = (
+            compiler.compile_expression(config.parsed_expression)
+            if config.parsed_expression is not None else None
+        )
+        columns = []
+        _compile_indicator(compiler, config.indicators, columns)
+        return cls(filter_fn, base_item_fn, columns, compiler)
+
+    def get_values(self, item, context=None):
+        values = []
+        for column, getter in self._columns:
+            if column is None:
+                values.extend(getter(item, context))
+            else:
+                values.append(ColumnValue(column, getter(item, context)))
+        return values
+
+
+def _compile_indicator(compiler, indicator, columns):
+    if isinstance(indicator, CompoundIndicator):
+        for sub_indicator in indicator.indicators:
+            _compile_indicator(compiler, sub_indicator, columns)
+    elif isinstance(indicator, BooleanIndicator):
+        filter_fn = compiler.compile_filter(indicator.filter)
+        if compiler.is_constant(filter_fn):
+            columns.append((indicator.column, compiler.constant(1 if compiler.constant_value(filter_fn) else 0)))
+        else:
+            def boolean(item, context=None):
+                return 1 if filter_fn(item, context) else 0
+            columns.append((indicator.column, boolean))
+    elif isinstance(indicator, RawIndicator):
+        columns.append((indicator.column, compiler.compile_expression(indicator.getter)))
+    else:
+        columns.append((None, indicator.get_values))
+
+
+def get_shared_lookup_keys(specs):
+    """
+    :param specs: JSON specs (or lists / dicts of specs) of expressions and filters
+    :return: keys of the ``property_name`` and ``property_path`` expressions
+             that are used more than once
+    """
+    counts = Counter()
+
+    def _count(spec):
+        if isinstance(spec, dict):
+            key = _get_lookup_key(spec)
+            if key is not None:
+                counts[key] += 1
+            for value in spec.values():
+                _count(value)
+        elif isinstance(spec, list):
+            for value in spec:
+                _count(value)
+
+    _count(specs)
+    return {key for key, count in counts.items() if count > 1}
+
+
+def _get_lookup_key(spec):
+    try:
+        if spec.get('type') == 'property_name' and isinstance(spec.get('property_name'), str):
+            return 'property_name', spec['property_name'], spec.get('datatype')
+        if spec.get('type') == 'property_path' and isinstance(spec.get('property_path'), list):
+            return 'property_path', tuple(spec['property_path']), spec.get('datatype')
+    except TypeError:
+        # e.g. unhashable path elements
+        return None
+    return None
@@ -376,6 +376,16 @@ class ExpressionFactory(object):
                 str(e),
             ))
 
+    @classmethod
+    def compile_from_spec(cls, spec, context=None, compiler=None):
+        """
+        Like ``from_spec`` but returns a compiled function instead of the expression tree.
+        See ``corehq.apps.userreports.expressions.compiler``.
+        """
+        from corehq.apps.userreports.expressions.compiler import ExpressionCompiler
+        compiler = compiler or ExpressionCompiler()
+        return compiler.compile_expression(cls.from_spec(spec, context))
+
 
 def _is_literal(value):
     return not isinstance(value, dict)
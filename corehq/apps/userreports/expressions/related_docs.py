@@ -0,0 +1,152 @@
+"""
+Chunk-scoped cache of the documents looked up by ``related_doc`` expressions.
+
+``RelatedDocExpressionSpec`` fetches related documents one at a time and only
+caches them for the ``EvaluationContext`` of a single document. When the UCR
+pillow processes a chunk of documents that point at the same related
+documents (e.g. many forms submitted against the same cases) that results in
+one read per document per lookup.
+
+A ``RelatedDocumentCache`` is shared by the evaluation contexts of every
+document in a chunk. Before the chunk is transformed, the ``doc_id_expression``
+of each ``related_doc`` expression in the data sources is evaluated against
+every document and the resulting ids are fetched in bulk per document type.
+Lookups that can't be predicted that way (e.g. ids computed from a repeat
+item or from another related document) are fetched individually on first use
+and are then cached for the rest of the chunk as well.
+"""
+from collections import OrderedDict, defaultdict
+
+from pillowtop.dao.exceptions import DocumentNotFoundError
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.specs import EvaluationContext
+
+DEFAULT_MAX_DOCUMENTS = 10000
+LOAD_SOURCE = "related_doc_expression"
+
+
+class RelatedDocumentCache(object):
+    """Least recently used cache of related documents for a single domain
+
+    Documents that were not found are cached as ``None``.
+    """
+
+    def __init__(self, domain, max_size=DEFAULT_MAX_DOCUMENTS):
+        self.domain = domain
+        self.max_size = max_size
+        self._docs = OrderedDict()
+        self._doc_stores = {}
+        self.bulk_fetched = 0
+        self.single_fetched = 0
+
+    def get_document(self, doc_type, doc_id):
+        key = (doc_type, doc_id)
+        if key in self._docs:
+            self._docs.move_to_end(key)
+            return self._docs[key]
+
+        try:
+            doc = self._get_doc_store(doc_type).get_document(doc_id)
+        except DocumentNotFoundError:
+            doc = None
+        self.single_fetched += 1
+        self._set(key, doc)
+        return doc
+
+    def prefetch(self, doc_ids_by_type):
+        """Fetch the documents that aren't cached yet
+
+        :param doc_ids_by_type: dict of ``doc_type -> iterable of doc IDs``
+        """
+        for doc_type, doc_ids in doc_ids_by_type.items():
+            to_fetch = [doc_id for doc_id in dict.fromkeys(doc_ids) if (doc_type, doc_id) not in self._docs]
+            # don't fetch more than can be kept
+            to_fetch = to_fetch[:self.max_size]
+            if not to_fetch:
+                continue
+            docs_by_id = {
+                doc['_id']: doc
+                for doc in self._get_doc_store(doc_type).iter_documents(to_fetch)
+            }
+            self.bulk_fetched += len(to_fetch)
+            for doc_id in to_fetch:
+                self._set((doc_type, doc_id), docs_by_id.get(doc_id))
+
+    def _set(self, key, doc):
+        self._docs[key] = doc
+        self._docs.move_to_end(key)
+        while len(self._docs) > self.max_size:
+            self._docs.popitem(last=False)
+
+    def _get_doc_store(self, doc_type):
+        if doc_type not in self._doc_stores:
+            self._doc_stores[doc_type] = get_document_store_for_doc_type(
+                self.domain, doc_type, load_source=LOAD_SOURCE
+            )
+        return self._doc_stores[doc_type]
+
+
+def get_related_doc_id_expressions(config):
+    """
+    :return: list of ``(related_doc_type, doc_id_expression)`` for every
+             ``related_doc`` expression in the data source
+    """
+    from corehq.apps.userreports.expressions.factory import ExpressionFactory
+
+    factory_context = config.get_factory_context()
+    expressions = []
+
+    def _collect(spec):
+        if isinstance(spec, dict):
+            if spec.get('type') == 'related_doc' and spec.get('doc_id_expression'):
+                expressions.append((
+                    spec.get('related_doc_type'),
+                    ExpressionFactory.from_spec(spec['doc_id_expression'], factory_context),
+                ))
+            for value in spec.values():
+                _collect(value)
+        elif isinstance(spec, list):
+            for value in spec:
+                _collect(value)
+
+    _collect([
+        config.configured_filter,
+        config.configured_indicators,
+        config.named_expressions,
+        config.named_filters,
+        config.base_item_expression,
+    ])
+    return expressions
+
+
+def get_related_doc_ids(configs, docs, related_docs=None):
+    """Evaluate the ``doc_id_expression`` of every ``related_doc`` expression
+    of the data sources against the documents
+
+    This is best effort: expressions that fail or don't return a doc ID for
+    the root document are ignored.
+
+    :return: dict of ``related_doc_type -> set of doc IDs``
+    """
+    doc_ids_by_type = defaultdict(set)
+    expressions = [
+        expression
+        for config in configs
+        for expression in config.related_doc_id_expressions
+    ]
+    if not expressions:
+        return doc_ids_by_type
+
+    for doc in docs:
+        context = EvaluationContext(doc, related_docs=related_docs)
+        for doc_type, doc_id_expression in expressions:
+            try:
+                doc_id = doc_id_expression(doc, context)
+            except Exception:
+                continue
+            if doc_id and isinstance(doc_id, str):
+                doc_ids_by_type[doc_type].add(doc_id)
+    return doc_ids_by_type
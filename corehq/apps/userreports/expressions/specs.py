@@ -512,13 +512,18 @@ class RelatedDocExpressionSpec(JsonObject):
     @staticmethod
     @ucr_context_cache(vary_on=('related_doc_type', 'doc_id',))
     def _get_document(related_doc_type, doc_id, context):
-        document_store = get_document_store_for_doc_type(
-            context.root_doc['domain'], related_doc_type,
-            load_source="related_doc_expression")
-        try:
-            doc = document_store.get_document(doc_id)
-        except DocumentNotFoundError:
-            return None
+        if context.related_docs is not None:
+            doc = context.related_docs.get_document(related_doc_type, doc_id)
+            if doc is None:
+                return None
+        else:
+            document_store = get_document_store_for_doc_type(
+                context.root_doc['domain'], related_doc_type,
+                load_source="related_doc_expression")
+            try:
+                doc = document_store.get_document(doc_id)
+            except DocumentNotFoundError:
+                return None
         if context.root_doc['domain'] != doc.get('domain'):
             return None
         return doc
@@ -527,7 +532,7 @@ class RelatedDocExpressionSpec(JsonObject):
         assert context.root_doc['domain']
         doc = self._get_document(self.related_doc_type, doc_id, context)
         # explicitly use a new evaluation context since this is a new document
-        return self._value_expression(doc, EvaluationContext(doc, 0))
+        return self._value_expression(doc, EvaluationContext(doc, 0, related_docs=context.related_docs))
 
     def __str__(self):
         return "{}[{}]/{}".format(self.related_doc_type,
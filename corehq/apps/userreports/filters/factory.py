@@ -94,6 +94,16 @@ class FilterFactory(object):
                 str(e),
             ))
 
+    @classmethod
+    def compile_from_spec(cls, spec, context=None, compiler=None):
+        """
+        Like ``from_spec`` but returns a compiled function instead of the filter tree.
+        See ``corehq.apps.userreports.expressions.compiler``.
+        """
+        from corehq.apps.userreports.expressions.compiler import ExpressionCompiler
+        compiler = compiler or ExpressionCompiler()
+        return compiler.compile_filter(cls.from_spec(spec, context))
+
     @classmethod
     def validate_spec(self, spec):
         if spec.get('type') not in self.constructor_map:
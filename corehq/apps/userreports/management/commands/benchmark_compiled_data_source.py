@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mock import patch
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.models import (
+    DataSourceConfiguration,
+    get_datasource_config,
+)
+from corehq.apps.userreports.specs import EvaluationContext
+
+
+class Command(BaseCommand):
+    help = "Compare processing time of a data source with and without compiled expressions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain')
+        parser.add_argument('data_source_id')
+        parser.add_argument('doc_ids', nargs='+')
+        parser.add_argument('--iterations', type=int, default=100)
+
+    def handle(self, domain, data_source_id, doc_ids, **options):
+        config, _ = get_datasource_config(data_source_id, domain)
+        doc_store = get_document_store_for_doc_type(
+            domain, config.referenced_doc_type, load_source="benchmark_compiled_data_source")
+        docs = list(doc_store.iter_documents(doc_ids))
+        if not docs:
+            raise CommandError("No documents found")
+
+        iterations = options['iterations']
+        interpreted_rows, interpreted_time = _run(config, docs, iterations, compiled=False)
+        compiled_rows, compiled_time = _run(config, docs, iterations, compiled=True)
+        if interpreted_rows != compiled_rows:
+            raise CommandError("Compiled data source produced different rows")
+
+        rows_processed = iterations * len(docs)
+        print("Processed {} documents {} times".format(len(docs), iterations))
+        print("Interpreted: {:.3f}s ({:.3f}ms per doc)".format(
+            interpreted_time, interpreted_time * 1000 / rows_processed))
+        print("Compiled:    {:.3f}s ({:.3f}ms per doc)".format(
+            compiled_time, compiled_time * 1000 / rows_processed))
+        if compiled_time:
+            print("Speedup:     {:.2f}x".format(interpreted_time / compiled_time))
+        print("Plan stats:  {}".format(dict(config.compiled_plan.stats)))
+
+
+def _run(config, docs, iterations, compiled):
+    with patch.object(DataSourceConfiguration, 'use_compiled_plan', compiled):
+        start = time.time()
+        for _ in range(iterations):
+            rows = [_get_rows(config, doc) for doc in docs]
+        return rows, time.time() - start
+
+
+def _get_rows(config, doc):
+    return [
+        [(value.column.id, value.value) for value in row if value.column.id != 'inserted_at']
+        for row in config.get_all_values(doc, EvaluationContext(doc))
+    ]
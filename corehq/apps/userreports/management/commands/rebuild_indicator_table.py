@@ -1,6 +1,10 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from corehq.apps.userreports import tasks
+from corehq.apps.userreports.sharded_rebuild import (
+    ShardedRebuildError,
+    rebuild_indicators_sharded,
+)
 
 
 class Command(BaseCommand):
@@ -12,9 +16,34 @@ class Command(BaseCommand):
                             help='Rebuild table in place (preserve existing data)')
         parser.add_argument('--initiated-by', action='store', required=True, dest='initiated',
                             help='Who initiated the rebuild (for sending email notifications)')
+        parser.add_argument('--processes', type=int, default=0,
+                            help='Rebuild SQL domain form or case data sources by shard using this many '
+                                 'worker processes')
+        parser.add_argument('--ranges-per-db', type=int, default=1, dest='ranges_per_db',
+                            help='Number of ID ranges to split each shard database into (with --processes)')
+        parser.add_argument('--resume', action='store_true', default=False,
+                            help='Resume an interrupted rebuild (with --processes)')
 
     def handle(self, indicator_config_id, **options):
-        if options['in_place']:
+        if options['processes']:
+            config = tasks._get_config_by_id(indicator_config_id)
+            try:
+                throughput = rebuild_indicators_sharded(
+                    config,
+                    options['processes'],
+                    ranges_per_db=options['ranges_per_db'],
+                    initiated_by=options['initiated'],
+                    source='rebuild_indicator_table',
+                    in_place=options['in_place'],
+                    resume=options['resume'],
+                )
+            except ShardedRebuildError as e:
+                raise CommandError(str(e))
+            for pid, stats in sorted(throughput.items()):
+                self.stdout.write("Worker {}: {} docs in {:.0f}s ({:.1f} docs/s)".format(
+                    pid, stats['docs'], stats['seconds'], stats['docs_per_second']
+                ))
+        elif options['in_place']:
             tasks.rebuild_indicators_in_place(
                 indicator_config_id, options['initiated'], source='rebuild_indicator_table'
             )
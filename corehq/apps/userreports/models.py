@@ -86,6 +86,7 @@ from corehq.apps.userreports.util import (
 )
 from corehq.pillows.utils import get_deleted_doc_types
 from corehq.sql_db.connections import UCR_ENGINE_ID, connection_manager
+from corehq.toggles import UCR_COMPILED_EXPRESSIONS
 from corehq.util.couch import DocumentNotFound, get_document_or_not_found
 from corehq.util.quickcache import quickcache
 
@@ -260,7 +261,10 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
         if eval_context is None:
             eval_context = EvaluationContext(document)
 
-        filter_fn = self._get_main_filter()
+        if self.use_compiled_plan:
+            filter_fn = self.compiled_plan.filter
+        else:
+            filter_fn = self._get_main_filter()
         return filter_fn(document, eval_context)
 
     def deleted_filter(self, document):
@@ -431,6 +435,23 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
             return ExpressionFactory.from_spec(self.base_item_expression, context=self.get_factory_context())
         return None
 
+    @property
+    @memoized
+    def compiled_plan(self):
+        from corehq.apps.userreports.expressions.compiler import DataSourcePlan
+        return DataSourcePlan.from_data_source(self)
+
+    @property
+    @memoized
+    def related_doc_id_expressions(self):
+        from corehq.apps.userreports.expressions.related_docs import get_related_doc_id_expressions
+        return get_related_doc_id_expressions(self)
+
+    @property
+    @memoized
+    def use_compiled_plan(self):
+        return UCR_COMPILED_EXPRESSIONS.enabled(self.domain)
+
     @memoized
     def get_columns(self):
         return self.indicators.get_columns()
@@ -448,7 +469,10 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
             if not self.base_item_expression:
                 return [document]
             else:
-                result = self.parsed_expression(document, eval_context)
+                if self.use_compiled_plan:
+                    result = self.compiled_plan.base_item_expression(document, eval_context)
+                else:
+                    result = self.parsed_expression(document, eval_context)
                 if result is None:
                     return []
                 elif isinstance(result, list):
@@ -479,9 +503,13 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
                     )
                 return []
 
+        if self.use_compiled_plan:
+            get_values = self.compiled_plan.get_values
+        else:
+            get_values = self.indicators.get_values
         rows = []
         for item in self.get_items(doc, eval_context):
-            indicators = self.indicators.get_values(item, eval_context)
+            indicators = get_values(item, eval_context)
             rows.append(indicators)
             eval_context.increment_iteration()
 
@@ -33,6 +33,10 @@ from corehq.apps.userreports.exceptions import (
     TableRebuildError,
     UserReportsWarning,
 )
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocumentCache,
+    get_related_doc_ids,
+)
 from corehq.apps.userreports.models import AsyncIndicator
 from corehq.apps.userreports.rebuild import (
     get_table_diffs,
@@ -44,6 +48,7 @@ from corehq.apps.userreports.sql import get_metadata
 from corehq.apps.userreports.tasks import rebuild_indicators
 from corehq.apps.userreports.util import get_indicator_adapter
 from corehq.sql_db.connections import connection_manager
+from corehq.toggles import UCR_BATCHED_RELATED_DOCS
 from corehq.util.soft_assert import soft_assert
 from corehq.util.timer import TimingContext
 
@@ -310,11 +315,17 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
             retry_changes, docs = bulk_fetch_changes_docs(to_update, domain)
         change_exceptions = []
 
+        related_docs = None
+        if UCR_BATCHED_RELATED_DOCS.enabled(domain):
+            related_docs = RelatedDocumentCache(domain)
+            with self._metrics_timer('related_doc_prefetch'):
+                self._prefetch_related_docs(related_docs, adapters, docs)
+
         with self._metrics_timer('single_batch_transform'):
             for doc in docs:
                 change = changes_by_id[doc['_id']]
                 doc_subtype = change.metadata.document_subtype
-                eval_context = EvaluationContext(doc)
+                eval_context = EvaluationContext(doc, related_docs=related_docs)
                 with self._metrics_timer('single_doc_transform'):
                     for adapter in adapters:
                         with self._metrics_timer('transform', adapter.config._id):
@@ -366,6 +377,16 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
 
         return retry_changes, change_exceptions
 
+    @staticmethod
+    def _prefetch_related_docs(related_docs, adapters, docs):
+        # best effort: anything not prefetched is fetched when the expression is evaluated
+        try:
+            related_docs.prefetch(get_related_doc_ids(
+                [adapter.config for adapter in adapters], docs, related_docs
+            ))
+        except Exception:
+            pillow_logging.exception("Error prefetching related documents for domain %s", related_docs.domain)
+
     def _metrics_timer(self, step, config_id=None):
         tags = {
             'action': step,
@@ -1,3 +1,4 @@
+import json
 import logging
 from collections import defaultdict
 
@@ -46,6 +47,53 @@ class DataSourceResumeHelper(object):
         return self._client.exists(self._key)
 
 
+class ShardedRebuildResumeHelper(object):
+    """Tracks the progress of each shard of a sharded data source rebuild
+
+    Progress is stored as the primary key of the last document processed in
+    the shard so that an interrupted rebuild can resume part way through a shard.
+    """
+    COMPLETE = b'complete'
+
+    def __init__(self, config):
+        self.config = config
+        self._client = get_redis_client().client.get_client()
+        self._key = '{}:shards'.format(get_redis_key_for_config(config))
+        self._shards_key = '{}:shard_list'.format(get_redis_key_for_config(config))
+
+    def get_shards(self):
+        """
+        :return: list of the JSON dicts of the shards of the rebuild, or ``None``
+                 if the rebuild hasn't been started
+        """
+        value = self._client.get(self._shards_key)
+        return json.loads(value) if value is not None else None
+
+    def set_shards(self, shards):
+        self._client.set(self._shards_key, json.dumps(shards))
+
+    def get_last_pk(self, shard_id):
+        value = self._client.hget(self._key, shard_id)
+        if value is None or value == self.COMPLETE:
+            return None
+        return int(value)
+
+    def set_last_pk(self, shard_id, last_pk):
+        self._client.hset(self._key, shard_id, last_pk)
+
+    def is_shard_complete(self, shard_id):
+        return self._client.hget(self._key, shard_id) == self.COMPLETE
+
+    def mark_shard_complete(self, shard_id):
+        self._client.hset(self._key, shard_id, self.COMPLETE)
+
+    def clear_resume_info(self):
+        self._client.delete(self._key, self._shards_key)
+
+    def has_resume_info(self):
+        return self._client.exists(self._shards_key)
+
+
 @attr.s
 class MigrateRebuildTables(object):
     migrate = attr.ib()
@@ -0,0 +1,285 @@
+"""
+Multi-process rebuild of UCR data sources backed by the sharded SQL databases.
+
+``rebuild_indicators`` processes one case type or xmlns at a time in a single
+process and only records progress once a whole case type or xmlns has been
+processed. ``rebuild_indicators_sharded`` instead splits the documents of the
+data source into shards:
+
+  - one shard per case type or xmlns per SQL shard database
+  - optionally further split into ``ranges_per_db`` primary key ranges
+
+Shards are processed in parallel by a pool of worker processes. Each worker
+records the primary key of the last document it processed after every chunk
+(``ShardedRebuildResumeHelper``), so a rebuild that is interrupted and then
+resumed continues part way through each shard instead of starting it over.
+
+Only data sources of forms or cases in domains that use the SQL backend can be
+rebuilt this way.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import connections
+from django.db.models import Max, Min
+
+import attr
+
+from pillowtop.dao.couch import ID_CHUNK_SIZE
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.models import id_is_static
+from corehq.apps.userreports.rebuild import ShardedRebuildResumeHelper
+from corehq.apps.userreports.util import get_indicator_adapter
+from corehq.form_processor.models import CommCareCaseSQL, XFormInstanceSQL
+from corehq.form_processor.utils.general import should_use_sql_backend
+from corehq.sql_db.connections import connection_manager
+from corehq.sql_db.util import get_db_aliases_for_partitioned_query
+
+logger = logging.getLogger(__name__)
+
+SHARDED_REBUILD_DOC_TYPES = ('CommCareCase', 'XFormInstance')
+
+
+class ShardedRebuildError(Exception):
+    pass
+
+
+@attr.s(frozen=True)
+class RebuildShard(object):
+    """The documents of a data source in a single database and primary key range
+
+    :param start_pk: exclusive lower bound of the primary key range, ``None`` for no bound
+    :param end_pk: inclusive upper bound of the primary key range, ``None`` for no bound
+    """
+    case_type_or_xmlns = attr.ib()
+    db_alias = attr.ib()
+    start_pk = attr.ib(default=None)
+    end_pk = attr.ib(default=None)
+
+    @property
+    def shard_id(self):
+        return '{}:{}:{}-{}'.format(
+            self.db_alias,
+            self.case_type_or_xmlns or '',
+            '' if self.start_pk is None else self.start_pk,
+            '' if self.end_pk is None else self.end_pk,
+        )
+
+
+@attr.s
+class ShardResult(object):
+    shard_id = attr.ib()
+    doc_count = attr.ib()
+    seconds = attr.ib()
+    pid = attr.ib(factory=os.getpid)
+    error = attr.ib(default=None)
+
+
+def supports_sharded_rebuild(config):
+    return config.referenced_doc_type in SHARDED_REBUILD_DOC_TYPES and should_use_sql_backend(config.domain)
+
+
+def get_rebuild_shards(config, ranges_per_db=1):
+    shards = []
+    for case_type_or_xmlns in config.get_case_type_or_xmlns_filter():
+        for db_alias in get_db_aliases_for_partitioned_query():
+            if ranges_per_db <= 1:
+                shards.append(RebuildShard(case_type_or_xmlns, db_alias))
+                continue
+            query = _get_shard_query(config, case_type_or_xmlns, db_alias)
+            bounds = query.aggregate(min_pk=Min('id'), max_pk=Max('id'))
+            if bounds['min_pk'] is None:
+                continue
+            shards.extend(
+                RebuildShard(case_type_or_xmlns, db_alias, start_pk, end_pk)
+                for start_pk, end_pk in _split_range(bounds['min_pk'], bounds['max_pk'], ranges_per_db)
+            )
+    return shards
+
+
+def _split_range(min_pk, max_pk, count):
+    """Split ``[min_pk, max_pk]`` into ``count`` ranges of ``(exclusive start, inclusive end)``"""
+    step = max((max_pk - min_pk + 1) // count, 1)
+    ranges = []
+    start = min_pk - 1
+    while start < max_pk:
+        end = start + step if len(ranges) < count - 1 else max_pk
+        end = min(end, max_pk)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _get_shard_query(config, case_type_or_xmlns, db_alias):
+    # same filters as the document stores used by the regular rebuild
+    if config.referenced_doc_type == 'CommCareCase':
+        query = CommCareCaseSQL.objects.using(db_alias).filter(domain=config.domain, deleted=False)
+        if case_type_or_xmlns:
+            query = query.filter(type=case_type_or_xmlns)
+    else:
+        query = XFormInstanceSQL.objects.using(db_alias).filter(
+            domain=config.domain, state=XFormInstanceSQL.NORMAL
+        )
+        if case_type_or_xmlns:
+            query = query.filter(xmlns=case_type_or_xmlns)
+    return query
+
+
+def iter_shard_id_chunks(config, shard, last_pk=None, chunk_size=ID_CHUNK_SIZE):
+    """
+    :return: generator of lists of ``(doc_id, pk)`` in primary key order
+    """
+    id_field = 'case_id' if config.referenced_doc_type == 'CommCareCase' else 'form_id'
+    query = _get_shard_query(config, shard.case_type_or_xmlns, shard.db_alias)
+    if shard.end_pk is not None:
+        query = query.filter(id__lte=shard.end_pk)
+    if last_pk is None:
+        last_pk = shard.start_pk
+    while True:
+        chunk_query = query if last_pk is None else query.filter(id__gt=last_pk)
+        chunk = list(chunk_query.order_by('id').values_list(id_field, 'id')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1][1]
+
+
+def build_shard(config_id, shard):
+    """Build the indicators for a shard, resuming from the last recorded progress
+
+    Runs in a worker process.
+    """
+    from corehq.apps.userreports.tasks import _build_indicators, _get_config_by_id
+
+    start = time.time()
+    doc_count = 0
+    try:
+        config = _get_config_by_id(config_id)
+        resume_helper = ShardedRebuildResumeHelper(config)
+        document_store = get_document_store_for_doc_type(
+            config.domain, config.referenced_doc_type,
+            case_type_or_xmlns=shard.case_type_or_xmlns,
+            load_source="build_indicators_sharded",
+        )
+        last_pk = resume_helper.get_last_pk(shard.shard_id)
+        for chunk in iter_shard_id_chunks(config, shard, last_pk):
+            _build_indicators(config, document_store, [doc_id for doc_id, pk in chunk])
+            resume_helper.set_last_pk(shard.shard_id, chunk[-1][1])
+            doc_count += len(chunk)
+            seconds = time.time() - start
+            logger.info(
+                "[%s] shard %s: %s docs in %.0fs (%.1f docs/s)",
+                os.getpid(), shard.shard_id, doc_count, seconds, doc_count / seconds if seconds else 0
+            )
+        resume_helper.mark_shard_complete(shard.shard_id)
+    except Exception as e:
+        logger.exception("Error building shard %s of data source %s", shard.shard_id, config_id)
+        return ShardResult(shard.shard_id, doc_count, time.time() - start, error=repr(e))
+    return ShardResult(shard.shard_id, doc_count, time.time() - start)
+
+
+def _build_shard(args):
+    return build_shard(*args)
+
+
+def _init_worker():
+    # connections are not safe to share with the parent process
+    connections.close_all()
+    connection_manager.dispose_all()
+
+
+def rebuild_indicators_sharded(config, processes, ranges_per_db=1, initiated_by=None,
+                               source=None, in_place=False, resume=False):
+    """Rebuild a data source using multiple processes
+
+    :param resume: continue a previous sharded rebuild instead of starting over
+    :return: dict of ``pid -> {'docs': ..., 'seconds': ..., 'docs_per_second': ...}``
+    """
+    from corehq.apps.userreports.tasks import _mark_build_finished
+
+    if not supports_sharded_rebuild(config):
+        raise ShardedRebuildError(
+            "Sharded rebuilds are only supported for SQL domain data sources of {}".format(
+                ', '.join(SHARDED_REBUILD_DOC_TYPES)
+            )
+        )
+
+    adapter = get_indicator_adapter(config)
+    if resume:
+        adapter.log_table_build(initiated_by=initiated_by, source=source)
+    else:
+        ShardedRebuildResumeHelper(config).clear_resume_info()
+        _start_build(config, in_place)
+        if in_place:
+            adapter.build_table(initiated_by=initiated_by, source=source)
+        else:
+            adapter.rebuild_table(initiated_by=initiated_by, source=source)
+
+    # progress is keyed by the config's revision, which changes when the build starts
+    resume_helper = ShardedRebuildResumeHelper(config)
+    # shards are saved so that a resumed rebuild uses the same primary key ranges
+    saved_shards = resume_helper.get_shards() if resume else None
+    if saved_shards is None:
+        shards = get_rebuild_shards(config, ranges_per_db)
+        resume_helper.set_shards([attr.asdict(shard) for shard in shards])
+    else:
+        shards = [RebuildShard(**shard) for shard in saved_shards]
+    shards = [shard for shard in shards if not resume_helper.is_shard_complete(shard.shard_id)]
+    logger.info("Building %s shards of data source %s with %s processes", len(shards), config._id, processes)
+
+    _init_worker()
+    pool = multiprocessing.Pool(processes=processes, initializer=_init_worker)
+    try:
+        results = list(pool.imap_unordered(_build_shard, [(config._id, shard) for shard in shards]))
+    finally:
+        pool.terminate()
+        pool.join()
+
+    throughput = get_worker_throughput(results)
+    for pid, stats in sorted(throughput.items()):
+        logger.info(
+            "Worker %s: %s docs in %.0fs (%.1f docs/s)",
+            pid, stats['docs'], stats['seconds'], stats['docs_per_second']
+        )
+
+    failed = [result.shard_id for result in results if result.error]
+    if failed:
+        raise ShardedRebuildError(
+            "{} shards failed, resume the rebuild to retry them: {}".format(len(failed), ', '.join(failed))
+        )
+
+    resume_helper.clear_resume_info()
+    _mark_build_finished(config, in_place)
+    return throughput
+
+
+def get_worker_throughput(results):
+    throughput = defaultdict(lambda: {'docs': 0, 'seconds': 0})
+    for result in results:
+        throughput[result.pid]['docs'] += result.doc_count
+        throughput[result.pid]['seconds'] += result.seconds
+    for stats in throughput.values():
+        stats['docs_per_second'] = stats['docs'] / stats['seconds'] if stats['seconds'] else 0
+    return dict(throughput)
+
+
+def _start_build(config, in_place):
+    if id_is_static(config._id):
+        return
+    # Save the start time now in case anything goes wrong. This way we'll be
+    # able to see if the rebuild started a long time ago without finishing.
+    if in_place:
+        config.meta.build.initiated_in_place = datetime.utcnow()
+        config.meta.build.finished_in_place = False
+    else:
+        config.meta.build.initiated = datetime.utcnow()
+        config.meta.build.finished = False
+    config.meta.build.rebuilt_asynchronously = False
+    config.save()
@@ -17,6 +17,11 @@ from corehq.apps.userreports.exceptions import (
     TableRebuildError,
     translate_programming_error,
 )
+from corehq.apps.userreports.sql.bulk_load import (
+    COPY_ROW_THRESHOLD,
+    copy_rows,
+    copy_upsert,
+)
 from corehq.apps.userreports.sql.columns import column_to_sql
 from corehq.apps.userreports.util import get_table_name
 from corehq.sql_db.connections import connection_manager
@@ -34,6 +39,8 @@ def get_metadata(engine_id):
 
 
 class IndicatorSqlAdapter(IndicatorAdapter):
+    # save_rows loads batches of at least this many rows with COPY
+    copy_row_threshold = COPY_ROW_THRESHOLD
 
     def __init__(self, config, override_table_name=None, engine_id=None):
         super(IndicatorSqlAdapter, self).__init__(config)
@@ -180,13 +187,23 @@ class IndicatorSqlAdapter(IndicatorAdapter):
             {i.column.database_column_name.decode('utf-8'): i.value for i in row}
             for row in rows
         ]
+        use_copy = len(formatted_rows) >= self.copy_row_threshold
         if self.session_helper.is_citus_db:
             config = self.config.sql_settings.citus_config
             if config.distribution_type == 'hash':
-                self._by_column_update(formatted_rows)
+                self._by_column_update(formatted_rows, use_copy)
                 return
         doc_ids = set(row['doc_id'] for row in formatted_rows)
         table = self.get_table()
+        if use_copy:
+            with self.session_context() as session:
+                if self.supports_upsert():
+                    copy_upsert(session, table, formatted_rows)
+                else:
+                    session.execute(table.delete().where(table.c.doc_id.in_(doc_ids)))
+                    copy_rows(session, table, formatted_rows)
+            return
+
         if self.supports_upsert():
             queries = [self._upsert_query(table, formatted_rows)]
         else:
@@ -205,12 +222,25 @@ class IndicatorSqlAdapter(IndicatorAdapter):
             for query in queries:
                 session.execute(query)
 
-    def _by_column_update(self, rows):
+    def _by_column_update(self, rows, use_copy=False):
         config = self.config.sql_settings.citus_config
         shard_col = config.distribution_column
         table = self.get_table()
 
         rows = sorted(rows, key=lambda row: row[shard_col])
+        if use_copy:
+            with self.session_context() as session:
+                if self.supports_upsert():
+                    copy_upsert(session, table, rows)
+                else:
+                    # delete by shard value to avoid locking the whole distributed table
+                    for shard_value, rows_ in itertools.groupby(rows, key=lambda row: row[shard_col]):
+                        doc_ids = set(row['doc_id'] for row in rows_)
+                        delete = table.delete().where(table.c.get(shard_col) == shard_value)
+                        session.execute(delete.where(table.c.doc_id.in_(doc_ids)))
+                    copy_rows(session, table, rows)
+            return
+
         for shard_value, rows_ in itertools.groupby(rows, key=lambda row: row[shard_col]):
             formatted_rows = list(rows_)
             doc_ids = set(row['doc_id'] for row in formatted_rows)
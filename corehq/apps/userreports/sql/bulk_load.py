@@ -0,0 +1,171 @@
+"""
+Bulk loading of UCR rows with PostgreSQL ``COPY``.
+
+For large batches of rows, building and parsing a single ``INSERT ... VALUES``
+statement with one set of parameters per value is much slower than streaming
+the rows to the database with ``COPY``. Rows are written in CSV format, with
+``NULL`` as an unquoted empty field and every other value quoted.
+
+  - ``copy_rows`` copies rows straight into the indicator table (used after the
+    old rows have been deleted)
+  - ``copy_upsert`` copies rows into a temporary table and merges them into the
+    indicator table with a single ``INSERT ... ON CONFLICT DO UPDATE``
+
+The statements are run with the raw psycopg2 cursor of the session's
+connection. Database errors are raised as the sqlalchemy exceptions that
+``session.execute`` would raise, so that they are handled like errors of
+the other save paths (see ``translate_programming_error``).
+"""
+import datetime
+import hashlib
+import io
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import sql
+from sqlalchemy.exc import DBAPIError
+
+# number of rows above which IndicatorSqlAdapter.save_rows uses COPY
+COPY_ROW_THRESHOLD = 500
+
+TEMP_TABLE_PREFIX = 'ucr_bulk_load_'
+
+
+def copy_rows(session, table, rows):
+    """Copy rows (dicts of column name to value) into the table"""
+    columns = _get_columns(table, rows)
+    _copy(session, sql.Identifier(table.name), columns, rows)
+
+
+def copy_upsert(session, table, rows):
+    """Insert or update rows (dicts of column name to value) in the table
+
+    The temporary table is dropped at the end of the session's transaction.
+    """
+    columns = _get_columns(table, rows)
+    temp_table = sql.Identifier(get_temp_table_name(table.name))
+    pk_columns = [column.name for column in table.primary_key.columns]
+    update_columns = [column for column in columns if column not in pk_columns]
+    _execute(session, sql.SQL(
+        "CREATE TEMPORARY TABLE IF NOT EXISTS {temp_table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+    ).format(temp_table=temp_table, table=sql.Identifier(table.name)))
+    _copy(session, temp_table, columns, rows)
+
+    if update_columns:
+        on_conflict = sql.SQL("DO UPDATE SET {}").format(sql.SQL(", ").join(
+            sql.SQL("{column} = EXCLUDED.{column}").format(column=sql.Identifier(column))
+            for column in update_columns
+        ))
+    else:
+        on_conflict = sql.SQL("DO NOTHING")
+    column_list = _column_list(columns)
+    _execute(session, sql.SQL(
+        "INSERT INTO {table} ({columns}) SELECT {columns} FROM {temp_table} "
+        "ON CONFLICT ({pk_columns}) {on_conflict}"
+    ).format(
+        table=sql.Identifier(table.name),
+        columns=column_list,
+        temp_table=temp_table,
+        pk_columns=_column_list(pk_columns),
+        on_conflict=on_conflict,
+    ))
+    _execute(session, sql.SQL("TRUNCATE {}").format(temp_table))
+
+
+def get_temp_table_name(table_name):
+    """Name of the temporary table used to upsert rows into a table
+
+    Each table has its own temporary table, since it has the same columns.
+    Table names are hashed to stay within PostgreSQL's identifier length.
+    """
+    return TEMP_TABLE_PREFIX + hashlib.md5(table_name.encode('utf-8')).hexdigest()
+
+
+def _get_columns(table, rows):
+    # rows always have the same columns since they come from the same data source
+    return [column.name for column in table.columns if column.name in rows[0]]
+
+
+def _column_list(columns):
+    return sql.SQL(", ").join(sql.Identifier(column) for column in columns)
+
+
+def _copy(session, table_identifier, columns, rows):
+    data = rows_to_csv(columns, rows)
+    with _get_cursor(session) as cursor:
+        statement = sql.SQL("COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)").format(
+            table=table_identifier, columns=_column_list(columns)
+        ).as_string(cursor)
+        with _translate_errors(statement):
+            cursor.copy_expert(statement, data)
+
+
+def _execute(session, query):
+    with _get_cursor(session) as cursor:
+        statement = query.as_string(cursor)
+        with _translate_errors(statement):
+            cursor.execute(statement)
+
+
+def _get_cursor(session):
+    # the raw psycopg2 connection of the session's transaction
+    return session.connection().connection.cursor()
+
+
+@contextmanager
+def _translate_errors(statement):
+    """Raise psycopg2 errors as the equivalent sqlalchemy exceptions"""
+    try:
+        yield
+    except psycopg2.Error as e:
+        raise DBAPIError.instance(statement, None, e, psycopg2.Error) from e
+
+
+def rows_to_csv(columns, rows):
+    """
+    :return: file-like object with the rows in CSV format
+    """
+    data = io.StringIO()
+    for row in rows:
+        data.write(','.join(format_csv_value(row.get(column)) for column in columns))
+        data.write('\n')
+    data.seek(0)
+    return data
+
+
+def format_csv_value(value):
+    """Format a value for COPY in CSV format
+
+    ``None`` is an unquoted empty field, which COPY reads as ``NULL``. All other
+    values are quoted so that empty strings are kept as empty strings.
+    """
+    if value is None:
+        return ''
+    return _quote(_to_text(value))
+
+
+def _to_text(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return _to_array_literal(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def _to_array_literal(values):
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append('NULL')
+        else:
+            text = _to_text(value).replace('\\', '\\\\').replace('"', '\\"')
+            elements.append('"{}"'.format(text))
+    return '{' + ','.join(elements) + '}'
+
+
+def _quote(text):
+    return '"{}"'.format(text.replace('"', '""'))
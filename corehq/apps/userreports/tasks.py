@@ -155,7 +155,6 @@ def resume_building_indicators(indicator_config_id, initiated_by=None):
 
 def _iteratively_build_table(config, resume_helper=None, in_place=False, limit=-1):
     resume_helper = resume_helper or DataSourceResumeHelper(config)
-    indicator_config_id = config._id
     case_type_or_xmlns_list = config.get_case_type_or_xmlns_filter()
     completed_ct_xmlns = resume_helper.get_completed_case_type_or_xmlns()
     if completed_ct_xmlns:
@@ -187,6 +186,11 @@ def _iteratively_build_table(config, resume_helper=None, in_place=False, limit=-
         resume_helper.add_completed_case_type_or_xmlns(case_type_or_xmlns)
 
     resume_helper.clear_resume_info()
+    _mark_build_finished(config, in_place)
+
+
+def _mark_build_finished(config, in_place=False):
+    indicator_config_id = config._id
     if not id_is_static(indicator_config_id):
         if in_place:
             config.meta.build.finished_in_place = True
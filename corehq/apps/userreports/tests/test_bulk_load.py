@@ -0,0 +1,107 @@
+import datetime
+import uuid
+
+from django.test import SimpleTestCase, TestCase
+
+from mock import patch
+
+from corehq.apps.userreports.sql.adapter import IndicatorSqlAdapter
+from corehq.apps.userreports.sql.bulk_load import (
+    copy_upsert,
+    format_csv_value,
+    rows_to_csv,
+)
+from corehq.apps.userreports.tests.test_save_errors import get_sample_config
+from corehq.apps.userreports.tests.utils import (
+    get_sample_data_source,
+    get_sample_doc_and_indicators,
+)
+from corehq.apps.userreports.util import get_indicator_adapter
+from corehq.util.test_utils import generate_cases
+
+
+class FormatCsvValueTest(SimpleTestCase):
+
+    def test_rows_to_csv(self):
+        rows = [
+            {'doc_id': 'a', 'name': 'with "quotes", commas\nand newlines', 'count': 1},
+            {'doc_id': 'b', 'name': '', 'count': None},
+        ]
+        self.assertEqual(
+            rows_to_csv(['doc_id', 'name', 'count'], rows).read(),
+            '"a","with ""quotes"", commas\nand newlines","1"\n'
+            '"b","",\n'
+        )
+
+
+@generate_cases([
+    (None, ''),
+    ('', '""'),
+    ('text', '"text"'),
+    (4, '"4"'),
+    (True, '"true"'),
+    (datetime.date(2019, 3, 4), '"2019-03-04"'),
+    (datetime.datetime(2019, 3, 4, 10, 20, 30, 5), '"2019-03-04T10:20:30.000005"'),
+    (['a', 'b c', None], '"{""a"",""b c"",NULL}"'),
+    (['back\\slash', 'quo"te'], '"{""back\\\\slash"",""quo\\""te""}"'),
+    ([], '"{}"'),
+], FormatCsvValueTest)
+def test_format_csv_value(self, value, expected):
+    self.assertEqual(format_csv_value(value), expected)
+
+
+class BulkLoadDbTest(TestCase):
+
+    def setUp(self):
+        super(BulkLoadDbTest, self).setUp()
+        self.config = get_sample_data_source()
+        self.config.table_id = uuid.uuid4().hex
+        self.adapter = get_indicator_adapter(self.config)
+        self.adapter.build_table()
+        self.addCleanup(self.adapter.drop_table)
+
+    def _save(self, docs):
+        with patch.object(IndicatorSqlAdapter, 'copy_row_threshold', 1):
+            self.adapter.bulk_save(docs)
+
+    def _get_rows(self):
+        return {
+            row.doc_id: row
+            for row in self.adapter.get_query_object()
+        }
+
+    def test_insert(self):
+        docs = [get_sample_doc_and_indicators()[0] for _ in range(3)]
+        self._save(docs)
+        rows = self._get_rows()
+        self.assertEqual(set(rows), {doc['_id'] for doc in docs})
+        for doc in docs:
+            _, expected = get_sample_doc_and_indicators()
+            row = rows[doc['_id']]
+            self.assertEqual(row.date, expected['date'])
+            self.assertEqual(row.owner, expected['owner'])
+            self.assertEqual(row.priority, expected['priority'])
+            self.assertAlmostEqual(row.estimate, expected['estimate'])
+
+    def test_update(self):
+        docs = [get_sample_doc_and_indicators()[0] for _ in range(2)]
+        self._save(docs)
+        docs[0]['owner_id'] = 'new-owner'
+        self._save(docs)
+        rows = self._get_rows()
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[docs[0]['_id']].owner, 'new-owner')
+        self.assertEqual(rows[docs[1]['_id']].owner, 'some-user-id')
+
+    def test_upsert_into_two_tables(self):
+        other_config = get_sample_config()
+        other_adapter = get_indicator_adapter(other_config)
+        other_adapter.build_table()
+        self.addCleanup(other_adapter.drop_table)
+
+        with self.adapter.session_context() as session:
+            copy_upsert(session, self.adapter.get_table(), [{'doc_id': 'a', 'owner': 'owner-a'}])
+            copy_upsert(session, other_adapter.get_table(), [{'doc_id': 'b', 'name': 'name-b'}])
+
+        self.assertEqual(self.adapter.get_query_object().one().owner, 'owner-a')
+        self.assertEqual(other_adapter.get_query_object().one().name, 'name-b')
@@ -0,0 +1,241 @@
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from corehq.apps.userreports.expressions.compiler import (
+    DataSourcePlan,
+    ExpressionCompiler,
+    get_shared_lookup_keys,
+)
+from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.filters.factory import FilterFactory
+from corehq.apps.userreports.models import DataSourceConfiguration
+from corehq.apps.userreports.specs import EvaluationContext, FactoryContext
+from corehq.apps.userreports.tests.utils import (
+    get_sample_data_source,
+    get_sample_doc_and_indicators,
+)
+from corehq.util.test_utils import generate_cases
+
+DOCS = [
+    {
+        'domain': 'test', 'doc_type': 'CommCareCase', 'type': 'ticket', 'age': '25', 'district': 'north',
+        'opened_on': '2019-03-04T10:00:00.000000Z', 'siblings': ['a', 'b'], 'child': {'age': 3, 'name': ''},
+    },
+    {'domain': 'test', 'doc_type': 'CommCareCase', 'type': 'other', 'age': 'x', 'district': ['south']},
+    {'domain': 'other', 'child': 'not a dict', 'siblings': 'not a list'},
+    {},
+]
+
+FACTORY_CONTEXT = FactoryContext(
+    {
+        'age': ExpressionFactory.from_spec(
+            {'type': 'property_name', 'property_name': 'age', 'datatype': 'integer'}
+        ),
+    },
+    {},
+)
+
+
+class CompiledExpressionTest(SimpleTestCase):
+
+    def assertSameResults(self, interpreted, compiled):
+        for doc in DOCS:
+            self.assertEqual(
+                interpreted(doc, EvaluationContext(doc)),
+                compiled(doc, EvaluationContext(doc)),
+                doc
+            )
+
+
+@generate_cases([
+    ({'type': 'identity'},),
+    ({'type': 'constant', 'constant': 'hello'},),
+    ('2019-01-01',),
+    ({'type': 'property_name', 'property_name': 'age'},),
+    ({'type': 'property_name', 'property_name': 'age', 'datatype': 'integer'},),
+    ({'type': 'property_name', 'property_name': {'type': 'constant', 'constant': 'type'}},),
+    ({'type': 'property_path', 'property_path': ['child', 'age'], 'datatype': 'string'},),
+    ({'type': 'property_path', 'property_path': ['opened_on'], 'datatype': 'date'},),
+    ({'type': 'property_path', 'property_path': []},),
+    ({'type': 'named', 'name': 'age'},),
+    ({
+        'type': 'conditional',
+        'test': {
+            'type': 'boolean_expression', 'operator': 'gt',
+            'expression': {'type': 'named', 'name': 'age'}, 'property_value': 21,
+        },
+        'expression_if_true': 'legal',
+        'expression_if_false': {'type': 'property_name', 'property_name': 'type'},
+    },),
+    ({
+        'type': 'conditional',
+        'test': {'type': 'boolean_expression', 'operator': 'eq', 'expression': 1, 'property_value': 1},
+        'expression_if_true': 'always',
+        'expression_if_false': 'never',
+    },),
+    ({
+        'type': 'switch',
+        'switch_on': {'type': 'property_name', 'property_name': 'district'},
+        'cases': {'north': 4000, 'south': 2500},
+        'default': 0,
+    },),
+    ({
+        'type': 'array_index',
+        'array_expression': {'type': 'property_name', 'property_name': 'siblings'},
+        'index_expression': 1,
+    },),
+    ({'type': 'root_doc', 'expression': {'type': 'property_name', 'property_name': 'domain'}},),
+    ({
+        'type': 'nested',
+        'argument_expression': {'type': 'property_name', 'property_name': 'child'},
+        'value_expression': {'type': 'property_name', 'property_name': 'name'},
+    },),
+    ({'type': 'dict', 'properties': {'a': 'constant', 'b': {'type': 'property_name', 'property_name': 'type'}}},),
+    ({
+        'type': 'iterator',
+        'expressions': [
+            {'type': 'property_name', 'property_name': 'type'},
+            {'type': 'property_name', 'property_name': 'age'},
+        ],
+        'test': {'type': 'boolean_expression', 'operator': 'eq', 'expression': {'type': 'identity'},
+                 'property_value': 'ticket'},
+    },),
+    ({
+        'type': 'coalesce',
+        'expression': {'type': 'property_path', 'property_path': ['child', 'name']},
+        'default_expression': 'unknown',
+    },),
+    ({'type': 'split_string', 'string_expression': {'type': 'property_name', 'property_name': 'type'}},),
+], CompiledExpressionTest)
+def test_compiled_expression(self, spec):
+    self.assertSameResults(
+        ExpressionFactory.from_spec(spec, FACTORY_CONTEXT),
+        ExpressionFactory.compile_from_spec(spec, FACTORY_CONTEXT),
+    )
+
+
+@generate_cases([
+    ({'type': 'boolean_expression', 'operator': 'eq',
+      'expression': {'type': 'property_name', 'property_name': 'type'}, 'property_value': 'ticket'},),
+    ({'type': 'boolean_expression', 'operator': 'in',
+      'expression': {'type': 'property_name', 'property_name': 'type'}, 'property_value': ['ticket', 'other']},),
+    ({'type': 'property_match', 'property_name': 'type', 'property_value': 'ticket'},),
+    ({'type': 'not', 'filter': {'type': 'boolean_expression', 'operator': 'eq', 'expression': 1,
+                                'property_value': 1}},),
+    ({
+        'type': 'and',
+        'filters': [
+            {'type': 'boolean_expression', 'operator': 'eq', 'expression': 1, 'property_value': 1},
+            {'type': 'boolean_expression', 'operator': 'gte', 'expression': {'type': 'named', 'name': 'age'},
+             'property_value': 18},
+        ],
+    },),
+    ({
+        'type': 'or',
+        'filters': [
+            {'type': 'boolean_expression', 'operator': 'eq', 'expression': 1, 'property_value': 2},
+            {'type': 'boolean_expression', 'operator': 'eq',
+             'expression': {'type': 'property_name', 'property_name': 'domain'}, 'property_value': 'other'},
+        ],
+    },),
+], CompiledExpressionTest)
+def test_compiled_filter(self, spec):
+    self.assertSameResults(
+        FilterFactory.from_spec(spec, FACTORY_CONTEXT),
+        FilterFactory.compile_from_spec(spec, FACTORY_CONTEXT),
+    )
+
+
+class ExpressionCompilerTest(SimpleTestCase):
+
+    def test_constant_folding(self):
+        compiler = ExpressionCompiler()
+        fn = FilterFactory.compile_from_spec({
+            'type': 'and',
+            'filters': [
+                {'type': 'boolean_expression', 'operator': 'eq', 'expression': 1, 'property_value': 1},
+                {'type': 'not', 'filter': {
+                    'type': 'boolean_expression', 'operator': 'eq', 'expression': 'a', 'property_value': 'b'
+                }},
+            ]
+        }, compiler=compiler)
+        self.assertTrue(compiler.is_constant(fn))
+        self.assertTrue(compiler.constant_value(fn))
+
+    def test_identical_lookups_are_shared(self):
+        compiler = ExpressionCompiler()
+        spec = {'type': 'property_path', 'property_path': ['child', 'age'], 'datatype': 'integer'}
+        first = ExpressionFactory.compile_from_spec(spec, compiler=compiler)
+        second = ExpressionFactory.compile_from_spec(dict(spec), compiler=compiler)
+        self.assertIs(first, second)
+
+    def test_shared_lookups_are_cached_per_iteration(self):
+        spec = {'type': 'property_name', 'property_name': 'opened_on', 'datatype': 'date'}
+        compiler = ExpressionCompiler(shared_lookup_keys=get_shared_lookup_keys([spec, spec]))
+        fn = ExpressionFactory.compile_from_spec(spec, compiler=compiler)
+        doc = {'opened_on': '2019-03-04'}
+        context = EvaluationContext(doc)
+        value = fn(doc, context)
+        doc['opened_on'] = '2020-01-01'
+        self.assertEqual(fn(doc, context), value)
+        context.increment_iteration()
+        self.assertNotEqual(fn(doc, context), value)
+
+
+class DataSourcePlanTest(SimpleTestCase):
+
+    def _get_rows(self, config, doc, compiled):
+        context = EvaluationContext(doc)
+        with patch.object(DataSourceConfiguration, 'use_compiled_plan', compiled):
+            return [
+                [(value.column.id, value.value) for value in row if value.column.id != 'inserted_at']
+                for row in config.get_all_values(doc, context)
+            ]
+
+    def test_sample_data_source(self):
+        config = get_sample_data_source()
+        doc, _ = get_sample_doc_and_indicators()
+        interpreted = self._get_rows(config, doc, False)
+        self.assertEqual(len(interpreted), 1)
+        self.assertEqual(self._get_rows(config, doc, True), interpreted)
+
+    def test_sample_data_source_filter(self):
+        config = get_sample_data_source()
+        plan = DataSourcePlan.from_data_source(config)
+        doc, _ = get_sample_doc_and_indicators()
+        for document in [doc, dict(doc, type='not-ticket'), dict(doc, domain='other'), {}]:
+            self.assertEqual(
+                plan.filter(document, EvaluationContext(document)),
+                config.filter(document)
+            )
+
+    def test_base_item_expression(self):
+        config = DataSourceConfiguration(
+            domain='test',
+            referenced_doc_type='XFormInstance',
+            table_id='repeat',
+            base_item_expression={'type': 'property_path', 'property_path': ['form', 'time_logs']},
+            configured_indicators=[{
+                'type': 'expression',
+                'column_id': 'start_time',
+                'datatype': 'datetime',
+                'expression': {'type': 'property_name', 'property_name': 'start_time'},
+            }, {
+                'type': 'boolean',
+                'column_id': 'has_person',
+                'filter': {'type': 'boolean_expression', 'operator': 'in',
+                           'expression': {'type': 'property_name', 'property_name': 'person'},
+                           'property_value': ['a', 'b']},
+            }],
+        )
+        doc = {
+            '_id': 'form-id', 'domain': 'test', 'doc_type': 'XFormInstance',
+            'form': {'time_logs': [
+                {'start_time': '2019-01-01T10:00:00.000000Z', 'person': 'a'},
+                {'start_time': '2019-01-02T10:00:00.000000Z', 'person': 'c'},
+            ]},
+        }
+        interpreted = self._get_rows(config, doc, False)
+        self.assertEqual(len(interpreted), 2)
+        self.assertEqual(self._get_rows(config, doc, True), interpreted)
@@ -0,0 +1,133 @@
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from pillowtop.dao.exceptions import DocumentNotFoundError
+from pillowtop.dao.interface import DocumentStore
+
+from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocumentCache,
+    get_related_doc_ids,
+)
+from corehq.apps.userreports.models import DataSourceConfiguration
+from corehq.apps.userreports.specs import EvaluationContext
+
+RELATED_DOC_SPEC = {
+    "type": "related_doc",
+    "related_doc_type": "CommCareCase",
+    "doc_id_expression": {"type": "property_path", "property_path": ["form", "case", "@case_id"]},
+    "value_expression": {"type": "property_name", "property_name": "owner_id"},
+}
+
+
+class CountingDocumentStore(DocumentStore):
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.get_calls = []
+        self.iter_calls = []
+
+    def get_document(self, doc_id):
+        self.get_calls.append(doc_id)
+        try:
+            return self.docs[doc_id]
+        except KeyError:
+            raise DocumentNotFoundError()
+
+    def iter_documents(self, ids):
+        self.iter_calls.append(sorted(ids))
+        return [self.docs[doc_id] for doc_id in ids if doc_id in self.docs]
+
+    def iter_document_ids(self):
+        return iter(self.docs)
+
+
+class RelatedDocumentCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.store = CountingDocumentStore({
+            'case1': {'_id': 'case1', 'domain': 'related-docs', 'owner_id': 'owner1'},
+            'case2': {'_id': 'case2', 'domain': 'related-docs', 'owner_id': 'owner2'},
+            'other-domain': {'_id': 'other-domain', 'domain': 'other', 'owner_id': 'owner3'},
+        })
+        patcher = patch(
+            'corehq.apps.userreports.expressions.related_docs.get_document_store_for_doc_type',
+            return_value=self.store
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prefetch(self):
+        cache = RelatedDocumentCache('related-docs')
+        cache.prefetch({'CommCareCase': ['case1', 'case2', 'missing']})
+        cache.prefetch({'CommCareCase': ['case1']})
+        self.assertEqual(self.store.iter_calls, [['case1', 'case2', 'missing']])
+        self.assertEqual(cache.get_document('CommCareCase', 'case2')['owner_id'], 'owner2')
+        self.assertIsNone(cache.get_document('CommCareCase', 'missing'))
+        self.assertEqual(self.store.get_calls, [])
+
+    def test_single_fetch_is_cached(self):
+        cache = RelatedDocumentCache('related-docs')
+        for _ in range(3):
+            self.assertEqual(cache.get_document('CommCareCase', 'case1')['owner_id'], 'owner1')
+        self.assertEqual(self.store.get_calls, ['case1'])
+
+    def test_eviction(self):
+        cache = RelatedDocumentCache('related-docs', max_size=1)
+        cache.get_document('CommCareCase', 'case1')
+        cache.get_document('CommCareCase', 'case2')
+        cache.get_document('CommCareCase', 'case1')
+        self.assertEqual(self.store.get_calls, ['case1', 'case2', 'case1'])
+
+    def test_expression_uses_shared_cache(self):
+        expression = ExpressionFactory.from_spec(RELATED_DOC_SPEC)
+        cache = RelatedDocumentCache('related-docs')
+        forms = [
+            _form('form1', 'case1'),
+            _form('form2', 'case1'),
+            _form('form3', 'case2'),
+            _form('form4', 'other-domain'),
+        ]
+        cache.prefetch({'CommCareCase': ['case1', 'case2', 'other-domain']})
+        values = [
+            expression(form, EvaluationContext(form, related_docs=cache))
+            for form in forms
+        ]
+        self.assertEqual(values, ['owner1', 'owner1', 'owner2', None])
+        self.assertEqual(len(self.store.iter_calls), 1)
+        self.assertEqual(self.store.get_calls, [])
+
+    def test_get_related_doc_ids(self):
+        config = DataSourceConfiguration(
+            domain='related-docs',
+            referenced_doc_type='XFormInstance',
+            table_id='related',
+            configured_filter={
+                'type': 'boolean_expression',
+                'operator': 'eq',
+                'expression': {'type': 'named', 'name': 'owner'},
+                'property_value': 'owner1',
+            },
+            named_expressions={'owner': RELATED_DOC_SPEC},
+            configured_indicators=[{
+                'type': 'expression',
+                'column_id': 'owner',
+                'datatype': 'string',
+                'expression': RELATED_DOC_SPEC,
+            }],
+        )
+        doc_ids = get_related_doc_ids(
+            [config],
+            [_form('form1', 'case1'), _form('form2', 'case2'), _form('form3', None), {'domain': 'related-docs'}]
+        )
+        self.assertEqual(dict(doc_ids), {'CommCareCase': {'case1', 'case2'}})
+
+
+def _form(form_id, case_id):
+    return {
+        '_id': form_id,
+        'domain': 'related-docs',
+        'doc_type': 'XFormInstance',
+        'form': {'case': {'@case_id': case_id}},
+    }
@@ -1,6 +1,9 @@
 from django.test import SimpleTestCase
 
-from corehq.apps.userreports.rebuild import DataSourceResumeHelper
+from corehq.apps.userreports.rebuild import (
+    DataSourceResumeHelper,
+    ShardedRebuildResumeHelper,
+)
 from corehq.apps.userreports.tests.utils import get_sample_data_source
 
 
@@ -41,3 +44,41 @@ class DataSourceResumeBuildTest(SimpleTestCase):
     def test_has_resume_info_true(self):
         self._resume_helper.add_completed_case_type_or_xmlns('type1')
         self.assertEqual(True, self._resume_helper.has_resume_info())
+
+
+class ShardedRebuildResumeTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(ShardedRebuildResumeTest, cls).setUpClass()
+        cls._resume_helper = ShardedRebuildResumeHelper(get_sample_data_source())
+
+    def setUp(self):
+        super(ShardedRebuildResumeTest, self).setUp()
+        self._resume_helper.clear_resume_info()
+
+    def test_shard_progress(self):
+        self.assertIsNone(self._resume_helper.get_last_pk('db1::-'))
+        self._resume_helper.set_last_pk('db1::-', 1234)
+        self.assertEqual(1234, self._resume_helper.get_last_pk('db1::-'))
+        self.assertFalse(self._resume_helper.is_shard_complete('db1::-'))
+
+        self._resume_helper.mark_shard_complete('db1::-')
+        self.assertTrue(self._resume_helper.is_shard_complete('db1::-'))
+        self.assertIsNone(self._resume_helper.get_last_pk('db1::-'))
+        self.assertFalse(self._resume_helper.is_shard_complete('db2::-'))
+
+    def test_shards(self):
+        self.assertIsNone(self._resume_helper.get_shards())
+        self.assertFalse(self._resume_helper.has_resume_info())
+        shards = [{'case_type_or_xmlns': 'type1', 'db_alias': 'db1', 'start_pk': 0, 'end_pk': 10}]
+        self._resume_helper.set_shards(shards)
+        self.assertEqual(shards, self._resume_helper.get_shards())
+        self.assertTrue(self._resume_helper.has_resume_info())
+
+    def test_clear_resume_info(self):
+        self._resume_helper.set_shards([])
+        self._resume_helper.set_last_pk('db1::-', 1)
+        self._resume_helper.clear_resume_info()
+        self.assertIsNone(self._resume_helper.get_shards())
+        self.assertIsNone(self._resume_helper.get_last_pk('db1::-'))
@@ -2,6 +2,8 @@ import uuid
 
 from django.test import TestCase, override_settings
 
+from mock import patch
+
 from alembic.operations import Operations
 from alembic.runtime.migration import MigrationContext
 
@@ -15,6 +17,7 @@ from corehq.apps.userreports.models import (
     DataSourceConfiguration,
     InvalidUCRData,
 )
+from corehq.apps.userreports.sql.adapter import IndicatorSqlAdapter
 from corehq.apps.userreports.util import get_indicator_adapter
 
 
@@ -99,6 +102,16 @@ class SaveErrorsTest(TestCase):
         self.assertEqual(invalid[0].doc_id, '123')
 
 
+class CopySaveErrorsTest(SaveErrorsTest):
+    """Errors are handled the same way when rows are saved with COPY"""
+
+    def setUp(self):
+        super(CopySaveErrorsTest, self).setUp()
+        patcher = patch.object(IndicatorSqlAdapter, 'copy_row_threshold', 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
 class AdapterBulkSaveTest(TestCase):
 
     def setUp(self):
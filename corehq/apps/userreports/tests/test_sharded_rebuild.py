@@ -0,0 +1,124 @@
+from functools import partial
+
+from django.test import SimpleTestCase
+
+from mock import Mock, patch
+
+from corehq.apps.userreports.sharded_rebuild import (
+    RebuildShard,
+    ShardResult,
+    _split_range,
+    build_shard,
+    get_worker_throughput,
+    iter_shard_id_chunks,
+)
+from corehq.util.test_utils import generate_cases
+
+
+class ShardedRebuildTest(SimpleTestCase):
+
+    def test_shard_id(self):
+        self.assertEqual(RebuildShard('type1', 'p1').shard_id, 'p1:type1:-')
+        self.assertEqual(RebuildShard(None, 'p1', 0, 100).shard_id, 'p1::0-100')
+
+    def test_worker_throughput(self):
+        throughput = get_worker_throughput([
+            ShardResult('a', 100, 10., pid=1),
+            ShardResult('b', 300, 10., pid=1),
+            ShardResult('c', 50, 0., pid=2),
+        ])
+        self.assertEqual(throughput, {
+            1: {'docs': 400, 'seconds': 20., 'docs_per_second': 20.},
+            2: {'docs': 50, 'seconds': 0., 'docs_per_second': 0},
+        })
+
+
+@generate_cases([
+    (1, 10, 1, [(0, 10)]),
+    (1, 10, 3, [(0, 3), (3, 6), (6, 10)]),
+    (5, 6, 4, [(4, 5), (5, 6)]),
+    (7, 7, 2, [(6, 7)]),
+], ShardedRebuildTest)
+def test_split_range(self, min_pk, max_pk, count, expected):
+    self.assertEqual(_split_range(min_pk, max_pk, count), expected)
+
+
+class ResumeShardTest(SimpleTestCase):
+    rows = [('case{}'.format(pk), pk) for pk in [1, 2, 4, 7, 8, 10, 11, 15]]
+
+    def setUp(self):
+        self.progress = {}
+        self.built_ids = []
+        self.fail_on_chunk = None
+        module = 'corehq.apps.userreports.sharded_rebuild'
+        for target, kwargs in [
+            (module + '._get_shard_query', {'return_value': FakeShardQuery(self.rows)}),
+            (module + '.iter_shard_id_chunks', {'new': partial(iter_shard_id_chunks, chunk_size=2)}),
+            (module + '.ShardedRebuildResumeHelper', {'return_value': FakeResumeHelper(self.progress)}),
+            (module + '.get_document_store_for_doc_type', {}),
+            ('corehq.apps.userreports.tasks._get_config_by_id', {
+                'return_value': Mock(referenced_doc_type='CommCareCase'),
+            }),
+            ('corehq.apps.userreports.tasks._build_indicators', {'new': self.build_indicators}),
+        ]:
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def build_indicators(self, config, document_store, doc_ids):
+        if self.fail_on_chunk is not None:
+            if self.fail_on_chunk == 0:
+                raise Exception('interrupted')
+            self.fail_on_chunk -= 1
+        self.built_ids.extend(doc_ids)
+
+    def test_resume_after_interruption(self):
+        shard = RebuildShard('type1', 'p1', start_pk=1, end_pk=11)
+        expected_ids = ['case{}'.format(pk) for pk in [2, 4, 7, 8, 10, 11]]
+
+        self.fail_on_chunk = 2
+        result = build_shard('config-id', shard)
+        self.assertIsNotNone(result.error)
+        self.assertEqual(result.doc_count, 4)
+        self.assertEqual(self.progress, {shard.shard_id: 8})
+
+        self.fail_on_chunk = None
+        result = build_shard('config-id', shard)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.doc_count, 2)
+        self.assertEqual(self.built_ids, expected_ids)
+        self.assertEqual(self.progress, {shard.shard_id: 'complete'})
+
+
+class FakeShardQuery(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, id__gt=None, id__lte=None):
+        return FakeShardQuery([
+            (doc_id, pk) for doc_id, pk in self.rows
+            if (id__gt is None or pk > id__gt) and (id__lte is None or pk <= id__lte)
+        ])
+
+    def order_by(self, field):
+        return FakeShardQuery(sorted(self.rows, key=lambda row: row[1]))
+
+    def values_list(self, *fields):
+        return self.rows
+
+
+class FakeResumeHelper(object):
+
+    def __init__(self, progress):
+        self.progress = progress
+
+    def get_last_pk(self, shard_id):
+        last_pk = self.progress.get(shard_id)
+        return None if last_pk == 'complete' else last_pk
+
+    def set_last_pk(self, shard_id, last_pk):
+        self.progress[shard_id] = last_pk
+
+    def mark_shard_complete(self, shard_id):
+        self.progress[shard_id] = 'complete'
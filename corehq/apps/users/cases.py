@@ -2,6 +2,8 @@ import numbers
 
 from couchdbkit import ResourceNotFound
 
+from dimagi.utils.couch.database import iter_docs
+
 from corehq.apps.groups.models import Group
 from corehq.apps.locations.models import SQLLocation
 from corehq.apps.users.models import CommCareUser, CouchUser, WebUser
@@ -26,13 +28,6 @@ def get_wrapped_owner(owner_id, support_deleted=False):
     if isinstance(owner_id, numbers.Number):
         return None
 
-    def _get_class(doc_type):
-        return {
-            'CommCareUser': CommCareUser,
-            'WebUser': WebUser,
-            'Group': Group,
-        }.get(doc_type)
-
     def _get_deleted_class(doc_type):
         return {
             'Group-Deleted': Group,
@@ -48,7 +43,7 @@ def get_wrapped_owner(owner_id, support_deleted=False):
     except ResourceNotFound:
         pass
     else:
-        cls = _get_class(owner_doc['doc_type'])
+        cls = _get_owner_class(owner_doc['doc_type'])
         if support_deleted and cls is None:
             cls = _get_deleted_class(owner_doc['doc_type'])
         return cls.wrap(owner_doc) if cls else None
@@ -56,6 +51,37 @@ def get_wrapped_owner(owner_id, support_deleted=False):
     return None
 
 
+def get_wrapped_owners(owner_ids):
+    """
+    Like get_wrapped_owner for several IDs, with one query for locations
+    and bulk requests for users and groups.
+
+    :return: A dict of the wrapped owners by ID, without the IDs that
+    aren't known owners.
+    """
+    owner_ids = {
+        owner_id for owner_id in owner_ids
+        if owner_id and not isinstance(owner_id, numbers.Number)
+    }
+    owners = {
+        location.location_id: location
+        for location in SQLLocation.objects.filter(location_id__in=owner_ids)
+    }
+    for owner_doc in iter_docs(user_db(), [owner_id for owner_id in owner_ids if owner_id not in owners]):
+        cls = _get_owner_class(owner_doc['doc_type'])
+        if cls:
+            owners[owner_doc['_id']] = cls.wrap(owner_doc)
+    return owners
+
+
+def _get_owner_class(doc_type):
+    return {
+        'CommCareUser': CommCareUser,
+        'WebUser': WebUser,
+        'Group': Group,
+    }.get(doc_type)
+
+
 def get_owning_users(owner_id):
     """
     Given an owner ID, get a list of the owning users, regardless of whether
@@ -1,7 +1,11 @@
 from django.test import TestCase
 
 from corehq.apps.groups.models import Group
-from corehq.apps.users.cases import get_owning_users, get_wrapped_owner
+from corehq.apps.users.cases import (
+    get_owning_users,
+    get_wrapped_owner,
+    get_wrapped_owners,
+)
 from corehq.apps.users.models import CommCareUser
 from corehq.apps.users.util import user_id_to_username
 from corehq.util.test_utils import generate_cases
@@ -26,6 +30,18 @@ class CaseUtilsTestCase(TestCase):
         wrapped = get_wrapped_owner(group._id)
         self.assertTrue(isinstance(wrapped, Group))
 
+    def test_get_wrapped_owners(self):
+        user = CommCareUser.create(self.domain, 'wrapped-owners-test', 'password')
+        user.save()
+        self.addCleanup(user.delete)
+        group = Group(domain=self.domain, name='wrapped-owners-test')
+        group.save()
+        self.addCleanup(group.delete)
+        owners = get_wrapped_owners([user._id, group._id, 'foobar', '', None, 1])
+        self.assertEqual(set(owners), {user._id, group._id})
+        self.assertTrue(isinstance(owners[user._id], CommCareUser))
+        self.assertTrue(isinstance(owners[group._id], Group))
+
     def test_owned_by_user(self):
         user = CommCareUser.create(self.domain, 'owned-user-test', 'password')
         user.save()
@@ -0,0 +1,67 @@
+import os
+import time
+from io import BytesIO
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from corehq.blobs.s3db import MB, S3BlobDB
+
+
+class Command(BaseCommand):
+    """Compare single stream and parallel S3 transfer throughput
+
+    Example: ./manage.py benchmark_blob_transfers --size-mb 64 --count 3
+    """
+    help = (
+        "Upload and download random blobs to the S3 blob db with single "
+        "stream transfers and with the configured parallel transfers "
+        "and report their throughput. Blobs are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=64, help="Size of each blob in MB.")
+        parser.add_argument('--count', type=int, default=3, help="Number of blobs to transfer.")
+        parser.add_argument(
+            '--settings-name',
+            default="S3_BLOB_DB_SETTINGS",
+            help="Name of the S3 blob db settings to use.",
+        )
+
+    def handle(self, size_mb, count, settings_name, **options):
+        config = getattr(settings, settings_name, None)
+        if not config:
+            raise CommandError("{} is not configured".format(settings_name))
+        single_stream_config = dict(
+            config,
+            multipart_threshold=2 ** 63,
+            ranged_get_threshold=0,
+            max_concurrency=1,
+        )
+        # ranged gets are disabled by default
+        parallel_config = dict({"ranged_get_threshold": 8 * MB}, **config)
+        content = os.urandom(size_mb * MB)
+        for name, db_config in [("single stream", single_stream_config), ("parallel", parallel_config)]:
+            db = S3BlobDB(db_config)
+            keys = ["blob-transfer-benchmark-{}".format(uuid4().hex) for i in range(count)]
+            try:
+                upload = self._time(lambda key: db.copy_blob(BytesIO(content), key), keys)
+                download = self._time(lambda key: _read_all(db.get(key)), keys)
+            finally:
+                db._s3_bucket().delete_objects(Delete={"Objects": [{"Key": key} for key in keys]})
+            self.stdout.write("{}: upload {:.1f}MB/s, download {:.1f}MB/s".format(
+                name, size_mb * count / upload, size_mb * count / download))
+
+    @staticmethod
+    def _time(transfer, keys):
+        start = time.time()
+        for key in keys:
+            transfer(key)
+        return time.time() - start
+
+
+def _read_all(blob):
+    with blob:
+        while blob.read(MB):
+            pass
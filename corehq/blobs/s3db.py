@@ -1,7 +1,10 @@
 import os
+import re
 import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from io import RawIOBase, UnsupportedOperation
+from io import BytesIO, RawIOBase, UnsupportedOperation
 
 from corehq.blobs.exceptions import NotFound
 from corehq.blobs.interface import AbstractBlobDB
@@ -12,12 +15,24 @@ from dimagi.utils.logging import notify_exception
 from dimagi.utils.chunked import chunked
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from botocore.exceptions import ClientError
 from botocore.utils import fix_s3_host
 
 DEFAULT_S3_BUCKET = "blobdb"
 DEFAULT_BULK_DELETE_CHUNKSIZE = 1000
+MB = 1024 * 1024
+# Transfers of blobs larger than the threshold are split in parts of
+# ``chunksize`` bytes that are transferred concurrently. The upload
+# defaults are those of boto3 (S3 requires parts of at least 5MB).
+# Ranged gets use a thread pool per blob and must be enabled with the
+# ``ranged_get_threshold`` setting.
+DEFAULT_MULTIPART_THRESHOLD = 8 * MB
+DEFAULT_MULTIPART_CHUNKSIZE = 8 * MB
+DEFAULT_RANGED_GET_THRESHOLD = 0
+DEFAULT_RANGED_GET_CHUNKSIZE = 8 * MB
+DEFAULT_MAX_CONCURRENCY = 10
 
 
 class S3BlobDB(AbstractBlobDB):
@@ -35,6 +50,15 @@ class S3BlobDB(AbstractBlobDB):
             **kwargs
         )
         self.bulk_delete_chunksize = config.get("bulk_delete_chunksize", DEFAULT_BULK_DELETE_CHUNKSIZE)
+        self.max_concurrency = config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=config.get("multipart_threshold", DEFAULT_MULTIPART_THRESHOLD),
+            multipart_chunksize=config.get("multipart_chunksize", DEFAULT_MULTIPART_CHUNKSIZE),
+            max_concurrency=self.max_concurrency,
+        )
+        # a threshold of 0 disables ranged gets
+        self.ranged_get_threshold = config.get("ranged_get_threshold", DEFAULT_RANGED_GET_THRESHOLD)
+        self.ranged_get_chunksize = config.get("ranged_get_chunksize", DEFAULT_RANGED_GET_CHUNKSIZE)
         self.s3_bucket_name = config.get("s3_bucket", DEFAULT_S3_BUCKET)
         self._s3_bucket_exists = False
         # https://github.com/boto/boto3/issues/259
@@ -70,20 +94,52 @@ class S3BlobDB(AbstractBlobDB):
             self.metadb.put(meta)
             source = {"Bucket": self.s3_bucket_name, "Key": content.blob_key}
             with self.report_timing('put-via-copy', meta.key):
-                s3_bucket.copy(source, meta.key)
+                s3_bucket.copy(source, meta.key, Config=self.transfer_config)
         else:
             content.seek(0)
             meta.content_length = get_file_size(content)
             self.metadb.put(meta)
             with self.report_timing('put', meta.key):
-                s3_bucket.upload_fileobj(content, meta.key)
+                s3_bucket.upload_fileobj(content, meta.key, Config=self.transfer_config)
         return meta
 
     def get(self, key):
         check_safe_key(key)
         with maybe_not_found(throw=NotFound(key)), self.report_timing('get', key):
-            resp = self._s3_bucket().Object(key).get()
-        return BlobStream(resp["Body"], self, key)
+            obj = self._s3_bucket().Object(key)
+            if self.ranged_get_threshold and self.max_concurrency > 1:
+                body = self._get_ranged(obj)
+            else:
+                body = obj.get()["Body"]
+        return BlobStream(body, self, key)
+
+    def _get_ranged(self, obj):
+        """Get the body of an object, fetching large objects in parts
+
+        The first ``ranged_get_threshold`` bytes are requested with a
+        range request, which also returns the size of the object. The
+        remaining bytes of larger objects are fetched concurrently by a
+        ``RangedBody``.
+        """
+        try:
+            resp = obj.get(Range="bytes=0-{}".format(self.ranged_get_threshold - 1))
+        except ClientError as err:
+            if err.response["Error"]["Code"] != "InvalidRange":
+                raise
+            # empty objects have no byte ranges
+            return obj.get()["Body"]
+        size = get_content_range_size(resp)
+        if size is None or size <= self.ranged_get_threshold:
+            return resp["Body"]
+        return RangedBody(
+            obj,
+            resp["Body"],
+            size=size,
+            etag=resp["ETag"],
+            start=self.ranged_get_threshold,
+            chunksize=self.ranged_get_chunksize,
+            max_concurrency=self.max_concurrency,
+        )
 
     def size(self, key):
         check_safe_key(key)
@@ -125,7 +181,7 @@ class S3BlobDB(AbstractBlobDB):
 
     def copy_blob(self, content, key):
         with self.report_timing('copy_blobdb', key):
-            self._s3_bucket(create=True).upload_fileobj(content, key)
+            self._s3_bucket(create=True).upload_fileobj(content, key, Config=self.transfer_config)
 
     def _s3_bucket(self, create=False):
         if create and not self._s3_bucket_exists:
@@ -183,11 +239,92 @@ class BlobStream(RawIOBase):
         return self._blob_db()
 
 
+class RangedBody(object):
+    """Body of an S3 object read with concurrent byte range requests
+
+    Has the interface of ``botocore.response.StreamingBody`` that is
+    used by ``BlobStream``. ``first_body`` is read first, then the bytes
+    from ``start`` to ``size`` in parts of ``chunksize`` bytes. Up to
+    ``max_concurrency`` parts are fetched ahead of the reader and they
+    are read in order. Parts are only fetched if the object still has
+    the given ``etag``. The thread pool is shut down when the last part
+    has been fetched, when the body is closed or when it is garbage
+    collected.
+    """
+
+    def __init__(self, obj, first_body, size, etag, start, chunksize, max_concurrency):
+        self._obj = obj
+        self._body = first_body
+        self._etag = etag
+        self._content_length = size
+        self._amount_read = 0
+        self._max_concurrency = max_concurrency
+        self._ranges = deque(
+            (offset, min(offset + chunksize, size) - 1)
+            for offset in range(start, size, chunksize)
+        )
+        self._parts = deque()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._shutdown_pool = weakref.finalize(self, self._pool.shutdown, wait=False)
+        self._fetch_parts()
+
+    def read(self, amt=None):
+        chunks = []
+        while amt is None or amt > 0:
+            data = self._body.read(amt)
+            if data:
+                chunks.append(data)
+                if amt is not None:
+                    amt -= len(data)
+            elif not self._next_part():
+                break
+        data = b"".join(chunks)
+        self._amount_read += len(data)
+        return data
+
+    def close(self):
+        self._body.close()
+        for part in self._parts:
+            part.cancel()
+        self._parts.clear()
+        self._ranges.clear()
+        self._shutdown_pool()
+
+    def _next_part(self):
+        if not self._parts:
+            return False
+        data = self._parts.popleft().result()
+        self._body.close()
+        self._body = BytesIO(data)
+        self._fetch_parts()
+        if not self._parts:
+            self._shutdown_pool()
+        return True
+
+    def _fetch_parts(self):
+        while self._ranges and len(self._parts) < self._max_concurrency:
+            first_byte, last_byte = self._ranges.popleft()
+            self._parts.append(self._pool.submit(self._get_range, first_byte, last_byte))
+
+    def _get_range(self, first_byte, last_byte):
+        resp = self._obj.get(
+            Range="bytes={}-{}".format(first_byte, last_byte),
+            IfMatch=self._etag,
+        )
+        return resp["Body"].read()
+
+
 def is_not_found(err, not_found_codes=["NoSuchKey", "NoSuchBucket", "404"]):
     return (err.response["Error"]["Code"] in not_found_codes or
         err.response.get("Errors", {}).get("Error", {}).get("Code") in not_found_codes)
 
 
+def get_content_range_size(resp):
+    """Get the object size from the response to a range request"""
+    match = re.match(r"bytes \d+-\d+/(\d+)$", resp.get("ContentRange") or "")
+    return int(match.group(1)) if match else None
+
+
 def get_file_size(fileobj):
     # botocore.response.StreamingBody has a '_content_length' attribute
     length = getattr(fileobj, "_content_length", None)
@@ -60,12 +60,13 @@ Finally, add the following to `localsettings.py`:
         }
 
 """  # noqa: W605
+import gc
 from io import BytesIO, SEEK_SET, TextIOWrapper
 
 from django.conf import settings
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
-from corehq.blobs.s3db import S3BlobDB, BlobStream
+from corehq.blobs.s3db import MB, BlobStream, RangedBody, S3BlobDB
 from corehq.blobs.tests.util import new_meta, TemporaryS3BlobDB
 from corehq.blobs.tests.test_fsdb import _BlobDBTests
 from corehq.util.test_utils import trap_extra_setup
@@ -96,6 +97,111 @@ class TestS3BlobDB(TestCase, _BlobDBTests):
             self.assertEqual(blob2.read(), b"content")
 
 
+class TestS3BlobDBParallelTransfers(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestS3BlobDBParallelTransfers, cls).setUpClass()
+        with trap_extra_setup(AttributeError, msg="S3_BLOB_DB_SETTINGS not configured"):
+            config = dict(settings.S3_BLOB_DB_SETTINGS)
+        # S3 requires multipart upload parts of at least 5MB
+        config.update(
+            multipart_threshold=5 * MB,
+            multipart_chunksize=5 * MB,
+            ranged_get_threshold=MB,
+            ranged_get_chunksize=300 * 1024,
+            max_concurrency=3,
+        )
+        cls.db = TemporaryS3BlobDB(config)
+        cls.content = b"".join(bytes([i % 256]) * 1000 for i in range(11 * 1024))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+        super(TestS3BlobDBParallelTransfers, cls).tearDownClass()
+
+    def test_multipart_put_and_ranged_get(self):
+        meta = self.db.put(BytesIO(self.content), meta=new_meta())
+        self.assertEqual(meta.content_length, len(self.content))
+        with self.db.get(meta.key) as blob:
+            self.assertEqual(blob.read(), self.content)
+
+    def test_ranged_get_sizes(self):
+        for size in [0, 1, MB - 1, MB, MB + 1, MB + 300 * 1024, MB + 300 * 1024 + 1]:
+            meta = self.db.put(BytesIO(self.content[:size]), meta=new_meta())
+            with self.db.get(meta.key) as blob:
+                self.assertEqual(blob.read(), self.content[:size], size)
+
+    def test_ranged_get_read_chunks(self):
+        size = 2 * MB
+        meta = self.db.put(BytesIO(self.content[:size]), meta=new_meta())
+        with self.db.get(meta.key) as blob:
+            self.assertEqual(blob.read(MB + 1), self.content[:MB + 1])
+            self.assertEqual(blob.tell(), MB + 1)
+            self.assertEqual(blob.read(1), self.content[MB + 1:MB + 2])
+            self.assertEqual(blob.read(), self.content[MB + 2:size])
+            self.assertEqual(blob.read(), b"")
+
+    def test_put_from_ranged_get(self):
+        db2 = S3BlobDB(settings.S3_BLOB_DB_SETTINGS)
+        meta = self.db.put(BytesIO(self.content[:2 * MB]), meta=new_meta())
+        with self.db.get(meta.key) as blob:
+            meta2 = db2.put(blob, meta=new_meta())
+        self.assertEqual(meta2.content_length, 2 * MB)
+        with db2.get(meta2.key) as blob2:
+            self.assertEqual(blob2.read(), self.content[:2 * MB])
+
+
+class TestRangedBody(SimpleTestCase):
+
+    def test_read(self):
+        obj = FakeObject(b"0123456789")
+        body = RangedBody(obj, BytesIO(b"012"), size=10, etag="e", start=3, chunksize=2, max_concurrency=2)
+        self.assertEqual(body.read(4), b"0123")
+        self.assertEqual(body.read(), b"456789")
+        self.assertEqual(body.read(), b"")
+        self.assertEqual(body._amount_read, 10)
+        self.assertEqual(sorted(obj.ranges), ["bytes=3-4", "bytes=5-6", "bytes=7-8", "bytes=9-9"])
+
+    def test_close(self):
+        obj = FakeObject(b"0123456789")
+        body = RangedBody(obj, BytesIO(b"012"), size=10, etag="e", start=3, chunksize=2, max_concurrency=1)
+        self.assertEqual(body.read(1), b"0")
+        body.close()
+        self.assertLessEqual(len(obj.ranges), 2)
+        self.assertTrue(body._pool._shutdown)
+
+    def test_pool_shut_down_after_last_part(self):
+        obj = FakeObject(b"0123456789")
+        body = RangedBody(obj, BytesIO(b"012"), size=10, etag="e", start=3, chunksize=4, max_concurrency=2)
+        self.assertEqual(body.read(7), b"0123456")
+        self.assertFalse(body._pool._shutdown)
+        self.assertEqual(body.read(1), b"7")
+        self.assertTrue(body._pool._shutdown)
+        self.assertEqual(body.read(), b"89")
+
+    def test_pool_shut_down_when_collected(self):
+        obj = FakeObject(b"0123456789")
+        body = RangedBody(obj, BytesIO(b"012"), size=10, etag="e", start=3, chunksize=2, max_concurrency=1)
+        body.read(4)
+        pool = body._pool
+        del body
+        gc.collect()
+        self.assertTrue(pool._shutdown)
+
+
+class FakeObject(object):
+
+    def __init__(self, content):
+        self.content = content
+        self.ranges = []
+
+    def get(self, Range, IfMatch):
+        self.ranges.append(Range)
+        first_byte, last_byte = Range[len("bytes="):].split("-")
+        return {"Body": BytesIO(self.content[int(first_byte):int(last_byte) + 1])}
+
+
 class TestBlobStream(TestCase):
 
     @classmethod
@@ -1,8 +1,13 @@
 import copy
+import hashlib
 import json
 import logging
+import queue
+import threading
 import time
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from urllib.parse import unquote
 
 from django.conf import settings
@@ -254,7 +259,7 @@ def iter_es_docs_from_query(query):
     return ScanResult(scroll_result.count, iter_export_docs())
 
 
-def scroll_query(index_name, q, es_instance_alias=ES_DEFAULT_INSTANCE):
+def scroll_query(index_name, q, es_instance_alias=ES_DEFAULT_INSTANCE, **kwargs):
     es_meta = ES_META[index_name]
     try:
         return scan(
@@ -262,11 +267,22 @@ def scroll_query(index_name, q, es_instance_alias=ES_DEFAULT_INSTANCE):
             index=es_meta.index,
             doc_type=es_meta.type,
             query=q,
+            **kwargs
         )
     except ElasticsearchException as e:
         raise ESError(e)
 
 
+def get_shard_count(index_name, es_instance_alias=ES_DEFAULT_INSTANCE):
+    """Number of shards of the index, as used in a ``_shards:N`` search preference"""
+    es_meta = ES_META[index_name]
+    try:
+        result = get_es_instance(es_instance_alias).search_shards(index=es_meta.index)
+    except ElasticsearchException as e:
+        raise ESError(e)
+    return max(shard['shard'] for group in result['shards'] for shard in group) + 1
+
+
 class ScanResult(object):
 
     def __init__(self, count, iterator):
@@ -341,6 +357,193 @@ def scan(client, query=None, scroll='5m', **kwargs):
     return ScanResult(count, fetch_all(initial_resp))
 
 
+# pages of hits buffered for each slice of a parallel scan
+SCAN_SLICE_BUFFER_SIZE = 10
+SCAN_SLICE_RETRIES = 3
+SCAN_SLICE_PAGE_SIZE = 1000
+_SLICE_DONE = object()
+
+
+def parallel_scroll_query(index_name, q, slices=None, ordered=False,
+                          es_instance_alias=ES_DEFAULT_INSTANCE, **kwargs):
+    """Like ``scroll_query`` but the query is scrolled in ``slices`` parallel
+    scrolls, one per group of shards of the index (ES 1.x has no sliced
+    scroll). Defaults to one slice per shard. See ``parallel_scan``"""
+    es_meta = ES_META[index_name]
+    shard_count = get_shard_count(index_name, es_instance_alias)
+    return parallel_scan(
+        get_es_instance(es_instance_alias),
+        query=q,
+        preferences=get_slice_preferences(shard_count, slices),
+        ordered=ordered,
+        index=es_meta.index,
+        doc_type=es_meta.type,
+        **kwargs
+    )
+
+
+def get_slice_preferences(shard_count, slices=None):
+    """Search preferences splitting the shards of an index between ``slices``"""
+    slices = min(slices or shard_count, shard_count)
+    return [
+        '_shards:{}'.format(','.join(str(shard) for shard in range(number, shard_count, slices)))
+        for number in range(slices)
+    ]
+
+
+class ScanSlice(object):
+    """Progress of one slice of a ``parallel_scan``"""
+
+    def __init__(self, number, preference):
+        self.number = number
+        self.preference = preference
+        self.count = None
+        self.fetched = 0
+        self.retries = 0
+        self.done = False
+
+
+class ScanSliceChanged(ESError):
+    pass
+
+
+class ParallelScanResult(ScanResult):
+
+    def __init__(self, count, iterator, slices):
+        super(ParallelScanResult, self).__init__(count, iterator)
+        self.slices = slices
+
+
+def parallel_scan(client, query=None, preferences=(), scroll='5m', ordered=False,
+                  buffer_size=SCAN_SLICE_BUFFER_SIZE, retries=SCAN_SLICE_RETRIES, **kwargs):
+    """
+    Run ``scan`` once for each of the search ``preferences`` and drain the
+    scrolls concurrently, one thread per slice.
+
+    The hits are returned by a single iterator. With ``ordered=True`` all
+    hits of a slice are returned before those of the next slice, otherwise
+    hits are returned as soon as they are fetched. Each slice buffers at
+    most ``buffer_size`` pages of hits that have not been consumed yet.
+
+    A slice that fails is scanned again from the start, at most ``retries``
+    times, skipping the hits it has already returned. Those hits are
+    skipped by position, so the scan fails if the first hits of the new
+    scroll are not the ones already returned, in the same order (e.g.
+    because the index has changed).
+
+    The progress of each slice is available in ``ParallelScanResult.slices``.
+    """
+    slices = [ScanSlice(number, preference) for number, preference in enumerate(preferences)]
+
+    def _scan(scan_slice):
+        return scan(client, query=query, scroll=scroll, preference=scan_slice.preference, **kwargs)
+
+    def _start(scan_slice):
+        while True:
+            try:
+                return _scan(scan_slice)
+            except ElasticsearchException:
+                if scan_slice.retries >= retries:
+                    raise
+                scan_slice.retries += 1
+                time.sleep(scan_slice.retries)
+
+    with ThreadPoolExecutor(max_workers=max(len(slices), 1)) as pool:
+        try:
+            initial_results = list(pool.map(_start, slices))
+        except ElasticsearchException as e:
+            raise ESError(e)
+
+    for scan_slice, result in zip(slices, initial_results):
+        scan_slice.count = result.count
+    counts = [scan_slice.count for scan_slice in slices]
+    count = None if None in counts else sum(counts)
+
+    def _update_digest(digest, hits):
+        for hit in hits:
+            digest.update(hit['_id'].encode('utf-8') + b'\n')
+
+    def _skip_returned(scan_slice, hits, digest):
+        rescanned = hashlib.md5()
+        _update_digest(rescanned, islice(hits, scan_slice.fetched))
+        if rescanned.digest() != digest.digest():
+            raise ScanSliceChanged(
+                "Slice {} returned different hits when it was scanned again".format(scan_slice.number))
+
+    def _drain(scan_slice, result, put):
+        # digest of the ids of the hits returned so far, to check that they
+        # are the first hits of the scroll when the slice is scanned again
+        returned = hashlib.md5()
+        while True:
+            try:
+                if result is None:
+                    result = _scan(scan_slice)
+                hits = iter(result)
+                if scan_slice.fetched:
+                    _skip_returned(scan_slice, hits, returned)
+                for page in chunked(hits, SCAN_SLICE_PAGE_SIZE, list):
+                    if retries:
+                        _update_digest(returned, page)
+                    scan_slice.fetched += len(page)
+                    if not put(page):
+                        return
+                scan_slice.done = True
+                put(_SLICE_DONE)
+                return
+            except ScanSliceChanged as e:
+                put(e)
+                return
+            except Exception as e:
+                if scan_slice.retries >= retries:
+                    put(e)
+                    return
+                scan_slice.retries += 1
+                logging.getLogger('elasticsearch.helpers').warning(
+                    'Scan of slice %d failed, retrying (%d/%d): %s',
+                    scan_slice.number, scan_slice.retries, retries, e)
+                time.sleep(scan_slice.retries)
+                result = None
+
+    def _iter_hits():
+        stop = threading.Event()
+        if ordered:
+            queues = [queue.Queue(maxsize=buffer_size) for _ in slices]
+        else:
+            queues = [queue.Queue(maxsize=buffer_size * len(slices))] * len(slices)
+
+        def _get_put(scan_slice):
+            def put(item):
+                # give up once the consumer has stopped reading
+                while not stop.is_set():
+                    try:
+                        queues[scan_slice.number].put((scan_slice.number, item), timeout=0.1)
+                        return True
+                    except queue.Full:
+                        pass
+                return False
+            return put
+
+        pool = ThreadPoolExecutor(max_workers=max(len(slices), 1))
+        try:
+            for scan_slice, result in zip(slices, initial_results):
+                pool.submit(_drain, scan_slice, result, _get_put(scan_slice))
+            pending = set(range(len(slices)))
+            while pending:
+                current = min(pending) if ordered else None
+                number, item = queues[current if ordered else 0].get()
+                if item is _SLICE_DONE:
+                    pending.remove(number)
+                elif isinstance(item, Exception):
+                    raise ESError(item)
+                else:
+                    yield from item
+        finally:
+            stop.set()
+            pool.shutdown(wait=False)
+
+    return ParallelScanResult(count, _iter_hits(), slices)
+
+
 SIZE_LIMIT = 1000000
 SCROLL_PAGE_SIZE_LIMIT = 1000
 
@@ -0,0 +1,308 @@
+"""Case graph snapshots for incremental livequery restores
+
+Livequery walks the index graph of the cases owned by the restore user with
+repeated ``get_related_indices`` queries on every sync. A snapshot records
+the results of those queries, and the closed and deleted status of each
+case in the graph, so the next restore only needs to query the cases that
+changed since the snapshot was taken.
+
+Snapshot invariants:
+
+- For each id in ``complete_ids`` the snapshot contains all of its indices
+  and all indices of open extension cases that reference it (the same
+  indices that ``get_related_indices`` would return).
+- Indices belong to the case that has them (``index.case_id``), which is
+  modified whenever an index is added, changed or removed.
+- Opening, closing or deleting a case modifies it.
+
+A case is therefore re-queried if it was modified since the snapshot was
+taken, or if it is an extension case that was not part of the graph when
+the snapshot was taken. All other cases are answered from the snapshot.
+"""
+import gzip
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from io import BytesIO
+from itertools import chain
+
+from dimagi.utils.parsing import json_format_datetime, string_to_utc_datetime
+
+from corehq.blobs import CODES, get_blob_db
+from corehq.blobs.exceptions import NotFound
+from corehq.form_processor.models import CommCareCaseIndexSQL
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_TIMEOUT = 14 * 24 * 60  # minutes
+# server_modified_on is set before the form processing transaction commits,
+# so a case modified shortly before the snapshot date may have been read
+# by the graph walk before the change was visible. This is the timeout of
+# the form processing lock (see acquire_lock_for_xform).
+SNAPSHOT_DATE_MARGIN = timedelta(minutes=15)
+
+
+def index_key(index):
+    return '{} {}'.format(index.case_id, index.identifier)
+
+
+class CaseGraphSnapshot(object):
+    """Case graph state at the time of a sync
+
+    :param date: Time before the first graph query was made. Cases
+    modified at or after this time are re-queried.
+    :param complete_ids: Ids of cases whose related indices are all
+    included in `indices`.
+    :param indices: List of CommCareCaseIndex-like objects.
+    :param status: Dict of `case_id -> (closed, deleted)`.
+    """
+
+    def __init__(self, date, complete_ids, indices, status):
+        self.date = date
+        self.complete_ids = set(complete_ids)
+        self.indices = list(indices)
+        self.status = dict(status)
+
+    def to_json(self):
+        return {
+            'version': SNAPSHOT_VERSION,
+            'date': json_format_datetime(self.date),
+            'complete_ids': sorted(self.complete_ids),
+            'indices': [[
+                ix.case_id,
+                ix.identifier,
+                ix.referenced_id,
+                ix.referenced_type,
+                ix.relationship_id,
+            ] for ix in self.indices],
+            'closed_ids': sorted(c for c, (closed, deleted) in self.status.items() if closed),
+            'deleted_ids': sorted(c for c, (closed, deleted) in self.status.items() if deleted),
+            'open_ids': sorted(c for c, (closed, deleted) in self.status.items()
+                               if not (closed or deleted)),
+        }
+
+    @classmethod
+    def from_json(cls, domain, data):
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError("unknown snapshot version: {!r}".format(data.get('version')))
+        closed_ids = set(data['closed_ids'])
+        deleted_ids = set(data['deleted_ids'])
+        status = {case_id: (False, False) for case_id in data['open_ids']}
+        status.update(
+            (case_id, (case_id in closed_ids, case_id in deleted_ids))
+            for case_id in closed_ids | deleted_ids
+        )
+        indices = [CommCareCaseIndexSQL(
+            domain=domain,
+            case_id=case_id,
+            identifier=identifier,
+            referenced_id=referenced_id,
+            referenced_type=referenced_type,
+            relationship_id=relationship_id,
+        ) for case_id, identifier, referenced_id, referenced_type, relationship_id in data['indices']]
+        return cls(string_to_utc_datetime(data['date']), data['complete_ids'], indices, status)
+
+    def save(self, domain, sync_log_id):
+        content = gzip.compress(json.dumps(self.to_json()).encode('utf-8'))
+        get_blob_db().put(
+            BytesIO(content),
+            domain=domain,
+            parent_id=sync_log_id,
+            type_code=CODES.restore,
+            key=_get_blob_key(sync_log_id),
+            timeout=SNAPSHOT_TIMEOUT,
+        )
+
+    @classmethod
+    def load(cls, domain, sync_log_id):
+        """Load the snapshot saved with the given sync log
+
+        :returns: A `CaseGraphSnapshot` or `None` if the snapshot is
+        missing or invalid.
+        """
+        try:
+            with get_blob_db().get(key=_get_blob_key(sync_log_id)) as fileobj:
+                data = json.loads(gzip.decompress(fileobj.read()).decode('utf-8'))
+            return cls.from_json(domain, data)
+        except NotFound:
+            return None
+        except Exception:
+            logger.exception("Invalid livequery case graph snapshot for sync log %s", sync_log_id)
+            return None
+
+
+def _get_blob_key(sync_log_id):
+    return 'livequery-graph-{}.json.gz'.format(sync_log_id)
+
+
+class CaseGraphAccessor(object):
+    """Case accessor for the livequery case graph walk
+
+    Answers `get_related_indices` and `get_closed_and_deleted_ids` from a
+    snapshot for cases that have not changed since the snapshot was taken
+    and delegates everything else to the wrapped accessor.
+    """
+
+    def __init__(self, accessor, snapshot=None):
+        self.domain = accessor.domain
+        self.accessor = accessor
+        self.indices = {}                # index key -> index
+        self.keys_by_case = defaultdict(set)       # case_id -> index keys
+        self.extension_keys_by_host = defaultdict(set)  # host_id -> index keys
+        self.complete_ids = set()
+        self.status = {}                 # case_id -> (closed, deleted)
+        self.queried_ids = set()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        if snapshot is not None:
+            for index in snapshot.indices:
+                self._add_index(index)
+            self.complete_ids.update(snapshot.complete_ids)
+            self.status.update(snapshot.status)
+
+    def refresh(self, since):
+        """Re-query cases that may have changed since the given date
+
+        Cases modified up to `SNAPSHOT_DATE_MARGIN` before `since` are
+        also re-queried, since their changes may not have been committed
+        when the snapshot was taken.
+
+        :returns: Set of refreshed case ids.
+        """
+        since = since - SNAPSHOT_DATE_MARGIN
+        known_ids = self.complete_ids | set(self.status)
+        modified_dates = self.accessor.get_last_modified_dates(list(known_ids))
+        changed_ids = {
+            case_id for case_id in known_ids
+            if case_id not in modified_dates or modified_dates[case_id] >= since
+        }
+        # open extensions that reference cases in the graph are only
+        # discovered by querying their host, which is not modified when
+        # the extension is created or reopened. Closed extensions are not
+        # part of the graph.
+        new_extension_ids = set(self.accessor.get_extension_case_ids(
+            list(self.complete_ids), include_closed=False)) - known_ids
+        refresh_ids = changed_ids | new_extension_ids
+        if not refresh_ids:
+            return refresh_ids
+
+        for case_id in refresh_ids:
+            for key in self.keys_by_case.pop(case_id, ()):
+                self._remove_index(key)
+            self.complete_ids.discard(case_id)
+            self.status.pop(case_id, None)
+
+        related = self.accessor.get_related_indices(list(refresh_ids), set())
+        for index in related:
+            self._add_index(index)
+        self.complete_ids.update(refresh_ids)
+        self._update_status(refresh_ids | {
+            case_id
+            for index in related
+            for case_id in [index.case_id, index.referenced_id]
+            if case_id not in self.status
+        })
+        return refresh_ids
+
+    def get_related_indices(self, case_ids, exclude_indices):
+        self.queried_ids.update(case_ids)
+        related = {}
+        misses = []
+        for case_id in case_ids:
+            keys = self._get_related_keys(case_id)
+            if keys is None:
+                misses.append(case_id)
+                continue
+            for key in keys:
+                if key not in exclude_indices:
+                    related[key] = self.indices[key]
+        self.cache_hits += len(case_ids) - len(misses)
+        self.cache_misses += len(misses)
+        if misses:
+            for index in self.accessor.get_related_indices(misses, exclude_indices):
+                key = self._add_index(index)
+                related.setdefault(key, index)
+                if index.referenced_id in misses and index.relationship_id == CommCareCaseIndexSQL.EXTENSION:
+                    # reverse indices are only returned for open extensions
+                    self.status.setdefault(index.case_id, (False, False))
+            self.complete_ids.update(misses)
+        return list(related.values())
+
+    def get_closed_and_deleted_ids(self, case_ids):
+        rows = []
+        unknown_ids = []
+        for case_id in case_ids:
+            if case_id in self.status:
+                closed, deleted = self.status[case_id]
+                if closed or deleted:
+                    rows.append((case_id, closed, deleted))
+            else:
+                unknown_ids.append(case_id)
+        rows.extend(self._update_status(unknown_ids))
+        return rows
+
+    def get_snapshot(self, date, open_ids):
+        """Get snapshot of the case graph walked by livequery
+
+        :param date: Time before the graph walk started.
+        :param open_ids: Open case ids found by the graph walk. Includes
+        owned cases and extension cases whose status was not queried.
+        """
+        complete_ids = self.complete_ids & self.queried_ids
+        keys = {
+            key
+            for case_id in complete_ids
+            for key in chain(self.keys_by_case.get(case_id, ()),
+                             self.extension_keys_by_host.get(case_id, ()))
+        }
+        indices = [self.indices[key] for key in keys]
+        case_ids = complete_ids.union(*(
+            (index.case_id, index.referenced_id) for index in indices))
+        status = {c: self.status[c] for c in case_ids if c in self.status}
+        status.update((c, (False, False)) for c in case_ids & open_ids if c not in status)
+        return CaseGraphSnapshot(date, complete_ids, indices, status)
+
+    def _get_related_keys(self, case_id):
+        """Get keys of indices related to the given case from the snapshot
+
+        :returns: A list of index keys or `None` if the case is not in
+        the snapshot.
+        """
+        if case_id not in self.complete_ids:
+            return None
+        keys = list(self.keys_by_case.get(case_id, ()))
+        for key in self.extension_keys_by_host.get(case_id, ()):
+            ext_id = self.indices[key].case_id
+            if ext_id not in self.status:
+                return None
+            if self.status[ext_id] == (False, False):
+                keys.append(key)
+        return keys
+
+    def _update_status(self, case_ids):
+        case_ids = list(case_ids)
+        if not case_ids:
+            return []
+        rows = self.accessor.get_closed_and_deleted_ids(case_ids)
+        for case_id in case_ids:
+            self.status[case_id] = (False, False)
+        for case_id, closed, deleted in rows:
+            self.status[case_id] = (closed, deleted)
+        return rows
+
+    def _add_index(self, index):
+        key = index_key(index)
+        if key in self.indices:
+            self._remove_index(key)
+        self.indices[key] = index
+        self.keys_by_case[index.case_id].add(key)
+        if index.relationship_id == CommCareCaseIndexSQL.EXTENSION:
+            self.extension_keys_by_host[index.referenced_id].add(key)
+        return key
+
+    def _remove_index(self, key):
+        index = self.indices.pop(key)
+        self.keys_by_case.get(index.case_id, set()).discard(key)
+        self.extension_keys_by_host.get(index.referenced_id, set()).discard(key)
@@ -28,6 +28,10 @@ from itertools import chain, islice
 
 from casexml.apps.case.const import CASE_INDEX_EXTENSION as EXTENSION
 from casexml.apps.phone.const import ASYNC_RETRY_AFTER
+from casexml.apps.phone.data_providers.case.graph_snapshot import (
+    CaseGraphAccessor,
+    CaseGraphSnapshot,
+)
 from casexml.apps.phone.data_providers.case.load_testing import (
     get_xml_for_response,
 )
@@ -36,7 +40,11 @@ from casexml.apps.phone.data_providers.case.utils import get_case_sync_updates
 from casexml.apps.phone.tasks import ASYNC_RESTORE_SENT
 from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
 from corehq.sql_db.routers import read_from_plproxy_standbys
-from corehq.toggles import LIVEQUERY_READ_FROM_STANDBYS, NAMESPACE_USER
+from corehq.toggles import (
+    LIVEQUERY_GRAPH_SNAPSHOT,
+    LIVEQUERY_READ_FROM_STANDBYS,
+    NAMESPACE_USER,
+)
 from corehq.util.datadog.utils import case_load_counter
 
 
@@ -57,7 +65,8 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
     """Get case sync restore response
 
     This function makes no changes to external state other than updating
-    the `restore_state.current_sync_log` and progress of `async_task`.
+    the `restore_state.current_sync_log`, saving the case graph snapshot
+    of the current sync log (if enabled) and progress of `async_task`.
     Extends `response` with restore elements.
     """
     def index_key(index):
@@ -187,7 +196,7 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
             if index.relationship == 'extension'
         }
         check_cases = list(set(case_ids) - open_cases)
-        rows = accessor.get_closed_and_deleted_ids(check_cases)
+        rows = graph_accessor.get_closed_and_deleted_ids(check_cases)
         for case_id, closed, deleted in rows:
             if deleted:
                 deleted_ids.add(case_id)
@@ -208,9 +217,15 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
     indices = defaultdict(list)  # case_id -> list of CommCareCaseIndex-like
     seen_ix = defaultdict(set)   # case_id -> set of '<index.case_id> <index.identifier>'
     owner_ids = list(restore_state.owner_ids)
+    use_snapshot = use_case_graph_snapshot(restore_state)
 
     debug("sync %s for %r", restore_state.current_sync_log._id, owner_ids)
     with timing_context("livequery"):
+        if use_snapshot:
+            graph_accessor = get_case_graph_accessor(timing_context, restore_state, accessor)
+        else:
+            graph_accessor = accessor
+
         with timing_context("get_case_ids_by_owners"):
             owned_ids = accessor.get_case_ids_by_owners(owner_ids, closed=False)
             debug("owned: %r", owned_ids)
@@ -222,7 +237,7 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
             exclude = set(chain.from_iterable(seen_ix[id] for id in next_ids))
             with timing_context("get_related_indices({} cases, {} seen)".format(
                     len(next_ids), len(exclude))):
-                related = accessor.get_related_indices(list(next_ids), exclude)
+                related = graph_accessor.get_related_indices(list(next_ids), exclude)
                 if not related:
                     break
                 update_open_and_deleted_ids(related)
@@ -250,6 +265,14 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
 
             debug('live: %r', live_ids)
 
+        if use_snapshot:
+            with timing_context("save case graph snapshot"):
+                debug('case graph: %s cached, %s queried',
+                      graph_accessor.cache_hits, graph_accessor.cache_misses)
+                snapshot = graph_accessor.get_snapshot(
+                    restore_state.current_sync_log.date, open_ids)
+                snapshot.save(restore_state.domain, restore_state.current_sync_log._id)
+
         if restore_state.last_sync_log:
             with timing_context("discard_already_synced_cases"):
                 debug('last sync: %s', restore_state.last_sync_log._id)
@@ -270,6 +293,32 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
             )
 
 
+def use_case_graph_snapshot(restore_state):
+    # standbys may not have the latest changes, which would then be
+    # missing from the snapshot until the cases are modified again
+    return (
+        LIVEQUERY_GRAPH_SNAPSHOT.enabled(restore_state.domain)
+        and not LIVEQUERY_READ_FROM_STANDBYS.enabled(restore_state.restore_user.user_id, NAMESPACE_USER)
+    )
+
+
+def get_case_graph_accessor(timing_context, restore_state, accessor):
+    """Get accessor for the case graph walk
+
+    Uses the case graph snapshot of the last sync log if there is one,
+    otherwise the graph walk queries all cases.
+    """
+    snapshot = None
+    if restore_state.last_sync_log:
+        with timing_context("load case graph snapshot"):
+            snapshot = CaseGraphSnapshot.load(restore_state.domain, restore_state.last_sync_log._id)
+    graph_accessor = CaseGraphAccessor(accessor, snapshot)
+    if snapshot is not None:
+        with timing_context("refresh case graph snapshot"):
+            graph_accessor.refresh(snapshot.date)
+    return graph_accessor
+
+
 def discard_already_synced_cases(live_ids, restore_state, accessor):
     debug = logging.getLogger(__name__).debug
     sync_log = restore_state.last_sync_log
@@ -7,6 +7,8 @@ class CasePayloadProvider(AsyncDataProvider):
     """
     Async provider responsible for generating the case and stock payloads.
     """
+    # the cases on the phone are recorded in the sync log
+    writes_restore_state = True
 
     def extend_response(self, restore_state, response):
         if restore_state.is_livequery:
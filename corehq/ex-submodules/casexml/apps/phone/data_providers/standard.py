@@ -3,6 +3,10 @@ from casexml.apps.phone.fixtures import generator
 
 
 class TimedProvider(object):
+    # Set on providers that write to the restore state, which can't be
+    # run concurrently with other providers.
+    writes_restore_state = False
+
     def __init__(self, timing_context):
         self.timing_context = timing_context
 
@@ -49,6 +53,8 @@ class FixtureElementProvider(RestoreDataProvider):
     """
     Gets any associated fixtures.
     """
+    # the mobile UCR fixture records its sync times in the sync log
+    writes_restore_state = True
 
     def get_elements(self, restore_state):
         # fixture block
@@ -0,0 +1,184 @@
+"""Shared cache of serialized fixture payloads
+
+Many fixtures are byte-identical for large groups of users in a domain.
+Payloads are cached under a key made of the domain, a fixture bucket, a
+freshness token that is replaced when fixture data is written and a
+"scope", which identifies the content the payload was generated from
+(usually a hash of the ids and revisions of the source documents). Users
+whose fixture is generated from the same content share a single payload.
+
+Payloads are cached in two tiers: a size-bounded LRU cache in the memory
+of each process, backed by a shared store (redis by default).
+
+Cached payloads are generated with ``GLOBAL_USER_ID`` in place of the
+restore user's id, which is substituted when the payload is returned.
+"""
+import datetime
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from memoized import memoized
+
+from dimagi.utils.couch import CriticalSection
+from dimagi.utils.couch.cache.cache_core import get_redis_default_cache
+
+from casexml.apps.phone.utils import GLOBAL_USER_ID, write_fixture_items_to_io
+from corehq.util.metrics import metrics_counter
+from corehq.util.quickcache import quickcache
+
+MEMORY_CACHE_SIZE = 64 * 1024 * 1024  # bytes
+SHARED_CACHE_TIMEOUT = 24 * 60 * 60  # seconds
+GLOBAL_SCOPE = 'global'
+
+
+def get_content_hash(parts):
+    """Get a hash of JSON-serializable parts to be used as a cache scope"""
+    content = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+@quickcache(['domain'], timeout=60 * 24 * 60 * 60)
+def _get_fixture_freshness_token(domain):
+    # a random value would work here, but this leaves a more useful trail for debugging
+    return datetime.datetime.utcnow().isoformat()
+
+
+def invalidate_fixture_payloads(domain):
+    """Make all cached fixture payloads of the domain unreachable
+
+    Stale payloads are not deleted. They are evicted from the memory
+    tier when it fills up and expire from the shared store.
+    """
+    _get_fixture_freshness_token.clear(domain)
+
+
+class PayloadLRUCache(object):
+    """Thread-safe LRU cache of byte strings bounded by their total size"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_size // 4:
+            # caching this would evict most other payloads
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._data[key] = value
+            self.size += len(value)
+            while self.size > self.max_size:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+memory_cache = PayloadLRUCache(MEMORY_CACHE_SIZE)
+
+
+class RedisPayloadStore(object):
+    tier = 'redis'
+
+    def get(self, key):
+        return get_redis_default_cache().get(key)
+
+    def set(self, key, payload):
+        get_redis_default_cache().set(key, payload, timeout=SHARED_CACHE_TIMEOUT)
+
+
+class FixturePayloadCache(object):
+    """Two tier cache of serialized fixture payloads
+
+    :param domain: Domain name.
+    :param bucket: Name of the group of fixtures that are cached together.
+    :param store: Shared store behind the memory tier. An object with
+    `tier` (a name used in metrics), `get(key)` and `set(key, payload)`.
+    """
+
+    def __init__(self, domain, bucket, store=None, memory=None):
+        self.domain = domain
+        self.bucket = bucket
+        self.store = store if store is not None else RedisPayloadStore()
+        self.memory = memory if memory is not None else memory_cache
+
+    @property
+    @memoized
+    def freshness_token(self):
+        return _get_fixture_freshness_token(self.domain)
+
+    def get_key(self, scope):
+        hashable_key = ','.join([self.domain, self.bucket, self.freshness_token, scope])
+        return 'fixture-payload-{}'.format(hashlib.md5(hashable_key.encode('utf-8')).hexdigest())
+
+    def get(self, scope):
+        key = self.get_key(scope)
+        payload = self.memory.get(key)
+        self._record_metric('memory', payload is not None)
+        if payload is None:
+            payload = self.store.get(key)
+            self._record_metric(self.store.tier, payload is not None)
+            if payload is not None:
+                self.memory.set(key, payload)
+        return payload
+
+    def set(self, scope, payload):
+        key = self.get_key(scope)
+        self.store.set(key, payload)
+        self.memory.set(key, payload)
+
+    def get_or_generate(self, scope, data_fn, user_id, overwrite_cache=False):
+        """Get the cached payload or generate and cache it
+
+        :param scope: Identifies the content of the payload.
+        :param data_fn: Function to generate the XML fixture elements.
+        Elements must use `GLOBAL_USER_ID` as the user id.
+        :param user_id: Restore user id, substituted in the payload.
+        :param overwrite_cache: Regenerate the payload even if it is cached.
+        :return: list containing the byte string representation of the
+        fixture.
+        """
+        payload = None if overwrite_cache else self.get(scope)
+        if payload is None:
+            with CriticalSection([self.get_key(scope)]):
+                if not overwrite_cache:
+                    # re-check the shared store to avoid re-computing it
+                    payload = self.store.get(self.get_key(scope))
+                if payload is None:
+                    metrics_counter('commcare.fixture.payload_cache.generate', tags={
+                        'bucket': self.bucket,
+                    })
+                    payload = write_fixture_items_to_io(data_fn()).read()
+                    self.set(scope, payload)
+                else:
+                    self.memory.set(self.get_key(scope), payload)
+        return [substitute_user_id(payload, user_id)]
+
+    def _record_metric(self, tier, hit):
+        metrics_counter('commcare.fixture.payload_cache.{}'.format('hit' if hit else 'miss'), tags={
+            'bucket': self.bucket,
+            'tier': tier,
+        })
+
+
+def substitute_user_id(payload, user_id):
+    return payload.replace(GLOBAL_USER_ID.encode('utf-8'), user_id.encode('utf-8'))
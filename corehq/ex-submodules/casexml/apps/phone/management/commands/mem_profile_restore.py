@@ -1,3 +1,6 @@
+import time
+import tracemalloc
+
 from django.core.management import BaseCommand
 
 from corehq.apps.users.models import CommCareUser
@@ -12,15 +15,26 @@ class Command(BaseCommand):
     http://manage.dimagi.com/default.asp?223540#1142280 and
     http://manage.dimagi.com/default.asp?225944#1142206
 
+    With --compare-streaming, prints the time to first byte, total time and
+    peak memory allocated while reading the response of a regular and a
+    streamed restore.
+
     Usage: ./manage.py mem_profile_restore large_caseload@domain.commcarehq.org
     """
     def add_arguments(self, parser):
         parser.add_argument('username')
+        parser.add_argument('--compare-streaming', action='store_true', default=False,
+                            dest='compare_streaming')
 
     def handle(self, username, **options):
         couch_user = CommCareUser.get_by_username(username)
         project = couch_user.project
 
+        if options['compare_streaming']:
+            for stream in [False, True]:
+                self.profile_response(couch_user, project, stream)
+            return
+
         restore_config = RestoreConfig(
             project=project,
             restore_user=couch_user.to_ota_restore_user(),
@@ -37,3 +51,28 @@ class Command(BaseCommand):
 
         with resident_set_size():
             restore_config.get_payload()
+
+    def profile_response(self, couch_user, project, stream):
+        restore_config = RestoreConfig(
+            project=project,
+            restore_user=couch_user.to_ota_restore_user(),
+            params=RestoreParams(version=V2),
+            cache_settings=RestoreCacheSettings(overwrite_cache=True),
+            stream=stream,
+        )
+        tracemalloc.start()
+        try:
+            start = time.time()
+            first_byte = None
+            size = 0
+            for chunk in restore_config.get_response().streaming_content:
+                if first_byte is None:
+                    first_byte = time.time() - start
+                size += len(chunk)
+            duration = time.time() - start
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        print('{} restore: {} bytes, first byte after {:.2f}s, {:.2f}s total, {:.1f}MB peak memory'.format(
+            'Streamed' if stream else 'Regular', size, first_byte or 0, duration, peak / 1024 / 1024
+        ))
@@ -2,8 +2,11 @@ import logging
 import os
 import shutil
 import tempfile
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from queue import Queue
 from uuid import uuid4
 from distutils.version import LooseVersion
 from datetime import datetime, timedelta
@@ -12,11 +15,13 @@ from xml.etree import cElementTree as ElementTree
 
 from celery.exceptions import TimeoutError
 from celery.result import AsyncResult
+from django.db import connections
 from django.http import HttpResponse, StreamingHttpResponse
 from django.conf import settings
 from django.utils.text import slugify
 
 from casexml.apps.phone.data_providers import get_element_providers, get_async_providers
+from casexml.apps.phone.data_providers.standard import AsyncDataProvider
 from casexml.apps.phone.exceptions import (
     InvalidSyncLogException, SyncLogUserMismatch,
     BadStateException, RestoreException
@@ -24,7 +29,12 @@ from casexml.apps.phone.exceptions import (
 from casexml.apps.phone.restore_caching import AsyncRestoreTaskIdCache, RestorePayloadPathCache
 from casexml.apps.phone.tasks import get_async_restore_payload, ASYNC_RESTORE_SENT
 from casexml.apps.phone.utils import get_cached_items_with_count
-from corehq.toggles import EXTENSION_CASES_SYNC_ENABLED, LIVEQUERY_SYNC
+from corehq.toggles import (
+    EXTENSION_CASES_SYNC_ENABLED,
+    LIVEQUERY_SYNC,
+    PARALLEL_RESTORE_PROVIDERS,
+    STREAMING_RESTORE,
+)
 from corehq.util.datadog.utils import bucket_value, maybe_add_domain_tag
 from corehq.util.metrics import metrics_counter, metrics_histogram
 from corehq.util.timer import TimingContext
@@ -61,6 +71,13 @@ logger = logging.getLogger('restore')
 
 DEFAULT_CASE_SYNC = CLEAN_OWNERS
 
+# streamed restores send content in chunks of at least this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+# and hold at most this many chunks in memory while waiting for the client
+STREAM_MAX_CHUNKS = 16
+# maximum number of restore providers run at the same time
+PARALLEL_PROVIDER_WORKERS = 4
+
 
 def stream_response(payload, headers=None, status=200):
     try:
@@ -112,32 +129,49 @@ class RestoreContent(object):
 
     def __enter__(self):
         self.response_body = tempfile.TemporaryFile('w+b')
+        if not self.items:
+            # the start tag only depends on the content if items are counted
+            self._write(self._get_start_tag())
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.response_body.close()
+        if self.response_body is not None:
+            self.response_body.close()
 
     def append(self, xml_element):
         self.num_items += 1
         if isinstance(xml_element, bytes):
             xml_element, num = get_cached_items_with_count(xml_element)
             self.num_items += num - 1
-            self.response_body.write(xml_element)
+            self._write(xml_element)
         else:
-            self.response_body.write(xml_util.tostring(xml_element))
+            self._write(xml_util.tostring(xml_element))
 
     def extend(self, iterable):
         for element in iterable:
             self.append(element)
 
-    def _write_to_file(self, fileobj):
+    def _write(self, data):
+        self.response_body.write(data)
+
+    def add_part(self, part):
+        """Append the content of a `RestoreContentPart`"""
+        self.num_items += part.num_items
+        part.response_body.seek(0)
+        for data in iter(lambda: part.response_body.read(STREAM_CHUNK_SIZE), b''):
+            self._write(data)
+
+    def _get_start_tag(self):
         # Add 1 to num_items to account for message element
         items = (self.items_template % ('%s' % (self.num_items + 1)).encode('utf-8')) if self.items else b''
-        fileobj.write(self.start_tag_template % {
+        return self.start_tag_template % {
             b"items": items,
             b"username": self.username.encode("utf8"),
             b"nature": ResponseNature.OTA_RESTORE_SUCCESS.encode("utf8"),
-        })
+        }
+
+    def _write_to_file(self, fileobj):
+        fileobj.write(self._get_start_tag())
 
         self.response_body.seek(0)
         shutil.copyfileobj(self.response_body, fileobj)
@@ -145,16 +179,129 @@ class RestoreContent(object):
         fileobj.write(self.closing_tag)
 
     def get_fileobj(self):
+        """Get a file object containing the complete response
+
+        The caller is responsible for closing the returned file. If
+        items are not counted the content is already complete apart
+        from the closing tag, so the file it was written to is returned
+        instead of a copy, and this can only be called once.
+        """
+        if not self.items:
+            fileobj, self.response_body = self.response_body, None
+            try:
+                fileobj.write(self.closing_tag)
+                fileobj.seek(0)
+                return fileobj
+            except Exception:
+                fileobj.close()
+                raise
+
         fileobj = tempfile.TemporaryFile('w+b')
         try:
             self._write_to_file(fileobj)
             fileobj.seek(0)
             return fileobj
-        except:
+        except Exception:
             fileobj.close()
             raise
 
 
+class RestoreContentPart(RestoreContent):
+    """Content generated by a single restore provider
+
+    Used to generate the content of providers concurrently. Each part is
+    added to the complete response with `RestoreContent.add_part()`.
+    """
+
+    def __init__(self):
+        super(RestoreContentPart, self).__init__()
+        self.response_body = tempfile.TemporaryFile('w+b')
+
+    def __enter__(self):
+        return self
+
+
+class RestoreCancelled(Exception):
+    pass
+
+
+class StreamingRestoreContent(RestoreContent):
+    """Restore content that is read while it is being generated
+
+    Content is put on a bounded queue in chunks of at least `chunk_size`
+    bytes, which are read with `iter_chunks()` while elements are
+    appended in another thread. At most `max_chunks` chunks are queued
+    at a time, so a slow client holds up the generation of the content
+    instead of it being held in memory.
+
+    Content is also written to a temp file so the response can be
+    cached after it has been sent.
+    """
+    _end = object()
+
+    def __init__(self, username=None, chunk_size=STREAM_CHUNK_SIZE, max_chunks=STREAM_MAX_CHUNKS):
+        super(StreamingRestoreContent, self).__init__(username, items=False)
+        self.chunk_size = chunk_size
+        self._buffer = []
+        self._buffer_size = 0
+        self._queue = Queue(max_chunks)
+        self._cancelled = False
+
+    def _write(self, data):
+        if self._cancelled:
+            raise RestoreCancelled()
+        super(StreamingRestoreContent, self)._write(data)
+        self._buffer.append(data)
+        self._buffer_size += len(data)
+        if self._buffer_size >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._queue.put(b''.join(self._buffer))
+            self._buffer = []
+            self._buffer_size = 0
+
+    def finish(self):
+        """Write the closing tag and end the stream"""
+        self._write(self.closing_tag)
+        self._flush()
+        self._queue.put(self._end)
+
+    def abort(self, error):
+        """End the stream with an error, which is raised by `iter_chunks()`"""
+        if not self._cancelled:
+            self._queue.put(error)
+
+    def cancel(self):
+        """Stop reading content
+
+        Makes the thread generating the content raise `RestoreCancelled`
+        on its next write.
+        """
+        self._cancelled = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    def iter_chunks(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is self._end:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+
+    def get_fileobj(self):
+        """Get a file object containing the content that was streamed
+
+        Can only be called after `finish()`.
+        """
+        fileobj, self.response_body = self.response_body, None
+        fileobj.seek(0)
+        return fileobj
+
+
 class RestoreResponse(object):
 
     def __init__(self, fileobj):
@@ -180,6 +327,27 @@ class RestoreResponse(object):
         return stream_response(self.fileobj, headers)
 
 
+class StreamingRestoreResponse(object):
+    """Restore response that is generated while it is being sent
+
+    :param content: An iterable of response content chunks (bytes).
+    """
+
+    def __init__(self, content):
+        self.content = content
+
+    def as_string(self):
+        """Get content as utf8-encoded bytes
+
+        NOTE: This method is only used in tests.
+        Cannot be called more than once.
+        """
+        return b''.join(self.content)
+
+    def get_http_response(self):
+        return StreamingHttpResponse(self.content, content_type="text/xml; charset=utf-8")
+
+
 class AsyncRestoreResponse(object):
 
     def __init__(self, task, username):
@@ -497,10 +665,14 @@ class RestoreConfig(object):
     :param cache_settings:  The RestoreCacheSettings associated with this (see above).
     :param is_async:           Whether to get the restore response using a celery task
     :param case_sync:       Case sync algorithm (None -> default).
+    :param stream:          Whether to stream the restore response while
+                            it is being generated (None -> STREAMING_RESTORE
+                            toggle). Ignored for async restores and restores
+                            that include the item count.
     """
 
     def __init__(self, project=None, restore_user=None, params=None,
-                 cache_settings=None, is_async=False, case_sync=None):
+                 cache_settings=None, is_async=False, case_sync=None, stream=None):
         assert isinstance(restore_user, OTARestoreUser)
         self.project = project
         self.domain = project.name if project else ''
@@ -508,6 +680,9 @@ class RestoreConfig(object):
         self.params = params or RestoreParams()
         self.cache_settings = cache_settings or RestoreCacheSettings()
         self.is_async = is_async
+        if stream is None:
+            stream = STREAMING_RESTORE.enabled(self.domain)
+        self.stream = stream and not is_async and not self.params.include_item_count
 
         self.restore_state = RestoreState(
             self.project,
@@ -557,9 +732,20 @@ class RestoreConfig(object):
 
     def get_response(self):
         is_async = self.is_async
+        is_streaming = False
         try:
-            with self.timing_context:
+            self.timing_context.start()
+            try:
                 payload = self.get_payload()
+            except Exception:
+                self.timing_context.stop()
+                raise
+            is_streaming = isinstance(payload, StreamingRestoreResponse)
+            if not is_streaming:
+                # streamed responses are timed until all content has been sent
+                self.timing_context.stop()
+                if not is_async:
+                    self._record_first_byte(self.timing_context.duration, streaming=False)
             response = payload.get_http_response()
         except RestoreException as e:
             logger.exception("%s error during restore submitted by %s: %s" %
@@ -571,7 +757,7 @@ class RestoreConfig(object):
             )
             response = HttpResponse(response, content_type="text/xml; charset=utf-8",
                                     status=412)  # precondition failed
-        if not is_async:
+        if not (is_async or is_streaming):
             self._record_timing(response.status_code)
         return response
 
@@ -593,6 +779,8 @@ class RestoreConfig(object):
         # Start new sync
         if self.is_async:
             response = self._get_asynchronous_payload()
+        elif self.stream:
+            response = StreamingRestoreResponse(self._iter_streaming_payload())
         else:
             response = self.generate_payload()
 
@@ -690,16 +878,138 @@ class RestoreConfig(object):
         username = self.restore_user.username
         count_items = self.params.include_item_count
         with RestoreContent(username, count_items) as content:
-            for provider in get_element_providers(self.timing_context):
-                with self.timing_context(provider.__class__.__name__):
-                    content.extend(provider.get_elements(self.restore_state))
-
-            for provider in get_async_providers(self.timing_context, async_task):
-                with self.timing_context(provider.__class__.__name__):
-                    provider.extend_response(self.restore_state, content)
-
+            self._extend_restore_content(content, async_task)
             return content.get_fileobj()
 
+    def _extend_restore_content(self, content, async_task=None):
+        if PARALLEL_RESTORE_PROVIDERS.enabled(self.domain):
+            self._extend_restore_content_concurrently(content, async_task)
+            return
+
+        for provider in get_element_providers(self.timing_context):
+            with self.timing_context(provider.__class__.__name__):
+                content.extend(provider.get_elements(self.restore_state))
+
+        for provider in get_async_providers(self.timing_context, async_task):
+            with self.timing_context(provider.__class__.__name__):
+                provider.extend_response(self.restore_state, content)
+
+    def _extend_restore_content_concurrently(self, content, async_task=None):
+        """Run restore providers concurrently
+
+        Each provider writes to its own `RestoreContentPart` and records
+        its timing in its own `TimingContext`. Parts are added to the
+        content in the same order as they would be added when providers
+        are run one after the other, and timers are added to this
+        restore's timing context.
+
+        Only providers that don't write restore state are run in worker
+        threads. They may read ``self.restore_state``, its memoized
+        properties (``owner_ids``, ``stock_settings``, ...) and the
+        memoized lookups of its ``restore_user``: those have no side
+        effects, so two threads that compute the same value at once get
+        equal results. Providers with ``writes_restore_state`` set, like
+        the case and fixture providers which write to
+        ``restore_state.current_sync_log``, are run one after the other
+        on this thread while the others run in the worker threads.
+        """
+        def get_part(provider):
+            timing_context = TimingContext(provider.__class__.__name__)
+            provider.timing_context = timing_context
+            part = RestoreContentPart()
+            try:
+                with timing_context:
+                    if isinstance(provider, AsyncDataProvider):
+                        provider.extend_response(self.restore_state, part)
+                    else:
+                        part.extend(provider.get_elements(self.restore_state))
+            except Exception:
+                part.response_body.close()
+                raise
+            return part, timing_context
+
+        def get_part_in_thread(provider):
+            try:
+                return get_part(provider)
+            finally:
+                connections.close_all()
+
+        providers = (
+            get_element_providers(self.timing_context)
+            + get_async_providers(self.timing_context, async_task)
+        )
+        with ThreadPoolExecutor(max_workers=PARALLEL_PROVIDER_WORKERS) as pool:
+            futures = [
+                None if provider.writes_restore_state else pool.submit(get_part_in_thread, provider)
+                for provider in providers
+            ]
+            try:
+                for provider, future in zip(providers, futures):
+                    if future is None:
+                        part, timing_context = get_part(provider)
+                    else:
+                        part, timing_context = future.result()
+                    with part:
+                        content.add_part(part)
+                    self.timing_context.peek().append(timing_context.root)
+            except Exception:
+                futures = [future for future in futures if future is not None]
+                for future in futures:
+                    future.cancel()
+                for future in futures:
+                    if not future.cancelled() and future.exception() is None:
+                        future.result()[0].response_body.close()
+                raise
+
+    def _iter_streaming_payload(self):
+        """Generate the restore response while it is being sent
+
+        The content is generated in another thread and read in chunks by
+        this generator, so the first bytes are sent before the restore has
+        finished and only a few chunks are held in memory. The sync log is
+        saved before the last chunk is sent. Afterwards the content is
+        cached if necessary.
+
+        If the restore fails part way the response is cut short, which the
+        client treats as a failed restore.
+        """
+        def generate_content():
+            try:
+                self.restore_state.start_sync()
+                self._extend_restore_content(content)
+                self.restore_state.finish_sync()
+                content.finish()
+            except RestoreCancelled:
+                pass
+            except BaseException as err:
+                logger.exception("error generating streamed restore for %s", self.restore_user.username)
+                content.abort(err)
+            finally:
+                connections.close_all()
+
+        status = 500
+        with StreamingRestoreContent(self.restore_user.username) as content:
+            thread = threading.Thread(target=generate_content, name='restore-{}'.format(self.domain))
+            thread.daemon = True
+            thread.start()
+            try:
+                is_first_chunk = True
+                for chunk in content.iter_chunks():
+                    if is_first_chunk:
+                        # the root timer was started when the request was received
+                        self._record_first_byte(self.timing_context.duration)
+                        is_first_chunk = False
+                    yield chunk
+                status = 200
+            finally:
+                content.cancel()
+                thread.join()
+                self.timing_context.stop()
+                self._record_timing(status)
+
+            with content.get_fileobj() as fileobj:
+                self.set_cached_payload_if_necessary(fileobj, self.restore_state.duration, is_async=False)
+
     def set_cached_payload_if_necessary(self, fileobj, duration, is_async):
         # must cache if the duration was longer than the threshold
         is_long_restore = duration > timedelta(seconds=INITIAL_SYNC_CACHE_THRESHOLD)
@@ -739,6 +1049,15 @@ class RestoreConfig(object):
             # so delete it to avoid a stale payload if they (say) wipe the phone and sync again
             self.initial_restore_payload_path_cache.invalidate()
 
+    def _record_first_byte(self, duration, streaming=True):
+        tags = {'streaming': 'yes' if streaming else 'no'}
+        maybe_add_domain_tag(self.domain, tags)
+        metrics_histogram(
+            'commcare.restores.first_byte.seconds', duration,
+            bucket_tag='duration', buckets=(1, 5, 20, 60, 120, 300, 600), bucket_unit='s',
+            tags=tags,
+        )
+
     def _record_timing(self, status):
         timing = self.timing_context
         assert timing.is_finished()
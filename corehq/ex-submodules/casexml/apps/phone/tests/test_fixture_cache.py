@@ -0,0 +1,110 @@
+from contextlib import contextmanager
+from xml.etree import cElementTree as ElementTree
+
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from casexml.apps.phone.fixture_cache import (
+    FixturePayloadCache,
+    PayloadLRUCache,
+    get_content_hash,
+)
+from casexml.apps.phone.utils import GLOBAL_USER_ID
+
+
+class FakeStore(object):
+    tier = 'fake'
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, payload):
+        self.data[key] = payload
+
+
+@contextmanager
+def fake_critical_section(keys):
+    yield
+
+
+class PayloadLRUCacheTest(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = PayloadLRUCache(12)
+        for key in 'abcd':
+            cache.set(key, b'123')
+        cache.get('a')
+        cache.set('e', b'123')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'123')
+        self.assertEqual(cache.size, 12)
+
+    def test_replace(self):
+        cache = PayloadLRUCache(12)
+        cache.set('a', b'12')
+        cache.set('a', b'123')
+        self.assertEqual((len(cache), cache.size), (1, 3))
+
+    def test_skip_large_payloads(self):
+        cache = PayloadLRUCache(12)
+        cache.set('a', b'1234')
+        self.assertIsNone(cache.get('a'))
+
+
+@patch('casexml.apps.phone.fixture_cache.CriticalSection', fake_critical_section)
+@patch('casexml.apps.phone.fixture_cache._get_fixture_freshness_token', lambda domain: 'token')
+class FixturePayloadCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.store = FakeStore()
+        self.memory = PayloadLRUCache(1024)
+        self.calls = 0
+
+    def get_cache(self, domain='test', memory=None):
+        return FixturePayloadCache(domain, 'bucket', self.store, memory or self.memory)
+
+    def data_fn(self):
+        self.calls += 1
+        return [ElementTree.Element('fixture', {'user_id': GLOBAL_USER_ID})]
+
+    def test_payload_is_shared(self):
+        payload = self.get_cache().get_or_generate('scope', self.data_fn, 'user1')
+        self.assertEqual(payload, [b'<!--items=1--><fixture user_id="user1" />'])
+        payload = self.get_cache().get_or_generate('scope', self.data_fn, 'user2')
+        self.assertEqual(payload, [b'<!--items=1--><fixture user_id="user2" />'])
+        self.assertEqual(self.calls, 1)
+
+    def test_shared_store(self):
+        self.get_cache().get_or_generate('scope', self.data_fn, 'user1')
+        other_process = self.get_cache(memory=PayloadLRUCache(1024))
+        other_process.get_or_generate('scope', self.data_fn, 'user2')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(other_process.memory), 1)
+
+    def test_scope_and_domain(self):
+        self.get_cache().get_or_generate('scope', self.data_fn, 'user1')
+        self.get_cache().get_or_generate('other', self.data_fn, 'user1')
+        self.get_cache('other').get_or_generate('scope', self.data_fn, 'user1')
+        self.assertEqual(self.calls, 3)
+
+    def test_overwrite_cache(self):
+        self.get_cache().get_or_generate('scope', self.data_fn, 'user1')
+        self.get_cache().get_or_generate('scope', self.data_fn, 'user1', overwrite_cache=True)
+        self.assertEqual(self.calls, 2)
+
+    def test_invalidate(self):
+        self.get_cache().get_or_generate('scope', self.data_fn, 'user1')
+        with patch('casexml.apps.phone.fixture_cache._get_fixture_freshness_token', lambda domain: 'new'):
+            self.get_cache().get_or_generate('scope', self.data_fn, 'user1')
+        self.assertEqual(self.calls, 2)
+
+
+class ContentHashTest(SimpleTestCase):
+
+    def test_content_hash(self):
+        self.assertEqual(get_content_hash([['a', 1]]), get_content_hash([('a', 1)]))
+        self.assertNotEqual(get_content_hash([['a', 1]]), get_content_hash([['a', 2]]))
@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.data_providers.case.graph_snapshot import (
+    CaseGraphAccessor,
+    CaseGraphSnapshot,
+    index_key,
+)
+from corehq.form_processor.models import CommCareCaseIndexSQL
+
+CHILD = CommCareCaseIndexSQL.CHILD
+EXTENSION = CommCareCaseIndexSQL.EXTENSION
+SNAPSHOT_DATE = datetime(2020, 1, 1)
+BEFORE = SNAPSHOT_DATE - timedelta(days=1)
+AFTER = SNAPSHOT_DATE + timedelta(days=1)
+
+
+class FakeCaseAccessor(object):
+    domain = 'test'
+
+    def __init__(self):
+        self.cases = {}    # case_id -> [closed, deleted, server_modified_on]
+        self.indices = {}  # index key -> index
+        self.queried_ids = []
+
+    def add_case(self, case_id, closed=False, deleted=False, modified=BEFORE):
+        self.cases[case_id] = [closed, deleted, modified]
+
+    def add_index(self, case_id, referenced_id, relationship_id=CHILD, identifier='parent'):
+        index = CommCareCaseIndexSQL(
+            domain=self.domain,
+            case_id=case_id,
+            identifier=identifier,
+            referenced_id=referenced_id,
+            referenced_type='type',
+            relationship_id=relationship_id,
+        )
+        self.indices[index_key(index)] = index
+
+    def get_related_indices(self, case_ids, exclude_indices):
+        self.queried_ids.extend(case_ids)
+        return [ix for key, ix in self.indices.items()
+            if key not in exclude_indices and (
+                ix.case_id in case_ids
+                or (ix.referenced_id in case_ids
+                    and ix.relationship_id == EXTENSION
+                    and not any(self.cases[ix.case_id][:2])))]
+
+    def get_closed_and_deleted_ids(self, case_ids):
+        return [(case_id, closed, deleted)
+            for case_id in case_ids
+            for closed, deleted, modified in [self.cases[case_id]]
+            if closed or deleted]
+
+    def get_last_modified_dates(self, case_ids):
+        return {case_id: self.cases[case_id][2] for case_id in case_ids if case_id in self.cases}
+
+    def get_extension_case_ids(self, case_ids, include_closed=True):
+        return [
+            ix.case_id for ix in self.indices.values()
+            if ix.referenced_id in case_ids and ix.relationship_id == EXTENSION
+            and (include_closed or not self.cases[ix.case_id][0])
+        ]
+
+
+def walk(accessor, case_ids):
+    """Get keys of indices reachable from the given case ids"""
+    seen = set()
+    all_ids = next_ids = set(case_ids)
+    while next_ids:
+        related = accessor.get_related_indices(list(next_ids), seen)
+        seen.update(index_key(ix) for ix in related)
+        next_ids = {c for ix in related for c in [ix.case_id, ix.referenced_id]} - all_ids
+        all_ids |= next_ids
+    return seen, all_ids
+
+
+class CaseGraphAccessorTest(SimpleTestCase):
+
+    def setUp(self):
+        self.db = FakeCaseAccessor()
+        for case_id in 'abcde':
+            self.db.add_case(case_id)
+        self.db.add_case('f', closed=True)
+        self.db.add_index('b', 'a')
+        self.db.add_index('c', 'b', EXTENSION, 'host')
+        self.db.add_index('d', 'e', EXTENSION, 'host')
+        self.db.add_index('f', 'a', EXTENSION, 'host')
+
+    def get_snapshot(self, owned_ids):
+        graph = CaseGraphAccessor(self.db)
+        seen, all_ids = walk(graph, owned_ids)
+        graph.get_closed_and_deleted_ids(list(all_ids))
+        return graph.get_snapshot(SNAPSHOT_DATE, set(owned_ids))
+
+    def get_refreshed_accessor(self, snapshot):
+        graph = CaseGraphAccessor(self.db, CaseGraphSnapshot.from_json('test', snapshot.to_json()))
+        self.refreshed_ids = graph.refresh(snapshot.date)
+        self.db.queried_ids = []
+        return graph
+
+    def assert_walk(self, graph, owned_ids):
+        """Check that the graph walk matches the database
+
+        :returns: Case ids queried from the database by the graph walk.
+        """
+        expected = walk(self.db, owned_ids)
+        self.db.queried_ids = []
+        self.assertEqual(walk(graph, owned_ids), expected)
+        return set(self.db.queried_ids)
+
+    def test_walk_without_snapshot(self):
+        graph = CaseGraphAccessor(self.db)
+        self.assertEqual(self.assert_walk(graph, ['b']), {'a', 'b', 'c'})
+
+    def test_unchanged_graph_is_not_queried(self):
+        snapshot = self.get_snapshot(['b'])
+        graph = self.get_refreshed_accessor(snapshot)
+        self.assertEqual(self.assert_walk(graph, ['b']), set())
+        self.assertEqual(graph.get_closed_and_deleted_ids(['a', 'b', 'c']), [])
+
+    def test_modified_index(self):
+        snapshot = self.get_snapshot(['b'])
+        self.db.add_index('b', 'e', identifier='parent')
+        self.db.cases['b'][2] = AFTER
+        graph = self.get_refreshed_accessor(snapshot)
+        self.assertEqual(self.assert_walk(graph, ['b']), {'d', 'e'})
+
+    def test_closed_extension(self):
+        snapshot = self.get_snapshot(['b'])
+        self.db.cases['c'][:] = [True, False, AFTER]
+        graph = self.get_refreshed_accessor(snapshot)
+        self.assert_walk(graph, ['b'])
+        self.assertEqual(graph.get_closed_and_deleted_ids(['c']), [('c', True, False)])
+
+    def test_new_extension(self):
+        snapshot = self.get_snapshot(['b'])
+        self.db.add_case('g', modified=AFTER)
+        self.db.add_index('g', 'a', EXTENSION, 'host')
+        graph = self.get_refreshed_accessor(snapshot)
+        self.assert_walk(graph, ['b'])
+        self.assertIn('g', walk(graph, ['b'])[1])
+
+    def test_reopened_extension(self):
+        snapshot = self.get_snapshot(['b'])
+        self.db.cases['f'][:] = [False, False, AFTER]
+        graph = self.get_refreshed_accessor(snapshot)
+        self.assertIn('f', walk(graph, ['b'])[1])
+
+    def test_newly_owned_case(self):
+        snapshot = self.get_snapshot(['b'])
+        graph = self.get_refreshed_accessor(snapshot)
+        self.assertEqual(self.assert_walk(graph, ['b', 'd']), {'d', 'e'})
+
+    def test_case_modified_before_snapshot_date(self):
+        # the change was committed after the graph walk read the case
+        snapshot = self.get_snapshot(['b'])
+        self.db.add_index('b', 'e', identifier='parent')
+        self.db.cases['b'][2] = SNAPSHOT_DATE - timedelta(minutes=1)
+        graph = self.get_refreshed_accessor(snapshot)
+        self.assertEqual(self.assert_walk(graph, ['b']), {'d', 'e'})
+
+    def test_closed_extensions_are_not_refreshed(self):
+        snapshot = self.get_snapshot(['b'])
+        self.get_refreshed_accessor(snapshot)
+        self.assertEqual(self.refreshed_ids, set())
+
+    def test_deleted_case(self):
+        snapshot = self.get_snapshot(['b'])
+        self.db.cases['b'][:] = [False, True, AFTER]
+        graph = self.get_refreshed_accessor(snapshot)
+        self.assertEqual(graph.get_closed_and_deleted_ids(['b']), [('b', False, True)])
+
+
+class CaseGraphSnapshotTest(SimpleTestCase):
+
+    def test_json_round_trip(self):
+        index = CommCareCaseIndexSQL(
+            domain='test',
+            case_id='b',
+            identifier='host',
+            referenced_id='a',
+            referenced_type='type',
+            relationship_id=EXTENSION,
+        )
+        snapshot = CaseGraphSnapshot(
+            SNAPSHOT_DATE,
+            {'a', 'b'},
+            [index],
+            {'a': (False, False), 'b': (True, False), 'c': (True, True)},
+        )
+        copy = CaseGraphSnapshot.from_json('test', snapshot.to_json())
+        self.assertEqual(copy.date, snapshot.date)
+        self.assertEqual(copy.complete_ids, snapshot.complete_ids)
+        self.assertEqual(copy.status, snapshot.status)
+        [copy_index] = copy.indices
+        self.assertEqual(
+            (copy_index.case_id, copy_index.identifier, copy_index.referenced_id,
+             copy_index.referenced_type, copy_index.relationship_id),
+            ('b', 'host', 'a', 'type', EXTENSION),
+        )
+
+    def test_unknown_version(self):
+        data = CaseGraphSnapshot(SNAPSHOT_DATE, [], [], {}).to_json()
+        data['version'] = 0
+        with self.assertRaises(ValueError):
+            CaseGraphSnapshot.from_json('test', data)
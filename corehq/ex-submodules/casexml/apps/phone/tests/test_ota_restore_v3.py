@@ -1,3 +1,5 @@
+import threading
+
 import six
 from django.test import TestCase
 from django.test.testcases import SimpleTestCase
@@ -9,9 +11,24 @@ from casexml.apps.case.tests.util import (
     delete_all_sync_logs,
 )
 from casexml.apps.case.mock import CaseBlock
-from casexml.apps.phone.restore import RestoreContent
-from casexml.apps.phone.tests.utils import create_restore_user
+from casexml.apps.phone.data_providers import RestoreDataProvider
+from casexml.apps.phone.restore import (
+    RestoreCancelled,
+    RestoreConfig,
+    RestoreContent,
+    RestoreContentPart,
+    StreamingRestoreContent,
+)
+from casexml.apps.phone.tests.utils import (
+    create_restore_user,
+    deprecated_generate_restore_payload,
+    deprecated_synclog_id_from_restore_payload,
+)
 from casexml.apps.phone.utils import MockDevice
+from casexml.apps.case.xml import V2
+from corehq.util.test_utils import flag_enabled
+from corehq.util.timer import TimingContext
+from mock import MagicMock, patch
 
 
 class OtaV3RestoreTest(TestCase):
@@ -42,6 +59,69 @@ class OtaV3RestoreTest(TestCase):
         ))
         self.assertIn(case_id, device.sync().cases)
 
+    def test_parallel_providers(self):
+        restore_user = create_restore_user(domain=self.domain)
+        device = MockDevice(self.project, restore_user)
+        device.change_cases([
+            CaseBlock(
+                create=True,
+                case_id='case-{}'.format(i),
+                user_id=restore_user.user_id,
+                owner_id=restore_user.user_id,
+                case_type='test-case-type',
+            )
+            for i in range(3)
+        ])
+        device.post_changes()
+
+        def get_payload():
+            payload = deprecated_generate_restore_payload(
+                self.project, restore_user, version=V2, items=True, overwrite_cache=True)
+            # the only difference between restores is the new sync log
+            restore_id = deprecated_synclog_id_from_restore_payload(payload)
+            return payload.replace(restore_id.encode('utf-8'), b'restore-id')
+
+        serial_payload = get_payload()
+        with flag_enabled('PARALLEL_RESTORE_PROVIDERS'):
+            parallel_payload = get_payload()
+        self.assertEqual(parallel_payload, serial_payload)
+
+
+class ConcurrentRestoreProvidersTest(SimpleTestCase):
+
+    def test_state_writers_run_on_calling_thread(self):
+        threads = {}
+
+        class Provider(RestoreDataProvider):
+            def __init__(self, name, writes_restore_state):
+                super(Provider, self).__init__(None)
+                self.name = name
+                self.writes_restore_state = writes_restore_state
+
+            def get_elements(self, restore_state):
+                threads[self.name] = threading.current_thread()
+                yield '<{}/>'.format(self.name).encode('utf-8')
+
+        element_providers = [
+            Provider('sync', False),
+            Provider('fixtures', True),
+            Provider('registration', False),
+            Provider('cases', True),
+        ]
+        config = MagicMock(timing_context=TimingContext('restore'))
+        with patch('casexml.apps.phone.restore.get_element_providers', return_value=element_providers), \
+                patch('casexml.apps.phone.restore.get_async_providers', return_value=[]), \
+                config.timing_context, RestoreContent('user1') as content:
+            RestoreConfig._extend_restore_content_concurrently(config, content)
+            with content.get_fileobj() as fileobj:
+                payload = fileobj.read()
+
+        self.assertIn(b'<sync/><fixtures/><registration/><cases/>', payload)
+        self.assertIs(threads['fixtures'], threading.current_thread())
+        self.assertIs(threads['cases'], threading.current_thread())
+        self.assertIsNot(threads['sync'], threading.current_thread())
+        self.assertIsNot(threads['registration'], threading.current_thread())
+
 
 class TestRestoreContent(SimpleTestCase):
 
@@ -75,3 +155,43 @@ class TestRestoreContent(SimpleTestCase):
             response.append(body.encode('utf-8'))
             with response.get_fileobj() as fileobj:
                 self.assertEqual(expected, fileobj.read().decode('utf-8'))
+
+    def test_parts(self):
+        user = 'user1'
+        expected = self._expected(user, '<elem>data0</elem><elem>data1</elem>', items=3)
+        parts = [RestoreContentPart(), RestoreContentPart()]
+        parts[1].append(b'<elem>data1</elem>')
+        parts[0].append(b'<elem>data0</elem>')
+        with RestoreContent(user, True) as response:
+            for part in parts:
+                with part:
+                    response.add_part(part)
+            with response.get_fileobj() as fileobj:
+                self.assertEqual(expected, fileobj.read().decode('utf-8'))
+
+    def test_streaming(self):
+        user = 'user1'
+        body = '<elem>data0</elem>'
+        expected = self._expected(user, body + body, items=None)
+        with StreamingRestoreContent(user, chunk_size=10, max_chunks=10) as response:
+            response.append(body.encode('utf-8'))
+            response.append(body.encode('utf-8'))
+            response.finish()
+            chunks = list(response.iter_chunks())
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual(expected, b''.join(chunks).decode('utf-8'))
+            with response.get_fileobj() as fileobj:
+                self.assertEqual(expected, fileobj.read().decode('utf-8'))
+
+    def test_streaming_error(self):
+        with StreamingRestoreContent('user1') as response:
+            response.append(b'<elem>data0</elem>')
+            response.abort(ValueError('restore failed'))
+            with self.assertRaises(ValueError):
+                list(response.iter_chunks())
+
+    def test_streaming_cancelled(self):
+        with StreamingRestoreContent('user1', chunk_size=1, max_chunks=10) as response:
+            response.cancel()
+            with self.assertRaises(RestoreCancelled):
+                response.append(b'<elem>data0</elem>')
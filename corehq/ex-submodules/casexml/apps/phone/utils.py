@@ -18,6 +18,7 @@ from memoized import memoized
 
 from corehq.blobs import get_blob_db, CODES, NotFound
 from corehq.blobs.models import BlobMeta
+from corehq.toggles import SHARED_FIXTURE_CACHE
 from corehq.util.metrics import metrics_counter
 from dimagi.utils.couch import CriticalSection
 
@@ -45,6 +46,13 @@ def get_or_cache_global_fixture(restore_state, cache_bucket_prefix, fixture_name
     """
     domain = restore_state.restore_user.domain
 
+    if SHARED_FIXTURE_CACHE.enabled(domain):
+        from casexml.apps.phone.fixture_cache import GLOBAL_SCOPE, FixturePayloadCache
+        store = GlobalFixtureBlobStore(domain, cache_bucket_prefix, fixture_name)
+        payload_cache = FixturePayloadCache(domain, cache_bucket_prefix, store)
+        return payload_cache.get_or_generate(
+            GLOBAL_SCOPE, data_fn, restore_state.restore_user.user_id, restore_state.overwrite_cache)
+
     data = None
     key = '{}/{}'.format(cache_bucket_prefix, domain)
 
@@ -110,9 +118,31 @@ def get_cached_fixture_items(domain, bucket_prefix):
 
 
 def clear_fixture_cache(domain, bucket_prefix):
+    from casexml.apps.phone.fixture_cache import invalidate_fixture_payloads
     key = bucket_prefix + '/' + domain
     _record_datadog_metric('cache_clear', key)
     get_blob_db().delete(key=key)
+    invalidate_fixture_payloads(domain)
+
+
+class GlobalFixtureBlobStore(object):
+    """Blob db store for the shared fixture payload cache
+
+    There is one blob per domain and bucket, which is deleted when the
+    fixture is invalidated, so payload cache keys are not used.
+    """
+    tier = 'blob'
+
+    def __init__(self, domain, bucket_prefix, fixture_name):
+        self.domain = domain
+        self.bucket_prefix = bucket_prefix
+        self.fixture_name = fixture_name
+
+    def get(self, key):
+        return get_cached_fixture_items(self.domain, self.bucket_prefix)
+
+    def set(self, key, payload):
+        cache_fixture_items_data(BytesIO(payload), self.domain, self.fixture_name, self.bucket_prefix)
 
 
 def _record_datadog_metric(name, cache_key):
@@ -6,13 +6,16 @@ import os
 from django.test import SimpleTestCase
 from lxml import html, etree
 from mock import patch, Mock
+import openpyxl
 
-from couchexport.export import export_from_tables
+from couchexport.export import FormattedRow, export_from_tables
 from couchexport.models import Format
 from couchexport.writers import (
     MAX_XLS_COLUMNS,
     CsvFileWriter,
+    Excel2007ExportWriter,
     PythonDictWriter,
+    StreamingExcel2007ExportWriter,
     XlsLengthException,
     ZippedExportWriter,
 )
@@ -121,6 +124,58 @@ class Excel2007ExportWriterTests(SimpleTestCase):
         export_from_tables(tables, file_, format_)
 
 
+class StreamingExcel2007ExportWriterTests(SimpleTestCase):
+    headers = ['number', 'name', 'link', 'count', 'date', 'ratio']
+    rows = [
+        FormattedRow(
+            ['0', 'Mary & Jo <3', 'https://example.com/a?b=1&c=2', '12', '2020-01-02', '0.5'],
+            hyperlink_column_indices=[2],
+            skip_excel_formatting=[0],
+        ),
+        FormattedRow(['1', 'Mary & Jo <3', '', 7, '2020-01-02T10:11:12.000000Z', None]),
+        ['2', b'bytes\xe2\x80\x93', 'text', '---', '', 'true'],
+    ]
+
+    def _get_sheets(self, writer_class, **kwargs):
+        file_ = io.BytesIO()
+        writer = writer_class(**kwargs)
+        writer.open([('main', [self.headers]), ('other', [self.headers])], file_)
+        writer.write([('main', self.rows), ('other', self.rows[:1])])
+        writer.close()
+        file_.seek(0)
+        workbook = openpyxl.load_workbook(file_)
+        return [
+            (sheet.title, [
+                [
+                    (cell.value, cell.number_format, cell.hyperlink.target if cell.hyperlink else None)
+                    for cell in row
+                ]
+                for row in sheet.iter_rows()
+            ])
+            for sheet in workbook.worksheets
+        ]
+
+    def test_same_as_excel_2007_writer(self):
+        for kwargs in [{}, {'use_formatted_cells': True}, {'format_as_text': True}]:
+            self.assertEqual(
+                self._get_sheets(StreamingExcel2007ExportWriter, **kwargs),
+                self._get_sheets(Excel2007ExportWriter, **kwargs),
+                kwargs,
+            )
+
+    def test_shared_strings_limit(self):
+        file_ = io.BytesIO()
+        writer = StreamingExcel2007ExportWriter()
+        writer.open([('main', [['value']])], file_)
+        with patch('couchexport.xlsx.SHARED_STRINGS_LIMIT', 2):
+            writer.write([('main', [['a'], ['b'], ['c'], ['a'], ['c']])])
+        writer.close()
+        self.assertEqual(list(writer.book.shared_strings), ['value', 'a'])
+        file_.seek(0)
+        sheet = openpyxl.load_workbook(file_).active
+        self.assertEqual([row[0].value for row in sheet.iter_rows()], ['value', 'a', 'b', 'c', 'a', 'c'])
+
+
 class Excel2003ExportWriterTests(SimpleTestCase):
 
     def test_data_length(self):
@@ -20,6 +20,7 @@ from openpyxl.styles import numbers
 from openpyxl.cell import WriteOnlyCell
 
 from couchexport.util import get_excel_format_value, get_legacy_excel_safe_value
+from couchexport.xlsx import XlsxWorkbookWriter
 
 MAX_XLS_COLUMNS = 256
 
@@ -416,6 +417,54 @@ class Excel2007ExportWriter(ExportWriter):
         self.book.save(self.file)
 
 
+class StreamingExcel2007ExportWriter(Excel2007ExportWriter):
+    """
+    Writes the same workbook as Excel2007ExportWriter, but streams the rows
+    into the file so that memory use does not grow with the number of rows.
+    See couchexport.xlsx
+    """
+
+    def _init(self):
+        self.book = XlsxWorkbookWriter(self.file)
+        self.tables = {}
+        self.table_indices = {}
+
+    def _init_table(self, table_index, table_title):
+        self.tables[table_index] = self.book.add_sheet(table_title)
+        self.table_indices[table_index] = 0
+
+    def _write_row(self, sheet_index, row):
+        from couchexport.export import FormattedRow
+        if isinstance(row, FormattedRow):
+            skip_excel_formatting = row.skip_excel_formatting
+            hyperlink_column_indices = set(row.hyperlink_column_indices)
+        else:
+            skip_excel_formatting = hyperlink_column_indices = ()
+
+        cells = []
+        for col_ind, val in enumerate(row):
+            if (self.use_formatted_cells
+                    and col_ind not in skip_excel_formatting
+                    and not self.format_as_text):
+                excel_format, val = get_excel_format_value(val)
+            else:
+                val = get_legacy_excel_safe_value(val)
+                excel_format = numbers.FORMAT_TEXT if self.format_as_text else numbers.FORMAT_GENERAL
+            is_hyperlink = col_ind in hyperlink_column_indices
+            if is_hyperlink:
+                # the 'Hyperlink' style replaces the number format
+                excel_format = numbers.FORMAT_GENERAL
+            cells.append((val, excel_format, is_hyperlink))
+
+        self.tables[sheet_index].write_row(cells)
+
+    def _close(self):
+        """
+        Close any open file references, do any cleanup.
+        """
+        self.book.close()
+
+
 class Excel2003ExportWriter(ExportWriter):
     format = Format.XLS
     max_table_name_size = 31
@@ -0,0 +1,361 @@
+"""
+Write XLSX workbooks with memory use that does not grow with the number of rows
+
+openpyxl's write-only workbooks spool cells to temporary files, but keep
+every distinct string and every hyperlink in memory until the workbook is
+saved. ``XlsxWorkbookWriter`` writes the worksheet XML itself:
+
+  * The first sheet is written straight into its entry in the zip file as
+    rows arrive. Only one zip entry can be written at a time, so the other
+    sheets are spooled to temporary files and copied into the zip on close.
+  * Strings are deduplicated in the shared strings table until it holds
+    ``SHARED_STRINGS_LIMIT`` strings. Strings that are long or arrive after
+    the table is full are written inline in the cell.
+  * Hyperlinks are spooled to temporary files.
+  * Cell styles are limited to a number format and a hyperlink style, so
+    there are only as many styles as there are number formats in use.
+"""
+import datetime
+import math
+import re
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape, quoteattr
+
+from openpyxl.styles import numbers
+from openpyxl.utils import get_column_letter
+
+SHARED_STRINGS_LIMIT = 50000
+SHARED_STRING_MAX_LENGTH = 100
+MAX_CELL_LENGTH = 32767
+# Excel does not open sheets with more hyperlinks than this
+MAX_HYPERLINKS_PER_SHEET = 65530
+WRITE_BUFFER_SIZE = 256 * 1024
+
+EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+DEFAULT_DATE_FORMATS = [
+    # same as openpyxl, datetime must be before date since it is a subclass
+    (datetime.datetime, numbers.FORMAT_DATE_DATETIME),
+    (datetime.date, numbers.FORMAT_DATE_YYYYMMDD2),
+    (datetime.time, numbers.FORMAT_DATE_TIME4),
+]
+FIRST_CUSTOM_NUMBER_FORMAT_ID = 164
+
+_illegal_xml_chars = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+HYPERLINK_REL_TYPE = RELATIONSHIPS_NS + '/hyperlink'
+SHEET_HEADER = (
+    XML_DECLARATION
+    + '<worksheet xmlns="{}" xmlns:r="{}"><sheetData>'.format(MAIN_NS, RELATIONSHIPS_NS)
+)
+
+
+class XlsxWorkbookWriter(object):
+    """
+    Usage::
+
+        book = XlsxWorkbookWriter(fileobj)
+        sheet = book.add_sheet('Sheet 1')
+        sheet.write_row([(value, number_format, is_hyperlink), ...])
+        book.close()
+    """
+
+    def __init__(self, fileobj):
+        self.zip_file = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+        self.sheets = []
+        self.shared_strings = {}
+        # (number format, is hyperlink) -> index of the cell style
+        self.styles = {(numbers.FORMAT_GENERAL, False): 0}
+
+    def add_sheet(self, title):
+        number = len(self.sheets) + 1
+        if not self.sheets:
+            stream = self.zip_file.open(_sheet_path(number), 'w', force_zip64=True)
+        else:
+            stream = tempfile.TemporaryFile()
+        sheet = XlsxSheetWriter(self, number, title, stream)
+        self.sheets.append(sheet)
+        return sheet
+
+    def get_style(self, number_format, is_hyperlink):
+        key = (number_format or numbers.FORMAT_GENERAL, is_hyperlink)
+        if key not in self.styles:
+            self.styles[key] = len(self.styles)
+        return self.styles[key]
+
+    def get_shared_string(self, value):
+        """Return the index of the string in the shared strings table
+        or None if the string should be written inline"""
+        index = self.shared_strings.get(value)
+        if (index is None
+                and len(value) <= SHARED_STRING_MAX_LENGTH
+                and len(self.shared_strings) < SHARED_STRINGS_LIMIT):
+            index = self.shared_strings[value] = len(self.shared_strings)
+        return index
+
+    def close(self):
+        for sheet in self.sheets:
+            sheet.close()
+        self._write_entry('xl/sharedStrings.xml', self._get_shared_strings_xml())
+        self._write_entry('xl/styles.xml', self._get_styles_xml())
+        self._write_entry('xl/workbook.xml', self._get_workbook_xml())
+        self._write_entry('xl/_rels/workbook.xml.rels', self._get_workbook_rels_xml())
+        self._write_entry('_rels/.rels', _get_relationships_xml([
+            ('rId1', RELATIONSHIPS_NS + '/officeDocument', 'xl/workbook.xml'),
+        ]))
+        self._write_entry('[Content_Types].xml', self._get_content_types_xml())
+        self.zip_file.close()
+
+    def _write_entry(self, path, xml):
+        self.zip_file.writestr(path, xml.encode('utf-8'))
+
+    def _get_shared_strings_xml(self):
+        strings = ''.join(
+            '<si><t xml:space="preserve">{}</t></si>'.format(escape(value))
+            for value in self.shared_strings  # dicts keep insertion order
+        )
+        return XML_DECLARATION + '<sst xmlns="{}" uniqueCount="{}">{}</sst>'.format(
+            MAIN_NS, len(self.shared_strings), strings
+        )
+
+    def _get_styles_xml(self):
+        custom_formats = {}
+        cell_styles = []
+        for number_format, is_hyperlink in self.styles:
+            format_id = numbers.BUILTIN_FORMATS_REVERSE.get(number_format)
+            if format_id is None:
+                if number_format not in custom_formats:
+                    custom_formats[number_format] = FIRST_CUSTOM_NUMBER_FORMAT_ID + len(custom_formats)
+                format_id = custom_formats[number_format]
+            font_id = 1 if is_hyperlink else 0
+            cell_styles.append(
+                '<xf numFmtId="{id}" fontId="{font}" fillId="0" borderId="0" xfId="{font}"'
+                ' applyNumberFormat="1" applyFont="1"/>'.format(id=format_id, font=font_id)
+            )
+        number_formats = ''.join(
+            '<numFmt numFmtId="{}" formatCode={}/>'.format(format_id, quoteattr(number_format))
+            for number_format, format_id in custom_formats.items()
+        )
+        if number_formats:
+            number_formats = '<numFmts count="{}">{}</numFmts>'.format(len(custom_formats), number_formats)
+        return XML_DECLARATION + (
+            '<styleSheet xmlns="{ns}">'
+            '{formats}'
+            '<fonts count="2">'
+            '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+            '<font><u/><sz val="11"/><color rgb="FF0563C1"/><name val="Calibri"/><family val="2"/></font>'
+            '</fonts>'
+            '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+            '<fill><patternFill patternType="gray125"/></fill></fills>'
+            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+            '<cellStyleXfs count="2">'
+            '<xf numFmtId="0" fontId="0" fillId="0" borderId="0"/>'
+            '<xf numFmtId="0" fontId="1" fillId="0" borderId="0"/>'
+            '</cellStyleXfs>'
+            '<cellXfs count="{style_count}">{styles}</cellXfs>'
+            '<cellStyles count="2">'
+            '<cellStyle name="Normal" xfId="0" builtinId="0"/>'
+            '<cellStyle name="Hyperlink" xfId="1" builtinId="8"/>'
+            '</cellStyles>'
+            '</styleSheet>'
+        ).format(
+            ns=MAIN_NS,
+            formats=number_formats,
+            style_count=len(cell_styles),
+            styles=''.join(cell_styles),
+        )
+
+    def _get_workbook_xml(self):
+        sheets = ''.join(
+            '<sheet name={name} sheetId="{number}" r:id="rId{number}"/>'.format(
+                name=quoteattr(sheet.title), number=sheet.number
+            )
+            for sheet in self.sheets
+        )
+        return XML_DECLARATION + '<workbook xmlns="{}" xmlns:r="{}"><sheets>{}</sheets></workbook>'.format(
+            MAIN_NS, RELATIONSHIPS_NS, sheets
+        )
+
+    def _get_workbook_rels_xml(self):
+        sheet_type = RELATIONSHIPS_NS + '/worksheet'
+        relationships = [
+            ('rId{}'.format(sheet.number), sheet_type, _sheet_path(sheet.number, 'worksheets'))
+            for sheet in self.sheets
+        ]
+        count = len(self.sheets)
+        relationships.append(('rId{}'.format(count + 1), RELATIONSHIPS_NS + '/styles', 'styles.xml'))
+        relationships.append(('rId{}'.format(count + 2), RELATIONSHIPS_NS + '/sharedStrings', 'sharedStrings.xml'))
+        return _get_relationships_xml(relationships)
+
+    def _get_content_types_xml(self):
+        content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.{}+xml'
+        overrides = [('/xl/workbook.xml', content_type.format('sheet.main'))]
+        overrides.extend(
+            ('/' + _sheet_path(sheet.number), content_type.format('worksheet'))
+            for sheet in self.sheets
+        )
+        overrides.append(('/xl/styles.xml', content_type.format('styles')))
+        overrides.append(('/xl/sharedStrings.xml', content_type.format('sharedStrings')))
+        return XML_DECLARATION + (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '{}</Types>'
+        ).format(''.join(
+            '<Override PartName="{}" ContentType="{}"/>'.format(part, type_)
+            for part, type_ in overrides
+        ))
+
+
+class XlsxSheetWriter(object):
+
+    def __init__(self, workbook, number, title, stream):
+        self.workbook = workbook
+        self.number = number
+        self.title = title
+        self.row_count = 0
+        self.hyperlink_count = 0
+        # the sheet is either written directly into the zip file or spooled to a temporary file
+        self.is_zip_entry = number == 1
+        self._stream = stream
+        self._buffer = []
+        self._buffer_size = 0
+        self._hyperlinks = None
+        self._hyperlink_relationships = None
+        self._write(SHEET_HEADER)
+
+    def write_row(self, cells):
+        """
+        :param cells: list of ``(value, number_format, is_hyperlink)``
+        """
+        self.row_count += 1
+        row_xml = ['<row r="{}">'.format(self.row_count)]
+        for column, (value, number_format, is_hyperlink) in enumerate(cells, 1):
+            ref = '{}{}'.format(get_column_letter(column), self.row_count)
+            is_date = isinstance(value, (datetime.date, datetime.time))
+            if is_date and number_format in (None, numbers.FORMAT_GENERAL):
+                number_format = _get_default_date_format(value)
+            is_hyperlink = is_hyperlink and self._add_hyperlink(ref, value)
+            row_xml.append(self._get_cell_xml(ref, value, self.workbook.get_style(number_format, is_hyperlink)))
+        row_xml.append('</row>')
+        self._write(''.join(row_xml))
+
+    def _get_cell_xml(self, ref, value, style):
+        style_attr = ' s="{}"'.format(style) if style else ''
+        if value is None or value == '':
+            return '<c r="{}"{}/>'.format(ref, style_attr) if style else ''
+        if isinstance(value, bool):
+            return '<c r="{}"{} t="b"><v>{}</v></c>'.format(ref, style_attr, int(value))
+        if isinstance(value, int) or (isinstance(value, (float, Decimal)) and math.isfinite(value)):
+            return '<c r="{}"{}><v>{}</v></c>'.format(ref, style_attr, value)
+        if isinstance(value, (datetime.date, datetime.time)):
+            return '<c r="{}"{}><v>{}</v></c>'.format(ref, style_attr, _to_excel_serial(value))
+
+        value = _get_cell_string(value)
+        index = self.workbook.get_shared_string(value)
+        if index is not None:
+            return '<c r="{}"{} t="s"><v>{}</v></c>'.format(ref, style_attr, index)
+        return '<c r="{}"{} t="inlineStr"><is><t xml:space="preserve">{}</t></is></c>'.format(
+            ref, style_attr, escape(value)
+        )
+
+    def _add_hyperlink(self, ref, value):
+        if not isinstance(value, str) or not value or self.hyperlink_count >= MAX_HYPERLINKS_PER_SHEET:
+            return False
+        if self._hyperlinks is None:
+            self._hyperlinks = tempfile.TemporaryFile()
+            self._hyperlink_relationships = tempfile.TemporaryFile()
+        self.hyperlink_count += 1
+        rel_id = 'rId{}'.format(self.hyperlink_count)
+        self._hyperlinks.write('<hyperlink ref="{}" r:id="{}"/>'.format(ref, rel_id).encode('utf-8'))
+        self._hyperlink_relationships.write(
+            '<Relationship Id="{}" Type="{}" Target={} TargetMode="External"/>'.format(
+                rel_id, HYPERLINK_REL_TYPE, quoteattr(_get_cell_string(value))
+            ).encode('utf-8')
+        )
+        return True
+
+    def _write(self, xml):
+        self._buffer.append(xml)
+        self._buffer_size += len(xml)
+        if self._buffer_size >= WRITE_BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._stream.write(''.join(self._buffer).encode('utf-8'))
+        self._buffer = []
+        self._buffer_size = 0
+
+    def close(self):
+        self._write('</sheetData>')
+        if self._hyperlinks is not None:
+            self._write('<hyperlinks>')
+            self._flush()
+            self._hyperlinks.seek(0)
+            shutil.copyfileobj(self._hyperlinks, self._stream)
+            self._hyperlinks.close()
+            self._write('</hyperlinks>')
+        self._write('</worksheet>')
+        self._flush()
+
+        zip_file = self.workbook.zip_file
+        if self.is_zip_entry:
+            self._stream.close()
+        else:
+            self._stream.seek(0)
+            with zip_file.open(_sheet_path(self.number), 'w', force_zip64=True) as entry:
+                shutil.copyfileobj(self._stream, entry)
+            self._stream.close()
+
+        if self._hyperlink_relationships is not None:
+            path = 'xl/worksheets/_rels/sheet{}.xml.rels'.format(self.number)
+            with zip_file.open(path, 'w', force_zip64=True) as entry:
+                entry.write((XML_DECLARATION + '<Relationships xmlns="{}">'.format(
+                    PACKAGE_RELATIONSHIPS_NS)).encode('utf-8'))
+                self._hyperlink_relationships.seek(0)
+                shutil.copyfileobj(self._hyperlink_relationships, entry)
+                entry.write(b'</Relationships>')
+            self._hyperlink_relationships.close()
+
+
+def _sheet_path(number, folder='xl/worksheets'):
+    return '{}/sheet{}.xml'.format(folder, number)
+
+
+def _get_relationships_xml(relationships):
+    return XML_DECLARATION + '<Relationships xmlns="{}">{}</Relationships>'.format(
+        PACKAGE_RELATIONSHIPS_NS,
+        ''.join(
+            '<Relationship Id="{}" Type="{}" Target="{}"/>'.format(rel_id, type_, target)
+            for rel_id, type_, target in relationships
+        )
+    )
+
+
+def _get_cell_string(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    value = str(value)
+    return _illegal_xml_chars.sub('?', value[:MAX_CELL_LENGTH])
+
+
+def _get_default_date_format(value):
+    for type_, number_format in DEFAULT_DATE_FORMATS:
+        if isinstance(value, type_):
+            return number_format
+
+
+def _to_excel_serial(value):
+    if isinstance(value, datetime.datetime):
+        delta = value.replace(tzinfo=None) - EXCEL_EPOCH
+    elif isinstance(value, datetime.date):
+        delta = datetime.datetime.combine(value, datetime.time()) - EXCEL_EPOCH
+    else:
+        delta = datetime.datetime.combine(EXCEL_EPOCH, value.replace(tzinfo=None)) - EXCEL_EPOCH
+    return delta.days + delta.seconds / 86400 + delta.microseconds / 86400e6
@@ -1,4 +1,5 @@
 
 CHECKPOINT_FREQUENCY = 100
 CHECKPOINT_MIN_WAIT = 300
+CHUNK_MIN_WAIT = 30
 DEFAULT_PROCESSOR_CHUNK_SIZE = 10
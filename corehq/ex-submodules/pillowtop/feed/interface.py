@@ -143,6 +143,8 @@ class ChangeFeed(metaclass=ABCMeta):
     """
 
     sequence_format = 'text'
+    # set to true by feeds that implement ``defer_processed_offsets``
+    supports_deferred_offsets = False
 
     @abstractmethod
     def iter_changes(self, since, forever):
@@ -172,6 +174,22 @@ class ChangeFeed(metaclass=ABCMeta):
                  the last sequence ID that was processed for each topic.
         """
 
+    def defer_processed_offsets(self):
+        """
+        Stop treating changes as processed as soon as they are read from the feed.
+        Once this is called the caller is responsible for calling ``mark_processed``.
+        """
+        raise NotImplementedError(
+            '{} does not support deferred offset tracking'.format(self.__class__.__name__))
+
+    def mark_processed(self, offsets):
+        """
+        :param offsets: A dictionary of ``(topic, partition), offset integer`` pairs
+                        representing the last sequence ID that was processed for each topic.
+        """
+        raise NotImplementedError(
+            '{} does not support deferred offset tracking'.format(self.__class__.__name__))
+
     @abstractmethod
     def get_latest_offsets_as_checkpoint_value(self):
         """
@@ -1,9 +1,10 @@
 import sys
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from pillowtop.const import DEFAULT_PROCESSOR_CHUNK_SIZE
+from pillowtop.pillow.chunk_sizing import AdaptiveChunkSizer
 from pillowtop.run_pillowtop import start_pillows, start_pillow
 from pillowtop.utils import (
     get_all_pillow_instances,
@@ -78,6 +79,23 @@ class Command(BaseCommand):
             help="The process number of this pillow process. Should be between 0 and num-processes. "
                  "It's expected that there will only be one process for each number running at once",
         )
+        parser.add_argument(
+            '--pipelined',
+            action='store_true',
+            dest='pipelined',
+            default=False,
+            help="Process chunks on a worker per Kafka partition while the next chunk is being fetched. "
+                 "Only applies to pillows with batch processors, which must read from Kafka.",
+        )
+        parser.add_argument(
+            '--adaptive-chunk-size',
+            action='store_true',
+            dest='adaptive_chunk_size',
+            default=False,
+            help="Adjust the chunk size and flush deadline to observed processing times, "
+                 "starting from the processor chunk size of each pillow. "
+                 "Only applies to pillows with batch processors.",
+        )
 
     def handle(self, **options):
         run_all = options['run_all']
@@ -88,6 +106,8 @@ class Command(BaseCommand):
         num_processes = options['num_processes']
         process_number = options['process_number']
         processor_chunk_size = options['processor_chunk_size']
+        pipelined = options['pipelined']
+        adaptive_chunk_size = options['adaptive_chunk_size']
         assert 0 <= process_number < num_processes
         assert processor_chunk_size
         if list_all:
@@ -113,6 +133,10 @@ class Command(BaseCommand):
 
         elif not run_all and not pillow_key and pillow_name:
             pillow = get_pillow_by_name(pillow_name, num_processes=num_processes, process_num=process_number, processor_chunk_size=processor_chunk_size)
+            if pipelined:
+                set_pipelined([pillow])
+            if adaptive_chunk_size:
+                set_adaptive_chunk_size([pillow])
             start_pillow(pillow)
             sys.exit()
         elif list_checkpoints:
@@ -123,4 +147,34 @@ class Command(BaseCommand):
             print("\nNo command set, please see --help for runtime instructions")
             sys.exit()
 
-        start_pillows(pillows=[pillow_config.get_instance() for pillow_config in pillows_to_run])
+        pillows = [pillow_config.get_instance() for pillow_config in pillows_to_run]
+        if pipelined:
+            set_pipelined(pillows)
+        if adaptive_chunk_size:
+            set_adaptive_chunk_size(pillows)
+        start_pillows(pillows=pillows)
+
+
+def set_pipelined(pillows):
+    """Process the changes of pillows with batch processors in pipelined mode
+
+    Pipelined pillows only checkpoint the offsets of processed chunks, which
+    requires a change feed that supports deferred offset tracking (Kafka).
+    """
+    unsupported = [
+        pillow.get_name() for pillow in pillows
+        if pillow.batch_processors and not pillow.get_change_feed().supports_deferred_offsets
+    ]
+    if unsupported:
+        raise CommandError(
+            "--pipelined requires pillows that read from Kafka. These pillows do not: {}".format(
+                ", ".join(unsupported)))
+    for pillow in pillows:
+        pillow.pipelined = True
+
+
+def set_adaptive_chunk_size(pillows):
+    """Adjust the chunk size of pillows with batch processors to processing times"""
+    for pillow in pillows:
+        if pillow.batch_processors:
+            pillow.chunk_sizer = AdaptiveChunkSizer(pillow.processor_chunk_size)
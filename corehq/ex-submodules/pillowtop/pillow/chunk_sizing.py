@@ -0,0 +1,100 @@
+"""
+Adaptive chunk sizing for pillows with batch processors.
+
+By default a pillow processes chunks of ``processor_chunk_size`` changes and
+flushes partial chunks after ``CHUNK_MIN_WAIT`` seconds. An
+``AdaptiveChunkSizer`` set on ``PillowBase.chunk_sizer`` replaces both with
+values derived from the timings recorded for every processed chunk:
+
+  - the chunk size is scaled so that a chunk takes about
+    ``target_processing_seconds`` to process
+  - the flush deadline is scaled so that the lag of the oldest change in a
+    chunk stays around ``target_lag_seconds``
+
+Adjustments are limited to a factor of ``MAX_STEP`` per chunk to avoid
+oscillating on a single slow or fast chunk.
+"""
+from threading import Lock
+
+from pillowtop.const import CHUNK_MIN_WAIT
+
+MAX_STEP = 2.
+# largest chunk size, unless the initial chunk size is larger
+DEFAULT_MAX_CHUNK_SIZE = 1000
+# weight of the latest observation in the moving average of processing time per change
+SMOOTHING = 0.3
+
+
+class AdaptiveChunkSizer(object):
+
+    def __init__(self, initial_size, min_size=1, max_size=None,
+                 target_processing_seconds=5., target_lag_seconds=10.,
+                 min_wait_seconds=1., max_wait_seconds=CHUNK_MIN_WAIT):
+        """
+        :param initial_size: chunk size until the first chunk is recorded,
+        clamped to ``min_size`` and ``max_size``
+        :param max_size: defaults to ``DEFAULT_MAX_CHUNK_SIZE`` or
+        ``initial_size``, whichever is larger
+        """
+        if max_size is None:
+            max_size = max(DEFAULT_MAX_CHUNK_SIZE, initial_size)
+        assert min_size <= max_size, (min_size, max_size)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_processing_seconds = target_processing_seconds
+        self.target_lag_seconds = target_lag_seconds
+        self.min_wait_seconds = min_wait_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self._chunk_size = _clamp(initial_size, min_size, max_size)
+        self._wait_seconds = max_wait_seconds
+        self._seconds_per_change = None
+        self._lock = Lock()
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    @property
+    def wait_seconds(self):
+        return self._wait_seconds
+
+    def record_chunk(self, change_count, processing_time, max_change_lag):
+        """Update chunk size and flush deadline with the timings of a processed chunk
+
+        :param change_count: number of changes in the chunk
+        :param processing_time: seconds taken to process the chunk
+        :param max_change_lag: seconds between publishing the oldest change in the chunk and now
+        """
+        if not change_count:
+            return
+        with self._lock:
+            seconds_per_change = processing_time / change_count
+            if self._seconds_per_change is None:
+                self._seconds_per_change = seconds_per_change
+            else:
+                self._seconds_per_change = (
+                    SMOOTHING * seconds_per_change + (1 - SMOOTHING) * self._seconds_per_change
+                )
+
+            if self._seconds_per_change > 0:
+                ideal_size = self.target_processing_seconds / self._seconds_per_change
+                self._chunk_size = int(round(_clamp(
+                    _step_towards(self._chunk_size, ideal_size),
+                    self.min_size, self.max_size
+                )))
+
+            if max_change_lag > 0:
+                # time spent waiting for the chunk to fill up is what we control here
+                ideal_wait = self._wait_seconds * self.target_lag_seconds / max_change_lag
+                self._wait_seconds = _clamp(
+                    _step_towards(self._wait_seconds, ideal_wait),
+                    self.min_wait_seconds, self.max_wait_seconds
+                )
+
+
+def _step_towards(current, ideal):
+    return _clamp(ideal, current / MAX_STEP, current * MAX_STEP)
+
+
+def _clamp(value, lower, upper):
+    return max(lower, min(upper, value))
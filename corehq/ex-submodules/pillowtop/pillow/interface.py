@@ -13,7 +13,7 @@ from corehq.util.metrics import metrics_counter, metrics_gauge
 from corehq.util.timer import TimingContext
 from dimagi.utils.logging import notify_exception
 from kafka.common import TopicPartition
-from pillowtop.const import CHECKPOINT_MIN_WAIT
+from pillowtop.const import CHECKPOINT_MIN_WAIT, CHUNK_MIN_WAIT
 from pillowtop.dao.exceptions import DocumentMissingError
 from pillowtop.utils import force_seq_int
 from pillowtop.exceptions import PillowtopCheckpointReset
@@ -53,6 +53,12 @@ class PillowBase(metaclass=ABCMeta):
     retry_errors = True
     # this will be the batch size for processors that support batch processing
     processor_chunk_size = 0
+    # set to true to process chunks on per-partition workers while the next
+    # chunk is being read and prefetched (see pillowtop.pillow.pipeline)
+    pipelined = False
+    # set to an AdaptiveChunkSizer to adjust the chunk size and flush deadline
+    # to observed processing times (see pillowtop.pillow.chunk_sizing)
+    chunk_sizer = None
 
     @abstractproperty
     def pillow_id(self):
@@ -131,6 +137,16 @@ class PillowBase(metaclass=ABCMeta):
         else:
             return self.processors
 
+    def get_processor_chunk_size(self):
+        if self.chunk_sizer is not None:
+            return self.chunk_sizer.chunk_size
+        return self.processor_chunk_size
+
+    def get_chunk_wait_seconds(self):
+        if self.chunk_sizer is not None:
+            return self.chunk_sizer.wait_seconds
+        return CHUNK_MIN_WAIT
+
     def process_changes(self, since, forever):
         """
         Process changes on all the pillow processors.
@@ -139,8 +155,10 @@ class PillowBase(metaclass=ABCMeta):
             batch processors. If there are batch processors, checkpoint is updated
             at the end of the batch, otherwise is updated for every change.
         """
+        if self.pipelined and self.batch_processors:
+            return self._process_changes_pipelined(since, forever)
+
         context = PillowRuntimeContext(changes_seen=0)
-        min_wait_seconds = 30
 
         def process_offset_chunk(chunk, context):
             if not chunk:
@@ -160,8 +178,10 @@ class PillowBase(metaclass=ABCMeta):
                         # Queue and process in chunks for both batch
                         #   and serial processors
                         changes_chunk.append(change)
-                        chunk_full = len(changes_chunk) == self.processor_chunk_size
-                        time_elapsed = (datetime.utcnow() - last_process_time).seconds > min_wait_seconds
+                        chunk_full = len(changes_chunk) >= self.get_processor_chunk_size()
+                        time_elapsed = (
+                            (datetime.utcnow() - last_process_time).total_seconds() > self.get_chunk_wait_seconds()
+                        )
                         if chunk_full or time_elapsed:
                             last_process_time = datetime.utcnow()
                             self._batch_process_with_error_handling(changes_chunk)
@@ -181,6 +201,49 @@ class PillowBase(metaclass=ABCMeta):
             process_offset_chunk(changes_chunk, context)
             self.process_changes(since=self.get_last_checkpoint_sequence(), forever=forever)
 
+    def _process_changes_pipelined(self, since, forever):
+        """
+        Process changes in chunks on per-partition workers. The change feed is read
+        ahead of processing so the checkpoint is only moved to the offsets of chunks
+        that have been fully processed. See ``pillowtop.pillow.pipeline``.
+        """
+        from pillowtop.pillow.pipeline import ChangePipeline
+
+        context = PillowRuntimeContext(changes_seen=0)
+        change_feed = self.get_change_feed()
+        change_feed.defer_processed_offsets()
+        pipeline = ChangePipeline(self)
+        checkpoint_reset = False
+        try:
+            for change in change_feed.iter_changes(since=since or None, forever=forever):
+                context.changes_seen += 1
+                if change:
+                    pipeline.add(change)
+                else:
+                    pipeline.flush_expired()
+                    self._update_checkpoint(None, None)
+                pipeline.check_errors()
+                self._update_pipelined_checkpoint(pipeline, change_feed, context)
+        except PillowtopCheckpointReset:
+            checkpoint_reset = True
+        except Exception:
+            pipeline.close()
+            raise
+
+        # wait for chunks that are still in flight so their offsets get checkpointed
+        pipeline.flush()
+        pipeline.close()
+        pipeline.check_errors()
+        self._update_pipelined_checkpoint(pipeline, change_feed, context)
+        if checkpoint_reset:
+            self.process_changes(since=self.get_last_checkpoint_sequence(), forever=forever)
+
+    def _update_pipelined_checkpoint(self, pipeline, change_feed, context):
+        offsets = pipeline.tracker.pop_safe_offsets()
+        if offsets:
+            change_feed.mark_processed(offsets)
+            self._update_checkpoint(pipeline.last_change, context)
+
     def _batch_process_with_error_handling(self, changes_chunk):
         """
         Process given chunk in batch mode first on batch-processors
@@ -317,6 +380,11 @@ class PillowBase(metaclass=ABCMeta):
         metrics_counter('commcare.change_feed.processing_time.total', processing_time / change_count, tags=tags)
         metrics_counter('commcare.change_feed.processing_time.count', tags=tags)
 
+        if self.chunk_sizer is not None:
+            self.chunk_sizer.record_chunk(change_count, processing_time, max_change_lag)
+            metrics_gauge('commcare.change_feed.chunked.chunk_size', self.chunk_sizer.chunk_size, tags=tags)
+            metrics_gauge('commcare.change_feed.chunked.wait_seconds', self.chunk_sizer.wait_seconds, tags=tags)
+
     def _record_checkpoint_in_datadog(self):
         metrics_counter('commcare.change_feed.change_feed.checkpoint', tags={
             'pillow_name': self.get_name(),
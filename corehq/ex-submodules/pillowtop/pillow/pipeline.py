@@ -0,0 +1,200 @@
+"""
+Pipelined chunk processing for pillows.
+
+In the default mode a pillow reads a chunk of changes, fetches the documents,
+runs the processors and only then reads the next chunk. In pipelined mode
+(``PillowBase.pipelined``) the change feed is read on the main thread and each
+topic partition gets a dedicated worker:
+
+  - chunk documents are prefetched (``bulk_fetch_changes_docs``) on a separate
+    thread while the previous chunk of the same partition is being processed
+  - chunks of a partition are processed in order by the partition's worker
+  - each worker has a bounded queue so a slow partition applies back pressure
+    to the change feed instead of buffering without limit
+
+Since the feed is read ahead of processing, checkpoint offsets are tracked
+separately: a partition's offset only moves past a chunk once that chunk and
+every chunk read before it on the same partition have been processed.
+"""
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from queue import Queue
+from threading import Lock, Thread
+
+from pillowtop.logger import pillow_logging
+from pillowtop.utils import bulk_fetch_changes_docs
+
+DEFAULT_MAX_PENDING_CHUNKS = 2
+
+
+def get_partition_key(change):
+    return change.topic, change.partition
+
+
+class ChunkOffsetTracker(object):
+    """Keeps track of chunks that are in flight and the offsets that are safe to checkpoint"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._chunk_ids = itertools.count()
+        # partition key -> OrderedDict(chunk_id -> [max offset, is_done])
+        self._pending = {}
+        self._safe_offsets = {}
+        self._updated = False
+
+    def add_chunk(self, key, changes):
+        with self._lock:
+            chunk_id = next(self._chunk_ids)
+            offset = max(change.sequence_id for change in changes)
+            self._pending.setdefault(key, OrderedDict())[chunk_id] = [offset, False]
+            return chunk_id
+
+    def chunk_done(self, key, chunk_id):
+        with self._lock:
+            chunks = self._pending[key]
+            chunks[chunk_id][1] = True
+            while chunks:
+                first_id = next(iter(chunks))
+                offset, is_done = chunks[first_id]
+                if not is_done:
+                    break
+                del chunks[first_id]
+                self._safe_offsets[key] = offset
+                self._updated = True
+
+    @property
+    def pending_count(self):
+        with self._lock:
+            return sum(len(chunks) for chunks in self._pending.values())
+
+    def pop_safe_offsets(self):
+        """
+        :return: dict of ``(topic, partition): offset`` for the last change of every partition
+                 that is fully processed, or ``None`` if nothing has completed since the last call
+        """
+        with self._lock:
+            if not self._updated:
+                return None
+            self._updated = False
+            return dict(self._safe_offsets)
+
+
+class PartitionWorker(object):
+    """Processes the chunks of a single partition in order on a dedicated thread"""
+
+    def __init__(self, pillow, key, tracker, max_pending_chunks):
+        self.pillow = pillow
+        self.key = key
+        self.tracker = tracker
+        self.error = None
+        self._queue = Queue(maxsize=max_pending_chunks)
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        self._thread = Thread(
+            target=self._run, name='pillow-{}-{}'.format(pillow.get_name(), key), daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, changes):
+        """Queue a chunk for processing. Blocks while the worker's queue is full."""
+        chunk_id = self.tracker.add_chunk(self.key, changes)
+        prefetch = self._prefetcher.submit(prefetch_changes_docs, changes)
+        self._queue.put((chunk_id, changes, prefetch))
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._prefetcher.shutdown()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                # leave remaining chunks unprocessed so the checkpoint doesn't move past them
+                continue
+            chunk_id, changes, prefetch = item
+            try:
+                prefetch.result()
+                self.pillow._batch_process_with_error_handling(changes)
+            except Exception as e:
+                pillow_logging.exception("[%s] Error in pipelined worker for %s", self.pillow.get_name(), self.key)
+                self.error = e
+            else:
+                self.tracker.chunk_done(self.key, chunk_id)
+
+
+def prefetch_changes_docs(changes):
+    """Populate the documents of the changes so that the processors don't need to fetch them.
+
+    Errors are ignored here: changes that could not be fetched are fetched
+    again (and their errors handled) by the processors.
+    """
+    to_fetch = [
+        change for change in changes
+        if change.document_store is not None and change.metadata is not None and not change.deleted
+    ]
+    if not to_fetch:
+        return
+    try:
+        bulk_fetch_changes_docs(to_fetch)
+    except Exception:
+        pillow_logging.exception("Error prefetching documents for chunk")
+
+
+class ChangePipeline(object):
+    """Groups changes into per-partition chunks and dispatches them to the partition workers"""
+
+    def __init__(self, pillow, max_pending_chunks=DEFAULT_MAX_PENDING_CHUNKS):
+        self.pillow = pillow
+        self.max_pending_chunks = max_pending_chunks
+        self.tracker = ChunkOffsetTracker()
+        self._workers = {}
+        self._chunks = {}
+        self._chunk_started = {}
+        self.last_change = None
+
+    def add(self, change):
+        key = get_partition_key(change)
+        chunk = self._chunks.setdefault(key, [])
+        if not chunk:
+            self._chunk_started[key] = datetime.utcnow()
+        chunk.append(change)
+        self.last_change = change
+        if len(chunk) >= self.pillow.get_processor_chunk_size():
+            self._submit(key)
+        self.flush_expired()
+
+    def flush_expired(self):
+        now = datetime.utcnow()
+        max_wait_seconds = self.pillow.get_chunk_wait_seconds()
+        for key, chunk in list(self._chunks.items()):
+            if chunk and (now - self._chunk_started[key]).total_seconds() > max_wait_seconds:
+                self._submit(key)
+
+    def flush(self):
+        for key, chunk in list(self._chunks.items()):
+            if chunk:
+                self._submit(key)
+
+    def check_errors(self):
+        for worker in self._workers.values():
+            if worker.error is not None:
+                raise worker.error
+
+    def close(self):
+        """Wait for all queued chunks to be processed and stop the workers"""
+        for worker in self._workers.values():
+            worker.stop()
+        self._workers = {}
+
+    def _submit(self, key):
+        changes = self._chunks.pop(key)
+        worker = self._workers.get(key)
+        if worker is None:
+            worker = self._workers[key] = PartitionWorker(
+                self.pillow, key, self.tracker, self.max_pending_chunks
+            )
+        worker.submit(changes)
@@ -11,6 +11,10 @@ from corehq.util.es.elasticsearch import (
     RequestError,
 )
 from corehq.util.es.interface import ElasticsearchInterface
+from corehq.util.es.query_cache import (
+    bump_index_generation,
+    is_query_cache_enabled,
+)
 from corehq.util.metrics import metrics_histogram_timer
 
 from pillowtop.exceptions import BulkDocException, PillowtopIndexingError
@@ -65,6 +69,7 @@ class ElasticProcessor(PillowProcessor):
     def process_change(self, change):
         if change.deleted and change.id:
             self._delete_doc_if_exists(change.id)
+            self._invalidate_query_cache([change])
             return
 
         with self._datadog_timing('extract'):
@@ -79,6 +84,7 @@ class ElasticProcessor(PillowProcessor):
 
             if doc.get('doc_type') is not None and doc['doc_type'].endswith("-Deleted"):
                 self._delete_doc_if_exists(change.id)
+                self._invalidate_query_cache([change])
                 return
 
             # prepare doc for es
@@ -95,6 +101,22 @@ class ElasticProcessor(PillowProcessor):
                 data=doc_ready_to_save,
                 update=self._doc_exists(change.id),
             )
+        self._invalidate_query_cache([change])
+
+    def _invalidate_query_cache(self, changes):
+        """Invalidate cached ES query results of the domains of the changes.
+        See ``corehq.util.es.query_cache``"""
+        if not is_query_cache_enabled(self.index_info.index):
+            return
+        domains = set()
+        for change in changes:
+            if change.metadata is not None:
+                domains.add(change.metadata.domain)
+            elif change.document:
+                domains.add(change.document.get('domain'))
+        domains.discard(None)
+        if domains:
+            bump_index_generation(self.index_info.index, domains)
 
     def _doc_exists(self, doc_id):
         return self.elasticsearch.exists(self.index_info.index, self.index_info.type, doc_id)
@@ -154,6 +176,7 @@ class BulkElasticProcessor(ElasticProcessor, BulkPillowProcessor):
                 (change, e) for change in changes_to_process.values()
             ])
         else:
+            self._invalidate_query_cache(changes_to_process.values())
             for change_id, error_msg in get_errors_with_ids(errors):
                 error_changes.append((changes_to_process[change_id], BulkDocException(error_msg)))
         return retry_changes, error_changes
@@ -19,6 +19,7 @@ from corehq.util.argparse_types import date_type
 from corehq.util.doc_processor.interface import (
     BaseDocProcessor,
     BulkDocProcessor,
+    PipelinedBulkDocProcessor,
 )
 
 MAX_TRIES = 3
@@ -91,6 +92,17 @@ class ReindexerFactory(metaclass=ABCMeta):
             help='Number of docs to process at a time'
         )
 
+    @staticmethod
+    def pipelined_reindexer_args(parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            action='store',
+            dest='workers',
+            default=1,
+            help='Number of chunks of docs to process concurrently'
+        )
+
     @staticmethod
     def limit_db_args(parser):
         parser.add_argument(
@@ -235,8 +247,9 @@ class ResumableBulkElasticPillowReindexer(Reindexer):
 
     def __init__(self, doc_provider, elasticsearch, index_info,
                  doc_filter=None, doc_transform=None, chunk_size=1000, pillow=None,
-                 reset=False, in_place=False):
+                 reset=False, in_place=False, workers=1):
         self.reset = reset
+        self.workers = workers
         self.in_place = in_place
         self.doc_provider = doc_provider
         self.es = elasticsearch
@@ -254,12 +267,21 @@ class ResumableBulkElasticPillowReindexer(Reindexer):
         if not self.es.indices.exists(self.index_info.index):
             self.reset = True  # if the index doesn't exist always reset the processing
 
-        processor = BulkDocProcessor(
-            self.doc_provider,
-            self.doc_processor,
-            reset=self.reset,
-            chunk_size=self.chunk_size,
-        )
+        if self.workers > 1:
+            processor = PipelinedBulkDocProcessor(
+                self.doc_provider,
+                self.doc_processor,
+                reset=self.reset,
+                chunk_size=self.chunk_size,
+                workers=self.workers,
+            )
+        else:
+            processor = BulkDocProcessor(
+                self.doc_provider,
+                self.doc_processor,
+                reset=self.reset,
+                chunk_size=self.chunk_size,
+            )
 
         if not self.in_place and (self.reset or not processor.has_started()):
             _prepare_index_for_reindex(self.es, self.index_info)
@@ -0,0 +1,52 @@
+from django.test import SimpleTestCase
+
+from pillowtop.pillow.chunk_sizing import AdaptiveChunkSizer
+
+
+class AdaptiveChunkSizerTest(SimpleTestCase):
+
+    def test_grows_when_chunks_are_fast(self):
+        sizer = AdaptiveChunkSizer(10, target_processing_seconds=5)
+        sizer.record_chunk(10, processing_time=0.1, max_change_lag=1)
+        self.assertEqual(sizer.chunk_size, 20)
+        for _ in range(10):
+            sizer.record_chunk(sizer.chunk_size, processing_time=0.01 * sizer.chunk_size, max_change_lag=1)
+        self.assertEqual(sizer.chunk_size, 500)
+
+    def test_shrinks_when_chunks_are_slow(self):
+        sizer = AdaptiveChunkSizer(100, target_processing_seconds=5)
+        sizer.record_chunk(100, processing_time=100, max_change_lag=1)
+        self.assertEqual(sizer.chunk_size, 50)
+        for _ in range(10):
+            sizer.record_chunk(sizer.chunk_size, processing_time=sizer.chunk_size, max_change_lag=1)
+        self.assertEqual(sizer.chunk_size, 5)
+
+    def test_respects_limits(self):
+        sizer = AdaptiveChunkSizer(10, min_size=5, max_size=15)
+        for _ in range(5):
+            sizer.record_chunk(10, processing_time=0.001, max_change_lag=1)
+        self.assertEqual(sizer.chunk_size, 15)
+        for _ in range(5):
+            sizer.record_chunk(10, processing_time=1000, max_change_lag=1)
+        self.assertEqual(sizer.chunk_size, 5)
+
+    def test_default_max_size_allows_large_initial_size(self):
+        sizer = AdaptiveChunkSizer(2000)
+        self.assertEqual(sizer.chunk_size, 2000)
+        self.assertEqual(sizer.max_size, 2000)
+        self.assertEqual(AdaptiveChunkSizer(10).max_size, 1000)
+
+    def test_initial_size_is_clamped(self):
+        self.assertEqual(AdaptiveChunkSizer(2000, max_size=500).chunk_size, 500)
+        self.assertEqual(AdaptiveChunkSizer(1, min_size=5).chunk_size, 5)
+
+    def test_wait_follows_change_lag(self):
+        sizer = AdaptiveChunkSizer(10, target_lag_seconds=10, min_wait_seconds=1, max_wait_seconds=30)
+        self.assertEqual(sizer.wait_seconds, 30)
+        sizer.record_chunk(10, processing_time=1, max_change_lag=40)
+        self.assertEqual(sizer.wait_seconds, 15)
+        for _ in range(10):
+            sizer.record_chunk(10, processing_time=1, max_change_lag=40)
+        self.assertEqual(sizer.wait_seconds, 1)
+        sizer.record_chunk(10, processing_time=1, max_change_lag=2)
+        self.assertEqual(sizer.wait_seconds, 2)
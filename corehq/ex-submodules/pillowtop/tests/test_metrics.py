@@ -4,6 +4,7 @@ from django.test import SimpleTestCase, override_settings
 
 from corehq.util.metrics.tests.utils import capture_metrics
 from pillowtop.feed.interface import Change, ChangeMeta
+from pillowtop.pillow.chunk_sizing import AdaptiveChunkSizer
 from pillowtop.tests.test_import_pillows import FakePillow
 
 
@@ -78,6 +79,14 @@ class TestPillowMetrics(SimpleTestCase):
         # extra 1 for the change with a different doc type
         self.assertEqual(metrics.sum('commcare.change_feed.changes.count', pillow_name='fake pillow'), 4)
 
+    def test_chunk_size_metrics(self):
+        pillow = FakePillow()
+        pillow.chunk_sizer = AdaptiveChunkSizer(10)
+        with capture_metrics() as metrics:
+            pillow._record_datadog_metrics([self._get_change() for i in range(10)], 0.1)
+        self.assertEqual(metrics.sum('commcare.change_feed.chunked.chunk_size', pillow_name='fake pillow'), 20)
+        self.assertIn('commcare.change_feed.chunked.wait_seconds', metrics)
+
     def _get_change(self, topic='case', doc_type='CommCareCase', doc_subtype='person'):
         doc_id = uuid.uuid4().hex
         return Change(
@@ -0,0 +1,160 @@
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from mock import Mock
+
+from pillowtop.feed.interface import Change, ChangeFeed, ChangeMeta
+from pillowtop.feed.mock import MockChangeFeed
+from pillowtop.management.commands.run_ptop import (
+    set_adaptive_chunk_size,
+    set_pipelined,
+)
+from pillowtop.pillow.interface import ConstructedPillow
+from pillowtop.pillow.pipeline import ChunkOffsetTracker
+from pillowtop.processors.interface import BulkPillowProcessor
+
+
+class ChunkOffsetTrackerTest(SimpleTestCase):
+
+    def test_offsets_wait_for_earlier_chunks(self):
+        tracker = ChunkOffsetTracker()
+        first = tracker.add_chunk(('case', 0), [_change(0), _change(1)])
+        second = tracker.add_chunk(('case', 0), [_change(2), _change(3)])
+        self.assertIsNone(tracker.pop_safe_offsets())
+
+        tracker.chunk_done(('case', 0), second)
+        self.assertIsNone(tracker.pop_safe_offsets())
+
+        tracker.chunk_done(('case', 0), first)
+        self.assertEqual(tracker.pop_safe_offsets(), {('case', 0): 3})
+        self.assertIsNone(tracker.pop_safe_offsets())
+        self.assertEqual(tracker.pending_count, 0)
+
+    def test_partitions_are_independent(self):
+        tracker = ChunkOffsetTracker()
+        tracker.add_chunk(('case', 0), [_change(5)])
+        chunk = tracker.add_chunk(('case', 1), [_change(7)])
+        tracker.chunk_done(('case', 1), chunk)
+        self.assertEqual(tracker.pop_safe_offsets(), {('case', 1): 7})
+
+
+class PipelinedPillowTest(SimpleTestCase):
+
+    def test_process_changes(self):
+        changes = [_change(offset, partition) for partition in (0, 1) for offset in range(10)]
+        processor = RecordingProcessor()
+        feed = DeferredOffsetFeed(changes)
+        event_handler = Mock(update_checkpoint=Mock(return_value=False))
+        pillow = ConstructedPillow(
+            name='pipelined', checkpoint=Mock(), change_feed=feed, processor=processor,
+            change_processed_event_handler=event_handler, processor_chunk_size=3,
+        )
+        pillow.pipelined = True
+        pillow.process_changes(since=None, forever=False)
+
+        self.assertTrue(feed.deferred)
+        self.assertEqual(len(processor.chunks), 8)
+        for partition in (0, 1):
+            processed = [
+                change.sequence_id
+                for chunk in processor.chunks
+                for change in chunk
+                if change.partition == partition
+            ]
+            self.assertEqual(processed, list(range(10)))
+        self.assertEqual(feed.get_processed_offsets(), {('case', 0): 9, ('case', 1): 9})
+        self.assertTrue(event_handler.update_checkpoint.called)
+
+    def test_not_pipelined_without_batch_processors(self):
+        pillow = ConstructedPillow(
+            name='serial', checkpoint=Mock(), change_feed=DeferredOffsetFeed([]),
+            processor=Mock(supports_batch_processing=False), processor_chunk_size=0,
+        )
+        pillow.pipelined = True
+        pillow._process_changes_pipelined = Mock()
+        pillow.process_changes(since=None, forever=False)
+        self.assertFalse(pillow._process_changes_pipelined.called)
+
+
+class SetPipelinedTest(SimpleTestCase):
+
+    def test_set_pipelined(self):
+        pillows = [
+            _pillow('batch', DeferredOffsetFeed([]), RecordingProcessor(), processor_chunk_size=3),
+            _pillow('serial', MockChangeFeed([]), Mock(supports_batch_processing=False)),
+        ]
+        set_pipelined(pillows)
+        self.assertEqual([pillow.pipelined for pillow in pillows], [True, True])
+
+    def test_feed_without_deferred_offsets(self):
+        pillow = _pillow('batch', MockChangeFeed([]), RecordingProcessor(), processor_chunk_size=3)
+        with self.assertRaisesRegex(CommandError, 'batch'):
+            set_pipelined([pillow])
+        self.assertFalse(pillow.pipelined)
+
+
+class SetAdaptiveChunkSizeTest(SimpleTestCase):
+
+    def test_set_adaptive_chunk_size(self):
+        batch = _pillow('batch', DeferredOffsetFeed([]), RecordingProcessor(), processor_chunk_size=3)
+        serial = _pillow('serial', MockChangeFeed([]), Mock(supports_batch_processing=False))
+        set_adaptive_chunk_size([batch, serial])
+        self.assertEqual(batch.chunk_sizer.chunk_size, 3)
+        self.assertIsNone(serial.chunk_sizer)
+
+
+class RecordingProcessor(BulkPillowProcessor):
+
+    def __init__(self):
+        self.chunks = []
+
+    def process_change(self, change):
+        raise AssertionError('unexpected serial processing')
+
+    def process_changes_chunk(self, changes_chunk):
+        self.chunks.append(changes_chunk)
+        return [], []
+
+
+class DeferredOffsetFeed(ChangeFeed):
+    supports_deferred_offsets = True
+
+    def __init__(self, changes):
+        self._changes = changes
+        self._processed = {}
+        self.deferred = False
+
+    def iter_changes(self, since, forever):
+        yield from self._changes
+
+    def get_latest_offsets(self):
+        return {}
+
+    def get_latest_offsets_as_checkpoint_value(self):
+        return {}
+
+    def get_processed_offsets(self):
+        return self._processed
+
+    def defer_processed_offsets(self):
+        self.deferred = True
+
+    def mark_processed(self, offsets):
+        self._processed.update(offsets)
+
+
+def _pillow(name, feed, processor, processor_chunk_size=0):
+    return ConstructedPillow(
+        name=name, checkpoint=Mock(), change_feed=feed, processor=processor,
+        processor_chunk_size=processor_chunk_size,
+    )
+
+
+def _change(offset, partition=0):
+    return Change(
+        id='doc-{}-{}'.format(partition, offset),
+        sequence_id=offset,
+        metadata=ChangeMeta(document_id='doc', data_source_type='sql', data_source_name='case'),
+        topic='case',
+        partition=partition,
+    )
@@ -1140,6 +1140,17 @@ class CaseAccessorSQL(AbstractCaseAccessor):
             [domain, external_id, case_type]
         ))
 
+    @staticmethod
+    def get_cases_by_external_ids(domain, external_ids, case_type=None):
+        q_expression = Q(domain=domain, external_id__in=list(external_ids), deleted=False)
+        if case_type:
+            q_expression &= Q(type=case_type)
+        return [
+            case
+            for db_name in get_db_aliases_for_partitioned_query()
+            for case in CommCareCaseSQL.objects.using(db_name).filter(q_expression)
+        ]
+
     @staticmethod
     def get_case_by_domain_hq_user_id(domain, user_id, case_type):
         try:
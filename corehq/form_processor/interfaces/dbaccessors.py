@@ -363,6 +363,11 @@ class AbstractCaseAccessor(metaclass=ABCMeta):
     def get_cases_by_external_id(domain, external_id, case_type=None):
         raise NotImplementedError
 
+    @staticmethod
+    @abstractmethod
+    def get_cases_by_external_ids(domain, external_ids, case_type=None):
+        raise NotImplementedError
+
     @staticmethod
     @abstractmethod
     def soft_delete_cases(domain, case_ids, deletion_date=None, deletion_id=None):
@@ -468,8 +473,8 @@ class CaseAccessors(object):
     def get_case_ids_modified_with_owner_since(self, owner_id, reference_date):
         return self.db_accessor.get_case_ids_modified_with_owner_since(self.domain, owner_id, reference_date)
 
-    def get_extension_case_ids(self, case_ids):
-        return self.db_accessor.get_extension_case_ids(self.domain, case_ids)
+    def get_extension_case_ids(self, case_ids, include_closed=True):
+        return self.db_accessor.get_extension_case_ids(self.domain, case_ids, include_closed)
 
     def get_indexed_case_ids(self, case_ids):
         return self.db_accessor.get_indexed_case_ids(self.domain, case_ids)
@@ -495,6 +500,9 @@ class CaseAccessors(object):
     def get_cases_by_external_id(self, external_id, case_type=None):
         return self.db_accessor.get_cases_by_external_id(self.domain, external_id, case_type)
 
+    def get_cases_by_external_ids(self, external_ids, case_type=None):
+        return self.db_accessor.get_cases_by_external_ids(self.domain, external_ids, case_type)
+
     def soft_delete_cases(self, case_ids, deletion_date=None, deletion_id=None):
         return self.db_accessor.soft_delete_cases(self.domain, case_ids, deletion_date, deletion_id)
 
@@ -5,6 +5,7 @@ from django.db.models import Q
 from corehq.sql_db.util import (
     get_db_aliases_for_partitioned_query,
     paginate_query_across_partitioned_databases,
+    split_list_by_db_partition,
 )
 from corehq.util.datadog.utils import load_counter_for_model
 
@@ -260,6 +261,24 @@ def get_case_timed_schedule_instances_for_schedule_id(case_id, schedule_id):
     )
 
 
+def delete_case_alert_schedule_instances_for_schedule_id(case_ids, schedule_id):
+    from corehq.messaging.scheduling.scheduling_partitioned.models import CaseAlertScheduleInstance
+    for db_name, db_case_ids in split_list_by_db_partition(case_ids):
+        CaseAlertScheduleInstance.objects.using(db_name).filter(
+            case_id__in=db_case_ids,
+            alert_schedule_id=schedule_id
+        ).delete()
+
+
+def delete_case_timed_schedule_instances_for_schedule_id(case_ids, schedule_id):
+    from corehq.messaging.scheduling.scheduling_partitioned.models import CaseTimedScheduleInstance
+    for db_name, db_case_ids in split_list_by_db_partition(case_ids):
+        CaseTimedScheduleInstance.objects.using(db_name).filter(
+            case_id__in=db_case_ids,
+            timed_schedule_id=schedule_id
+        ).delete()
+
+
 def get_case_alert_schedule_instances_for_schedule(case_id, schedule):
     from corehq.messaging.scheduling.models import AlertSchedule
 
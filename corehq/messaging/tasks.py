@@ -10,12 +10,20 @@ from corehq.messaging.util import MessagingRuleProgressHelper, use_phone_entries
 from corehq.sql_db.util import paginate_query_across_partitioned_databases
 from corehq.util.celery_utils import no_result_task
 from corehq.util.datadog.utils import case_load_counter
+from dimagi.utils.chunked import chunked
 from dimagi.utils.couch import CriticalSection
+from dimagi.utils.logging import notify_exception
 from django.conf import settings
 from django.db.models import Q
 from django.db import transaction
 
 
+# Number of cases synced by each sync_cases_for_messaging_rule task
+MESSAGING_RULE_CASE_CHUNK_SIZE = 2000
+# Number of cases loaded, locked and run against the rule at a time
+MESSAGING_RULE_CASE_BATCH_SIZE = 100
+
+
 def get_sync_key(case_id):
     return 'sync-case-for-messaging-%s' % case_id
 
@@ -40,6 +48,17 @@ def sync_case_for_messaging_rule(self, domain, case_id, rule_id):
         self.retry(exc=e)
 
 
+@no_result_task(serializer='pickle', queue=settings.CELERY_REMINDER_CASE_UPDATE_QUEUE, acks_late=True)
+def sync_cases_for_messaging_rule(domain, case_ids, rule_id):
+    for batch in chunked(case_ids, MESSAGING_RULE_CASE_BATCH_SIZE, list):
+        try:
+            _sync_cases_for_messaging_rule(domain, batch, rule_id)
+        except Exception:
+            # sync the cases of the batch one at a time so that a failing
+            # case does not keep the others from being synced
+            _sync_cases_for_messaging_rule_one_at_a_time(domain, batch, rule_id)
+
+
 def _sync_case_for_messaging(domain, case_id):
     try:
         case = CaseAccessors(domain).get_case(case_id)
@@ -83,6 +102,34 @@ def _sync_case_for_messaging_rule(domain, case_id, rule_id):
         MessagingRuleProgressHelper(rule_id).increment_current_case_count()
 
 
+def _sync_cases_for_messaging_rule(domain, case_ids, rule_id):
+    rule = _get_cached_rule(domain, rule_id)
+    if not rule:
+        return
+
+    # sort the keys to avoid deadlocks with other tasks locking many cases
+    with CriticalSection(sorted(get_sync_key(case_id) for case_id in case_ids), timeout=5 * 60):
+        cases = CaseAccessors(domain).get_cases(case_ids)
+        case_load_counter("messaging_rule_sync", domain)(len(cases))
+        rule.run_rule_for_cases(cases, utcnow())
+    MessagingRuleProgressHelper(rule_id).increase_current_case_count(len(case_ids))
+
+
+def _sync_cases_for_messaging_rule_one_at_a_time(domain, case_ids, rule_id):
+    for case_id in case_ids:
+        try:
+            with CriticalSection([get_sync_key(case_id)], timeout=5 * 60):
+                _sync_case_for_messaging_rule(domain, case_id, rule_id)
+        except Exception:
+            notify_exception(
+                None,
+                message="Could not sync case for messaging rule",
+                details={'domain': domain, 'case_id': case_id, 'rule_id': rule_id},
+            )
+            # retry the case in its own task
+            sync_case_for_messaging_rule.delay(domain, case_id, rule_id)
+
+
 def initiate_messaging_rule_run(rule):
     if not rule.active:
         return
@@ -120,20 +167,15 @@ def run_messaging_rule(domain, rule_id):
     if not rule:
         return
 
-    incr = 0
     progress_helper = MessagingRuleProgressHelper(rule_id)
     progress_helper.set_initial_progress()
 
-    for case_id in get_case_ids_for_messaging_rule(domain, rule.case_type):
-        sync_case_for_messaging_rule.delay(domain, case_id, rule_id)
-        incr += 1
-        if incr >= 1000:
-            progress_helper.increase_total_case_count(incr)
-            incr = 0
-            if progress_helper.is_canceled():
-                break
-
-    progress_helper.increase_total_case_count(incr)
+    case_ids = get_case_ids_for_messaging_rule(domain, rule.case_type)
+    for chunk in chunked(case_ids, MESSAGING_RULE_CASE_CHUNK_SIZE, list):
+        sync_cases_for_messaging_rule.delay(domain, chunk, rule_id)
+        progress_helper.increase_total_case_count(len(chunk))
+        if progress_helper.is_canceled():
+            break
 
     # By putting this task last in the queue, the rule should be marked
     # complete at about the time that the last tasks are finishing up.
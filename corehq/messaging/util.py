@@ -60,6 +60,14 @@ class MessagingRuleProgressHelper(object):
             if fail_hard:
                 raise
 
+    def increase_current_case_count(self, value, fail_hard=False):
+        try:
+            self.client.incr(self.current_key, delta=value)
+            self.client.expire(self.current_key, self.key_expiry)
+        except Exception:
+            if fail_hard:
+                raise
+
     def increase_total_case_count(self, value):
         self.client.incr(self.total_key, delta=value)
         self.client.expire(self.total_key, self.key_expiry)
@@ -0,0 +1,233 @@
+"""
+Batched repeat records
+======================
+
+``check_repeaters`` queues one ``process_repeat_record`` task per repeat
+record that is due. For domains with the BATCH_REPEAT_RECORDS toggle it
+uses a ``RepeatRecordBatcher`` instead, which groups the records by
+repeater, claims each group of up to ``REPEAT_RECORD_BATCH_SIZE``
+records with one bulk save and queues one ``process_repeat_record_batch``
+task for the group.
+
+That task loads the records and their payload docs in bulk and sends
+the records with ``send_repeat_records``: up to ``MAX_REPEATER_WORKERS``
+requests at a time. Each worker thread has its own copy of the repeater
+with its own keep-alive session, since repeaters memoize their payloads
+and sessions are not thread-safe. Requests are limited to the rate
+allowed by ``repeater_rate_limiter``. The records are then saved with
+one bulk save.
+
+Records of the same repeater may still be sent by more than one batch
+at a time. The rate limiter applies to all of them. Its limits are
+dynamic rate definitions keyed by repeater type (see
+``get_dynamic_rate_definition``), counted per repeater.
+"""
+import copy
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+from django.db import connections
+
+from celery.utils.log import get_task_logger
+from couchdbkit import BulkSaveError, ResourceNotFound
+
+from dimagi.utils.couch.database import iter_docs
+
+from corehq.motech.repeaters.const import (
+    MAX_REPEATER_WORKERS,
+    REPEAT_RECORD_BATCH_SIZE,
+)
+from corehq.motech.repeaters.models import Repeater, RepeatRecord
+from corehq.project_limits.rate_limiter import (
+    RateDefinition,
+    RateLimiter,
+    get_dynamic_rate_definition,
+)
+from corehq.util.metrics import metrics_counter
+
+logging = get_task_logger(__name__)
+
+# seconds to wait for the rate limiter before postponing a record
+RATE_LIMIT_TIMEOUT = 15
+
+DEFAULT_REPEATER_RATE_DEFINITION = RateDefinition(
+    per_minute=1200,
+    per_second=30,
+)
+
+
+def _get_repeater_rate_limits(repeater_type, repeater_id):
+    return get_dynamic_rate_definition(
+        'repeater_requests_{}'.format(repeater_type),
+        default=DEFAULT_REPEATER_RATE_DEFINITION,
+    ).get_rate_limits()
+
+
+# scoped by (repeater type, repeater ID)
+repeater_rate_limiter = RateLimiter(
+    feature_key='repeater_requests',
+    get_rate_limits=_get_repeater_rate_limits,
+    scope_length=2,
+)
+
+
+class RepeatRecordBatcher(object):
+    """Group repeat records that are due by repeater and queue a batch
+    task for every ``batch_size`` records of a repeater
+
+    Call ``flush()`` to queue the remaining records.
+    """
+
+    def __init__(self, batch_size=REPEAT_RECORD_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.records_by_repeater = defaultdict(list)
+
+    def add(self, repeat_record):
+        if not repeat_record.is_due():
+            return
+        records = self.records_by_repeater[repeat_record.repeater_id]
+        records.append(repeat_record)
+        if len(records) >= self.batch_size:
+            self._queue_batch(repeat_record.repeater_id)
+
+    def flush(self):
+        for repeater_id in list(self.records_by_repeater):
+            self._queue_batch(repeater_id)
+
+    def _queue_batch(self, repeater_id):
+        from corehq.motech.repeaters.tasks import process_repeat_record_batch
+        records = claim_repeat_records(self.records_by_repeater.pop(repeater_id))
+        if records:
+            metrics_counter("commcare.repeaters.batch.queued", len(records))
+            process_repeat_record_batch.delay(repeater_id, [record._id for record in records])
+
+
+def claim_repeat_records(repeat_records):
+    """Postpone the next check of repeat records like
+    ``RepeatRecord.attempt_forward_now`` does, with one bulk save
+
+    :returns: The records that were saved. The others have been changed
+    by another process since they were loaded.
+    """
+    next_check = datetime.utcnow() + timedelta(hours=48)
+    for record in repeat_records:
+        record.next_check = next_check
+    try:
+        RepeatRecord.bulk_save(repeat_records)
+    except BulkSaveError as err:
+        conflicts = {error['id'] for error in err.errors}
+        return [record for record in repeat_records if record._id not in conflicts]
+    return repeat_records
+
+
+def get_repeat_records(repeat_record_ids):
+    return [
+        RepeatRecord.wrap(doc)
+        for doc in iter_docs(RepeatRecord.get_db(), repeat_record_ids)
+    ]
+
+
+def get_repeater(repeater_id):
+    """Get a repeater that is not shared with other callers
+
+    ``Repeater.get`` may return a cached instance; the payload docs
+    prefetched for a batch are stored on the repeater.
+    """
+    try:
+        return Repeater.wrap(Repeater.get_db().get(repeater_id))
+    except ResourceNotFound:
+        return None
+
+
+def send_repeat_records(repeater, repeat_records, max_workers=MAX_REPEATER_WORKERS):
+    """Send repeat records of one repeater concurrently and save them
+    with one bulk save
+    """
+    thread_local = threading.local()
+    lock = threading.Lock()
+
+    def get_thread_repeater(sessions):
+        if not hasattr(thread_local, 'repeater'):
+            thread_repeater = _copy_repeater(repeater)
+            with lock:
+                sessions.enter_context(thread_repeater.use_session())
+            thread_local.repeater = thread_repeater
+        return thread_local.repeater
+
+    def fire(record, sessions):
+        try:
+            if not _wait_for_rate_limit(repeater):
+                # try again at the next check
+                record.next_check = datetime.utcnow()
+                metrics_counter("commcare.repeaters.batch.rate_limited")
+                return
+            try:
+                record.fire(save=False, repeater=get_thread_repeater(sessions))
+            except Exception:
+                logging.exception('Failed to process repeat record: {}'.format(record._id))
+        finally:
+            # payload generation and repeaters may use the database
+            connections.close_all()
+
+    if not repeat_records:
+        return
+    attempt_counts = {record._id: len(record.attempts) for record in repeat_records}
+    with repeater.prefetch_payload_docs(repeat_records), ExitStack() as sessions, \
+            ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(lambda record: fire(record, sessions), repeat_records))
+    save_repeat_records(repeat_records, attempt_counts)
+    metrics_counter("commcare.repeaters.batch.sent", len(repeat_records))
+
+
+def _copy_repeater(repeater):
+    """Copy of a repeater for one worker thread, which shares the payload
+    docs prefetched by the repeater"""
+    thread_repeater = Repeater.wrap(copy.deepcopy(repeater.to_json()))
+    thread_repeater._prefetched_payload_docs = repeater._prefetched_payload_docs
+    return thread_repeater
+
+
+def save_repeat_records(repeat_records, attempt_counts):
+    """Save repeat records that have been sent with one bulk save
+
+    Records that fail to save, because they have been changed since
+    they were loaded, are saved one by one: the attempts added since
+    they were loaded are added to the latest version of the record.
+
+    :param attempt_counts: The number of attempts of each record, by
+    record ID, before it was sent
+    """
+    try:
+        RepeatRecord.bulk_save(repeat_records)
+    except BulkSaveError as err:
+        failed_ids = {error['id'] for error in err.errors}
+        logging.warning('Failed to bulk save repeat records: {}'.format(', '.join(sorted(failed_ids))))
+        for record in repeat_records:
+            if record._id in failed_ids:
+                _save_changed_record(record, attempt_counts[record._id])
+
+
+def _save_changed_record(record, attempt_count):
+    try:
+        latest = RepeatRecord.get(record._id)
+        new_attempts = record.attempts[attempt_count:]
+        latest.overall_tries += len(new_attempts)
+        for attempt in new_attempts:
+            latest.add_attempt(attempt)
+        if not new_attempts and not (latest.succeeded or latest.cancelled):
+            # release the record claimed by the batch
+            latest.next_check = record.next_check
+        latest.save()
+    except Exception:
+        logging.exception('Failed to save repeat record: {}'.format(record._id))
+
+
+def _wait_for_rate_limit(repeater):
+    scope = (repeater.doc_type, repeater._id)
+    if not repeater_rate_limiter.wait(scope, timeout=RATE_LIMIT_TIMEOUT):
+        return False
+    repeater_rate_limiter.report_usage(scope)
+    return True
@@ -7,6 +7,14 @@ CHECK_REPEATERS_KEY = 'check-repeaters-key'
 
 POST_TIMEOUT = 75  # seconds
 
+# Repeat records of domains with the BATCH_REPEAT_RECORDS toggle are sent
+# in batches of up to this many records per repeater
+REPEAT_RECORD_BATCH_SIZE = 100
+# Maximum number of concurrent requests to a repeater in a batch
+MAX_REPEATER_WORKERS = 4
+# Number of due repeat records claimed at a time from the SQL queue
+REPEAT_RECORD_QUEUE_CHUNK_SIZE = 1000
+
 RECORD_PENDING_STATE = 'PENDING'
 RECORD_SUCCESS_STATE = 'SUCCESS'
 RECORD_FAILURE_STATE = 'FAIL'
@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from django.core.management import BaseCommand
+
+import requests
+
+from dimagi.utils.post import simple_post
+
+from corehq.motech.repeaters.const import MAX_REPEATER_WORKERS
+
+
+class Command(BaseCommand):
+    """Compare sending repeat records one at a time with sending them
+    the way ``process_repeat_record_batch`` does
+
+    Example: ./manage.py benchmark_repeater_requests --count 500 --delay-ms 20
+    """
+    help = (
+        "Post payloads to a local stub server one at a time with a new "
+        "connection each, and concurrently over one keep-alive session, "
+        "and report the records sent per second."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500, help="Number of requests to send.")
+        parser.add_argument('--delay-ms', type=int, default=20, help="Response time of the stub server.")
+        parser.add_argument('--workers', type=int, default=MAX_REPEATER_WORKERS)
+        parser.add_argument('--payload-size', type=int, default=2048, help="Payload size in bytes.")
+
+    def handle(self, count, delay_ms, workers, payload_size, **options):
+        server = _StubServer(('127.0.0.1', 0), _handler_class(delay_ms / 1000))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+        payload = 'x' * payload_size
+        try:
+            elapsed = self._time(lambda: [simple_post(payload, url) for i in range(count)])
+            self.stdout.write("sequential: {:.1f} records/s".format(count / elapsed))
+
+            def send_batch():
+                with requests.Session() as session, ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(lambda i: simple_post(payload, url, session=session), range(count)))
+            elapsed = self._time(send_batch)
+            self.stdout.write("batched ({} workers): {:.1f} records/s".format(workers, count / elapsed))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @staticmethod
+    def _time(send):
+        start = time.time()
+        send()
+        return time.time() - start
+
+
+class _StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _handler_class(delay):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('content-length', 0)))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('content-length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from dimagi.utils.chunked import chunked
+
+from corehq.motech.repeaters.dbaccessors import iterate_repeat_records
+from corehq.motech.repeaters.repeaters_partitioned.dbaccessors import (
+    sync_repeat_record_queue_entries,
+)
+
+
+class Command(BaseCommand):
+    help = """
+    Add the repeat records that are waiting to be sent to the SQL repeat
+    record queue. Run this before setting USE_SQL_REPEAT_RECORD_QUEUE.
+    It is safe to run it again afterwards.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, chunk_size, **options):
+        count = 0
+        for records in chunked(iterate_repeat_records(datetime.max, chunk_size=chunk_size), chunk_size):
+            sync_repeat_record_queue_entries(records)
+            count += len(records)
+            self.stdout.write("{} repeat records added".format(count))
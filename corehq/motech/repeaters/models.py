@@ -65,12 +65,19 @@ class.
 """
 import re
 import warnings
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
+from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
-from couchdbkit.exceptions import ResourceConflict, ResourceNotFound
+from couchdbkit.exceptions import (
+    BulkSaveError,
+    ResourceConflict,
+    ResourceNotFound,
+)
+import requests
 from memoized import memoized
 from requests.auth import HTTPBasicAuth, HTTPDigestAuth
 from requests.exceptions import ConnectionError, Timeout
@@ -109,6 +116,10 @@ from corehq.motech.repeaters.repeater_generators import (
     ShortFormRepeaterJsonPayloadGenerator,
     UserPayloadGenerator,
 )
+from corehq.motech.repeaters.repeaters_partitioned.dbaccessors import (
+    delete_repeat_record_queue_entries,
+    sync_repeat_record_queue_entries,
+)
 from corehq.motech.utils import b64_aes_decrypt
 from corehq.util.datadog.metrics import (
     REPEATER_ERROR_COUNT,
@@ -187,6 +198,10 @@ class Repeater(QuickCachedDocumentMixin, Document):
     payload_generator_classes = ()
 
     _has_config = False
+    # set by use_session()
+    _session = None
+    # payload docs loaded by prefetch_payload_docs(), by payload ID
+    _prefetched_payload_docs = {}
 
     def __str__(self):
         url = "@".join((self.username, self.url)) if self.username else self.url
@@ -227,6 +242,41 @@ class Repeater(QuickCachedDocumentMixin, Document):
     def payload_doc(self, repeat_record):
         raise NotImplementedError
 
+    @contextmanager
+    def prefetch_payload_docs(self, repeat_records):
+        """Load the payload docs of many repeat records at once
+
+        Repeaters that can load their payload docs in bulk implement
+        ``get_payload_docs`` and look up ``_prefetched_payload_docs`` in
+        ``payload_doc``. The docs are dropped on exit so that they do
+        not go stale.
+        """
+        self._prefetched_payload_docs = self.get_payload_docs(
+            [record.payload_id for record in repeat_records]
+        )
+        try:
+            yield
+        finally:
+            self._prefetched_payload_docs = {}
+
+    def get_payload_docs(self, payload_ids):
+        """
+        :returns: A dict of payload docs by payload ID
+        """
+        return {}
+
+    @contextmanager
+    def use_session(self):
+        """Send the requests of this repeater over one ``requests.Session``
+        to reuse connections to the server between repeat records
+        """
+        with requests.Session() as session:
+            self._session = session
+            try:
+                yield
+            finally:
+                self._session = None
+
     @memoized
     def get_payload(self, repeat_record):
         return self.generator.get_payload(repeat_record, self.payload_doc(repeat_record))
@@ -376,7 +426,8 @@ class Repeater(QuickCachedDocumentMixin, Document):
         headers = self.get_headers(repeat_record)
         auth = self.get_auth()
         url = self.get_url(repeat_record)
-        return simple_post(payload, url, headers=headers, timeout=POST_TIMEOUT, auth=auth, verify=self.verify)
+        return simple_post(payload, url, headers=headers, timeout=POST_TIMEOUT, auth=auth, verify=self.verify,
+                           session=self._session)
 
     def fire_for_record(self, repeat_record):
         payload = self.get_payload(repeat_record)
@@ -432,8 +483,13 @@ class FormRepeater(Repeater):
 
     @memoized
     def payload_doc(self, repeat_record):
+        if repeat_record.payload_id in self._prefetched_payload_docs:
+            return self._prefetched_payload_docs[repeat_record.payload_id]
         return FormAccessors(repeat_record.domain).get_form(repeat_record.payload_id)
 
+    def get_payload_docs(self, payload_ids):
+        return {form.form_id: form for form in FormAccessors(self.domain).get_forms(payload_ids)}
+
     @property
     def form_class_name(self):
         """
@@ -501,8 +557,13 @@ class CaseRepeater(Repeater):
 
     @memoized
     def payload_doc(self, repeat_record):
+        if repeat_record.payload_id in self._prefetched_payload_docs:
+            return self._prefetched_payload_docs[repeat_record.payload_id]
         return CaseAccessors(repeat_record.domain).get_case(repeat_record.payload_id)
 
+    def get_payload_docs(self, payload_ids):
+        return {case.case_id: case for case in CaseAccessors(self.domain).get_cases(payload_ids)}
+
     @property
     def form_class_name(self):
         """
@@ -649,6 +710,30 @@ class RepeatRecord(Document):
     def record_id(self):
         return self._id
 
+    def save(self, *args, **kwargs):
+        super(RepeatRecord, self).save(*args, **kwargs)
+        if settings.USE_SQL_REPEAT_RECORD_QUEUE:
+            sync_repeat_record_queue_entries([self])
+
+    @classmethod
+    def bulk_save(cls, docs, *args, **kwargs):
+        try:
+            result = super(RepeatRecord, cls).bulk_save(docs, *args, **kwargs)
+        except BulkSaveError as err:
+            if settings.USE_SQL_REPEAT_RECORD_QUEUE:
+                failed = {error['id'] for error in err.errors}
+                sync_repeat_record_queue_entries([doc for doc in docs if doc._id not in failed])
+            raise
+        if settings.USE_SQL_REPEAT_RECORD_QUEUE:
+            sync_repeat_record_queue_entries(docs)
+        return result
+
+    def delete(self):
+        record_id = self._id
+        super(RepeatRecord, self).delete()
+        if settings.USE_SQL_REPEAT_RECORD_QUEUE:
+            delete_repeat_record_queue_entries([record_id])
+
     @classmethod
     def wrap(cls, data):
         should_bootstrap_attempts = ('attempts' not in data)
@@ -765,11 +850,17 @@ class RepeatRecord(Document):
             succeeded=False,
         )
 
-    def fire(self, force_send=False):
+    def fire(self, force_send=False, save=True, repeater=None):
+        """
+        :param save: Save the record after the attempt. Pass False to
+        save many records at once with ``RepeatRecord.bulk_save``.
+        :param repeater: The repeater to send the record with. Defaults
+        to ``self.repeater``.
+        """
         if self.try_now() or force_send:
             self.overall_tries += 1
             try:
-                attempt = self.repeater.fire_for_record(self)
+                attempt = (repeater or self.repeater).fire_for_record(self)
             except Exception as e:
                 log_repeater_error_in_datadog(self.domain, status_code=None,
                                               repeater_type=self.repeater_type)
@@ -780,7 +871,8 @@ class RepeatRecord(Document):
                 # that'll only happen if fire_for_record raise a non-Exception exception (e.g. SIGINT)
                 # or handle_payload_exception raises an exception. I'm okay with that. -DMR
                 self.add_attempt(attempt)
-                self.save()
+                if save:
+                    self.save()
 
     @staticmethod
     def _format_response(response):
@@ -850,16 +942,16 @@ class RepeatRecord(Document):
         self.next_check = None
         self.cancelled = True
 
+    def is_due(self):
+        """Whether the record has not been processed and its next check
+        has passed"""
+        already_processed = self.succeeded or self.cancelled or self.next_check is None
+        return not already_processed and self.next_check < datetime.utcnow()
+
     def attempt_forward_now(self):
         from corehq.motech.repeaters.tasks import process_repeat_record
 
-        def is_ready():
-            return self.next_check < datetime.utcnow()
-
-        def already_processed():
-            return self.succeeded or self.cancelled or self.next_check is None
-
-        if already_processed() or not is_ready():
+        if not self.is_due():
             return
 
         # Set the next check to happen an arbitrarily long time from now so
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from corehq.sql_db.util import get_db_alias_for_partitioned_doc
+
+
+def sync_repeat_record_queue_entries(repeat_records):
+    """Add or update the queue entries of repeat records that are
+    waiting to be sent and delete the entries of the others
+    """
+    from corehq.motech.repeaters.repeaters_partitioned.models import RepeatRecordQueueEntry
+
+    records_by_db = defaultdict(list)
+    for record in repeat_records:
+        records_by_db[get_db_alias_for_partitioned_doc(record._id)].append(record)
+
+    for db_alias, records in records_by_db.items():
+        queryset = RepeatRecordQueueEntry.objects.using(db_alias)
+        with transaction.atomic(using=db_alias):
+            queryset.filter(
+                repeat_record_id__in=[record._id for record in records if not _is_queued(record)]
+            ).delete()
+            for record in records:
+                if _is_queued(record):
+                    queryset.update_or_create(repeat_record_id=record._id, defaults={
+                        'domain': record.domain,
+                        'repeater_id': record.repeater_id,
+                        'state': record.state,
+                        'next_check': record.next_check,
+                    })
+
+
+def delete_repeat_record_queue_entries(repeat_record_ids):
+    from corehq.motech.repeaters.repeaters_partitioned.models import RepeatRecordQueueEntry
+
+    ids_by_db = defaultdict(list)
+    for repeat_record_id in repeat_record_ids:
+        ids_by_db[get_db_alias_for_partitioned_doc(repeat_record_id)].append(repeat_record_id)
+    for db_alias, ids in ids_by_db.items():
+        RepeatRecordQueueEntry.objects.using(db_alias).filter(repeat_record_id__in=ids).delete()
+
+
+def claim_due_repeat_record_ids(db_alias, due_before, limit, claim_for=timedelta(hours=48)):
+    """Claim up to ``limit`` repeat records that are due in one
+    partitioned database
+
+    Rows locked by another worker are skipped, and the next check of
+    the claimed entries is postponed by ``claim_for``, like
+    ``RepeatRecord.attempt_forward_now`` does, so that several workers
+    can claim due records at the same time.
+
+    :returns: The IDs of the claimed repeat records
+    """
+    from corehq.motech.repeaters.repeaters_partitioned.models import RepeatRecordQueueEntry
+
+    queryset = RepeatRecordQueueEntry.objects.using(db_alias)
+    with transaction.atomic(using=db_alias):
+        ids = list(
+            queryset.select_for_update(skip_locked=True)
+            .filter(next_check__lt=due_before)
+            .order_by('next_check')
+            .values_list('repeat_record_id', flat=True)[:limit]
+        )
+        if ids:
+            queryset.filter(repeat_record_id__in=ids).update(next_check=datetime.utcnow() + claim_for)
+    return ids
+
+
+def _is_queued(repeat_record):
+    # matches the repeaters/repeat_records_by_next_check view
+    return (
+        repeat_record.doc_type == 'RepeatRecord'
+        and not repeat_record.succeeded
+        and not repeat_record.cancelled
+        and repeat_record.next_check is not None
+    )
@@ -0,0 +1,31 @@
+# Generated by Django 1.11.28 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepeatRecordQueueEntry',
+            fields=[
+                ('repeat_record_id', models.CharField(max_length=126, primary_key=True, serialize=False)),
+                ('domain', models.CharField(max_length=126)),
+                ('repeater_id', models.CharField(max_length=126)),
+                ('state', models.CharField(max_length=64)),
+                ('next_check', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'repeaters_repeatrecordqueueentry',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='repeatrecordqueueentry',
+            index_together=set([('next_check', 'repeater_id', 'state')]),
+        ),
+    ]
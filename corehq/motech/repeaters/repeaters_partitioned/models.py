@@ -0,0 +1,28 @@
+from django.db import models
+
+from corehq.sql_db.models import PartitionedModel
+
+
+class RepeatRecordQueueEntry(PartitionedModel):
+    """
+    A repeat record that is waiting to be sent
+
+    ``RepeatRecord`` documents in Couch are the source of truth. When
+    ``settings.USE_SQL_REPEAT_RECORD_QUEUE`` is set, saving a repeat
+    record adds or updates its entry while it is pending or failed with
+    a next check, and removes it otherwise, so that due records can be
+    claimed from an index instead of a Couch view.
+    """
+    partition_attr = 'repeat_record_id'
+
+    repeat_record_id = models.CharField(max_length=126, primary_key=True)
+    domain = models.CharField(max_length=126)
+    repeater_id = models.CharField(max_length=126)
+    state = models.CharField(max_length=64)
+    next_check = models.DateTimeField()
+
+    class Meta(object):
+        db_table = 'repeaters_repeatrecordqueueentry'
+        index_together = (
+            ('next_check', 'repeater_id', 'state'),
+        )
@@ -0,0 +1,89 @@
+import uuid
+from datetime import datetime, timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TestCase
+
+from corehq.form_processor.tests.utils import (
+    only_run_with_non_partitioned_database,
+)
+from corehq.motech.repeaters.const import RECORD_FAILURE_STATE
+from corehq.motech.repeaters.models import RepeatRecord
+from corehq.motech.repeaters.repeaters_partitioned.dbaccessors import (
+    claim_due_repeat_record_ids,
+    delete_repeat_record_queue_entries,
+    sync_repeat_record_queue_entries,
+)
+from corehq.motech.repeaters.repeaters_partitioned.models import (
+    RepeatRecordQueueEntry,
+)
+from corehq.sql_db.util import get_db_aliases_for_partitioned_query
+
+
+class RepeatRecordQueueTest(TestCase):
+    domain = 'repeat-record-queue-test'
+
+    def tearDown(self):
+        for db_alias in get_db_aliases_for_partitioned_query():
+            RepeatRecordQueueEntry.objects.using(db_alias).all().delete()
+        super(RepeatRecordQueueTest, self).tearDown()
+
+    def make_record(self, next_check, **kwargs):
+        return RepeatRecord(
+            _id=uuid.uuid4().hex,
+            domain=self.domain,
+            repeater_id='repeater',
+            next_check=next_check,
+            **kwargs
+        )
+
+    def get_entries(self):
+        return {
+            entry.repeat_record_id: entry
+            for db_alias in get_db_aliases_for_partitioned_query()
+            for entry in RepeatRecordQueueEntry.objects.using(db_alias).all()
+        }
+
+    def test_sync(self):
+        now = datetime.utcnow()
+        pending = self.make_record(now)
+        failed = self.make_record(now, failure_reason='Boom!')
+        succeeded = self.make_record(None, succeeded=True)
+        sync_repeat_record_queue_entries([pending, failed, succeeded])
+        entries = self.get_entries()
+        self.assertEqual(set(entries), {pending._id, failed._id})
+        self.assertEqual(entries[failed._id].state, RECORD_FAILURE_STATE)
+
+        pending.cancel()
+        failed.next_check = now + timedelta(hours=1)
+        sync_repeat_record_queue_entries([pending, failed])
+        entries = self.get_entries()
+        self.assertEqual(set(entries), {failed._id})
+        self.assertEqual(entries[failed._id].next_check, now + timedelta(hours=1))
+
+        delete_repeat_record_queue_entries([failed._id])
+        self.assertEqual(self.get_entries(), {})
+
+    def test_claim(self):
+        now = datetime.utcnow()
+        records = [self.make_record(now - timedelta(minutes=i)) for i in range(3)]
+        later = self.make_record(now + timedelta(hours=1))
+        sync_repeat_record_queue_entries(records + [later])
+
+        claimed = []
+        for db_alias in get_db_aliases_for_partitioned_query():
+            claimed.extend(claim_due_repeat_record_ids(db_alias, now, limit=10))
+        self.assertEqual(set(claimed), {record._id for record in records})
+
+        entries = self.get_entries()
+        for record in records:
+            self.assertGreater(entries[record._id].next_check, now + timedelta(hours=47))
+        for db_alias in get_db_aliases_for_partitioned_query():
+            self.assertEqual(claim_due_repeat_record_ids(db_alias, now, limit=10), [])
+
+    @only_run_with_non_partitioned_database
+    def test_claim_oldest_first(self):
+        now = datetime.utcnow()
+        records = [self.make_record(now - timedelta(minutes=i)) for i in range(3)]
+        sync_repeat_record_queue_entries(records)
+        self.assertEqual(claim_due_repeat_record_ids(DEFAULT_DB_ALIAS, now, limit=1), [records[2]._id])
@@ -12,17 +12,31 @@ from dimagi.utils.couch.undo import DELETED_SUFFIX
 
 from corehq.apps.accounting.utils import domain_has_privilege
 from corehq.motech.models import RequestLog
+from corehq.motech.repeaters.batch import (
+    RepeatRecordBatcher,
+    get_repeat_records,
+    get_repeater,
+    send_repeat_records,
+)
 from corehq.motech.repeaters.const import (
     CHECK_REPEATERS_INTERVAL,
     CHECK_REPEATERS_KEY,
     RECORD_FAILURE_STATE,
     RECORD_PENDING_STATE,
+    REPEAT_RECORD_QUEUE_CHUNK_SIZE,
 )
 from corehq.motech.repeaters.dbaccessors import (
     get_overdue_repeat_record_count,
     iterate_repeat_records,
 )
+from corehq.motech.repeaters.repeaters_partitioned.dbaccessors import (
+    claim_due_repeat_record_ids,
+    delete_repeat_record_queue_entries,
+    sync_repeat_record_queue_entries,
+)
 from corehq.privileges import DATA_FORWARDING, ZAPIER_INTEGRATION
+from corehq.sql_db.util import get_db_aliases_for_partitioned_query
+from corehq.toggles import BATCH_REPEAT_RECORDS
 from corehq.util.datadog.utils import make_buckets_from_timedeltas
 from corehq.util.soft_assert import soft_assert
 
@@ -57,6 +71,11 @@ def clean_logs():
     queue=settings.CELERY_PERIODIC_QUEUE,
 )
 def check_repeaters():
+    if settings.USE_SQL_REPEAT_RECORD_QUEUE:
+        for db_alias in get_db_aliases_for_partitioned_query():
+            check_repeat_record_queue.delay(db_alias)
+        return
+
     start = datetime.utcnow()
     six_hours_sec = 6 * 60 * 60
     six_hours_later = start + timedelta(seconds=six_hours_sec)
@@ -76,27 +95,111 @@ def check_repeaters():
             "commcare.repeaters.check.processing",
             timing_buckets=_check_repeaters_buckets,
         ):
+            batcher = RepeatRecordBatcher()
             for record in iterate_repeat_records(start):
                 if datetime.utcnow() > six_hours_later:
                     _soft_assert(False, "I've been iterating repeat records for six hours. I quit!")
                     break
-                metrics_counter("commcare.repeaters.check.attempt_forward")
-                record.attempt_forward_now()
+                _attempt_forward_now(record, batcher)
+            batcher.flush()
     finally:
         check_repeater_lock.release()
 
 
+@task(queue=settings.CELERY_PERIODIC_QUEUE)
+def check_repeat_record_queue(db_alias):
+    """Forward the repeat records that are due in one partitioned
+    database of the SQL repeat record queue
+
+    Records are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``, so
+    this does not need a lock and can run on several workers at once.
+    """
+    start = datetime.utcnow()
+    stop_after = start + CHECK_REPEATERS_INTERVAL
+    with metrics_histogram_timer(
+        "commcare.repeaters.check_queue.processing",
+        timing_buckets=_check_repeaters_buckets,
+    ):
+        batcher = RepeatRecordBatcher()
+        while datetime.utcnow() < stop_after:
+            repeat_record_ids = claim_due_repeat_record_ids(db_alias, start, REPEAT_RECORD_QUEUE_CHUNK_SIZE)
+            if not repeat_record_ids:
+                break
+            repeat_records = get_repeat_records(repeat_record_ids)
+            missing_ids = set(repeat_record_ids) - {record._id for record in repeat_records}
+            if missing_ids:
+                delete_repeat_record_queue_entries(missing_ids)
+            for record in repeat_records:
+                if not record.is_due():
+                    # the queue entry was out of date
+                    sync_repeat_record_queue_entries([record])
+                    continue
+                _attempt_forward_now(record, batcher)
+        batcher.flush()
+
+
+def _attempt_forward_now(repeat_record, batcher):
+    metrics_counter("commcare.repeaters.check.attempt_forward")
+    if BATCH_REPEAT_RECORDS.enabled(repeat_record.domain):
+        batcher.add(repeat_record)
+    else:
+        repeat_record.attempt_forward_now()
+
+
 @task(serializer='pickle', queue=settings.CELERY_REPEAT_RECORD_QUEUE)
 def process_repeat_record(repeat_record):
+    repeater = repeat_record.repeater
+    if not _check_repeat_record(repeat_record, repeater, _domain_can_forward(repeat_record.domain)):
+        return
 
-    # A RepeatRecord should ideally never get into this state, as the
-    # domain_has_privilege check is also triggered in the create_repeat_records
-    # in signals.py. But if it gets here, forcefully cancel the RepeatRecord.
+    try:
+        if _check_repeater(repeat_record, repeater):
+            repeat_record.fire()
+    except Exception:
+        logging.exception('Failed to process repeat record: {}'.format(repeat_record._id))
+
+
+@task(queue=settings.CELERY_REPEAT_RECORD_QUEUE)
+def process_repeat_record_batch(repeater_id, repeat_record_ids):
+    """Send repeat records of one repeater queued by ``check_repeaters``
+
+    See ``corehq.motech.repeaters.batch``.
+    """
+    repeat_records = get_repeat_records(repeat_record_ids)
+    if not repeat_records:
+        return
+    can_forward = _domain_can_forward(repeat_records[0].domain)
+    repeater = get_repeater(repeater_id)
+    to_send = []
+    for repeat_record in repeat_records:
+        if not _check_repeat_record(repeat_record, repeater, can_forward):
+            continue
+        try:
+            if _check_repeater(repeat_record, repeater):
+                to_send.append(repeat_record)
+        except Exception:
+            logging.exception('Failed to process repeat record: {}'.format(repeat_record._id))
+    if to_send:
+        send_repeat_records(repeater, to_send)
+
+
+def _domain_can_forward(domain):
     # todo reconcile ZAPIER_INTEGRATION and DATA_FORWARDING
     #  they each do two separate things and are priced differently,
     #  but use the same infrastructure
-    if not (domain_has_privilege(repeat_record.domain, ZAPIER_INTEGRATION)
-            or domain_has_privilege(repeat_record.domain, DATA_FORWARDING)):
+    return (domain_has_privilege(domain, ZAPIER_INTEGRATION)
+            or domain_has_privilege(domain, DATA_FORWARDING))
+
+
+def _check_repeat_record(repeat_record, repeater, can_forward):
+    """Cancel a repeat record that can no longer be sent
+
+    :returns: False if the record is cancelled
+    """
+    # A RepeatRecord should ideally never get into this state, as the
+    # domain_has_privilege check is also triggered in the create_repeat_records
+    # in signals.py. But if it gets here, forcefully cancel the RepeatRecord.
+    if not can_forward:
         repeat_record.cancel()
         repeat_record.save()
 
@@ -106,30 +209,33 @@ def process_repeat_record(repeat_record):
     ):
         repeat_record.cancel()
         repeat_record.save()
-        return
+        return False
     if repeat_record.cancelled:
-        return
+        return False
 
-    repeater = repeat_record.repeater
     if not repeater:
         repeat_record.cancel()
         repeat_record.save()
-        return
+        return False
+    return True
 
-    try:
-        if repeater.paused:
-            # postpone repeat record by 1 day so that these don't get picked in each cycle and
-            # thus clogging the queue with repeat records with paused repeater
-            repeat_record.postpone_by(timedelta(days=1))
-            return
-        if repeater.doc_type.endswith(DELETED_SUFFIX):
-            if not repeat_record.doc_type.endswith(DELETED_SUFFIX):
-                repeat_record.doc_type += DELETED_SUFFIX
-                repeat_record.save()
-        elif repeat_record.state == RECORD_PENDING_STATE or repeat_record.state == RECORD_FAILURE_STATE:
-                repeat_record.fire()
-    except Exception:
-        logging.exception('Failed to process repeat record: {}'.format(repeat_record._id))
+
+def _check_repeater(repeat_record, repeater):
+    """Postpone or delete a repeat record of a paused or deleted repeater
+
+    :returns: True if the record should be sent
+    """
+    if repeater.paused:
+        # postpone repeat record by 1 day so that these don't get picked in each cycle and
+        # thus clogging the queue with repeat records with paused repeater
+        repeat_record.postpone_by(timedelta(days=1))
+        return False
+    if repeater.doc_type.endswith(DELETED_SUFFIX):
+        if not repeat_record.doc_type.endswith(DELETED_SUFFIX):
+            repeat_record.doc_type += DELETED_SUFFIX
+            repeat_record.save()
+        return False
+    return repeat_record.state == RECORD_PENDING_STATE or repeat_record.state == RECORD_FAILURE_STATE
 
 
 repeaters_overdue = metrics_gauge_task(
@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from couchdbkit import BulkSaveError
+from mock import MagicMock, patch
+
+from corehq.motech.repeaters.batch import (
+    RATE_LIMIT_TIMEOUT,
+    RepeatRecordBatcher,
+    _get_repeater_rate_limits,
+    _wait_for_rate_limit,
+    claim_repeat_records,
+    save_repeat_records,
+    send_repeat_records,
+)
+from corehq.motech.repeaters.models import RepeatRecord, RepeatRecordAttempt
+
+
+def _record(record_id, repeater_id, **kwargs):
+    kwargs.setdefault('next_check', datetime.utcnow() - timedelta(minutes=1))
+    return RepeatRecord(_id=record_id, domain='test', repeater_id=repeater_id, **kwargs)
+
+
+@patch('corehq.motech.repeaters.batch.claim_repeat_records', lambda records: records)
+@patch('corehq.motech.repeaters.tasks.process_repeat_record_batch.delay')
+class RepeatRecordBatcherTest(SimpleTestCase):
+
+    def test_batches(self, delay):
+        batcher = RepeatRecordBatcher(batch_size=2)
+        for record in [
+            _record('a1', 'a'),
+            _record('b1', 'b'),
+            _record('a2', 'a'),
+            _record('a3', 'a'),
+            _record('a4', 'a', succeeded=True),
+            _record('b2', 'b', next_check=datetime.utcnow() + timedelta(hours=1)),
+        ]:
+            batcher.add(record)
+        self.assertEqual([c[0] for c in delay.call_args_list], [('a', ['a1', 'a2'])])
+
+        batcher.flush()
+        self.assertEqual(
+            [c[0] for c in delay.call_args_list],
+            [('a', ['a1', 'a2']), ('b', ['b1']), ('a', ['a3'])]
+        )
+
+
+class ClaimRepeatRecordsTest(SimpleTestCase):
+
+    def test_claim(self):
+        records = [_record('a1', 'a'), _record('a2', 'a')]
+        with patch.object(RepeatRecord, 'bulk_save') as bulk_save:
+            self.assertEqual(claim_repeat_records(records), records)
+        bulk_save.assert_called_once_with(records)
+        for record in records:
+            self.assertGreater(record.next_check, datetime.utcnow() + timedelta(hours=47))
+
+    def test_skip_conflicts(self):
+        records = [_record('a1', 'a'), _record('a2', 'a')]
+        error = BulkSaveError([{'id': 'a1', 'error': 'conflict'}], [])
+        with patch.object(RepeatRecord, 'bulk_save', side_effect=error):
+            self.assertEqual(claim_repeat_records(records), records[1:])
+
+
+@patch.object(RepeatRecord, 'bulk_save')
+@patch('corehq.motech.repeaters.batch._copy_repeater', lambda repeater: MagicMock())
+class SendRepeatRecordsTest(SimpleTestCase):
+
+    def test_send(self, bulk_save):
+        repeater = MagicMock()
+        records = [MagicMock(), MagicMock()]
+        with patch('corehq.motech.repeaters.batch._wait_for_rate_limit', return_value=True):
+            send_repeat_records(repeater, records, max_workers=2)
+        for record in records:
+            record.fire.assert_called_once()
+            thread_repeater = record.fire.call_args[1]['repeater']
+            self.assertIsNot(thread_repeater, repeater)
+            thread_repeater.use_session.assert_called_once_with()
+        repeater.prefetch_payload_docs.assert_called_once_with(records)
+        repeater.use_session.assert_not_called()
+        bulk_save.assert_called_once_with(records)
+
+    def test_one_repeater_per_thread(self, bulk_save):
+        records = [MagicMock() for i in range(10)]
+        with patch('corehq.motech.repeaters.batch._wait_for_rate_limit', return_value=True):
+            send_repeat_records(MagicMock(), records, max_workers=1)
+        thread_repeaters = {id(record.fire.call_args[1]['repeater']) for record in records}
+        self.assertEqual(len(thread_repeaters), 1)
+
+    def test_rate_limited(self, bulk_save):
+        records = [_record('a1', 'a')]
+        with patch('corehq.motech.repeaters.batch._wait_for_rate_limit', return_value=False), \
+                patch.object(RepeatRecord, 'fire') as fire:
+            send_repeat_records(MagicMock(), records)
+        fire.assert_not_called()
+        self.assertLess(records[0].next_check, datetime.utcnow())
+        bulk_save.assert_called_once_with(records)
+
+    def test_failed_record_is_saved(self, bulk_save):
+        records = [MagicMock(), MagicMock()]
+        records[0].fire.side_effect = Exception('Boom!')
+        with patch('corehq.motech.repeaters.batch._wait_for_rate_limit', return_value=True):
+            send_repeat_records(MagicMock(), records)
+        records[1].fire.assert_called_once()
+        bulk_save.assert_called_once_with(records)
+
+    def test_closes_db_connections(self, bulk_save):
+        records = [MagicMock(), MagicMock()]
+        with patch('corehq.motech.repeaters.batch._wait_for_rate_limit', return_value=True), \
+                patch('corehq.motech.repeaters.batch.connections') as connections:
+            send_repeat_records(MagicMock(), records)
+        self.assertEqual(connections.close_all.call_count, len(records))
+
+
+class SaveRepeatRecordsTest(SimpleTestCase):
+
+    def test_conflicts_are_saved_individually(self):
+        records = [_record('a1', 'a'), _record('a2', 'a')]
+        attempt_counts = {'a1': 0, 'a2': 0}
+        next_check = datetime.utcnow() + timedelta(hours=1)
+        for record in records:
+            record.add_attempt(RepeatRecordAttempt(
+                datetime=datetime.utcnow(),
+                next_check=next_check,
+                failure_reason='Boom!',
+            ))
+        latest = _record('a1', 'a', overall_tries=3)
+        error = BulkSaveError([{'id': 'a1', 'error': 'conflict'}], [])
+        with patch.object(RepeatRecord, 'bulk_save', side_effect=error), \
+                patch.object(RepeatRecord, 'get', return_value=latest) as get, \
+                patch.object(RepeatRecord, 'save') as save:
+            save_repeat_records(records, attempt_counts)
+        get.assert_called_once_with('a1')
+        save.assert_called_once_with()
+        self.assertEqual(latest.overall_tries, 4)
+        self.assertEqual(len(latest.attempts), 1)
+        self.assertEqual(latest.failure_reason, 'Boom!')
+        self.assertEqual(latest.next_check, records[0].next_check)
+
+    def test_unsent_conflict_is_released(self):
+        record = _record('a1', 'a', next_check=datetime.utcnow())
+        latest = _record('a1', 'a', next_check=datetime.utcnow() + timedelta(hours=48))
+        error = BulkSaveError([{'id': 'a1', 'error': 'conflict'}], [])
+        with patch.object(RepeatRecord, 'bulk_save', side_effect=error), \
+                patch.object(RepeatRecord, 'get', return_value=latest), \
+                patch.object(RepeatRecord, 'save'):
+            save_repeat_records([record], {'a1': 0})
+        self.assertEqual(latest.next_check, record.next_check)
+
+
+class WaitForRateLimitTest(SimpleTestCase):
+
+    def test_scope(self):
+        repeater = MagicMock(doc_type='FormRepeater', _id='abc123')
+        with patch('corehq.motech.repeaters.batch.repeater_rate_limiter') as rate_limiter:
+            rate_limiter.wait.return_value = True
+            self.assertTrue(_wait_for_rate_limit(repeater))
+        rate_limiter.wait.assert_called_once_with(('FormRepeater', 'abc123'), timeout=RATE_LIMIT_TIMEOUT)
+        rate_limiter.report_usage.assert_called_once_with(('FormRepeater', 'abc123'))
+
+    def test_rate_limits_by_repeater_type(self):
+        with patch('corehq.motech.repeaters.batch.get_dynamic_rate_definition') as get_definition:
+            _get_repeater_rate_limits('FormRepeater', 'abc123')
+        self.assertEqual(get_definition.call_args[0], ('repeater_requests_FormRepeater',))
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase, override_settings
+
+from mock import ANY, call, patch
+
+from corehq.motech.repeaters.models import RepeatRecord
+from corehq.motech.repeaters.tasks import (
+    check_repeat_record_queue,
+    check_repeaters,
+)
+
+
+class CheckRepeatRecordQueueTest(SimpleTestCase):
+
+    @override_settings(USE_SQL_REPEAT_RECORD_QUEUE=True)
+    @patch('corehq.motech.repeaters.tasks.get_db_aliases_for_partitioned_query', lambda: ['p1', 'p2'])
+    @patch('corehq.motech.repeaters.tasks.check_repeat_record_queue.delay')
+    @patch('corehq.motech.repeaters.tasks.iterate_repeat_records')
+    def test_check_repeaters(self, iterate_repeat_records, delay):
+        check_repeaters()
+        self.assertEqual(delay.call_args_list, [call('p1'), call('p2')])
+        iterate_repeat_records.assert_not_called()
+
+    @patch('corehq.motech.repeaters.tasks._attempt_forward_now')
+    @patch('corehq.motech.repeaters.tasks.sync_repeat_record_queue_entries')
+    @patch('corehq.motech.repeaters.tasks.delete_repeat_record_queue_entries')
+    @patch('corehq.motech.repeaters.tasks.get_repeat_records')
+    @patch('corehq.motech.repeaters.tasks.claim_due_repeat_record_ids')
+    def test_check_repeat_record_queue(self, claim, get_records, delete_entries, sync_entries, forward):
+        now = datetime.utcnow()
+        due = RepeatRecord(_id='due', domain='test', next_check=now - timedelta(minutes=1))
+        later = RepeatRecord(_id='later', domain='test', next_check=now + timedelta(hours=1))
+        claim.side_effect = [['due', 'later', 'deleted'], []]
+        get_records.return_value = [due, later]
+
+        check_repeat_record_queue('p1')
+
+        self.assertEqual(claim.call_args_list, [call('p1', ANY, ANY), call('p1', ANY, ANY)])
+        delete_entries.assert_called_once_with({'deleted'})
+        sync_entries.assert_called_once_with([later])
+        forward.assert_called_once_with(due, ANY)
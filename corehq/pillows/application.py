@@ -52,6 +52,7 @@ class AppReindexerFactory(ReindexerFactory):
     slug = 'app'
     arg_contributors = [
         ReindexerFactory.resumable_reindexer_args,
+        ReindexerFactory.pipelined_reindexer_args,
         ReindexerFactory.elastic_reindexer_args,
     ]
 
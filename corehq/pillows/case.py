@@ -142,6 +142,7 @@ class CouchCaseReindexerFactory(ReindexerFactory):
     slug = 'case'
     arg_contributors = [
         ReindexerFactory.resumable_reindexer_args,
+        ReindexerFactory.pipelined_reindexer_args,
         ReindexerFactory.elastic_reindexer_args,
     ]
 
@@ -165,6 +166,7 @@ class SqlCaseReindexerFactory(ReindexerFactory):
     slug = 'sql-case'
     arg_contributors = [
         ReindexerFactory.resumable_reindexer_args,
+        ReindexerFactory.pipelined_reindexer_args,
         ReindexerFactory.elastic_reindexer_args,
         ReindexerFactory.limit_db_args,
         ReindexerFactory.domain_arg,
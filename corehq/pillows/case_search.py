@@ -41,10 +41,11 @@ from dimagi.utils.parsing import json_format_datetime
 from pillowtop.checkpoints.manager import (
     get_checkpoint_for_elasticsearch_pillow,
 )
+from pillowtop.const import DEFAULT_PROCESSOR_CHUNK_SIZE
 from pillowtop.es_utils import initialize_index_and_mapping
 from pillowtop.feed.interface import Change
 from pillowtop.pillow.interface import ConstructedPillow
-from pillowtop.processors.elastic import ElasticProcessor
+from pillowtop.processors.elastic import BulkElasticProcessor
 from pillowtop.reindexer.change_providers.case import (
     get_domain_case_change_provider,
 )
@@ -96,20 +97,43 @@ def _get_case_properties(doc_dict):
     return base_case_properties + dynamic_mapping
 
 
-class CaseSearchPillowProcessor(ElasticProcessor):
+class CaseSearchPillowProcessor(BulkElasticProcessor):
+    """Indexes the cases of domains that need the case search index.
+
+    Processes changes in chunks when the pillow has a ``processor_chunk_size``
+    and falls back to one change at a time otherwise.
+    """
 
     def process_change(self, change):
         assert isinstance(change, Change)
-        if change.metadata is not None:
-            # Comes from KafkaChangeFeed (i.e. running pillowtop)
-            domain = change.metadata.domain
-        else:
-            # comes from ChangeProvider (i.e reindexing)
-            domain = change.get_document()['domain']
-
+        domain = _get_change_domain(change)
         if domain and domain_needs_search_index(domain):
             super(CaseSearchPillowProcessor, self).process_change(change)
 
+    def process_changes_chunk(self, changes_chunk):
+        needs_search_index = {}
+
+        def _needs_search_index(change):
+            domain = _get_change_domain(change)
+            if not domain:
+                return False
+            if domain not in needs_search_index:
+                needs_search_index[domain] = domain_needs_search_index(domain)
+            return needs_search_index[domain]
+
+        changes = [change for change in changes_chunk if _needs_search_index(change)]
+        if not changes:
+            return [], []
+        return super(CaseSearchPillowProcessor, self).process_changes_chunk(changes)
+
+
+def _get_change_domain(change):
+    if change.metadata is not None:
+        # Comes from KafkaChangeFeed (i.e. running pillowtop)
+        return change.metadata.domain
+    # comes from ChangeProvider (i.e reindexing)
+    return change.get_document()['domain']
+
 
 def get_case_search_processor():
     """Case Search
@@ -186,7 +210,8 @@ class CaseSearchReindexerFactory(ReindexerFactory):
 
 
 def get_case_search_to_elasticsearch_pillow(pillow_id='CaseSearchToElasticsearchPillow', num_processes=1,
-                                            process_num=0, **kwargs):
+                                            process_num=0, processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE,
+                                            **kwargs):
     """Populates the `case search` Elasticsearch index.
 
         Processors:
@@ -211,6 +236,7 @@ def get_case_search_to_elasticsearch_pillow(pillow_id='CaseSearchToElasticsearch
         change_processed_event_handler=KafkaCheckpointEventHandler(
             checkpoint=checkpoint, checkpoint_frequency=100, change_feed=change_feed,
         ),
+        processor_chunk_size=processor_chunk_size,
     )
 
 
@@ -222,6 +248,7 @@ class ResumableCaseSearchReindexerFactory(ReindexerFactory):
     slug = 'case-search-resumable'
     arg_contributors = [
         ReindexerFactory.resumable_reindexer_args,
+        ReindexerFactory.pipelined_reindexer_args,
         ReindexerFactory.elastic_reindexer_args,
         ReindexerFactory.limit_db_args,
     ]
@@ -68,6 +68,7 @@ class SmsReindexerFactory(ReindexerFactory):
     slug = 'sms'
     arg_contributors = [
         ReindexerFactory.resumable_reindexer_args,
+        ReindexerFactory.pipelined_reindexer_args,
         ReindexerFactory.elastic_reindexer_args,
     ]
 
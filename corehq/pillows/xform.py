@@ -242,6 +242,7 @@ class CouchFormReindexerFactory(ReindexerFactory):
     slug = 'form'
     arg_contributors = [
         ReindexerFactory.resumable_reindexer_args,
+        ReindexerFactory.pipelined_reindexer_args,
         ReindexerFactory.elastic_reindexer_args,
     ]
 
@@ -272,6 +273,7 @@ class SqlFormReindexerFactory(ReindexerFactory):
     slug = 'sql-form'
     arg_contributors = [
         ReindexerFactory.resumable_reindexer_args,
+        ReindexerFactory.pipelined_reindexer_args,
         ReindexerFactory.elastic_reindexer_args,
         ReindexerFactory.limit_db_args,
         ReindexerFactory.domain_arg,
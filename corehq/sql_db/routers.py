@@ -33,6 +33,7 @@ BLOB_DB_APP = 'blobs'
 SQL_ACCESSORS_APP = 'sql_accessors'
 ICDS_REPORTS_APP = 'icds_reports'
 SCHEDULING_PARTITIONED_APP = 'scheduling_partitioned'
+REPEATERS_PARTITIONED_APP = 'repeaters_partitioned'
 SYNCLOGS_APP = 'phone'
 AAA_APP = 'aaa'
 
@@ -98,7 +99,7 @@ def allow_migrate(db, app_label, model_name=None):
         return True
     elif app_label == BLOB_DB_APP and model_name == 'blobexpiration':
         return False
-    elif app_label in (FORM_PROCESSOR_APP, SCHEDULING_PARTITIONED_APP, BLOB_DB_APP):
+    elif app_label in (FORM_PROCESSOR_APP, SCHEDULING_PARTITIONED_APP, REPEATERS_PARTITIONED_APP, BLOB_DB_APP):
         return (
             db == plproxy_config.proxy_db
             or db in plproxy_config.form_processing_dbs
@@ -136,7 +137,7 @@ def db_for_read_write(model, write=True, hints=None):
         if hasattr(model, 'partition_attr'):
             return get_read_write_db_for_partitioned_model(model, hints, write)
         return DEFAULT_DB_ALIAS
-    if app_label in (FORM_PROCESSOR_APP, SCHEDULING_PARTITIONED_APP):
+    if app_label in (FORM_PROCESSOR_APP, SCHEDULING_PARTITIONED_APP, REPEATERS_PARTITIONED_APP):
         return get_read_write_db_for_partitioned_model(model, hints, write)
     else:
         default_db = DEFAULT_DB_ALIAS
@@ -48,6 +48,7 @@ class TestPartitionedModelsWithMultipleDBs(PartitionedModelsTestMixin, TestCase)
 @generate_cases([
     ('scheduling', False),
     ('scheduling_partitioned', True),
+    ('repeaters_partitioned', True),
     ('form_processor', True),
 ], TestPartitionedModelsWithMultipleDBs)
 def test_models_are_located_in_correct_dbs(self, app_label, is_partitioned):
@@ -79,6 +80,7 @@ class TestPartitionedModelsWithSingleDB(PartitionedModelsTestMixin, TestCase):
 @generate_cases([
     ('scheduling',),
     ('scheduling_partitioned',),
+    ('repeaters_partitioned',),
     ('form_processor',),
 ], TestPartitionedModelsWithSingleDB)
 def test_models_are_located_in_correct_db(self, app_label):
@@ -0,0 +1,52 @@
+from django.test import SimpleTestCase
+
+from mock import MagicMock, patch
+
+from corehq.sql_db.util import (
+    paginate_query_across_partitioned_databases_concurrently,
+)
+
+ROWS = {
+    'p1': [(1, 'a'), (4, 'd'), (5, 'e')],
+    'p2': [(2, 'b'), (6, 'f')],
+    'p3': [(3, 'c')],
+    'p4': [],
+}
+
+
+def _paginate_query_with_pk(db_name, *args):
+    for pk, row in ROWS[db_name]:
+        if row == 'error':
+            raise ValueError('db error')
+        yield pk, row
+
+
+@patch('corehq.sql_db.util.connections', MagicMock())
+@patch('corehq.sql_db.util._paginate_query_with_pk', _paginate_query_with_pk)
+@patch('corehq.sql_db.util.get_db_aliases_for_partitioned_query', lambda: sorted(ROWS))
+class PaginateConcurrentlyTest(SimpleTestCase):
+
+    def _paginate(self, **kwargs):
+        return paginate_query_across_partitioned_databases_concurrently(None, None, query_size=1, **kwargs)
+
+    def test_unordered(self):
+        progress = {}
+        rows = list(self._paginate(max_workers=2, progress=progress))
+        self.assertEqual(sorted(rows), ['a', 'b', 'c', 'd', 'e', 'f'])
+        self.assertEqual(
+            {db_name: (shard.rows, shard.done) for db_name, shard in progress.items()},
+            {'p1': (3, True), 'p2': (2, True), 'p3': (1, True), 'p4': (0, True)}
+        )
+
+    def test_ordered(self):
+        self.assertEqual(list(self._paginate(ordered=True, max_workers=1)), ['a', 'b', 'c', 'd', 'e', 'f'])
+
+    def test_error(self):
+        with patch.dict(ROWS, {'p2': [(2, 'b'), (6, 'error')]}):
+            with self.assertRaises(ValueError):
+                list(self._paginate(ordered=True))
+
+    def test_stop_reading(self):
+        rows = self._paginate(ordered=True)
+        self.assertEqual(next(rows), 'a')
+        rows.close()
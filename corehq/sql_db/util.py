@@ -1,7 +1,11 @@
+import heapq
+import queue
 import random
 import re
+import threading
 import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from distutils.version import LooseVersion
 from functools import wraps
 
@@ -13,12 +17,18 @@ from django.db.utils import InterfaceError as DjangoInterfaceError
 from corehq.sql_db.config import plproxy_config, plproxy_standby_config
 from corehq.util.datadog.utils import load_counter_for_model
 from corehq.util.quickcache import quickcache
+from dimagi.utils.chunked import chunked
 from memoized import memoized
 from psycopg2._psycopg import InterfaceError as Psycopg2InterfaceError
 
 ACCEPTABLE_STANDBY_DELAY_SECONDS = 3
 STALE_CHECK_FREQUENCY = 30
 
+PARTITIONED_QUERY_MAX_WORKERS = 8
+# pages of rows buffered for each database by concurrent partitioned queries
+PARTITIONED_QUERY_BUFFER_SIZE = 2
+_SHARD_DONE = object()
+
 PG_V10 = LooseVersion('10.0.0')
 
 REPLICATION_SQL_10 = """
@@ -67,6 +77,114 @@ def paginate_query_across_partitioned_databases(model_class, q_expression, annot
             yield row
 
 
+class ShardProgress(object):
+    """Progress of one database of a concurrent partitioned query"""
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.rows = 0
+        self.done = False
+
+
+def paginate_query_across_partitioned_databases_concurrently(
+        model_class, q_expression, annotate=None, query_size=5000, values=None, load_source=None,
+        ordered=False, max_workers=PARTITIONED_QUERY_MAX_WORKERS, progress=None):
+    """
+    Like ``paginate_query_across_partitioned_databases`` but the databases
+    are paged concurrently, each in its own thread and connection. Each
+    database buffers at most ``PARTITIONED_QUERY_BUFFER_SIZE`` pages that
+    have not been consumed yet.
+
+    Rows from different databases are interleaved in the order they are
+    fetched, using at most ``max_workers`` threads. With ``ordered=True``
+    the pages are merged so that rows are returned in pk order across all
+    databases, using one thread per database.
+
+    Since rows are read from other threads, uncommitted changes made by the
+    calling thread are not visible to the query.
+
+    :param progress: (optional) A dict that is populated with a
+    ``ShardProgress`` for each database.
+
+    :return: A generator with the results
+    """
+    db_names = get_db_aliases_for_partitioned_query()
+    shards = {db_name: ShardProgress(db_name) for db_name in db_names}
+    if progress is not None:
+        progress.update(shards)
+    if ordered:
+        max_workers = len(db_names)
+    stop = threading.Event()
+
+    def _put(db_queue, item):
+        # give up once the consumer has stopped reading
+        while not stop.is_set():
+            try:
+                db_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _page_database(db_name, db_queue):
+        shard = shards[db_name]
+        try:
+            rows = _paginate_query_with_pk(
+                db_name, model_class, q_expression, annotate, query_size, values, load_source)
+            for page in chunked(rows, query_size, list):
+                if not _put(db_queue, (db_name, page)):
+                    return
+                shard.rows += len(page)
+            shard.done = True
+            _put(db_queue, (db_name, _SHARD_DONE))
+        except Exception as e:
+            _put(db_queue, (db_name, e))
+        finally:
+            connections[db_name].close()
+
+    def _iter_pages(db_queue, count):
+        pending = count
+        while pending:
+            db_name, page = db_queue.get()
+            if page is _SHARD_DONE:
+                pending -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+
+    def _iter_rows():
+        pool = ThreadPoolExecutor(max_workers=max(max_workers, 1))
+        try:
+            if ordered:
+                db_queues = [queue.Queue(maxsize=PARTITIONED_QUERY_BUFFER_SIZE) for _ in db_names]
+                for db_name, db_queue in zip(db_names, db_queues):
+                    pool.submit(_page_database, db_name, db_queue)
+                merged = heapq.merge(
+                    *[_iter_page_rows(_iter_pages(db_queue, 1)) for db_queue in db_queues],
+                    key=lambda pk_row: pk_row[0]
+                )
+                for pk, row in merged:
+                    yield row
+            else:
+                db_queue = queue.Queue(maxsize=PARTITIONED_QUERY_BUFFER_SIZE * max(max_workers, 1))
+                for db_name in db_names:
+                    pool.submit(_page_database, db_name, db_queue)
+                for page in _iter_pages(db_queue, len(db_names)):
+                    for pk, row in page:
+                        yield row
+        finally:
+            stop.set()
+            pool.shutdown(wait=False)
+
+    return _iter_rows()
+
+
+def _iter_page_rows(pages):
+    for page in pages:
+        yield from page
+
+
 def paginate_query(db_name, model_class, q_expression, annotate=None, query_size=5000, values=None,
                    load_source=None):
     """
@@ -88,7 +206,14 @@ def paginate_query(db_name, model_class, q_expression, annotate=None, query_size
 
     :return: A generator with the results
     """
+    for pk, row in _paginate_query_with_pk(
+            db_name, model_class, q_expression, annotate, query_size, values, load_source):
+        yield row
+
 
+def _paginate_query_with_pk(db_name, model_class, q_expression, annotate=None, query_size=5000, values=None,
+                            load_source=None):
+    """Same as ``paginate_query`` but yields ``(pk, row)`` tuples"""
     track_load = load_counter_for_model(model_class)(load_source, None, extra_tags=['db:{}'.format(db_name)])
     sort_col = 'pk'
 
@@ -112,10 +237,10 @@ def paginate_query(db_name, model_class, q_expression, annotate=None, query_size
             track_load()
             if return_values:
                 value = row[0]
-                yield row[1:]
+                yield value, row[1:]
             else:
                 value = row.pk
-                yield row
+                yield value, row
 
         if len(results) < query_size:
             break
@@ -124,10 +249,20 @@ def paginate_query(db_name, model_class, q_expression, annotate=None, query_size
 
 
 def estimate_partitioned_row_count(model_class, q_expression):
-    """Estimate query row count summed across all partitions"""
+    """Estimate query row count summed across all partitions
+
+    The partitions are queried concurrently."""
     db_names = get_db_aliases_for_partitioned_query()
     query = model_class.objects.using(db_names[0]).filter(q_expression)
-    return estimate_row_count(query, db_names)
+
+    def count(db_name):
+        try:
+            return estimate_row_count(query, db_name)
+        finally:
+            connections[db_name].close()
+
+    with ThreadPoolExecutor(max_workers=min(len(db_names), PARTITIONED_QUERY_MAX_WORKERS)) as pool:
+        return sum(pool.map(count, db_names))
 
 
 def estimate_row_count(query, db_name="default"):
@@ -600,6 +600,28 @@ LOCATIONS_IN_UCR = StaticToggle(
     [NAMESPACE_DOMAIN]
 )
 
+UCR_COMPILED_EXPRESSIONS = StaticToggle(
+    'ucr_compiled_expressions',
+    'Evaluate UCR data sources with compiled expressions',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description=(
+        "Compile data source filters, base item expressions and indicators into a single "
+        "evaluation plan instead of interpreting the expression tree for every document."
+    ),
+)
+
+UCR_BATCHED_RELATED_DOCS = StaticToggle(
+    'ucr_batched_related_docs',
+    'Fetch UCR related documents in bulk for each pillow chunk',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description=(
+        "Look up the documents referenced by related_doc expressions for a whole chunk of changes "
+        "with bulk reads and share them across all documents in the chunk."
+    ),
+)
+
 REPORT_BUILDER = StaticToggle(
     'report_builder',
     'Activate Report Builder for a project without setting up a subscription.',
@@ -1803,6 +1825,107 @@ LIVEQUERY_READ_FROM_STANDBYS = DynamicallyPredictablyRandomToggle(
     """
 )
 
+LIVEQUERY_GRAPH_SNAPSHOT = StaticToggle(
+    'livequery_graph_snapshot',
+    'Reuse the case graph of the previous livequery restore',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Save the livequery case graph with each sync log and only re-query the
+    cases that changed since the previous sync. Not used for users that read
+    from plproxy standbys since replication lag could hide changes from the
+    snapshot.
+    """
+)
+
+STREAMING_RESTORE = StaticToggle(
+    'streaming_restore',
+    'Stream restore responses while they are being generated',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Send restore content to the phone in chunks as it is generated instead
+    of generating the whole response before sending it. Does not apply to
+    asynchronous restores or restores that include the item count.
+    """
+)
+
+PARALLEL_RESTORE_PROVIDERS = StaticToggle(
+    'parallel_restore_providers',
+    'Run restore data providers concurrently',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Generate the sync and registration parts of a restore while the
+    fixture and case parts are generated, instead of one after the other.
+    """
+)
+
+
+SHARED_FIXTURE_CACHE = StaticToggle(
+    'shared_fixture_cache',
+    'Share cached item list and location fixtures between users',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Cache serialized item list and location fixtures in memory and redis,
+    keyed by their content, so users with the same fixture data share
+    one payload instead of generating it on every restore.
+    """
+)
+
+
+INCREMENTAL_SAVED_EXPORTS = StaticToggle(
+    'incremental_saved_exports',
+    'Rebuild daily saved exports incrementally',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Keep the rendered rows of daily saved form and case exports between
+    rebuilds and only render the documents that changed since the last
+    rebuild.
+    """
+)
+
+
+STREAMING_XLSX_EXPORTS = StaticToggle(
+    'streaming_xlsx_exports',
+    'Write Excel exports with the streaming XLSX writer',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Stream the rows of Excel 2007 exports straight into the file instead of
+    building the workbook with openpyxl, so large exports do not run out
+    of memory.
+    """
+)
+
+
+BATCH_REPEAT_RECORDS = StaticToggle(
+    'batch_repeat_records',
+    'Send waiting repeat records in batches per repeater',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Group the repeat records that are due by repeater and send each group
+    in one task, with bulk loads and saves and concurrent requests over
+    pooled connections, instead of queuing one task per repeat record.
+    """
+)
+
+
+PARALLEL_CASE_IMPORT = StaticToggle(
+    'parallel_case_import',
+    'Submit the case blocks of bulk case imports concurrently',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Submit up to four chunks of case blocks at a time during bulk case
+    imports. Chunks that update the same cases, or that reference cases
+    created by an earlier chunk, are still submitted in order.
+    """
+)
+
 
 RUN_CUSTOM_DATA_PULL_REQUESTS = StaticToggle(
     'run_custom_data_pull_requests',
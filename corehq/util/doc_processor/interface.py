@@ -1,5 +1,6 @@
 import weakref
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
 
 from .progress import ProgressManager, ProcessorProgressLogger
@@ -177,10 +178,12 @@ class BulkDocProcessor(DocumentProcessorController):
     100 would exceed available memory.
     :param progress_logger: A ``ProcessorProgressLogger`` object to notify of progress events.
     """
+    event_handler_class = BulkDocProcessorEventHandler
+
     def __init__(self, document_provider, doc_processor, reset=False, max_retry=2,
                  chunk_size=100, progress_logger=None):
 
-        event_handler = BulkDocProcessorEventHandler(self)
+        event_handler = self.event_handler_class(self)
         super(BulkDocProcessor, self).__init__(
             document_provider, doc_processor, reset, max_retry, chunk_size,
             event_handler, progress_logger
@@ -199,3 +202,125 @@ class BulkDocProcessor(DocumentProcessorController):
             self.changes = []
         else:
             raise BulkProcessingFailed("Processing batch failed")
+
+
+class PipelinedBulkDocProcessorEventHandler(BulkDocProcessorEventHandler):
+
+    def page_start(self, total_emitted, *args, **kwargs):
+        processor = self.processor_ref()
+        if processor:
+            processor.start_chunk(args, kwargs)
+        else:
+            raise BulkProcessingFailed("Processor has gone away")
+
+    def stop(self):
+        processor = self.processor_ref()
+        if processor:
+            processor.wait_for_chunks()
+
+
+class _Chunk(object):
+
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.size = 0
+        self.future = None
+
+
+class PipelinedBulkDocProcessor(BulkDocProcessor):
+    """Process docs in batches on multiple threads
+
+    Chunks of documents are fetched in the calling thread while up to
+    ``workers`` chunks are processed concurrently in a thread pool and at
+    most ``prefetch_chunks`` more are waiting to be processed. The
+    ``process_bulk_docs`` method of the document processor must therefore
+    be thread safe.
+
+    The iteration state is saved at the start of the first chunk that has
+    not been processed yet, so a resumed iteration never skips a chunk
+    (chunks after it that had already been processed are sent to the
+    processor again). If processing a chunk fails no more chunks are
+    started and ``BulkProcessingFailed`` is raised once the chunks in
+    progress have finished.
+
+    See ``BulkDocProcessor`` for the other parameters.
+
+    :param workers: Number of chunks processed concurrently.
+    :param prefetch_chunks: Number of chunks fetched ahead of processing.
+    """
+    event_handler_class = PipelinedBulkDocProcessorEventHandler
+
+    def __init__(self, document_provider, doc_processor, reset=False, max_retry=2,
+                 chunk_size=100, progress_logger=None, workers=2, prefetch_chunks=2):
+        super(PipelinedBulkDocProcessor, self).__init__(
+            document_provider, doc_processor, reset, max_retry, chunk_size, progress_logger
+        )
+        self.workers = workers
+        self.prefetch_chunks = prefetch_chunks
+        self.document_iterator.checkpoint_on_page_start = False
+        self._chunks = []
+        self._checkpoint_chunk = None
+        self._pool = None
+
+    def run(self):
+        """
+        :returns: A tuple `(<num processed>, <num skipped>)`
+        """
+        self.progress.total = self.document_provider.get_total_document_count()
+
+        with self.doc_processor, self.progress, ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self._pool = pool
+            for doc in self.document_iterator:
+                self._process_doc(doc)
+            self.wait_for_chunks()
+
+        self.doc_processor.processing_complete(self.progress.skipped)
+
+        return self.progress.processed, self.progress.skipped
+
+    def start_chunk(self, args, kwargs):
+        """Called by the PipelinedBulkDocProcessorEventHandler"""
+        if self._chunks and self._chunks[-1].future is None:
+            # the previous attempt to load this page failed
+            self._chunks.pop()
+        self._chunks.append(_Chunk(args, kwargs))
+        self._checkpoint()
+
+    def process_chunk(self):
+        """Called by the PipelinedBulkDocProcessorEventHandler"""
+        chunk = self._chunks[-1]
+        chunk.size = len(self.changes)
+        chunk.future = self._pool.submit(
+            self.doc_processor.process_bulk_docs, self.changes, self.progress.logger
+        )
+        self.changes = []
+        self._collect_processed_chunks()
+        while len(self._chunks) > self.workers + self.prefetch_chunks:
+            self._collect_processed_chunks(wait=True)
+
+    def wait_for_chunks(self):
+        while self._chunks and self._chunks[0].future is not None:
+            self._collect_processed_chunks(wait=True)
+
+    def _collect_processed_chunks(self, wait=False):
+        """Record the progress of chunks that have been processed, in order
+
+        :param wait: Wait for the first chunk to be processed.
+        """
+        while self._chunks and self._chunks[0].future is not None:
+            chunk = self._chunks[0]
+            if not (wait or chunk.future.done()):
+                break
+            wait = False
+            if not chunk.future.result():
+                raise BulkProcessingFailed("Processing batch failed")
+            self._chunks.pop(0)
+            self.progress.add(chunk.size)
+        self._checkpoint()
+
+    def _checkpoint(self):
+        if self._chunks and self._chunks[0] is not self._checkpoint_chunk:
+            chunk = self._chunks[0]
+            self.document_iterator.checkpoint(chunk.args, chunk.kwargs)
+            self._checkpoint_chunk = chunk
@@ -0,0 +1,166 @@
+"""Cache of ES query results
+
+Results are cached under a hash of the index, the query body and the
+"generation" of each domain the query is restricted to. The ES pillows
+increment the generation of a domain in an index whenever they write
+documents of that domain to it, which makes all cached results of the
+domain in that index unreachable without having to find or delete them.
+
+Only queries of the indices in ``QUERY_CACHE_TIMEOUTS`` that are
+restricted to domains are cached, and the pillows only increment the
+generations of those indices.
+
+Documents only become visible to searches after the index is refreshed,
+so results are not stored until ``WRITE_SETTLE_TIMEOUT`` seconds after
+the last write to any of the domains of the query. Otherwise a query run
+between a write and the next refresh would cache the stale result under
+the new generation.
+
+Results are cached in two tiers: the local memory of the process for at
+most ``MEMORY_TIMEOUT`` seconds, backed by redis for the timeout of the
+index. The generations are always read from redis.
+"""
+import hashlib
+import json
+
+from django.core.cache import caches
+
+from dimagi.utils.couch.cache.cache_core import get_redis_default_cache
+
+from memoized import memoized
+
+from corehq.util.metrics import metrics_counter
+
+# seconds, by ES_META index name
+QUERY_CACHE_TIMEOUTS = {
+    'forms': 5 * 60,
+    'cases': 5 * 60,
+    'active_cases': 5 * 60,
+    'report_cases': 5 * 60,
+    'report_xforms': 5 * 60,
+    'users': 5 * 60,
+    'groups': 5 * 60,
+    'sms': 5 * 60,
+}
+MEMORY_TIMEOUT = 30
+# seconds, twice the refresh_interval of INDEX_STANDARD_SETTINGS
+WRITE_SETTLE_TIMEOUT = 10
+DOMAIN_FIELDS = ('domain', 'domain.exact')
+
+
+def get_query_domains(filters):
+    """Domains a query is restricted to by its top level ``filters`` or
+    None if it is not restricted to domains"""
+    domains = set()
+    for filter_ in filters:
+        for filter_type in ('term', 'terms'):
+            for field, value in filter_.get(filter_type, {}).items():
+                if field in DOMAIN_FIELDS:
+                    values = set(value) if filter_type == 'terms' else {value}
+                    domains = domains & values if domains else values
+    return domains or None
+
+
+@memoized
+def _get_cached_indices():
+    from corehq.elastic import ES_META
+    return {ES_META[index_name].index for index_name in QUERY_CACHE_TIMEOUTS}
+
+
+def is_query_cache_enabled(index):
+    """Whether queries of the ES index (not the ES_META name) are cached"""
+    return index in _get_cached_indices()
+
+
+def _get_generation_key(index, domain):
+    return 'es-index-generation-{}-{}'.format(index, domain)
+
+
+def _get_written_key(index, domain):
+    return 'es-index-written-{}-{}'.format(index, domain)
+
+
+def get_index_generations(index, domains):
+    """Generations of the domains in an ES index or None if documents of
+    any of the domains were written too recently to be searchable"""
+    domains = sorted(domains)
+    keys = [_get_generation_key(index, domain) for domain in domains]
+    written_keys = [_get_written_key(index, domain) for domain in domains]
+    values = get_redis_default_cache().get_many(keys + written_keys)
+    if any(key in values for key in written_keys):
+        return None
+    return [values.get(key, 0) for key in keys]
+
+
+def bump_index_generation(index, domains):
+    """Invalidate cached query results for the domains in an ES index"""
+    cache = get_redis_default_cache()
+    for domain in domains:
+        key = _get_generation_key(index, domain)
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    cache.set_many(
+        {_get_written_key(index, domain): True for domain in domains},
+        timeout=WRITE_SETTLE_TIMEOUT,
+    )
+
+
+class ESQueryCache(object):
+    """
+    :param index_name: ES_META name of the index that is queried
+    :param index: Name of the index in ES
+    :param domains: Domains the query is restricted to. Queries that are
+    not restricted to domains or that are not of an index in
+    ``QUERY_CACHE_TIMEOUTS`` are always run.
+    :param report: Name used to tag metrics
+    """
+
+    def __init__(self, index_name, index, domains, report=None, timeout=None):
+        self.index_name = index_name
+        self.index = index
+        self.domains = domains
+        self.report = report
+        self.timeout = timeout or QUERY_CACHE_TIMEOUTS.get(index_name)
+        self.memory = caches['locmem']
+        self.store = get_redis_default_cache()
+
+    def get_key(self, raw_query, es_instance_alias):
+        """Cache key of the query or None if its result must not be cached"""
+        generations = get_index_generations(self.index, self.domains)
+        if generations is None:
+            return None
+        content = json.dumps(
+            [self.index, es_instance_alias, sorted(self.domains), generations, raw_query],
+            sort_keys=True, default=str,
+        )
+        return 'es-query-{}'.format(hashlib.md5(content.encode('utf-8')).hexdigest())
+
+    def get_or_run(self, raw_query, es_instance_alias, run_fn):
+        """Get the cached result of the query or run it with ``run_fn``"""
+        if not self.domains or self.index_name not in QUERY_CACHE_TIMEOUTS:
+            self._record_metric('uncacheable')
+            return run_fn()
+        key = self.get_key(raw_query, es_instance_alias)
+        if key is None:
+            self._record_metric('unsettled')
+            return run_fn()
+        result = self.memory.get(key)
+        if result is not None:
+            self._record_metric('memory')
+            return result
+        result = self.store.get(key)
+        if result is not None:
+            self._record_metric('redis')
+        else:
+            self._record_metric('miss')
+            result = run_fn()
+            self.store.set(key, result, timeout=self.timeout)
+        self.memory.set(key, result, timeout=min(MEMORY_TIMEOUT, self.timeout))
+        return result
+
+    def _record_metric(self, result):
+        metrics_counter('commcare.es.query_cache', tags={
+            'index': self.index_name,
+            'report': self.report or 'unknown',
+            'result': result,
+        })
@@ -232,6 +232,10 @@ class ResumableFunctionIterator(object):
     iteration immediately (it may be resumed later).
     """
 
+    # Save the position of the iteration at the start of each page. Set to
+    # False to save it with ``checkpoint`` instead.
+    checkpoint_on_page_start = True
+
     def __init__(self, iteration_key, data_function, args_provider, item_getter, event_handler=None):
         self.iteration_key = iteration_key
         self.data_function = data_function
@@ -335,6 +339,12 @@ class ResumableFunctionIterator(object):
         self.state.progress[key] = value
         self._save_state()
 
+    def checkpoint(self, args, kwargs):
+        """Save the arguments of the page that a resumed iteration starts from"""
+        self.state.args = list(args)
+        self.state.kwargs = kwargs
+        self._save_state()
+
     def _save_state(self):
         self.state.timestamp = datetime.utcnow()
         state_json = self.state.to_json()
@@ -367,9 +377,8 @@ class ResumableIteratorEventHandler(PaginationEventHandler):
         self.iterator = iterator
 
     def page_start(self, total_emitted, *args, **kwargs):
-        self.iterator.state.args = list(args)
-        self.iterator.state.kwargs = kwargs
-        self.iterator._save_state()
+        if self.iterator.checkpoint_on_page_start:
+            self.iterator.checkpoint(args, kwargs)
 
 
 class StopToResume(Exception):
@@ -15,7 +15,8 @@ from corehq.form_processor.utils import TestFormMetadata
 from corehq.form_processor.utils.xform import get_simple_wrapped_form
 from corehq.util.doc_processor.couch import resumable_docs_by_type_iterator, CouchDocumentProvider
 from corehq.util.doc_processor.interface import (
-    BaseDocProcessor, DocumentProcessorController, BulkDocProcessor, BulkProcessingFailed
+    BaseDocProcessor, DocumentProcessorController, BulkDocProcessor, BulkProcessingFailed,
+    PipelinedBulkDocProcessor
 )
 from corehq.util.doc_processor.sql import resumable_sql_model_iterator
 from corehq.util.pagination import TooManyRetries
@@ -578,3 +579,24 @@ class TestBulkDocProcessor(BaseCouchDocProcessorTest):
             {'bar-{}'.format(ident) for ident in range(4)} | {'foo-{}'.format(ident) for ident in range(4)},
             doc_processor.docs_processed
         )
+
+
+class TestPipelinedBulkDocProcessor(TestBulkDocProcessor):
+    processor_class = PipelinedBulkDocProcessor
+
+    def test_failed_chunk_is_resumed_after_later_chunks(self):
+        # the second chunk may be processed before the first one fails
+        doc_processor, processor = self._get_processor(skip_docs=['bar-0'])
+        with self.assertRaises(BulkProcessingFailed):
+            processor.run()
+
+        self.assertNotIn('bar-0', doc_processor.docs_processed)
+
+        doc_processor, processor = self._get_processor()
+        processed, skipped = processor.run()
+        self.assertEqual(processed, 4)
+        self.assertEqual(skipped, 0)
+        self.assertEqual(
+            {'bar-{}'.format(ident) for ident in range(4)},
+            doc_processor.docs_processed
+        )
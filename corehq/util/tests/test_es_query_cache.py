@@ -0,0 +1,102 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from corehq.util.es.query_cache import (
+    ESQueryCache,
+    _get_written_key,
+    bump_index_generation,
+    get_query_domains,
+)
+from corehq.util.test_utils import generate_cases
+
+
+class GetQueryDomainsTest(SimpleTestCase):
+    pass
+
+
+@generate_cases([
+    ([{'term': {'domain.exact': 'a'}}], {'a'}),
+    ([{'terms': {'domain.exact': ['a', 'b']}}], {'a', 'b'}),
+    ([{'terms': {'domain': ['a', 'b']}}, {'term': {'domain.exact': 'b'}}], {'b'}),
+    ([{'term': {'doc_type': 'XFormInstance'}}, {'term': {'domain': 'a'}}], {'a'}),
+    ([{'term': {'doc_type': 'XFormInstance'}}], None),
+    ([{'or': [{'term': {'domain.exact': 'a'}}, {'term': {'domain.exact': 'b'}}]}], None),
+], GetQueryDomainsTest)
+def test_get_query_domains(self, filters, expected):
+    self.assertEqual(get_query_domains(filters), expected)
+
+
+class ESQueryCacheTest(SimpleTestCase):
+    query = {'query': {'filtered': {'filter': {'and': [{'term': {'domain.exact': 'test'}}]}}}}
+
+    def setUp(self):
+        self.redis = LocMemCache('es-query-cache-redis', {})
+        self.memory = LocMemCache('es-query-cache-memory', {})
+        self.other_memory = LocMemCache('es-query-cache-other-memory', {})
+        for cache in [self.redis, self.memory, self.other_memory]:
+            cache.clear()
+        patcher = patch('corehq.util.es.query_cache.get_redis_default_cache', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.runs = 0
+
+    def run_query(self):
+        self.runs += 1
+        return {'hits': {'total': self.runs}}
+
+    def get_result(self, domains=('test',), memory=None, query=None, index_name='forms'):
+        cache = ESQueryCache(index_name, 'xforms', set(domains) if domains else None, report='test')
+        cache.memory = memory or self.memory
+        return cache.get_or_run(query or self.query, 'default', self.run_query)
+
+    def test_cached(self):
+        self.assertEqual(self.get_result(), {'hits': {'total': 1}})
+        self.assertEqual(self.get_result(), {'hits': {'total': 1}})
+        self.assertEqual(self.runs, 1)
+
+    def test_shared_tier(self):
+        self.get_result()
+        self.get_result(memory=self.other_memory)
+        self.assertEqual(self.runs, 1)
+
+    def test_different_query(self):
+        self.get_result()
+        self.get_result(query={'size': 0})
+        self.assertEqual(self.runs, 2)
+
+    def bump_generation(self, domains):
+        bump_index_generation('xforms', domains)
+        # as if the index was refreshed
+        self.redis.delete_many([_get_written_key('xforms', domain) for domain in domains])
+
+    def test_invalidated_by_writes_to_domain(self):
+        self.get_result()
+        self.bump_generation({'other'})
+        self.get_result()
+        self.assertEqual(self.runs, 1)
+        self.bump_generation({'test'})
+        self.assertEqual(self.get_result(), {'hits': {'total': 2}})
+        self.bump_generation({'test'})
+        self.get_result()
+        self.assertEqual(self.runs, 3)
+
+    def test_not_cached_until_writes_are_searchable(self):
+        self.get_result()
+        bump_index_generation('xforms', {'test'})
+        self.get_result()
+        self.assertEqual(self.get_result(), {'hits': {'total': 3}})
+        self.redis.delete(_get_written_key('xforms', 'test'))
+        self.get_result()
+        self.assertEqual(self.get_result(), {'hits': {'total': 4}})
+
+    def test_not_restricted_to_domains(self):
+        self.get_result(domains=None)
+        self.get_result(domains=None)
+        self.assertEqual(self.runs, 2)
+
+    def test_index_not_cached(self):
+        self.get_result(index_name='case_search')
+        self.get_result(index_name='case_search')
+        self.assertEqual(self.runs, 2)
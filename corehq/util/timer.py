@@ -23,6 +23,9 @@ class NestableTimer(object):
     def init(self, root, parent):
         self.root = root
         self.parent = parent
+        # timers recorded by another TimingContext may already have subs
+        for sub in self.subs:
+            sub.init(root, self)
 
     def start(self):
         self.beginning = time.time()
@@ -340,6 +340,7 @@ HQ_APPS = (
     'corehq.motech.dhis2',
     'corehq.motech.openmrs',
     'corehq.motech.repeaters',
+    'corehq.motech.repeaters.repeaters_partitioned',
     'corehq.util',
     'dimagi.ext',
     'corehq.blobs',
@@ -726,6 +727,12 @@ CASE_ES_DROP_FORM_FIELDS = False
 # Set to None to enable all or empty tuple to disable all.
 REPEATERS_WHITELIST = None
 
+# Set to True to keep an index of the repeat records that are waiting to
+# be sent in the repeaters_partitioned SQL table and to claim due records
+# from it instead of iterating a Couch view. Populate the table with
+# `./manage.py populate_repeat_record_queue` before enabling this.
+USE_SQL_REPEAT_RECORD_QUEUE = False
+
 # If ENABLE_PRELOGIN_SITE is set to true, redirect to Dimagi.com urls
 ENABLE_PRELOGIN_SITE = False
 
@@ -1,6 +1,6 @@
 import uuid
 
-from django.test import override_settings, TestCase
+from django.test import override_settings, SimpleTestCase, TestCase
 from mock import MagicMock, patch
 
 from corehq.apps.case_search.const import SPECIAL_CASE_PROPERTIES_MAP
@@ -19,6 +19,7 @@ from corehq.elastic import get_es_new
 from corehq.form_processor.tests.utils import FormProcessorTestUtils
 from corehq.pillows.case import get_case_pillow
 from corehq.pillows.case_search import (
+    CaseSearchPillowProcessor,
     CaseSearchReindexerFactory,
     delete_case_search_cases,
     domains_needing_search_index,
@@ -30,6 +31,39 @@ from corehq.pillows.mappings.case_search_mapping import (
 from corehq.util.elastic import ensure_index_deleted
 from corehq.util.test_utils import create_and_save_a_case
 from pillowtop.es_utils import initialize_index_and_mapping
+from pillowtop.feed.interface import Change, ChangeMeta
+from pillowtop.processors.elastic import BulkElasticProcessor
+
+
+@patch.object(BulkElasticProcessor, 'process_changes_chunk', return_value=([], []))
+class CaseSearchPillowProcessorTest(SimpleTestCase):
+
+    def _get_change(self, domain):
+        case_id = uuid.uuid4().hex
+        metadata = ChangeMeta(document_id=case_id, data_source_type='sql', data_source_name='case-sql',
+                              domain=domain)
+        return Change(case_id, 0, metadata=metadata)
+
+    def _process_chunk(self, changes):
+        processor = CaseSearchPillowProcessor(
+            elasticsearch=MagicMock(), index_info=CASE_SEARCH_INDEX_INFO)
+        with patch('corehq.pillows.case_search.domain_needs_search_index',
+                   new=MagicMock(side_effect=lambda domain: domain == 'enabled')) as needs_search_index:
+            result = processor.process_changes_chunk(changes)
+        return result, needs_search_index
+
+    def test_filters_domains(self, process_changes_chunk):
+        changes = [self._get_change(domain) for domain in ['enabled', 'disabled', 'enabled', 'disabled']]
+        result, needs_search_index = self._process_chunk(changes)
+        self.assertEqual(result, ([], []))
+        process_changes_chunk.assert_called_once_with([changes[0], changes[2]])
+        # the lookup is made once per domain in the chunk
+        self.assertEqual(sorted(call[0][0] for call in needs_search_index.call_args_list), ['disabled', 'enabled'])
+
+    def test_no_changes_to_index(self, process_changes_chunk):
+        result, _ = self._process_chunk([self._get_change('disabled'), self._get_change(None)])
+        self.assertEqual(result, ([], []))
+        process_changes_chunk.assert_not_called()
 
 
 class CaseSearchPillowTest(TestCase):